@@ -0,0 +1,184 @@
+import os
+import time
+
+from pydub import AudioSegment
+from pydub.silence import detect_nonsilent
+
+# --- CONFIGURATION ---
+
+# OpenAI rejects uploads over 26,214,400 bytes
+WHISPER_LIMIT_BYTES = 25 * 1024 * 1024
+
+# Only gaps at least this long are cut; normal pauses between sentences stay in
+MIN_SILENCE_MS = 2000
+# Relative to the clip's average loudness, so quiet recordings still trim
+SILENCE_THRESH_OFFSET_DB = -16
+# Audio kept either side of each speech span so words are not clipped
+KEEP_PADDING_MS = 300
+SEEK_STEP_MS = 50
+
+# Available encodings, highest first. Whisper resamples everything to
+# 16 kHz mono internally, so nothing above that is worth uploading.
+ENCODING_LADDER = [
+    (32, 16000),
+    (24, 16000),
+    (16, 16000),
+    (12, 8000),
+    (8, 8000),
+]
+# Cheapest rung that still transcribes as well as the 32k encode; rungs below
+# it are only used when the audio would not fit under the limit otherwise.
+QUALITY_FLOOR = (
+    int(os.getenv("TRANSCRIBE_MIN_KBPS", "16")),
+    int(os.getenv("TRANSCRIBE_MIN_SAMPLE_RATE", "16000")),
+)
+# MP3 frame headers / ID3 tags on top of the raw bitrate
+CONTAINER_OVERHEAD = 1.03
+
+
+def detect_speech_spans(audio, min_silence_ms=MIN_SILENCE_MS, keep_padding_ms=KEEP_PADDING_MS):
+    """
+    Returns [(start_ms, end_ms), ...] of the audio worth keeping.
+    Long silences (and anything quieter than the threshold) fall between spans.
+    """
+    silence_thresh = audio.dBFS + SILENCE_THRESH_OFFSET_DB
+    spans = detect_nonsilent(
+        audio,
+        min_silence_len=min_silence_ms,
+        silence_thresh=silence_thresh,
+        seek_step=SEEK_STEP_MS,
+    )
+    if not spans:
+        return [(0, len(audio))]
+
+    # Pad and merge spans that now touch
+    padded = []
+    for start, end in spans:
+        start = max(0, start - keep_padding_ms)
+        end = min(len(audio), end + keep_padding_ms)
+        if padded and start <= padded[-1][1]:
+            padded[-1] = (padded[-1][0], max(padded[-1][1], end))
+        else:
+            padded.append((start, end))
+    return padded
+
+
+def trim_silence(audio):
+    """
+    Cuts long silences out of an AudioSegment.
+    Returns (trimmed_audio, offset_map). Each offset_map entry is
+    (trimmed_start, original_start, duration) in seconds.
+    """
+    spans = detect_speech_spans(audio)
+    trimmed = AudioSegment.empty()
+    offset_map = []
+    cursor_ms = 0
+    for start, end in spans:
+        trimmed += audio[start:end]
+        offset_map.append((cursor_ms / 1000, start / 1000, (end - start) / 1000))
+        cursor_ms += end - start
+    return trimmed, offset_map
+
+
+def to_original_time(t, offset_map):
+    """
+    Translates a timestamp on the trimmed timeline back to the original media.
+    """
+    if not offset_map:
+        return t
+    for trimmed_start, original_start, duration in offset_map:
+        if t < trimmed_start + duration:
+            return original_start + max(0.0, t - trimmed_start)
+    # Past the end (Whisper rounding): anchor to the last span
+    trimmed_start, original_start, duration = offset_map[-1]
+    return original_start + (t - trimmed_start)
+
+
+def remap_segments(segments, offset_map):
+    """
+    Returns Whisper segments as dicts with start/end on the original timeline.
+    """
+    remapped = []
+    for seg in segments:
+        # Handle Object vs Dict access (OpenAI SDK returns objects)
+        text = seg.text if hasattr(seg, 'text') else seg['text']
+        start = seg.start if hasattr(seg, 'start') else seg['start']
+        end = seg.end if hasattr(seg, 'end') else seg['end']
+        remapped.append({
+            "start": to_original_time(start, offset_map),
+            "end": to_original_time(end, offset_map),
+            "text": text,
+        })
+    return remapped
+
+
+def choose_encoding(duration_s, limit_bytes=WHISPER_LIMIT_BYTES):
+    """
+    Picks the smallest (bitrate_kbps, sample_rate) from ENCODING_LADDER that
+    still meets QUALITY_FLOOR and fits under limit_bytes. Audio too long for
+    the floor drops to the best lower rung that fits, then the smallest rung.
+    """
+    floor_kbps, floor_rate = QUALITY_FLOOR
+    acceptable = [(kbps, rate) for kbps, rate in ENCODING_LADDER if kbps >= floor_kbps and rate >= floor_rate]
+    below_floor = [rung for rung in ENCODING_LADDER if rung not in acceptable]
+    # Cheapest acceptable rung first, then the least degraded fallback
+    for bitrate_kbps, sample_rate in acceptable[::-1] + below_floor:
+        estimated = bitrate_kbps * 1000 / 8 * duration_s * CONTAINER_OVERHEAD
+        if estimated <= limit_bytes:
+            return bitrate_kbps, sample_rate
+    return ENCODING_LADDER[-1]
+
+
+def preprocess_audio(filepath, output_path, limit_bytes=WHISPER_LIMIT_BYTES, trim=True):
+    """
+    Mono, silence-trimmed, size-capped MP3 ready for Whisper.
+    Returns (output_path, offset_map, stats) or (None, None, stats) if the
+    result is still over the limit at the smallest encoding.
+    """
+    started = time.perf_counter()
+    audio = AudioSegment.from_file(filepath).set_channels(1)
+    original_s = len(audio) / 1000
+
+    if trim:
+        audio, offset_map = trim_silence(audio)
+    else:
+        offset_map = [(0.0, 0.0, original_s)]
+    kept_s = len(audio) / 1000
+
+    bitrate_kbps, sample_rate = choose_encoding(kept_s, limit_bytes)
+    audio = audio.set_frame_rate(sample_rate)
+    audio.export(output_path, format="mp3", bitrate=f"{bitrate_kbps}k")
+
+    stats = {
+        "original_seconds": original_s,
+        "kept_seconds": kept_s,
+        "input_bytes": os.path.getsize(filepath),
+        "upload_bytes": os.path.getsize(output_path),
+        "bitrate_kbps": bitrate_kbps,
+        "sample_rate": sample_rate,
+        "preprocess_seconds": time.perf_counter() - started,
+    }
+
+    print(f"   ✂️  Kept {kept_s / 60:.1f} of {original_s / 60:.1f} min "
+          f"@ {bitrate_kbps}k/{sample_rate // 1000}kHz -> {stats['upload_bytes'] / 1024 / 1024:.2f} MB")
+
+    if stats["upload_bytes"] > limit_bytes:
+        print("   ⚠️ WARNING: Still over the upload limit at the smallest encoding.")
+        os.remove(output_path)
+        return None, None, stats
+
+    return output_path, offset_map, stats
+
+
+def report_upload_stats(stats, transcribe_seconds):
+    """
+    Prints upload size and Whisper latency normalised per hour of original audio.
+    """
+    hours = stats["original_seconds"] / 3600
+    if hours <= 0:
+        return
+    stats["transcribe_seconds"] = transcribe_seconds
+    print(f"   📊 {stats['upload_bytes'] / 1024 / 1024 / hours:.1f} MB uploaded/hour "
+          f"(was {stats['input_bytes'] / 1024 / 1024 / hours:.1f}), "
+          f"{transcribe_seconds / hours:.0f}s transcription/hour, "
+          f"{100 * (1 - stats['kept_seconds'] / stats['original_seconds']):.0f}% silence skipped")
@@ -1,39 +1,156 @@
 import os
-from moviepy import VideoFileClip 
+import sys
+import json
+import time
+import shutil
+import subprocess
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 # --- CONFIGURATION ---
-LOCAL_VIDEO_PATH = "Emotional_Intelligence_Workshop.mp4" 
+LOCAL_VIDEO_PATH = "Emotional_Intelligence_Workshop.mp4"
 OUTPUT_DIR = "audio_output"
 
+VIDEO_EXTENSIONS = ('.mp4', '.mov', '.mkv', '.webm', '.m4v', '.avi')
+
+# Each ffmpeg runs single-threaded; parallelism comes from running one per core
+DEFAULT_WORKERS = os.cpu_count() or 4
+
 # Ensure output directory exists
 if not os.path.exists(OUTPUT_DIR):
     os.makedirs(OUTPUT_DIR)
 
-def extract_local_audio(video_path):
+def probe_audio(video_path):
+    """
+    Reads container metadata only (no decoding).
+    Returns (audio_codec, duration_seconds); codec is None if there's no audio.
+    """
+    result = subprocess.run(
+        ["ffprobe", "-v", "error", "-select_streams", "a:0",
+         "-show_entries", "stream=codec_name:format=duration",
+         "-of", "json", video_path],
+        capture_output=True, text=True, check=True
+    )
+    info = json.loads(result.stdout or "{}")
+    streams = info.get("streams") or []
+    codec = streams[0].get("codec_name") if streams else None
+    duration = float(info.get("format", {}).get("duration") or 0)
+    return codec, duration
+
+def is_up_to_date(video_path, output_path):
+    return os.path.exists(output_path) and os.path.getmtime(output_path) >= os.path.getmtime(video_path)
+
+def output_names(videos):
+    """
+    Maps each video to its .mp3 name. Stems shared by several files
+    (talk.mp4 and talk.mov) keep their extension: talk.mp4.mp3, talk.mov.mp3.
+    """
+    stems = {}
+    for video in videos:
+        stem = os.path.splitext(os.path.basename(video))[0]
+        stems[stem] = stems.get(stem, 0) + 1
+    names = {}
+    for video in videos:
+        base = os.path.basename(video)
+        stem = os.path.splitext(base)[0]
+        names[video] = f"{base if stems[stem] > 1 else stem}.mp3"
+    return names
+
+def extract_local_audio(video_path, force=False, output_name=None):
+    """
+    Pulls the audio track out of a local video with ffmpeg.
+    Video streams are never mapped, so no frames are decoded. MP3 sources are
+    stream-copied; anything else is decoded audio-only to 32k mono MP3.
+    Returns seconds of media processed (0 if skipped or failed).
+    """
     if not os.path.exists(video_path):
         print(f"\n⚠️  Could not find local file: {video_path}")
         print("   -> Make sure the file is in the same folder as this script, or provide the full path.")
-        return
+        return 0
+
+    # Create output filename based on input video name
+    base_name = os.path.splitext(os.path.basename(video_path))[0]
+    output_path = os.path.join(OUTPUT_DIR, output_name or f"{base_name}.mp3")
+    # Write to a temp name and rename so a killed run never looks up to date
+    tmp_path = output_path + ".part"
+
+    if not force and is_up_to_date(video_path, output_path):
+        print(f"⏩ Up to date: {output_path}")
+        return 0
 
-    print(f"\n🎙️  Extracting audio from local file (32k bitrate)...")
     try:
-        video = VideoFileClip(video_path)
-        
-        # Create output filename based on input video name
-        base_name = os.path.splitext(os.path.basename(video_path))[0]
-        output_path = os.path.join(OUTPUT_DIR, f"{base_name}.mp3")
-        
-        # Write audio file
-        video.audio.write_audiofile(output_path, bitrate="32k") 
-        
-        video.close()
+        codec, duration = probe_audio(video_path)
+        if not codec:
+            print(f"⚠️  No audio track in {video_path}")
+            return 0
+
+        if codec == "mp3":
+            audio_args = ["-c:a", "copy"]
+            mode = "stream copy"
+        else:
+            audio_args = ["-c:a", "libmp3lame", "-b:a", "32k", "-ac", "1", "-ar", "16000"]
+            mode = "audio-only decode"
+
+        print(f"🎙️  Extracting audio from {os.path.basename(video_path)} ({mode})...")
+
+        subprocess.run(
+            ["ffmpeg", "-v", "error", "-y", "-threads", "1",
+             "-i", video_path,
+             "-map", "0:a:0", "-vn", "-sn", "-dn",
+             *audio_args, "-f", "mp3", tmp_path],
+            check=True, capture_output=True, text=True
+        )
+        os.replace(tmp_path, output_path)
+
         print(f"✅ Saved to: {output_path}")
-        
+        return duration
+
+    except subprocess.CalledProcessError as e:
+        print(f"❌ Error extracting local audio from {video_path}: {(e.stderr or '').strip()}")
     except Exception as e:
         print(f"❌ Error extracting local audio: {e}")
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return 0
+
+def extract_directory(directory, workers=DEFAULT_WORKERS, force=False):
+    videos = sorted(
+        os.path.join(directory, f) for f in os.listdir(directory)
+        if f.lower().endswith(VIDEO_EXTENSIONS)
+    )
+    if not videos:
+        print(f"⚠️  No video files found in {directory}")
+        return
+
+    print(f"🔎 Found {len(videos)} videos. Extracting with {workers} workers...")
+    started = time.perf_counter()
+    media_seconds = 0
+    names = output_names(videos)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(extract_local_audio, v, force, names[v]) for v in videos]
+        for future in as_completed(futures):
+            media_seconds += future.result()
+
+    elapsed_min = (time.perf_counter() - started) / 60
+    if media_seconds and elapsed_min > 0:
+        print(f"\n📊 {media_seconds / 3600:.2f} media hours in {elapsed_min * 60:.1f}s "
+              f"({media_seconds / 3600 / elapsed_min:.2f} media hours/minute)")
 
 if __name__ == "__main__":
-    if LOCAL_VIDEO_PATH:
-        extract_local_audio(LOCAL_VIDEO_PATH)
+    # Usage: python extract_local.py [video_or_directory] [workers] [--force]
+    if not shutil.which("ffmpeg") or not shutil.which("ffprobe"):
+        print("❌ ffmpeg/ffprobe not found. Install with: 'brew install ffmpeg'")
+        sys.exit(1)
+
+    args = [a for a in sys.argv[1:] if a != "--force"]
+    force = "--force" in sys.argv[1:]
+    target = args[0] if args else LOCAL_VIDEO_PATH
+    workers = int(args[1]) if len(args) > 1 else DEFAULT_WORKERS
+
+    if not target:
+        print("⚠️ No file path provided in LOCAL_VIDEO_PATH.")
+    elif os.path.isdir(target):
+        extract_directory(target, workers, force)
     else:
-        print("⚠️ No file path provided in LOCAL_VIDEO_PATH.")
\ No newline at end of file
+        extract_local_audio(target, force)
@@ -2,6 +2,7 @@ const path = require('path');
 require('dotenv').config({ path: path.resolve(__dirname, '../../.env') });
 
 const fs = require('fs');
+const readline = require('readline');
 const { createClient } = require('@supabase/supabase-js');
 const { OpenAI } = require('openai');
 
@@ -17,11 +18,12 @@ const MIN_CHUNK_LENGTH = 800;
 const MAX_CHUNK_LENGTH = 2000;
 
 // 🗺️ URL MAPPING
-// Map filenames to their source URLs so citations are clickable.
+// Map episode titles (the filename without .mp3.jsonl / .mp3.json) to their
+// source URLs so citations are clickable. Full filenames still work too.
 // If a file isn't listed here, it will just default to an empty link.
 const URL_MAP = {
   // Example:
-  // "Inside Oddbox The CMO Who Helped a Purpose-Driven Brand Become a Growth Machine - Ep 68.mp3.json": "https://youtu.be/..."
+  // "Inside Oddbox The CMO Who Helped a Purpose-Driven Brand Become a Growth Machine - Ep 68": "https://youtu.be/..."
 };
 
 // Initialize Clients
@@ -39,40 +41,60 @@ async function generateEmbedding(text) {
   return response.data[0].embedding;
 }
 
-function chunkTranscript(segments) {
-  const chunks = [];
+// Yields segments one at a time. .jsonl transcripts (header line + one
+// segment per line) are streamed so memory stays flat on long episodes;
+// legacy indent=2 .json files are parsed whole.
+async function* readSegments(filePath) {
+  if (filePath.endsWith('.jsonl')) {
+    const rl = readline.createInterface({
+      input: fs.createReadStream(filePath, { encoding: 'utf8' }),
+      crlfDelay: Infinity
+    });
+    let isHeader = true;
+    for await (const line of rl) {
+      if (isHeader) { isHeader = false; continue; }
+      if (line.trim()) yield JSON.parse(line);
+    }
+    return;
+  }
+  const rawData = JSON.parse(fs.readFileSync(filePath, 'utf8'));
+  yield* rawData.segments;
+}
+
+async function* chunkTranscript(segments) {
   let currentChunkText = "";
-  let currentStartTime = segments[0]?.start || 0;
+  let currentStartTime = null;
+  let lastEnd = 0;
   
-  for (let i = 0; i < segments.length; i++) {
-    const segment = segments[i];
+  for await (const segment of segments) {
+    if (currentStartTime === null) currentStartTime = segment.start || lastEnd;
     currentChunkText += (currentChunkText ? " " : "") + segment.text;
+    lastEnd = segment.end;
 
     if (currentChunkText.length >= MIN_CHUNK_LENGTH) {
       const isEndOfSentence = /[.!?]$/.test(segment.text.trim());
       if (isEndOfSentence || currentChunkText.length >= MAX_CHUNK_LENGTH) {
-        chunks.push({
+        yield {
           content: currentChunkText,
           metadata: {
             timestampStart: Math.floor(currentStartTime),
             timestampEnd: Math.ceil(segment.end)
           }
-        });
+        };
         currentChunkText = "";
-        currentStartTime = segments[i + 1]?.start || segment.end;
+        currentStartTime = null;
       }
     }
   }
   if (currentChunkText.length > 100) {
-    chunks.push({
+    yield {
       content: currentChunkText,
       metadata: {
         timestampStart: Math.floor(currentStartTime),
-        timestampEnd: Math.ceil(segments[segments.length - 1].end)
+        timestampEnd: Math.ceil(lastEnd)
       }
-    });
+    };
   }
-  return chunks;
 }
 
 async function processFile(filename) {
@@ -84,11 +106,10 @@ async function processFile(filename) {
       return;
   }
 
-  const rawData = JSON.parse(fs.readFileSync(filePath, 'utf8'));
-  const cleanTitle = filename.replace('.mp3.json', '').replace('.json', '');
+  const cleanTitle = filename.replace(/\.jsonl?$/, '').replace(/\.mp3$/, '');
 
   // Look up URL in the map, otherwise default to empty string
-  const sourceUrl = URL_MAP[filename] || "";
+  const sourceUrl = URL_MAP[cleanTitle] || URL_MAP[filename] || "";
 
   // --- STEP 1: CREATE PARENT DOCUMENT ---
   console.log(`   📚 Creating Document Entry: "${cleanTitle}"...`);
@@ -112,10 +133,11 @@ async function processFile(filename) {
   const documentId = docData.id;
 
   // --- STEP 2: CREATE CHUNKS ---
-  const chunks = chunkTranscript(rawData.segments);
-  console.log(`   👉 Created ${chunks.length} chunks. Uploading...`);
+  console.log(`   👉 Chunking and uploading...`);
+  let chunkCount = 0;
 
-  for (const chunk of chunks) {
+  for await (const chunk of chunkTranscript(readSegments(filePath))) {
+    chunkCount++;
     const embedding = await generateEmbedding(chunk.content);
 
     const { error } = await supabase.from('provider_knowledge').insert({
@@ -128,17 +150,20 @@ async function processFile(filename) {
 
     if (error) console.error(`   ❌ Chunk Error:`, error);
   }
-  console.log(`   ✅ Done with ${cleanTitle}`);
+  console.log(`   ✅ Done with ${cleanTitle} (${chunkCount} chunks)`);
 }
 
 (async () => {
   console.log(`📂 Scanning directory: ${INPUT_DIR}`);
   
-  // Find all JSON files in the directory
-  const files = fs.readdirSync(INPUT_DIR).filter(file => file.endsWith('.json'));
+  // Find all transcripts; prefer .jsonl when both formats exist
+  const all = fs.readdirSync(INPUT_DIR);
+  const files = all.filter(file =>
+    file.endsWith('.jsonl') || (file.endsWith('.json') && !all.includes(file + 'l'))
+  );
 
   if (files.length === 0) {
-      console.log("⚠️ No .json transcript files found.");
+      console.log("⚠️ No .jsonl/.json transcript files found.");
       return;
   }
 
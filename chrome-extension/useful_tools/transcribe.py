@@ -1,14 +1,21 @@
 import os
-import json
+import sys
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from openai import OpenAI
 from dotenv import load_dotenv
+from transcript_format import JSONL_SUFFIX, read_header, write_transcript
 
 # Try importing pydub for compression
 try:
-    from pydub import AudioSegment
+    from audio_preprocess import (
+        WHISPER_LIMIT_BYTES, preprocess_audio, remap_segments, report_upload_stats
+    )
     PYDUB_AVAILABLE = True
 except ImportError:
+    WHISPER_LIMIT_BYTES = 25 * 1024 * 1024
     PYDUB_AVAILABLE = False
     print("⚠️ Warning: 'pydub' not installed. Large files (>25MB) will fail.")
 
@@ -25,134 +32,232 @@ if not api_key:
     print("❌ ERROR: Could not find OPENAI_API_KEY in your .env file.")
     exit(1)
 
+# OPENAI_BASE_URL (read by the SDK) can point this at a local stub for benchmarking
 client = OpenAI(api_key=api_key)
 
 # Directories
 INPUT_DIR = PROJECT_ROOT / "audio_output"
 OUTPUT_DIR = PROJECT_ROOT / "transcripts"
 
+# Concurrent Whisper uploads in batch mode
+DEFAULT_WORKERS = int(os.getenv("TRANSCRIBE_WORKERS", "4"))
+
 if not os.path.exists(OUTPUT_DIR):
     os.makedirs(OUTPUT_DIR)
 
 def compress_audio(filepath):
     """
-    Compresses audio to ensure it is under the 25MB limit.
-    Returns the path to the temporary compressed file.
+    Trims long silences and re-encodes so the upload is under the 25MB limit.
+    Returns (temp_path, offset_map, stats); temp_path is None on failure.
     """
     if not PYDUB_AVAILABLE:
         raise Exception("pydub library is required to compress large files. Run: pip3 install pydub")
 
-    print(f"   📉 File > 25MB. Compressing audio to shrink size...")
+    print(f"   📉 Preprocessing audio (silence trim + size cap)...")
     
     try:
-        audio = AudioSegment.from_file(filepath)
-        
-        # Convert to Mono (1 channel)
-        audio = audio.set_channels(1)
-        
-        # Export as a temporary MP3 with 32k bitrate (More aggressive compression)
-        # 32k is sufficient for speech recognition and creates very small files
         temp_path = filepath.with_suffix('.temp.mp3')
-        audio.export(temp_path, format="mp3", bitrate="32k")
-        
-        new_size = os.path.getsize(temp_path)
-        print(f"   ✅ Compressed: {new_size / 1024 / 1024:.2f} MB")
-        
-        # Safety check: If still > 25MB, warn the user (rare with 32k)
-        if new_size > 25 * 1024 * 1024:
-             print("   ⚠️ WARNING: File is STILL over 25MB even after compression. OpenAI might reject it.")
-        
-        return temp_path
+        return preprocess_audio(filepath, temp_path)
     except Exception as e:
         print(f"   ❌ Compression failed: {e}")
         if "ffmpeg" in str(e).lower() or "no such file" in str(e).lower():
             print("      (Make sure you have installed ffmpeg: 'brew install ffmpeg')")
-        return None
+        return None, None, None
 
-def transcribe_file(filepath):
-    filename = os.path.basename(filepath)
-    print(f"🎤 Transcribing: {filename}...")
+def transcript_path_for(filepath, suffix=JSONL_SUFFIX):
+    original_filename = os.path.basename(filepath).replace(".temp.mp3", ".mp3")
+    return OUTPUT_DIR / f"{original_filename}{suffix}"
 
+def is_up_to_date(filepath):
+    """
+    True if a transcript exists for this exact source file (same size + mtime).
+    Older transcripts without source info count as fresh if newer than the audio.
+    """
+    output_path = transcript_path_for(filepath)
+    if not os.path.exists(output_path):
+        # Legacy indent=2 transcript from before the .jsonl format
+        output_path = transcript_path_for(filepath, ".json")
+        if not os.path.exists(output_path):
+            return False
+
+    src = os.stat(filepath)
+    try:
+        source = read_header(output_path).get("source")
+    except (OSError, ValueError):
+        return False
+
+    if source:
+        return source.get("size") == src.st_size and source.get("mtime") == src.st_mtime
+    return os.path.getmtime(output_path) >= src.st_mtime
+
+def prepare_file(filepath):
+    """
+    CPU/disk half of a transcription: silence trim + compression.
+    Returns a job dict for upload_file, or None if the file can't be sent.
+    """
     # Check file size (limit is strictly 26,214,400 bytes)
     file_size = os.path.getsize(filepath)
-    limit_bytes = 25 * 1024 * 1024 
     
-    actual_filepath = filepath
-    is_temp_file = False
+    job = {
+        "filepath": filepath,
+        "upload_path": filepath,
+        "is_temp_file": False,
+        "offset_map": None,
+        "stats": None,
+    }
 
-    # If file is too big, attempt compression
-    if file_size > limit_bytes:
-        print(f"   ⚠️ File size {file_size / 1024 / 1024:.2f}MB exceeds 25MB limit.")
-        compressed_path = compress_audio(filepath)
+    # Trim silence whenever we can (Whisper bills per minute); otherwise only
+    # files over the limit are a problem
+    if PYDUB_AVAILABLE:
+        compressed_path, offset_map, stats = compress_audio(filepath)
         if compressed_path:
-            actual_filepath = compressed_path
-            is_temp_file = True
-        else:
+            job.update(upload_path=compressed_path, is_temp_file=True, offset_map=offset_map, stats=stats)
+        elif file_size > WHISPER_LIMIT_BYTES:
             print("   ⏩ Skipping this file due to size limit.")
-            return
+            return None
+    elif file_size > WHISPER_LIMIT_BYTES:
+        print(f"   ⚠️ File size {file_size / 1024 / 1024:.2f}MB exceeds 25MB limit.")
+        print("   ⏩ Skipping this file due to size limit.")
+        return None
+
+    return job
+
+def upload_file(job):
+    """
+    Network half of a transcription: Whisper call + atomic transcript write.
+    Returns True on success.
+    """
+    filepath = job["filepath"]
+    filename = os.path.basename(filepath)
+    offset_map = job["offset_map"]
+    stats = job["stats"]
 
     try:
-        audio_file = open(actual_filepath, "rb")
-        
-        transcript = client.audio.transcriptions.create(
-            model="whisper-1", 
-            file=audio_file, 
-            response_format="verbose_json", 
-            timestamp_granularities=["segment"]
-        )
+        started = time.perf_counter()
+        with open(job["upload_path"], "rb") as audio_file:
+            transcript = client.audio.transcriptions.create(
+                model="whisper-1", 
+                file=audio_file, 
+                response_format="verbose_json", 
+                timestamp_granularities=["segment"]
+            )
+        if stats:
+            report_upload_stats(stats, time.perf_counter() - started)
+
+        # Put timestamps back on the original media timeline
+        segments = transcript.segments
+        if offset_map:
+            segments = remap_segments(segments, offset_map)
         
         # Determine output filename (strip .temp if needed)
         original_filename = filename.replace(".temp.mp3", ".mp3")
-        output_filename = f"{original_filename}.json"
-        output_path = OUTPUT_DIR / output_filename
+        output_path = transcript_path_for(filepath)
+        src = os.stat(filepath)
         
-        with open(output_path, 'w') as f:
-            data = {
-                "filename": original_filename,
-                "text": transcript.text,
-                "segments": [
-                    {
-                        "start": seg.start,
-                        "end": seg.end,
-                        "text": seg.text.strip()
-                    } 
-                    for seg in transcript.segments
-                ]
+        header = {
+            "filename": original_filename,
+            "source": {"size": src.st_size, "mtime": src.st_mtime},
+        }
+        write_transcript(output_path, header, (
+            {
+                "start": seg["start"] if isinstance(seg, dict) else seg.start,
+                "end": seg["end"] if isinstance(seg, dict) else seg.end,
+                "text": seg["text"] if isinstance(seg, dict) else seg.text
             }
-            json.dump(data, f, indent=2)
+            for seg in segments
+        ))
             
         print(f"✅ Saved transcript to: {output_path}")
+        return True
 
     except Exception as e:
         print(f"❌ Error processing {filename}: {e}")
+        return False
     
     finally:
         # Cleanup temp file
-        if is_temp_file and os.path.exists(actual_filepath):
-            os.remove(actual_filepath)
+        if job["is_temp_file"] and os.path.exists(job["upload_path"]):
+            os.remove(job["upload_path"])
             print("   🧹 Cleaned up temporary compressed file.")
 
+def transcribe_file(filepath):
+    print(f"🎤 Transcribing: {os.path.basename(filepath)}...")
+    job = prepare_file(filepath)
+    if job:
+        return upload_file(job)
+    return False
+
+def transcribe_batch(paths, workers=DEFAULT_WORKERS):
+    """
+    Transcribes many files with `workers` concurrent uploads.
+    Compression runs on its own pool so the next file is being prepared
+    while the current ones upload. At most 2 * workers prepared files
+    wait on disk at once.
+    """
+    in_flight = threading.BoundedSemaphore(workers * 2)
+    results = []
+
+    def run_upload(job):
+        try:
+            return upload_file(job)
+        finally:
+            in_flight.release()
+
+    with ThreadPoolExecutor(max_workers=workers) as prep_pool, \
+         ThreadPoolExecutor(max_workers=workers) as upload_pool:
+
+        def on_prepared(future):
+            try:
+                job = future.result()
+            except Exception as e:
+                print(f"❌ Error preparing file: {e}")
+                job = None
+            if job is None:
+                in_flight.release()
+                results.append(False)
+                return
+            results.append(upload_pool.submit(run_upload, job))
+
+        for path in paths:
+            in_flight.acquire()
+            print(f"🎤 Queued: {os.path.basename(path)}")
+            prep_pool.submit(prepare_file, path).add_done_callback(on_prepared)
+
+        # Wait for every prepare to hand off before closing the upload pool
+        prep_pool.shutdown(wait=True)
+        done = [r if isinstance(r, bool) else r.result() for r in results]
+
+    return done
+
 # --- EXECUTION ---
 if __name__ == "__main__":
+    # Usage: python transcribe.py [workers]
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_WORKERS
+
     print(f"📂 Scanning '{INPUT_DIR}' for audio files...")
 
     if not os.path.exists(INPUT_DIR):
         print(f"❌ Error: Input directory not found at {INPUT_DIR}")
         exit(1)
 
-    # Find all MP3 files
-    files = [f for f in os.listdir(INPUT_DIR) if f.lower().endswith('.mp3')]
+    # Find all MP3 files (skip temp files if they were left over)
+    files = sorted(
+        f for f in os.listdir(INPUT_DIR)
+        if f.lower().endswith('.mp3') and ".temp.mp3" not in f
+    )
 
     if not files:
         print("⚠️  No .mp3 files found in the output folder.")
     else:
-        print(f"🔎 Found {len(files)} files to transcribe.")
-        
-        for file in files:
-            full_path = INPUT_DIR / file
-            # Skip temp files if they were left over
-            if ".temp.mp3" in file:
-                continue
-            transcribe_file(full_path)
+        todo = [INPUT_DIR / f for f in files if not is_up_to_date(INPUT_DIR / f)]
+        print(f"🔎 Found {len(files)} files, {len(files) - len(todo)} already transcribed.")
+
+        if todo:
+            started = time.perf_counter()
+            outcomes = transcribe_batch(todo, workers)
+            elapsed = time.perf_counter() - started
+            ok = sum(1 for o in outcomes if o)
+            print(f"\n📊 {ok}/{len(todo)} files in {elapsed:.1f}s with {workers} workers "
+                  f"({ok / elapsed * 60:.1f} files/min)")
             
-        print("\n✨ All files processed!")
\ No newline at end of file
+        print("\n✨ All files processed!")
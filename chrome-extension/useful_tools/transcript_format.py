@@ -0,0 +1,148 @@
+import os
+import sys
+import json
+
+# Optional: ijson lets the converter stream huge legacy files too
+try:
+    import ijson
+    IJSON_AVAILABLE = True
+except ImportError:
+    IJSON_AVAILABLE = False
+
+# --- FORMAT ---
+# One JSON object per line. Line 1 is a small header, every line after it
+# is a single segment:
+#
+#   {"type": "header", "version": 1, "filename": "ep1.mp3", "source": {...}}
+#   {"start": 0.0, "end": 4.2, "text": "Welcome to the show."}
+#   {"start": 4.2, "end": 9.8, "text": "Today we're talking about..."}
+#
+# The full transcript text is not stored; join the segment texts if needed.
+
+FORMAT_VERSION = 1
+JSONL_SUFFIX = ".jsonl"
+
+
+def write_transcript(output_path, header, segments):
+    """
+    Streams segments (dicts with start/end/text) to output_path.
+    Written to a temp file and renamed so readers never see half a transcript.
+    """
+    tmp_path = f"{output_path}.tmp.{os.getpid()}"
+    count = 0
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            head = {"type": "header", "version": FORMAT_VERSION}
+            head.update(header)
+            f.write(json.dumps(head, ensure_ascii=False) + "\n")
+            for seg in segments:
+                f.write(json.dumps({
+                    "start": seg["start"],
+                    "end": seg["end"],
+                    "text": seg["text"].strip()
+                }, ensure_ascii=False) + "\n")
+                count += 1
+        os.replace(tmp_path, output_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return count
+
+
+def read_header(path):
+    """
+    Returns the header dict, reading only the first line.
+    Legacy .json transcripts return their top-level fields minus text/segments.
+    """
+    if not str(path).endswith(JSONL_SUFFIX):
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        return {k: v for k, v in data.items() if k not in ("text", "segments")}
+
+    with open(path, encoding='utf-8') as f:
+        first = f.readline()
+    header = json.loads(first) if first else {}
+    if header.get("type") != "header":
+        raise ValueError(f"{path} has no transcript header")
+    return header
+
+
+def iter_segments(path):
+    """
+    Yields segment dicts one at a time. Memory stays flat for .jsonl files
+    however long the transcript is. Legacy .json files are streamed with
+    ijson when available and loaded whole otherwise.
+    """
+    if str(path).endswith(JSONL_SUFFIX):
+        with open(path, encoding='utf-8') as f:
+            for line_no, line in enumerate(f):
+                if line_no == 0 or not line.strip():
+                    continue
+                yield json.loads(line)
+        return
+
+    if IJSON_AVAILABLE:
+        with open(path, 'rb') as f:
+            for seg in ijson.items(f, "segments.item", use_float=True):
+                yield seg
+        return
+
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+    for seg in data.get("segments", []):
+        yield seg
+
+
+def convert_json_file(json_path, remove_original=False):
+    """
+    Converts a legacy indent=2 transcript to .jsonl alongside it.
+    Returns the new path.
+    """
+    json_path = str(json_path)
+    base = json_path[:-len(".json")] if json_path.endswith(".json") else json_path
+    output_path = base + JSONL_SUFFIX
+
+    header = read_header(json_path)
+    header.pop("type", None)
+    header.pop("version", None)
+    count = write_transcript(output_path, header, iter_segments(json_path))
+
+    if remove_original:
+        os.remove(json_path)
+    print(f"   ✅ {os.path.basename(json_path)} -> {os.path.basename(output_path)} ({count} segments)")
+    return output_path
+
+
+def convert_directory(directory, remove_original=False):
+    converted = 0
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith(".json"):
+            continue
+        json_path = os.path.join(directory, name)
+        target = json_path[:-len(".json")] + JSONL_SUFFIX
+        # Skip if already converted and newer than the source
+        if os.path.exists(target) and os.path.getmtime(target) >= os.path.getmtime(json_path):
+            continue
+        try:
+            convert_json_file(json_path, remove_original)
+            converted += 1
+        except Exception as e:
+            print(f"   ❌ Failed to convert {name}: {e}")
+    return converted
+
+
+# --- EXECUTION ---
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python transcript_format.py <transcript.json | transcripts_dir> [--remove-original]")
+        sys.exit(1)
+
+    target = sys.argv[1]
+    remove = "--remove-original" in sys.argv[2:]
+
+    print(f"🔁 Converting legacy transcripts in '{target}'...")
+    if os.path.isdir(target):
+        n = convert_directory(target, remove)
+        print(f"\n✨ Converted {n} files.")
+    else:
+        convert_json_file(target, remove)
@@ -0,0 +1,114 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import resource
+import tempfile
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from similarity_engine import SimilarityEngine, META_FILE, ROWS_FILE, VECTORS_FILE, unit_rows
+
+# Throughput and memory of the blocked similarity engine.
+#
+#   python bench/bulk_match.py                               # 200k chunks x 1536, 2000 sentences
+#   python bench/bulk_match.py --chunks 1000000 --sentences 5000
+#   python bench/bulk_match.py --chunks 50000 --check        # also verify against an unblocked product
+#
+# Writes a synthetic provider snapshot (random unit vectors, generated block
+# by block so the bench itself stays small) to --work-dir, opens it
+# memory-mapped and runs top_k() for --sentences queries. Reports
+# sentence-chunk pairs per second, numpy's peak traced allocation (the
+# engine's working memory: block copy, similarity tile, argpartition
+# indexes) and the process' peak RSS, which includes the page cache pages of
+# the mapped file the kernel chose to keep resident.
+
+
+def write_snapshot(path, n_chunks, dim, block=65536, seed=7):
+    rng = np.random.default_rng(seed)
+    os.makedirs(path, exist_ok=True)
+    with open(os.path.join(path, VECTORS_FILE), "wb") as f:
+        for start in range(0, n_chunks, block):
+            n = min(block, n_chunks - start)
+            f.write(unit_rows(rng.standard_normal((n, dim), dtype=np.float32)).tobytes())
+    with open(os.path.join(path, ROWS_FILE), "w") as f:
+        for i in range(n_chunks):
+            f.write(json.dumps({"id": i + 1, "document_id": i // 40, "timestamp_start": 30 * (i % 40)}) + "\n")
+    with open(os.path.join(path, META_FILE), "w") as f:
+        json.dump({"dim": dim, "count": n_chunks, "dtype": "float32"}, f)
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the blocked similarity engine.")
+    parser.add_argument("--chunks", type=int, default=200000)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--sentences", type=int, default=2000)
+    parser.add_argument("--k", type=int, default=8)
+    parser.add_argument("--block-rows", type=int, help="chunks per block (default SIM_BLOCK_ROWS)")
+    parser.add_argument("--query-block", type=int, help="sentences per block (default SIM_QUERY_BLOCK)")
+    parser.add_argument("--check", action="store_true", help="compare with one unblocked product (needs RAM)")
+    parser.add_argument("--work-dir", help="snapshot location (default: a temp dir, removed afterwards)")
+    parser.add_argument("--out", help="write results JSON here")
+    args = parser.parse_args()
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="bulk-match-")
+    try:
+        if not os.path.exists(os.path.join(work_dir, META_FILE)):
+            started = time.perf_counter()
+            write_snapshot(work_dir, args.chunks, args.dim)
+            print(f"💾 Snapshot {args.chunks:,} x {args.dim} written in {time.perf_counter() - started:.1f}s")
+
+        kwargs = {k: v for k, v in (("block_rows", args.block_rows), ("query_block", args.query_block)) if v}
+        engine = SimilarityEngine.open(work_dir, **kwargs)
+        queries = np.random.default_rng(11).standard_normal((args.sentences, engine.dim), dtype=np.float32)
+
+        rss_before = peak_rss_mb()
+        tracemalloc.start()
+        scores, ids = engine.top_k(queries, args.k)
+        _, traced_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        s = engine.stats()
+        matrix_mb = len(engine) * engine.dim * 4 / 2 ** 20
+        result = {
+            "chunks": len(engine),
+            "dim": engine.dim,
+            "sentences": args.sentences,
+            "k": args.k,
+            "block_rows": engine.block_rows,
+            "query_block": engine.query_block,
+            "seconds": s["seconds"],
+            "pairs_per_s": s["pairs_per_s"],
+            "matrix_mb": round(matrix_mb, 1),
+            "traced_peak_mb": round(traced_peak / 2 ** 20, 1),
+            "peak_rss_mb": round(peak_rss_mb(), 1),
+            "peak_rss_before_mb": round(rss_before, 1),
+        }
+        print(f"\n🧮 {args.sentences:,} sentences x {len(engine):,} chunks ({matrix_mb:,.0f} MB of vectors)")
+        print(f"   {s['seconds']:.2f}s, {s['pairs_per_s']:,} pairs/s")
+        print(f"   working memory (numpy peak) {result['traced_peak_mb']:.0f} MB, "
+              f"peak RSS {result['peak_rss_mb']:.0f} MB (before search {result['peak_rss_before_mb']:.0f} MB)")
+
+        if args.check:
+            reference = unit_rows(queries) @ np.asarray(engine.vectors).T
+            expected = np.argsort(-reference, axis=1)[:, :args.k]
+            agree = float((expected == ids).all(axis=1).mean())
+            result["check_agreement"] = agree
+            print(f"   top-{args.k} identical to the unblocked product for {agree:.1%} of sentences")
+
+        if args.out:
+            with open(args.out, "w") as f:
+                json.dump({"config": vars(args), "results": result}, f, indent=2)
+            print(f"\n💾 Results: {args.out}")
+    finally:
+        if not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
@@ -0,0 +1,151 @@
+import os
+import sys
+import json
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bs4 import BeautifulSoup
+from fixtures import FixtureSite
+from fake_services import fake_embedding
+from web_chunker import chunk_html, token_len, MIN_TOKENS, MAX_TOKENS
+
+# Chunk count and match quality: structure-aware chunker vs the old
+# SentenceSplitter(1024, 50) path, on the fixture articles.
+#
+#   python bench/chunk_quality.py
+#   python bench/chunk_quality.py --min-tokens 150 --max-tokens 512 --out chunking.json
+#
+# For every paragraph sentence on a page we embed the sentence (fake_services'
+# deterministic bag-of-words vectors) and take the best-scoring chunk from
+# that page. "hit" counts when that chunk contains the sentence; "on-topic" is
+# the share of the chunk's sentences that come from the query's own heading
+# section, i.e. how much unrelated text rides along with a match. "purity" is
+# the share of chunks whose sentences all come from one section.
+
+# Optional: the real baseline; without it a same-sized word window stands in
+try:
+    from llama_index.core.node_parser import SentenceSplitter
+    BASELINE = "sentence_splitter"
+except ImportError:
+    SentenceSplitter = None
+    BASELINE = "word_window"
+
+try:
+    import trafilatura
+except ImportError:
+    trafilatura = None
+
+
+def page_text(html):
+    """
+    The text seed-site used to split: trafilatura, else bs4 minus chrome.
+    """
+    if trafilatura is not None:
+        text = trafilatura.extract(html, include_comments=False, include_tables=True)
+        if text:
+            return text
+    soup = BeautifulSoup(html, "html.parser")
+    for tag in soup(["script", "style", "nav", "footer"]):
+        tag.decompose()
+    return soup.get_text(separator=" ", strip=True)
+
+
+def baseline_chunks(html, chunk_size=1024, overlap=50):
+    text = page_text(html)
+    if SentenceSplitter is not None:
+        return SentenceSplitter(chunk_size=chunk_size, chunk_overlap=overlap).split_text(text)
+    words = text.split()
+    # ~0.75 words per token
+    size, step = int(chunk_size * 0.75), int((chunk_size - overlap) * 0.75)
+    return [" ".join(words[i:i + size]) for i in range(0, len(words), step)]
+
+
+def dot(a, b):
+    return sum(x * y for x, y in zip(a, b))
+
+
+def evaluate_page(chunks, article):
+    """
+    chunks: list of strings. Returns (hits, on_topic_sum, queries, pure_chunks).
+    """
+    section_of = {}
+    for s_index, (_, paras) in enumerate(article["sections"]):
+        for para in paras:
+            for sentence in para.split(". "):
+                section_of.setdefault(sentence.rstrip("."), set()).add(s_index)
+
+    pure = 0
+    contents = []
+    for chunk in chunks:
+        inside = [sentence for sentence in section_of if sentence in chunk]
+        contents.append(inside)
+        if len(set().union(*(section_of[s] for s in inside))) <= 1:
+            pure += 1
+
+    vectors = [fake_embedding(c) for c in chunks]
+    hits = queries = 0
+    on_topic = 0.0
+    for sentence, owners in section_of.items():
+        q = fake_embedding(sentence)
+        best = max(range(len(chunks)), key=lambda i: dot(q, vectors[i]))
+        queries += 1
+        hits += sentence in chunks[best]
+        inside = contents[best]
+        if inside:
+            on_topic += sum(1 for s in inside if section_of[s] & owners) / len(inside)
+    return hits, on_topic, queries, pure
+
+
+def evaluate(n_articles=20, min_tokens=MIN_TOKENS, max_tokens=MAX_TOKENS):
+    site = FixtureSite("http://fixture.local", n_articles)
+    results = {}
+    for name in ("structure", BASELINE):
+        pages = chunks_total = tokens_total = hits = queries = pure = 0
+        on_topic = 0.0
+        for i, article in enumerate(site.articles):
+            html = site.render_article(i)
+            if name == "structure":
+                chunks = [c["text"] for c in chunk_html(html, min_tokens, max_tokens)]
+            else:
+                chunks = baseline_chunks(html)
+            if not chunks:
+                continue
+            h, t, q, p = evaluate_page(chunks, article)
+            pages += 1
+            chunks_total += len(chunks)
+            tokens_total += sum(token_len(c) for c in chunks)
+            hits, on_topic, queries, pure = hits + h, on_topic + t, queries + q, pure + p
+        results[name] = {
+            "pages": pages,
+            "chunks": chunks_total,
+            "chunks_per_page": round(chunks_total / pages, 2) if pages else 0.0,
+            "embed_tokens": tokens_total,
+            "top1_hit_rate": round(hits / queries, 3) if queries else 0.0,
+            "top1_on_topic": round(on_topic / queries, 3) if queries else 0.0,
+            "purity": round(pure / chunks_total, 3) if chunks_total else 0.0,
+        }
+    return results
+
+
+def print_results(results):
+    print(f"\n{'chunker':<20}{'pages':>7}{'chunks':>8}{'/page':>7}{'tokens':>9}{'hit':>8}{'on-topic':>10}{'purity':>8}")
+    for name, r in results.items():
+        print(f"{name:<20}{r['pages']:>7}{r['chunks']:>8}{r['chunks_per_page']:>7}{r['embed_tokens']:>9}"
+              f"{r['top1_hit_rate']:>8.1%}{r['top1_on_topic']:>10.1%}{r['purity']:>8.1%}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare web chunkers on the fixture site.")
+    parser.add_argument("--articles", type=int, default=20)
+    parser.add_argument("--min-tokens", type=int, default=MIN_TOKENS)
+    parser.add_argument("--max-tokens", type=int, default=MAX_TOKENS)
+    parser.add_argument("--out", help="write results JSON here")
+    args = parser.parse_args()
+
+    results = evaluate(args.articles, args.min_tokens, args.max_tokens)
+    print_results(results)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"config": vars(args), "results": results}, f, indent=2)
+        print(f"\n💾 Results: {args.out}")
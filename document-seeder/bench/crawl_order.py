@@ -0,0 +1,111 @@
+import os
+import sys
+import json
+import argparse
+import tempfile
+from urllib.parse import urljoin, urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bs4 import BeautifulSoup
+from fixtures import FixtureSite
+from crawl_frontier import CrawlFrontier
+from crawl_schedule import CrawlSchedule, START_PRIORITY
+from url_canon import canonicalize, same_site
+
+# Crawl order on the fixture site: discovery order vs sitemap priority.
+#
+#   python bench/crawl_order.py
+#   python bench/crawl_order.py --articles 200 --budget 50
+#
+# No HTTP, database or embeddings: pages come straight from FixtureSite and
+# only the frontier/schedule logic of seed-site.py runs. Reports how many
+# fetches it takes to reach half / all articles, how many listing pages were
+# fetched before the last article, and how many articles a --budget of
+# fetches (seed-site --max-pages) would have ingested.
+
+BASE_URL = "http://fixture.local"
+
+
+def fixture_get(site):
+    def get(url):
+        status, _, body = site.render(urlsplit(url).path)
+        return body if status == 200 else None
+    return get
+
+
+def page_links(html, page_url, start_url, root):
+    links = set()
+    for a_tag in BeautifulSoup(html, "html.parser").find_all("a", href=True):
+        url = canonicalize(urljoin(page_url, a_tag["href"]), like=start_url)
+        if same_site(url, root):
+            links.add(url)
+    return sorted(links, key=html.find)
+
+
+def crawl_order(site, sitemaps, state_path):
+    start_url = canonicalize(site.url("/site/"))
+    get = fixture_get(site)
+    schedule = CrawlSchedule(start_url, get, use_sitemaps=sitemaps)
+    frontier = CrawlFrontier(state_path)
+    frontier.add(start_url, depth=0, priority=START_PRIORITY)
+    schedule.seed(frontier)
+
+    order = []
+    while (item := frontier.next()):
+        url, depth = item
+        html = get(url)
+        frontier.mark(url, "done" if html else "failed")
+        order.append(url)
+        if html:
+            for link in page_links(html, url, start_url, schedule.root):
+                if schedule.allowed(link):
+                    frontier.add(link, depth + 1, schedule.priority(link, depth + 1))
+    frontier.close()
+    return order
+
+
+def summarise(order, article_urls, budget):
+    seen, firsts = set(), []
+    for n, url in enumerate(order, 1):
+        if url in article_urls and url not in seen:
+            seen.add(url)
+            firsts.append(n)
+    last = firsts[-1] if firsts else len(order)
+    half = firsts[(len(article_urls) - 1) // 2] if len(firsts) >= len(article_urls) / 2 else None
+    return {
+        "fetches": len(order),
+        "fetches_to_half": half,
+        "fetches_to_all": last if len(firsts) == len(article_urls) else None,
+        "other_pages_before_last_article": last - len(firsts),
+        f"articles_in_first_{budget}": sum(1 for n in firsts if n <= budget),
+    }
+
+
+def run(n_articles, budget):
+    site = FixtureSite(BASE_URL, n_articles)
+    article_urls = {canonicalize(site.article_url(i)) for i in range(n_articles)}
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for mode, sitemaps in (("discovery", False), ("sitemap_priority", True)):
+            order = crawl_order(site, sitemaps, os.path.join(tmp, f"{mode}.sqlite"))
+            results[mode] = summarise(order, article_urls, budget)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare crawl orders on the fixture site.")
+    parser.add_argument("--articles", type=int, default=40)
+    parser.add_argument("--budget", type=int, default=20, help="fetch budget to score (like --max-pages)")
+    parser.add_argument("--out", help="write results JSON here")
+    args = parser.parse_args()
+
+    results = run(args.articles, args.budget)
+    print(f"\n{'mode':<18}{'fetches':>9}{'to 50%':>8}{'to 100%':>9}{'other first':>13}{f'in {args.budget}':>8}")
+    for mode, r in results.items():
+        print(f"{mode:<18}{r['fetches']:>9}{str(r['fetches_to_half']):>8}{str(r['fetches_to_all']):>9}"
+              f"{r['other_pages_before_last_article']:>13}{r[f'articles_in_first_{args.budget}']:>8}")
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"config": vars(args), "results": results}, f, indent=2)
+        print(f"\n💾 Results: {args.out}")
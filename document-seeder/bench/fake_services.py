@@ -0,0 +1,497 @@
+import re
+import sys
+import json
+import time
+import base64
+import hashlib
+import argparse
+import threading
+from array import array
+from datetime import datetime, timezone
+from urllib.parse import urlsplit, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from fixtures import FixtureSite
+
+# One local HTTP server standing in for everything the seeders talk to:
+#
+#   /v1/embeddings                 OpenAI embeddings (deterministic vectors)
+#   /v1/audio/transcriptions       Whisper verbose_json (canned segments)
+#   /rest/v1/<table>               PostgREST subset: select/insert/delete with
+#                                  eq/neq/gt/gte/lt/lte/in filters, order, limit
+#   /rest/v1/rpc/match_provider_knowledge   cosine search over stored rows
+#   /site/..., /robots.txt         fixture website + RSS feed (fixtures.py)
+#   /__stats, /__reset             round-trip counters for the benchmark
+#
+# --embed-rpm / --embed-tpm make /v1/embeddings enforce a one-minute window
+# like the real API: 429 with retry-after-ms once it is spent, and
+# x-ratelimit-* headers on every response.
+#
+# Point the seeders at it with:
+#   SUPABASE_URL=http://127.0.0.1:<port>  SUPABASE_SERVICE_ROLE_KEY=bench.bench.bench
+#   OPENAI_BASE_URL=http://127.0.0.1:<port>/v1  OPENAI_API_BASE=<same>
+
+EMBED_DIM = 1536
+TOKEN_RE = re.compile(r"\w+")
+
+# Optional: numpy makes the RPC similarity scan fast on big fixtures
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+
+def fake_embedding(text, dim=EMBED_DIM):
+    """
+    Hashed bag-of-words, L2-normalised. Deterministic, and texts sharing
+    words get high cosine similarity, so matching behaves plausibly.
+    """
+    vec = [0.0] * dim
+    for token in TOKEN_RE.findall(str(text).lower()):
+        h = int.from_bytes(hashlib.blake2b(token.encode(), digest_size=8).digest(), "little")
+        vec[h % dim] += 1.0 if (h >> 32) & 1 else -1.0
+    norm = sum(v * v for v in vec) ** 0.5
+    if not norm:
+        vec[0] = 1.0
+        return vec
+    return [v / norm for v in vec]
+
+
+def parse_vector(value):
+    if isinstance(value, str):
+        return [float(x) for x in value.strip("[]").split(",") if x]
+    return [float(x) for x in value]
+
+
+class FakeState:
+    def __init__(self, site, embed_latency=0.0, whisper_latency=0.0, db_latency=0.0, site_latency=0.0,
+                 embed_rpm=0, embed_tpm=0):
+        self.site = site
+        self.embed_rpm = embed_rpm
+        self.embed_tpm = embed_tpm
+        self.window_start = time.monotonic()
+        self.window_requests = 0
+        self.window_tokens = 0
+        self.embed_latency = embed_latency
+        self.whisper_latency = whisper_latency
+        self.db_latency = db_latency
+        self.site_latency = site_latency
+        self.lock = threading.Lock()
+        self.tables = {}
+        self.next_id = {}
+        self.counters = {}
+
+    def bump(self, name, n=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def reset(self, data=False):
+        with self.lock:
+            self.counters = {}
+            if data:
+                self.tables = {}
+                self.next_id = {}
+
+    def take_embed_quota(self, tokens):
+        """
+        Returns (allowed, headers) for a request of `tokens` in the current window.
+        """
+        with self.lock:
+            now = time.monotonic()
+            if now - self.window_start >= 60:
+                self.window_start = now
+                self.window_requests = 0
+                self.window_tokens = 0
+            reset = 60 - (now - self.window_start)
+            allowed = not (
+                (self.embed_rpm and self.window_requests + 1 > self.embed_rpm)
+                or (self.embed_tpm and self.window_tokens + tokens > self.embed_tpm)
+            )
+            if allowed:
+                self.window_requests += 1
+                self.window_tokens += tokens
+            headers = {}
+            if self.embed_rpm:
+                headers["x-ratelimit-limit-requests"] = str(self.embed_rpm)
+                headers["x-ratelimit-remaining-requests"] = str(max(0, self.embed_rpm - self.window_requests))
+                headers["x-ratelimit-reset-requests"] = f"{reset:.3f}s"
+            if self.embed_tpm:
+                headers["x-ratelimit-limit-tokens"] = str(self.embed_tpm)
+                headers["x-ratelimit-remaining-tokens"] = str(max(0, self.embed_tpm - self.window_tokens))
+                headers["x-ratelimit-reset-tokens"] = f"{reset:.3f}s"
+            if not allowed:
+                headers["retry-after-ms"] = str(int(reset * 1000))
+            return allowed, headers
+
+    def insert(self, table, rows):
+        now = datetime.now(timezone.utc).isoformat()
+        out = []
+        with self.lock:
+            store = self.tables.setdefault(table, [])
+            for row in rows:
+                row = dict(row)
+                if "id" not in row:
+                    self.next_id[table] = self.next_id.get(table, 0) + 1
+                    row["id"] = self.next_id[table]
+                row.setdefault("created_at", now)
+                if "embedding" in row and row["embedding"] is not None:
+                    row["embedding"] = parse_vector(row["embedding"])
+                store.append(row)
+                out.append(row)
+        return out
+
+
+# --- PostgREST filter helpers ---
+
+def _coerce(value, sample):
+    if isinstance(sample, bool):
+        return value.lower() == "true"
+    if isinstance(sample, int):
+        try:
+            return int(value)
+        except ValueError:
+            return value
+    if isinstance(sample, float):
+        return float(value)
+    return value
+
+
+def _matches(row, column, expr):
+    op, _, raw = expr.partition(".")
+    current = row.get(column)
+    if op == "is":
+        return current is None if raw == "null" else str(current).lower() == raw
+    if op == "in":
+        options = [v.strip('"') for v in raw.strip("()").split(",")]
+        return str(current) in options
+    if current is None:
+        return False
+    target = _coerce(raw, current)
+    try:
+        return {
+            "eq": lambda: current == target,
+            "neq": lambda: current != target,
+            "gt": lambda: current > target,
+            "gte": lambda: current >= target,
+            "lt": lambda: current < target,
+            "lte": lambda: current <= target,
+        }[op]()
+    except (KeyError, TypeError):
+        return False
+
+
+RESERVED_PARAMS = {"select", "order", "limit", "offset", "columns", "on_conflict"}
+
+
+def apply_query(rows, params):
+    for column, exprs in params.items():
+        if column in RESERVED_PARAMS:
+            continue
+        for expr in exprs:
+            rows = [r for r in rows if _matches(r, column, expr)]
+
+    if "order" in params:
+        for clause in reversed(params["order"][0].split(",")):
+            column, _, direction = clause.partition(".")
+            rows = sorted(rows, key=lambda r: (r.get(column) is None, r.get(column)),
+                          reverse=direction.startswith("desc"))
+    offset = int(params.get("offset", ["0"])[0])
+    if "limit" in params:
+        rows = rows[offset:offset + int(params["limit"][0])]
+    elif offset:
+        rows = rows[offset:]
+    return rows
+
+
+def project(row, select):
+    def out_value(key):
+        value = row.get(key)
+        # pgvector columns come back from PostgREST as text
+        if key == "embedding" and isinstance(value, list):
+            return "[" + ",".join(repr(v) for v in value) + "]"
+        return value
+
+    if not select or select == "*":
+        return {k: out_value(k) for k in row}
+    columns = [c.strip() for c in select.split(",") if c.strip()]
+    if "*" in columns:
+        return {k: out_value(k) for k in row}
+    return {c: out_value(c) for c in columns}
+
+
+def match_knowledge(state, params, provider_scoped=True):
+    query = parse_vector(params.get("query_embedding") or [])
+    threshold = float(params.get("match_threshold", 0.0))
+    count = int(params.get("match_count", 10))
+    provider_id = params.get("filter_provider_id")
+
+    with state.lock:
+        rows = [
+            r for r in state.tables.get("provider_knowledge", [])
+            if r.get("embedding") and (not provider_scoped or provider_id is None or r.get("provider_id") == provider_id)
+        ]
+
+    if not rows or not query:
+        return []
+
+    if NUMPY_AVAILABLE:
+        matrix = np.asarray([r["embedding"] for r in rows], dtype=np.float32)
+        scores = (matrix @ np.asarray(query, dtype=np.float32)).tolist()
+    else:
+        scores = [sum(a * b for a, b in zip(r["embedding"], query)) for r in rows]
+
+    ranked = sorted(
+        ((s, r) for s, r in zip(scores, rows) if s >= threshold),
+        key=lambda pair: pair[0], reverse=True
+    )[:count]
+    return [{
+        "id": r["id"],
+        "document_id": r.get("document_id"),
+        "provider_id": r.get("provider_id"),
+        "content": r.get("content"),
+        "metadata": r.get("metadata"),
+        "similarity": float(s),
+    } for s, r in ranked]
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    state = None  # set by make_server
+
+    def log_message(self, *args):
+        pass
+
+    # --- plumbing ---
+
+    def _body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    head_only = False
+
+    def _send(self, status, payload, content_type="application/json", headers=None):
+        body = payload if isinstance(payload, bytes) else (
+            payload.encode() if isinstance(payload, str) else json.dumps(payload).encode()
+        )
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        if not self.head_only:
+            self.wfile.write(body)
+
+    def _route(self, method):
+        parts = urlsplit(self.path)
+        path, params = parts.path, parse_qs(parts.query, keep_blank_values=True)
+        try:
+            if path == "/__stats":
+                with self.state.lock:
+                    tables = {k: len(v) for k, v in self.state.tables.items()}
+                    return self._send(200, {"counters": dict(self.state.counters), "tables": tables})
+            if path == "/__reset":
+                self._body()
+                self.state.reset(data="data" in params)
+                return self._send(200, {"ok": True})
+            if path.startswith("/v1/embeddings"):
+                return self._embeddings()
+            if path.startswith("/v1/audio/transcriptions"):
+                return self._transcriptions()
+            if path.startswith("/rest/v1/"):
+                return self._rest(method, path[len("/rest/v1/"):], params)
+            if method == "GET":
+                return self._site(path)
+            return self._send(404, {"error": "not found"})
+        except Exception as e:
+            return self._send(500, {"message": str(e)})
+
+    def do_GET(self):
+        self._route("GET")
+
+    def do_HEAD(self):
+        self.head_only = True
+        self._route("GET")
+
+    def do_POST(self):
+        self._route("POST")
+
+    def do_PATCH(self):
+        self._route("PATCH")
+
+    def do_DELETE(self):
+        self._route("DELETE")
+
+    # --- OpenAI ---
+
+    def _embeddings(self):
+        req = json.loads(self._body() or b"{}")
+        inputs = req.get("input") or []
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        dim = int(req.get("dimensions") or EMBED_DIM)
+        texts = [" ".join(map(str, t)) if isinstance(t, list) else t for t in inputs]
+        tokens = sum(max(1, len(t) // 4) for t in texts)
+        allowed, limit_headers = self.state.take_embed_quota(tokens)
+        if not allowed:
+            self.state.bump("openai.embeddings.rate_limited")
+            return self._send(429, {"error": {
+                "message": "Rate limit reached for text-embedding-3-small",
+                "type": "requests", "code": "rate_limit_exceeded",
+            }}, headers=limit_headers)
+        self.state.bump("openai.embeddings.requests")
+        self.state.bump("openai.embeddings.inputs", len(inputs))
+        time.sleep(self.state.embed_latency)
+
+        data = []
+        for i, text in enumerate(texts):
+            vec = fake_embedding(text)
+            if dim < EMBED_DIM:
+                vec = vec[:dim]
+                norm = sum(v * v for v in vec) ** 0.5 or 1.0
+                vec = [v / norm for v in vec]
+            if req.get("encoding_format") == "base64":
+                vec = base64.b64encode(array("f", vec).tobytes()).decode()
+            data.append({"object": "embedding", "index": i, "embedding": vec})
+        self.state.bump("openai.embeddings.tokens", tokens)
+        return self._send(200, {
+            "object": "list",
+            "data": data,
+            "model": req.get("model", "text-embedding-3-small"),
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+        }, headers=limit_headers)
+
+    def _transcriptions(self):
+        size = len(self._body())
+        self.state.bump("openai.whisper.requests")
+        self.state.bump("openai.whisper.bytes", size)
+        time.sleep(self.state.whisper_latency)
+
+        # Pretend the upload is 32 kbps audio: 4000 bytes per second
+        duration = max(5.0, size / 4000)
+        segments = []
+        t, i = 0.0, 0
+        while t < duration:
+            end = min(duration, t + 5.0)
+            text = f"Segment {i} talks about SEIS advance assurance and EIS relief."
+            segments.append({
+                "id": i, "seek": 0, "start": t, "end": end, "text": " " + text,
+                "tokens": [], "temperature": 0.0, "avg_logprob": -0.2,
+                "compression_ratio": 1.2, "no_speech_prob": 0.01,
+            })
+            t, i = end, i + 1
+        return self._send(200, {
+            "task": "transcribe", "language": "english", "duration": duration,
+            "text": "".join(s["text"] for s in segments).strip(), "segments": segments,
+        })
+
+    # --- PostgREST ---
+
+    def _rest(self, method, resource, params):
+        time.sleep(self.state.db_latency)
+        body = self._body()
+
+        if resource.startswith("rpc/"):
+            fn = resource[len("rpc/"):]
+            self.state.bump(f"rest.rpc.{fn}")
+            args = json.loads(body or b"{}")
+            if fn == "match_provider_knowledge":
+                return self._send(200, match_knowledge(self.state, args))
+            if fn == "match_documents":
+                return self._send(200, match_knowledge(self.state, args, provider_scoped=False))
+            return self._send(404, {"message": f"function {fn} not found"})
+
+        table = resource.strip("/")
+        self.state.bump(f"rest.{method.lower()}.{table}")
+        select = params.get("select", ["*"])[0]
+        single = "vnd.pgrst.object" in (self.headers.get("Accept") or "")
+
+        if method == "POST":
+            payload = json.loads(body or b"[]")
+            rows = payload if isinstance(payload, list) else [payload]
+            inserted = self.state.insert(table, rows)
+            self.state.bump(f"rows.{table}", len(inserted))
+            out = [project(r, select) for r in inserted]
+            return self._send(201, out[0] if single and out else out)
+
+        with self.state.lock:
+            rows = list(self.state.tables.get(table, []))
+        hits = apply_query(rows, params)
+
+        if method == "DELETE":
+            ids = {id(r) for r in hits}
+            with self.state.lock:
+                self.state.tables[table] = [r for r in self.state.tables.get(table, []) if id(r) not in ids]
+            return self._send(200, [project(r, select) for r in hits])
+
+        if method == "PATCH":
+            changes = json.loads(body or b"{}")
+            with self.state.lock:
+                for r in hits:
+                    r.update(changes)
+            return self._send(200, [project(r, select) for r in hits])
+
+        out = [project(r, select) for r in hits]
+        headers = {"Content-Range": f"0-{max(0, len(out) - 1)}/{len(out)}"}
+        if single:
+            if len(out) != 1:
+                return self._send(406, {"code": "PGRST116", "message": f"{len(out)} rows returned"})
+            return self._send(200, out[0], headers=headers)
+        return self._send(200, out, headers=headers)
+
+    # --- Fixture site ---
+
+    def _site(self, path):
+        self.state.bump("site.get")
+        time.sleep(self.state.site_latency)
+        status, content_type, body = self.state.site.render(path)
+        return self._send(status, body, content_type)
+
+
+def make_server(port=0, n_articles=20, embed_latency_ms=0, whisper_latency_ms=0,
+                db_latency_ms=0, site_latency_ms=0, embed_rpm=0, embed_tpm=0):
+    """
+    Builds (not starts) the server. Port 0 picks a free port.
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    state = FakeState(
+        FixtureSite(base_url, n_articles),
+        embed_latency_ms / 1000, whisper_latency_ms / 1000,
+        db_latency_ms / 1000, site_latency_ms / 1000,
+        embed_rpm, embed_tpm,
+    )
+    server.RequestHandlerClass = type("BoundHandler", (Handler,), {"state": state})
+    server.daemon_threads = True
+    return server, base_url, state
+
+
+def start_in_thread(**kwargs):
+    server, base_url, state = make_server(**kwargs)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, base_url, state
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stand-ins for OpenAI, Supabase and a fixture site.")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--articles", type=int, default=20)
+    parser.add_argument("--embed-latency-ms", type=float, default=0)
+    parser.add_argument("--whisper-latency-ms", type=float, default=0)
+    parser.add_argument("--db-latency-ms", type=float, default=0)
+    parser.add_argument("--site-latency-ms", type=float, default=0)
+    parser.add_argument("--embed-rpm", type=int, default=0, help="0 = unlimited")
+    parser.add_argument("--embed-tpm", type=int, default=0, help="0 = unlimited")
+    args = parser.parse_args()
+
+    server, base_url, _ = make_server(
+        args.port, args.articles, args.embed_latency_ms, args.whisper_latency_ms,
+        args.db_latency_ms, args.site_latency_ms, args.embed_rpm, args.embed_tpm,
+    )
+    print(f"🧪 Fake services on {base_url}  (site: {base_url}/site/, feed: {base_url}/site/feed)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        sys.exit(0)
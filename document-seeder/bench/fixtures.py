@@ -0,0 +1,275 @@
+import random
+import textwrap
+from html import escape
+
+# Deterministic fixture website + RSS feed for the offline benchmarks.
+#
+#   /site/                      home page, links to everything below
+#   /site/articles/<slug>/      article (headings, paragraphs, a table, nav/footer)
+#   /site/articles/<slug>/print/        same article, canonical -> the article
+#   /site/articles/<slug>/index.html    same article (related links use URL variants)
+#   /site/tag/<tag>/            tag archive listing articles
+#   /site/page/<n>/             paginated archive
+#   /site/feed                  RSS 2.0 with full content:encoded HTML
+#   /site/sitemap.xml           sitemap with lastmod/priority
+#   /robots.txt                 points at the sitemap, disallows author pages
+#
+# write_fixture_pdf() renders the same kind of text as a multi-page PDF
+# (Helvetica, real font sizes for headings) for the local PDF parser.
+#
+# Same seed + article count always produces byte-identical pages, so runs
+# are comparable across commits.
+
+SUBJECTS = [
+    "Founders", "Angel investors", "Early-stage startups", "The company",
+    "Each shareholder", "The board", "HMRC", "A qualifying trade",
+    "Your cap table", "The option pool", "Employees with EMI options",
+]
+VERBS = [
+    "must apply for", "can claim", "should review", "will need",
+    "often overlook", "need to confirm", "are entitled to", "may lose",
+]
+OBJECTS = [
+    "SEIS advance assurance before the round closes",
+    "EIS relief on qualifying share subscriptions",
+    "a clear vesting schedule for every founder",
+    "the gross assets test at the time of issue",
+    "income tax relief worth thirty percent of the investment",
+    "capital gains deferral on reinvested proceeds",
+    "a compliance statement within two years",
+    "the three year holding period for relief",
+    "a shareholder agreement that covers drag-along rights",
+    "the valuation agreed in the term sheet",
+]
+TAGS = ["seis", "eis", "fundraising", "options", "legal"]
+AUTHORS = ["anna", "ben", "chloe"]
+ARTICLES_PER_PAGE = 10
+
+
+def _sentence(rng):
+    return f"{rng.choice(SUBJECTS)} {rng.choice(VERBS)} {rng.choice(OBJECTS)}."
+
+
+def _paragraph(rng, n):
+    return " ".join(_sentence(rng) for _ in range(n))
+
+
+class FixtureSite:
+    def __init__(self, base_url, n_articles=20, seed=7):
+        self.base_url = base_url.rstrip("/")
+        self.n_articles = n_articles
+        self.articles = []
+        for i in range(n_articles):
+            rng = random.Random(seed * 1000 + i)
+            title = f"{rng.choice(SUBJECTS)} and {rng.choice(OBJECTS).split(' ', 1)[1]}"
+            sections = []
+            for _ in range(rng.randint(2, 4)):
+                heading = rng.choice(OBJECTS).capitalize()
+                paras = [_paragraph(rng, rng.randint(3, 6)) for _ in range(rng.randint(1, 3))]
+                sections.append((heading, paras))
+            self.articles.append({
+                "slug": f"article-{i:03d}",
+                "title": title[:1].upper() + title[1:],
+                "tags": rng.sample(TAGS, 2),
+                "author": rng.choice(AUTHORS),
+                "intro": _paragraph(rng, 2),
+                "sections": sections,
+                "lastmod": f"2024-{1 + i % 12:02d}-{1 + i % 28:02d}",
+                "related": [(i + k) % n_articles for k in (1, 2, 3)],
+            })
+
+    # --- URLs ---
+
+    def url(self, path):
+        return f"{self.base_url}{path}"
+
+    def article_url(self, index):
+        return self.url(f"/site/articles/{self.articles[index]['slug']}/")
+
+    # --- Rendering ---
+
+    def _layout(self, title, body, canonical):
+        nav = " ".join(f'<a href="/site/tag/{t}/">{t}</a>' for t in TAGS)
+        return (
+            "<!DOCTYPE html><html><head>"
+            f"<title>{escape(title)}</title>"
+            f'<link rel="canonical" href="{canonical}">'
+            "</head><body>"
+            f'<nav><a href="/site/">Home</a> {nav}</nav>'
+            f'<div class="elementor-section-wrap">{body}</div>'
+            '<footer><p>Subscribe to our newsletter for more guides.</p>'
+            '<a href="/site/page/2/">Older posts</a></footer>'
+            "</body></html>"
+        )
+
+    def _article_body_html(self, article):
+        parts = [f"<p>{escape(article['intro'])}</p>"]
+        for heading, paras in article["sections"]:
+            parts.append(f"<h2>{escape(heading)}</h2>")
+            parts.extend(f"<p>{escape(p)}</p>" for p in paras)
+        parts.append(
+            "<table><tr><th>Scheme</th><th>Relief</th></tr>"
+            "<tr><td>SEIS</td><td>50%</td></tr><tr><td>EIS</td><td>30%</td></tr></table>"
+        )
+        return "".join(parts)
+
+    def render_article(self, index, print_view=False):
+        article = self.articles[index]
+        # Same targets spelled differently, as real sites do
+        variants = ["", "?utm_source=related", "index.html"]
+        related = " ".join(
+            f'<a href="{self.article_url(j)}{variant}">{escape(self.articles[j]["title"])}</a>'
+            for j, variant in zip(article["related"], variants)
+        )
+        tags = " ".join(f'<a href="/site/tag/{t}/">#{t}</a>' for t in article["tags"])
+        body = (
+            f"<h1>{escape(article['title'])}</h1>"
+            f'<p class="byline">By <a href="/site/author/{article["author"]}/">{article["author"]}</a> {tags}</p>'
+            + self._article_body_html(article)
+            + f'<aside>Related: {related}</aside>'
+            + ("" if print_view else f'<p><a href="{self.article_url(index)}print/">Print this article</a></p>')
+        )
+        return self._layout(article["title"], body, self.article_url(index))
+
+    def _listing(self, title, indexes, canonical):
+        items = "".join(
+            f'<li><a href="/site/articles/{self.articles[i]["slug"]}/">{escape(self.articles[i]["title"])}</a></li>'
+            for i in indexes
+        )
+        return self._layout(title, f"<h1>{escape(title)}</h1><ul>{items}</ul>", canonical)
+
+    def render_feed(self):
+        items = []
+        for i, article in enumerate(self.articles):
+            items.append(
+                "<item>"
+                f"<title>{escape(article['title'])}</title>"
+                f"<link>{self.article_url(i)}</link>"
+                f"<guid>{self.article_url(i)}</guid>"
+                f"<author>{article['author']}</author>"
+                f"<pubDate>Mon, {1 + i % 28:02d} Jan 2024 09:00:00 GMT</pubDate>"
+                f"<content:encoded><![CDATA[{self._article_body_html(article)}]]></content:encoded>"
+                "</item>"
+            )
+        return (
+            '<?xml version="1.0" encoding="UTF-8"?>'
+            '<rss version="2.0" xmlns:content="http://purl.org/rss/1.0/modules/content/">'
+            f"<channel><title>Fixture Substack</title><link>{self.url('/site/')}</link>"
+            + "".join(items) + "</channel></rss>"
+        )
+
+    def render_sitemap(self):
+        urls = [f"<url><loc>{self.url('/site/')}</loc><priority>0.5</priority></url>"]
+        for i, article in enumerate(self.articles):
+            urls.append(
+                f"<url><loc>{self.article_url(i)}</loc><lastmod>{article['lastmod']}</lastmod>"
+                "<priority>0.8</priority></url>"
+            )
+        for tag in TAGS:
+            urls.append(f"<url><loc>{self.url(f'/site/tag/{tag}/')}</loc><priority>0.2</priority></url>")
+        return (
+            '<?xml version="1.0" encoding="UTF-8"?>'
+            '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">'
+            + "".join(urls) + "</urlset>"
+        )
+
+    def render(self, path):
+        """
+        Returns (status, content_type, body) for a request path.
+        """
+        html = "text/html; charset=utf-8"
+        path = path.split("?")[0].split("#")[0]
+        if path == "/robots.txt":
+            return 200, "text/plain", f"User-agent: *\nDisallow: /site/author/\nSitemap: {self.url('/site/sitemap.xml')}\n"
+        if not path.startswith("/site"):
+            return 404, "text/plain", "not found"
+
+        parts = [p for p in path[len("/site"):].split("/") if p]
+        if not parts:
+            return 200, html, self._listing("Home", range(min(self.n_articles, ARTICLES_PER_PAGE)), self.url("/site/"))
+        if parts == ["feed"]:
+            return 200, "application/rss+xml", self.render_feed()
+        if parts == ["sitemap.xml"]:
+            return 200, "application/xml", self.render_sitemap()
+        if parts[0] == "articles" and len(parts) >= 2:
+            for i, article in enumerate(self.articles):
+                if article["slug"] == parts[1]:
+                    if parts[2:] == ["print"]:
+                        return 200, html, self.render_article(i, print_view=True)
+                    if parts[2:] in ([], ["index.html"]):
+                        return 200, html, self.render_article(i)
+        if parts[0] == "tag" and len(parts) >= 2:
+            hits = [i for i, a in enumerate(self.articles) if parts[1] in a["tags"]]
+            return 200, html, self._listing(f"Tag: {parts[1]}", hits, self.url(f"/site/tag/{parts[1]}/"))
+        if parts[0] == "author" and len(parts) >= 2:
+            hits = [i for i, a in enumerate(self.articles) if a["author"] == parts[1]]
+            return 200, html, self._listing(f"Author: {parts[1]}", hits, self.url(f"/site/author/{parts[1]}/"))
+        if parts[0] == "page" and len(parts) >= 2 and parts[1].isdigit():
+            start = (int(parts[1]) - 1) * ARTICLES_PER_PAGE
+            hits = range(start, min(start + ARTICLES_PER_PAGE, self.n_articles))
+            return 200, html, self._listing(f"Page {parts[1]}", hits, self.url(f"/site/page/{parts[1]}/"))
+        return 404, html, self._layout("Not found", "<h1>Not found</h1>", self.url(path))
+
+
+# --- PDF ---
+
+def _pdf_escape(text):
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def _pdf_page_stream(rng, page_number):
+    ops, y = [], 760
+
+    def line(text, size, gap):
+        nonlocal y
+        y -= gap
+        ops.append(f"BT /F1 {size} Tf 60 {y} Td ({_pdf_escape(text)}) Tj ET")
+
+    if page_number % 5 == 1:
+        line(f"Chapter {page_number // 5 + 1}: {rng.choice(OBJECTS).capitalize()}", 22, 10)
+    while y > 140:
+        line(rng.choice(OBJECTS).capitalize(), 15, 30)
+        for _ in range(rng.randint(1, 2)):
+            y -= 8
+            for text in textwrap.wrap(_paragraph(rng, rng.randint(3, 5)), 95):
+                line(text, 10, 13)
+    ops.append(f"BT /F1 8 Tf 290 40 Td ({page_number}) Tj ET")
+    return "\n".join(ops).encode("latin-1")
+
+
+def write_fixture_pdf(path, n_pages=50, seed=7):
+    """
+    Minimal hand-built PDF: chapter titles (22pt) every five pages, section
+    headings (15pt), body paragraphs (10pt) and a page-number footer.
+    """
+    rng = random.Random(seed)
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # page tree, filled in once the page ids are known
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    page_ids = []
+    for n in range(1, n_pages + 1):
+        stream = _pdf_page_stream(rng, n)
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        content_id = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_id
+        )
+        page_ids.append(len(objects))
+    kids = " ".join(f"{i} 0 R" for i in page_ids).encode()
+    objects[1] = b"<< /Type /Pages /Kids [" + kids + b"] /Count %d >>" % n_pages
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for i, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % i + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % off for off in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    with open(path, "wb") as f:
+        f.write(out)
+    return path
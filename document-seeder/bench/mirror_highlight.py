@@ -0,0 +1,158 @@
+import os
+import re
+import sys
+import glob
+import json
+import time
+import argparse
+import statistics
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bs4 import BeautifulSoup
+
+from fixtures import FixtureSite
+from phrase_highlighter import highlight_phrases
+
+# Server-side vs client-side phrase highlighting for generate-map.py mirrors.
+#
+#   python bench/mirror_highlight.py                      # 40 fixture articles on one page, 50 phrases
+#   python bench/mirror_highlight.py --articles 200 --phrases 200
+#   python bench/mirror_highlight.py --chrome /usr/bin/chromium --out /tmp/mirror.json
+#
+# Builds one long page from the fixture articles and picks --phrases of its
+# sentences as "matches", the way generate-map.py does. Generation side:
+# parse + one Aho-Corasick highlight pass (median of --repeat runs). Client
+# side, when a headless Chrome is available (--chrome, CHROME_BIN or the
+# puppeteer cache): both mirrors are loaded with web-embed/highlight-matches.js
+# inlined - one that scans text nodes in the browser (the old behaviour) and
+# one pre-highlighted - and the time until highlights are in place plus the
+# forced layout after it are read back from the DOM.
+
+SEEDER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HIGHLIGHT_JS = os.path.join(os.path.dirname(SEEDER_DIR), "web-embed", "highlight-matches.js")
+
+PROBE = """
+<script>
+(function probe() {
+  if (window.__SL_HIGHLIGHT_MS__ === undefined) return setTimeout(probe, 5);
+  const started = performance.now();
+  document.body.getBoundingClientRect();
+  const root = document.documentElement;
+  root.dataset.slHighlightMs = window.__SL_HIGHLIGHT_MS__.toFixed(3);
+  root.dataset.slLayoutMs = (performance.now() - started).toFixed(3);
+  root.dataset.slSpans = document.querySelectorAll(".sl-smart-link").length;
+})();
+</script>
+"""
+
+
+def build_page(n_articles):
+    site = FixtureSite("http://bench.local", n_articles)
+    body = "".join(site._article_body_html(a) for a in site.articles)
+    return site._layout("All articles", body, site.url("/site/all/"))
+
+
+def pick_phrases(html, n):
+    soup = BeautifulSoup(html, "html.parser")
+    area = soup.find("div", class_="elementor-section-wrap") or soup.body
+    sentences = [s.strip() for s in re.split(r"(?<=[.!?])\s+", area.get_text(" ", strip=True))]
+    seen, phrases = set(), []
+    for s in sentences:
+        if 30 < len(s) < 150 and s not in seen:
+            seen.add(s)
+            phrases.append(s)
+    return phrases[:n]
+
+
+def server_highlight(html, phrases):
+    started = time.perf_counter()
+    soup = BeautifulSoup(html, "html.parser")
+    parsed = time.perf_counter()
+    found = highlight_phrases(soup, soup.body, phrases)
+    done = time.perf_counter()
+    return soup, found, (parsed - started) * 1000, (done - parsed) * 1000
+
+
+def mirror(html, phrases, prehighlighted):
+    with open(HIGHLIGHT_JS) as f:
+        client_js = f.read()
+    match_map = json.dumps([{"phrase": p, "status": "active"} for p in phrases]).replace("</", "<\\/")
+    tail = f"<script>window.__SL_MATCH_MAP__ = {match_map};</script><script>{client_js}</script>{PROBE}"
+    if prehighlighted:
+        html = html.replace("<html>", '<html data-sl-highlighted="server">', 1)
+    return html.replace("</body>", tail + "</body>")
+
+
+def find_chrome(explicit=None):
+    candidates = [explicit, os.getenv("CHROME_BIN")]
+    cache = os.path.expanduser("~/.cache/puppeteer")
+    candidates += sorted(glob.glob(os.path.join(cache, "chrome-headless-shell", "*", "*", "chrome-headless-shell")))
+    candidates += sorted(glob.glob(os.path.join(cache, "chrome", "*", "*", "chrome")))
+    return next((c for c in candidates if c and os.path.exists(c)), None)
+
+
+def client_render(chrome, path):
+    proc = subprocess.run(
+        [chrome, "--headless", "--no-sandbox", "--disable-gpu", "--virtual-time-budget=10000",
+         "--dump-dom", f"file://{os.path.abspath(path)}"],
+        capture_output=True, text=True, timeout=120,
+    )
+    values = dict(re.findall(r'data-sl-(highlight-ms|layout-ms|spans)="([^"]+)"', proc.stdout))
+    if not values:
+        raise RuntimeError((proc.stderr or "no timing in DOM").strip().splitlines()[-1])
+    return {k.replace("-", "_"): float(v) for k, v in values.items()}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark server-side mirror highlighting.")
+    parser.add_argument("--articles", type=int, default=40, help="fixture articles on the page")
+    parser.add_argument("--phrases", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--chrome", help="headless Chrome binary for client render timing")
+    parser.add_argument("--work-dir", default="/tmp/mirror-highlight-bench")
+    parser.add_argument("--out", help="write results JSON here")
+    args = parser.parse_args()
+
+    html = build_page(args.articles)
+    phrases = pick_phrases(html, args.phrases)
+    runs = [server_highlight(html, phrases) for _ in range(args.repeat)]
+    soup, found = runs[-1][0], runs[-1][1]
+    result = {
+        "page_kb": round(len(html) / 1024, 1),
+        "phrases": len(phrases),
+        "highlighted": sum(found),
+        "server": {
+            "parse_ms": round(statistics.median(r[2] for r in runs), 2),
+            "highlight_ms": round(statistics.median(r[3] for r in runs), 2),
+        },
+    }
+    print(f"\n🖍️  {result['page_kb']} KB page, {len(phrases)} phrases: {result['highlighted']} highlighted")
+    print(f"   generation  parse {result['server']['parse_ms']:.1f} ms + "
+          f"highlight {result['server']['highlight_ms']:.1f} ms (median of {args.repeat})")
+
+    chrome = find_chrome(args.chrome)
+    if chrome:
+        os.makedirs(args.work_dir, exist_ok=True)
+        variants = {"client_scan": mirror(html, phrases, False), "server": mirror(str(soup), phrases, True)}
+        result["client"] = {}
+        for name, page in variants.items():
+            path = os.path.join(args.work_dir, f"{name}.html")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(page)
+            try:
+                timing = client_render(chrome, path)
+            except (RuntimeError, OSError, subprocess.SubprocessError) as e:
+                print(f"   ⚠️ Chrome render failed ({name}): {e}")
+                break
+            result["client"][name] = timing
+            print(f"   browser {name:<12} highlight {timing['highlight_ms']:.1f} ms, "
+                  f"layout {timing['layout_ms']:.1f} ms, {int(timing['spans'])} spans")
+    else:
+        print("   (no headless Chrome found: pass --chrome or set CHROME_BIN for client render timing)")
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"config": vars(args), "results": result}, f, indent=2)
+        print(f"\n💾 Results: {args.out}")
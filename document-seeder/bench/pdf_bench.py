@@ -0,0 +1,72 @@
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fixtures import write_fixture_pdf
+from pdf_extract import extract_pdf, looks_scanned, PDFMINER_AVAILABLE, PDFIUM_AVAILABLE, PDF_WORKERS
+
+# Pages/sec for the local PDF parser on a generated fixture PDF.
+#
+#   python bench/pdf_bench.py                        # 200 pages, 1 vs PDF_WORKERS workers
+#   python bench/pdf_bench.py --pages 500 --workers 1 --workers 8
+#   python bench/pdf_bench.py --pdf handbook.pdf     # a real document instead
+#
+# Every available backend (pypdfium2, pdfminer) runs at each worker count.
+
+
+def run(pdf_path, backends, worker_counts):
+    results = []
+    for backend in backends:
+        for workers in worker_counts:
+            started = time.perf_counter()
+            pages = extract_pdf(pdf_path, workers, backend)
+            elapsed = time.perf_counter() - started
+            results.append({
+                "backend": backend,
+                "workers": workers,
+                "pages": len(pages),
+                "seconds": round(elapsed, 3),
+                "pages_per_s": round(len(pages) / elapsed, 1) if elapsed else 0.0,
+                "headings": sum(p["markdown"].count("\n#") + p["markdown"].startswith("#") for p in pages),
+                "scanned": looks_scanned(pages),
+            })
+    return results
+
+
+def print_results(results):
+    print(f"\n{'backend':<12}{'workers':>8}{'pages':>7}{'seconds':>9}{'pages/s':>9}{'headings':>10}")
+    for r in results:
+        print(f"{r['backend']:<12}{r['workers']:>8}{r['pages']:>7}{r['seconds']:>9.2f}"
+              f"{r['pages_per_s']:>9.1f}{r['headings']:>10}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local PDF parsing throughput.")
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--pdf", help="benchmark this file instead of a generated fixture")
+    parser.add_argument("--workers", type=int, action="append", help="worker counts (repeatable)")
+    parser.add_argument("--out", help="write results JSON here")
+    args = parser.parse_args()
+
+    backends = [name for name, ok in (("pypdfium2", PDFIUM_AVAILABLE), ("pdfminer", PDFMINER_AVAILABLE)) if ok]
+    if not backends:
+        print("❌ Install pypdfium2 or pdfminer.six first.")
+        sys.exit(1)
+
+    pdf_path = args.pdf
+    if not pdf_path:
+        pdf_path = os.path.join(tempfile.mkdtemp(prefix="pdf-bench-"), "fixture.pdf")
+        write_fixture_pdf(pdf_path, args.pages)
+        print(f"🧪 Fixture PDF: {pdf_path} ({args.pages} pages)")
+
+    results = run(pdf_path, backends, args.workers or sorted({1, PDF_WORKERS}))
+    print_results(results)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"config": vars(args), "results": results}, f, indent=2)
+        print(f"\n💾 Results: {args.out}")
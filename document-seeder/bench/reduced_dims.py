@@ -0,0 +1,122 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from similarity_engine import SimilarityEngine, REDUCED_FILE, VECTORS_FILE, unit_rows, write_reduced
+from bulk_match import write_snapshot
+
+# Recall of reduced-dimension first-pass matching against the full scan.
+#
+#   python bench/reduced_dims.py                                   # synthetic, 100k chunks x 1536
+#   python bench/reduced_dims.py --snapshot snapshots/provider-12  # our data
+#   python bench/reduced_dims.py --dims 128,256,512 --shortlist 16,64,256 --out /tmp/reduced.json
+#
+# Queries are knowledge chunks perturbed with noise (--noise), which stand in
+# for page sentences that paraphrase a moment. For every reduced size and
+# shortlist length, recall@1 is the share of queries whose best chunk after
+# the full-vector rerank is the full scan's best chunk; "first pass only"
+# is the same without the rerank. Times are for the whole top_k() call.
+#
+# The synthetic snapshot decays per-dimension variance along the vector the
+# way Matryoshka-trained embeddings (text-embedding-3) front-load their
+# information; random isotropic vectors would make any prefix look useless.
+# Prefer --snapshot for decisions.
+
+
+def write_matryoshka_snapshot(path, n_chunks, dim, decay, block=65536, seed=7):
+    rng = np.random.default_rng(seed)
+    scale = np.exp(-np.arange(dim, dtype=np.float32) / decay).astype(np.float32)
+    write_snapshot(path, n_chunks, dim, block, seed)
+    vectors = np.memmap(os.path.join(path, VECTORS_FILE), dtype=np.float32, mode="r+", shape=(n_chunks, dim))
+    for start in range(0, n_chunks, block):
+        n = min(block, n_chunks - start)
+        vectors[start:start + n] = unit_rows(rng.standard_normal((n, dim), dtype=np.float32) * scale)
+    vectors.flush()
+    del vectors
+
+
+def make_queries(engine, n, noise, seed=11):
+    rng = np.random.default_rng(seed)
+    picks = np.sort(rng.choice(len(engine), size=min(n, len(engine)), replace=False))
+    base = np.asarray(engine.vectors[picks])
+    spread = np.abs(base).mean(axis=0, keepdims=True)  # keep the noise on the vector's own scale
+    return unit_rows(base + noise * spread * rng.standard_normal(base.shape, dtype=np.float32))
+
+
+def timed_top_k(engine, queries, k):
+    started = time.perf_counter()
+    _, ids = engine.top_k(queries, k)
+    return ids, time.perf_counter() - started
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark reduced-dimension first-pass matching.")
+    parser.add_argument("--snapshot", help="similarity_engine snapshot to measure (default: synthetic)")
+    parser.add_argument("--chunks", type=int, default=100000)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--decay", type=float, default=400.0, help="synthetic variance decay (dims)")
+    parser.add_argument("--sentences", type=int, default=1000)
+    parser.add_argument("--noise", type=float, default=3.0)
+    parser.add_argument("--dims", default="128,256,512")
+    parser.add_argument("--shortlist", default="16,64")
+    parser.add_argument("--k", type=int, default=8)
+    parser.add_argument("--out", help="write results JSON here")
+    args = parser.parse_args()
+
+    work_dir = args.snapshot or tempfile.mkdtemp(prefix="reduced-dims-")
+    try:
+        if not args.snapshot:
+            started = time.perf_counter()
+            write_matryoshka_snapshot(work_dir, args.chunks, args.dim, args.decay)
+            print(f"💾 Snapshot {args.chunks:,} x {args.dim} written in {time.perf_counter() - started:.1f}s")
+
+        full = SimilarityEngine.open(work_dir, reduced_dim=0)
+        queries = make_queries(full, args.sentences, args.noise)
+        full_ids, full_seconds = timed_top_k(full, queries, args.k)
+        best = full_ids[:, 0]
+        full_mb = os.path.getsize(os.path.join(work_dir, VECTORS_FILE)) / 2 ** 20
+        print(f"\n🧮 {len(queries):,} sentences x {len(full):,} chunks, full {full.dim} dims: "
+              f"{full_seconds:.2f}s, {full_mb:,.0f} MB")
+
+        results = {"chunks": len(full), "dim": full.dim, "sentences": len(queries),
+                   "full": {"seconds": round(full_seconds, 3), "file_mb": round(full_mb, 1)}, "reduced": []}
+        for dim in [int(d) for d in args.dims.split(",")]:
+            reduced_path = os.path.join(work_dir, REDUCED_FILE.format(dim=dim))
+            if not os.path.exists(reduced_path):
+                write_reduced(work_dir, dim)
+            reduced_mb = os.path.getsize(reduced_path) / 2 ** 20
+
+            first_pass = SimilarityEngine.open(work_dir, reduced_dim=dim).reduced
+            ids, seconds = timed_top_k(first_pass, queries[:, :dim], args.k)
+            recall = float((ids[:, 0] == best).mean())
+            row = {"dim": dim, "file_mb": round(reduced_mb, 1), "first_pass_recall_at_1": round(recall, 4),
+                   "first_pass_seconds": round(seconds, 3), "rerank": []}
+            print(f"   {dim:>5} dims ({reduced_mb:,.0f} MB)  first pass only: recall@1 {recall:.1%}, "
+                  f"{seconds:.2f}s ({full_seconds / seconds:.1f}x)")
+
+            for shortlist in [int(s) for s in args.shortlist.split(",")]:
+                engine = SimilarityEngine.open(work_dir, reduced_dim=dim)
+                engine.shortlist = shortlist
+                ids, seconds = timed_top_k(engine, queries, args.k)
+                recall = float((ids[:, 0] == best).mean())
+                row["rerank"].append({"shortlist": shortlist, "recall_at_1": round(recall, 4),
+                                      "seconds": round(seconds, 3)})
+                print(f"         rerank top {shortlist:<4}     recall@1 {recall:.1%}, "
+                      f"{seconds:.2f}s ({full_seconds / seconds:.1f}x)")
+            results["reduced"].append(row)
+
+        if args.out:
+            with open(args.out, "w") as f:
+                json.dump({"config": vars(args), "results": results}, f, indent=2)
+            print(f"\n💾 Results: {args.out}")
+    finally:
+        if not args.snapshot:
+            shutil.rmtree(work_dir, ignore_errors=True)
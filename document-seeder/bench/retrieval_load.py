@@ -0,0 +1,151 @@
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_services import fake_embedding, EMBED_DIM
+from retrieval_service import RetrievalService, start_in_thread, percentile, NUMPY_AVAILABLE
+
+# Concurrent load test for retrieval_service.py.
+#
+#   python bench/retrieval_load.py                                # synthetic provider, in-process server
+#   python bench/retrieval_load.py --chunks 50000 --concurrency 64 --requests 20000
+#   python bench/retrieval_load.py --url http://127.0.0.1:8765 --provider 12
+#
+# Without --url, a service is started on a synthetic provider (--chunks random
+# unit vectors, fake_services' deterministic query embeddings), so no keys or
+# network are needed. --concurrency clients each keep one connection open and
+# send searches back to back, drawing from --distinct query texts (so the
+# query-embedding LRU warms up as it would in production). Client-side
+# latency percentiles, the service's own timing and the cache hit rate are
+# reported; p99 is the number to watch.
+
+PROVIDER_ID = 1
+TOPICS = ["SEIS", "EIS", "advance assurance", "option pool", "vesting", "cap table",
+          "term sheet", "valuation", "HMRC", "compliance statement", "drag-along rights"]
+TEMPLATES = ["What is {}?", "How does {} work for founders?", "Do I need {} before a round?",
+             "{} checklist", "Common mistakes with {}", "When should we review {}?"]
+
+
+def synthetic_provider(n_chunks, dim, seed=7):
+    rng = random.Random(seed)
+    documents = {d: {"id": d, "title": f"Video {d}", "source_url": f"https://vimeo.com/{1000 + d}",
+                     "media_type": "video"} for d in range(max(1, n_chunks // 40))}
+    rows = []
+    if NUMPY_AVAILABLE:
+        import numpy as np
+        vectors = np.random.default_rng(seed).standard_normal((n_chunks, dim), dtype=np.float32)
+    for i in range(n_chunks):
+        vector = vectors[i] if NUMPY_AVAILABLE else [rng.gauss(0, 1) for _ in range(dim)]
+        rows.append({
+            "id": i + 1,
+            "document_id": i % len(documents),
+            "content": f"chunk {i}",
+            "metadata": {"timestampStart": 30 * (i % 40), "timestampEnd": 30 * (i % 40) + 30},
+            "embedding": vector,
+        })
+    return rows, documents
+
+
+def query_texts(n):
+    texts = [t.format(topic) for t in TEMPLATES for topic in TOPICS]
+    return [f"{texts[i % len(texts)]} ({i // len(texts)})" if i >= len(texts) else texts[i] for i in range(n)]
+
+
+async def client(host, port, provider_id, texts, deadline, per_client, latencies, server_ms, rng):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for _ in range(per_client):
+            if time.perf_counter() > deadline:
+                break
+            body = json.dumps({"provider_id": provider_id, "query": rng.choice(texts),
+                               "match_threshold": 0.0, "match_count": 5}).encode()
+            started = time.perf_counter()
+            writer.write(b"POST /search HTTP/1.1\r\nHost: bench\r\nContent-Type: application/json\r\n"
+                         + f"Content-Length: {len(body)}\r\n\r\n".encode() + body)
+            await writer.drain()
+            status = await reader.readline()
+            length = 0
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b""):
+                    break
+                if line.lower().startswith(b"content-length:"):
+                    length = int(line.split(b":")[1])
+            payload = json.loads(await reader.readexactly(length))
+            latencies.append(time.perf_counter() - started)
+            if b" 200 " not in status:
+                raise RuntimeError(f"search failed: {status!r} {payload}")
+            server_ms.append(payload["took_ms"])
+    finally:
+        writer.close()
+
+
+async def run_load(host, port, provider_id, concurrency, requests, distinct, max_seconds, seed=7):
+    texts = query_texts(distinct)
+    latencies, server_ms = [], []
+    per_client = -(-requests // concurrency)
+    deadline = time.perf_counter() + max_seconds
+    started = time.perf_counter()
+    await asyncio.gather(*(
+        client(host, port, provider_id, texts, deadline, per_client, latencies, server_ms, random.Random(seed + i))
+        for i in range(concurrency)
+    ))
+    elapsed = time.perf_counter() - started
+    return {
+        "requests": len(latencies),
+        "seconds": round(elapsed, 2),
+        "rps": round(len(latencies) / elapsed, 1),
+        "client_ms": {p: round(percentile(latencies, int(p[1:])) * 1000, 3) for p in ("p50", "p95", "p99")},
+        "server_ms": {p: round(percentile(server_ms, int(p[1:])), 3) for p in ("p50", "p95", "p99")},
+    }
+
+
+def stats_from(host, port):
+    import urllib.request
+    with urllib.request.urlopen(f"http://{host}:{port}/stats") as resp:
+        return json.loads(resp.read())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test the retrieval service.")
+    parser.add_argument("--url", help="existing service (default: start one on synthetic data)")
+    parser.add_argument("--provider", type=int, default=PROVIDER_ID)
+    parser.add_argument("--chunks", type=int, default=10000, help="synthetic provider size")
+    parser.add_argument("--dim", type=int, default=EMBED_DIM)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--distinct", type=int, default=200, help="distinct query texts")
+    parser.add_argument("--warmup", type=int, default=200)
+    parser.add_argument("--max-seconds", type=float, default=60.0)
+    parser.add_argument("--out", help="write results JSON here")
+    args = parser.parse_args()
+
+    if args.url:
+        host, port = args.url.split("//")[-1].rstrip("/").split(":")
+        port = int(port)
+    else:
+        rows, documents = synthetic_provider(args.chunks, args.dim)
+        service = RetrievalService(loader=lambda _: (rows, documents), embed_fn=lambda text: fake_embedding(text, args.dim))
+        host, port = "127.0.0.1", start_in_thread(service, preload=[args.provider])
+
+    # Warm-up: loads the index (with --url) and fills the query cache
+    asyncio.run(run_load(host, port, args.provider, min(args.concurrency, 4), args.warmup, args.distinct, args.max_seconds))
+    result = asyncio.run(run_load(host, port, args.provider, args.concurrency, args.requests,
+                                  args.distinct, args.max_seconds))
+    result["service"] = stats_from(host, port)
+
+    c, s = result["client_ms"], result["server_ms"]
+    print(f"\n🔎 {result['requests']} searches, {args.concurrency} clients: {result['rps']} req/s")
+    print(f"   client  p50 {c['p50']:.2f} ms   p95 {c['p95']:.2f} ms   p99 {c['p99']:.2f} ms")
+    print(f"   service p50 {s['p50']:.2f} ms   p95 {s['p95']:.2f} ms   p99 {s['p99']:.2f} ms")
+    print(f"   query cache hit rate {result['service']['query_cache']['hit_rate']:.1%}")
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"config": vars(args), "results": result}, f, indent=2)
+        print(f"\n💾 Results: {args.out}")
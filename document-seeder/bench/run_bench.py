@@ -0,0 +1,215 @@
+import os
+import sys
+import json
+import time
+import glob
+import argparse
+import tempfile
+import subprocess
+import urllib.request
+
+from fake_services import start_in_thread
+
+# Optional: chunker comparison needs bs4 in this interpreter
+try:
+    from chunk_quality import evaluate as evaluate_chunking, print_results as print_chunking
+except ImportError:
+    evaluate_chunking = None
+
+# Offline end-to-end benchmark for the seeders.
+#
+#   python bench/run_bench.py                         # all scenarios
+#   python bench/run_bench.py --only seed-site --embed-latency-ms 80
+#   python bench/run_bench.py --embed-rpm 60 --embed-tpm 20000   # exercise the scheduler
+#   python bench/run_bench.py --out bench/results/main.json
+#   python bench/run_bench.py --compare bench/results/main.json
+#
+# Starts fake_services.py in-process, then runs each seeder as a subprocess
+# pointed at it (no API credits, no production Supabase). Records wall time,
+# docs/sec, chunks/sec and round-trips per endpoint, plus the seeder's own
+# span summary (instrumentation.py) and the chunker comparison from
+# chunk_quality.py. --compare exits non-zero when a scenario
+# got slower or chattier than the saved run by more than --tolerance.
+
+SEEDER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROVIDER_ID = 12  # crawl_and_map.py / generate-map.py are pinned to this provider
+
+# Counters that are volumes, not round-trips
+VOLUME_PREFIXES = ("rows.", "openai.embeddings.inputs", "openai.embeddings.tokens", "openai.whisper.bytes")
+
+
+def http_json(base_url, path, method="GET"):
+    req = urllib.request.Request(base_url + path, method=method, data=b"" if method == "POST" else None)
+    with urllib.request.urlopen(req) as resp:
+        return json.loads(resp.read())
+
+
+def scenarios(base_url, n_articles, tmp_dir):
+    site = f"{base_url}/site"
+    articles = [f"{site}/articles/article-{i:03d}/" for i in range(min(n_articles, 5))]
+    return [
+        ("seed-site", ["seed-site.py", site, str(PROVIDER_ID)]),
+        ("seed-site-pipeline", ["seed-site.py", site, str(PROVIDER_ID), "--pipeline"]),
+        ("seed-substack", ["seed-substack.py", f"{site}/feed", str(PROVIDER_ID)]),
+        ("crawl_and_map", ["crawl_and_map.py", *articles]),
+        ("generate-map", ["generate-map.py", articles[0], os.path.join(tmp_dir, "mirror.html")]),
+        ("generate-map-batch", ["generate-map.py", "--batch", f"{site}/sitemap.xml",
+                                "--out-dir", os.path.join(tmp_dir, "mirrors")]),
+    ]
+
+
+def run_scenario(name, argv, base_url, env, metrics_dir):
+    before = http_json(base_url, "/__stats")["counters"]
+    started = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, *argv], cwd=SEEDER_DIR, env=env,
+        capture_output=True, text=True,
+    )
+    wall = time.perf_counter() - started
+    after = http_json(base_url, "/__stats")["counters"]
+
+    delta = {k: after.get(k, 0) - before.get(k, 0) for k in after}
+    delta = {k: v for k, v in delta.items() if v}
+    round_trips = {k: v for k, v in delta.items() if not k.startswith(VOLUME_PREFIXES)}
+
+    docs = delta.get("rows.provider_documents", 0)
+    chunks = delta.get("rows.provider_knowledge", 0)
+    result = {
+        "scenario": name,
+        "exit_code": proc.returncode,
+        "wall_s": round(wall, 3),
+        "docs": docs,
+        "chunks": chunks,
+        "matches": delta.get("rows.page_matches", 0),
+        "docs_per_s": round(docs / wall, 3) if wall else 0.0,
+        "chunks_per_s": round(chunks / wall, 3) if wall else 0.0,
+        "round_trips": sum(round_trips.values()),
+        "round_trips_by_endpoint": round_trips,
+        "volumes": {k: v for k, v in delta.items() if k.startswith(VOLUME_PREFIXES)},
+    }
+
+    # The seeder's own span summary, if instrumentation wrote one
+    reports = sorted(glob.glob(os.path.join(metrics_dir, "*.json")), key=os.path.getmtime)
+    if reports:
+        with open(reports[-1]) as f:
+            result["spans"] = json.load(f).get("spans", {})
+
+    if proc.returncode != 0:
+        result["stderr_tail"] = proc.stderr[-2000:]
+    return result
+
+
+def print_results(results):
+    print(f"\n{'scenario':<22}{'wall s':>8}{'docs':>6}{'chunks':>8}{'docs/s':>9}{'chunks/s':>10}{'trips':>7}")
+    for r in results:
+        flag = "" if r["exit_code"] == 0 else "  ❌"
+        print(f"{r['scenario']:<22}{r['wall_s']:>8.2f}{r['docs']:>6}{r['chunks']:>8}"
+              f"{r['docs_per_s']:>9.2f}{r['chunks_per_s']:>10.2f}{r['round_trips']:>7}{flag}")
+
+
+def compare(results, baseline_path, tolerance):
+    with open(baseline_path) as f:
+        baseline = {r["scenario"]: r for r in json.load(f)["results"]}
+
+    regressions = []
+    print(f"\n🔍 Compared with {baseline_path} (tolerance {tolerance:.0%})")
+    for r in results:
+        old = baseline.get(r["scenario"])
+        if not old:
+            continue
+        checks = [
+            ("wall_s", r["wall_s"] > old["wall_s"] * (1 + tolerance)),
+            ("round_trips", r["round_trips"] > old["round_trips"] * (1 + tolerance)),
+            ("chunks_per_s", old["chunks_per_s"] and r["chunks_per_s"] < old["chunks_per_s"] * (1 - tolerance)),
+        ]
+        for metric, worse in checks:
+            marker = "⚠️ " if worse else "  "
+            print(f"   {marker}{r['scenario']:<22}{metric:<14}{old[metric]:>10} -> {r[metric]}")
+            if worse:
+                regressions.append((r["scenario"], metric))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline seeder benchmark.")
+    parser.add_argument("--articles", type=int, default=20)
+    parser.add_argument("--embed-latency-ms", type=float, default=20)
+    parser.add_argument("--whisper-latency-ms", type=float, default=200)
+    parser.add_argument("--db-latency-ms", type=float, default=5)
+    parser.add_argument("--site-latency-ms", type=float, default=10)
+    parser.add_argument("--embed-rpm", type=int, default=0, help="fake API request limit (0 = unlimited)")
+    parser.add_argument("--embed-tpm", type=int, default=0, help="fake API token limit (0 = unlimited)")
+    parser.add_argument("--only", action="append", help="run only these scenarios (repeatable)")
+    parser.add_argument("--out", help="write results JSON here (default bench/results/<timestamp>.json)")
+    parser.add_argument("--compare", help="baseline results JSON to diff against")
+    parser.add_argument("--tolerance", type=float, default=0.15)
+    args = parser.parse_args()
+
+    server, base_url, _ = start_in_thread(
+        n_articles=args.articles,
+        embed_latency_ms=args.embed_latency_ms,
+        whisper_latency_ms=args.whisper_latency_ms,
+        db_latency_ms=args.db_latency_ms,
+        site_latency_ms=args.site_latency_ms,
+        embed_rpm=args.embed_rpm,
+        embed_tpm=args.embed_tpm,
+    )
+    print(f"🧪 Fake services on {base_url}")
+
+    tmp_dir = tempfile.mkdtemp(prefix="seeder-bench-")
+    results = []
+    try:
+        for name, argv in scenarios(base_url, args.articles, tmp_dir):
+            if args.only and name not in args.only:
+                continue
+            metrics_dir = os.path.join(tmp_dir, name)
+            env = dict(
+                os.environ,
+                SUPABASE_URL=base_url,
+                PLASMO_PUBLIC_SUPABASE_URL=base_url,
+                SUPABASE_SERVICE_ROLE_KEY="bench.bench.bench",
+                OPENAI_API_KEY="sk-bench",
+                OPENAI_BASE_URL=f"{base_url}/v1",
+                OPENAI_API_BASE=f"{base_url}/v1",
+                CRAWL_DELAY="0",
+                SEEDER_METRICS="1",
+                SEEDER_METRICS_DIR=metrics_dir,
+                # Fresh crawl state per scenario, or the second site crawl would just resume the first
+                CRAWL_STATE_DIR=os.path.join(metrics_dir, "crawl_state"),
+                # Same for the mappers' semantic cache: hits should come from within the run
+                SEEDER_SEMANTIC_CACHE=os.path.join(metrics_dir, "semantic-cache.sqlite"),
+                # Per-run lexical index and match bundles (not the repo's web-embed/)
+                LEXICAL_INDEX_DIR=os.path.join(metrics_dir, "lexical_index"),
+                MATCH_BUNDLE_DIR=os.path.join(metrics_dir, "match-bundles"),
+            )
+            # Each scenario starts from an empty database except the mappers,
+            # which need the knowledge the seeders just wrote
+            if name in ("seed-site", "seed-site-pipeline", "seed-substack"):
+                http_json(base_url, "/__reset?data=1", "POST")
+            print(f"▶️  {name} ...")
+            results.append(run_scenario(name, argv, base_url, env, metrics_dir))
+    finally:
+        server.shutdown()
+
+    print_results(results)
+    chunking = None
+    if evaluate_chunking is not None:
+        chunking = evaluate_chunking(args.articles)
+        print_chunking(chunking)
+
+    out = args.out or os.path.join(SEEDER_DIR, "bench", "results", f"{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(out), exist_ok=True)
+    with open(out, "w") as f:
+        json.dump({"config": vars(args), "results": results, "chunking": chunking}, f, indent=2)
+    print(f"\n💾 Results: {out}")
+
+    failed = [r["scenario"] for r in results if r["exit_code"] != 0]
+    if failed:
+        print(f"❌ Scenarios failed: {', '.join(failed)}")
+    regressions = compare(results, args.compare, args.tolerance) if args.compare else []
+    if failed or regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from fake_services import start_in_thread, EMBED_DIM
+from similarity_engine import SimilarityEngine
+from snapshot_sync import sync_snapshot
+
+# Full re-pull vs incremental sync of a provider snapshot, against fake_services.
+#
+#   python bench/snapshot_sync.py                            # 10k chunks, then +500 / -200
+#   python bench/snapshot_sync.py --chunks 30000 --db-latency-ms 20 --out /tmp/sync.json
+#
+# Seeds --chunks provider_knowledge rows (random 1536-dim vectors) into the
+# in-process PostgREST stand-in, then times:
+#   full     the old path: retrieval_service.load_provider() + from_rows() + save()
+#   initial  snapshot_sync.py into an empty directory
+#   noop     a second sync with nothing changed
+#   delta    a sync after --added new rows, --deleted removals (one re-seeded
+#            document's worth) and --late rows inserted below the watermark
+# and checks that the synced snapshot returns the same top-k as one pulled
+# from scratch.
+
+PROVIDER_ID = 1
+
+
+def knowledge_rows(rng, n, start_id=None, documents=50):
+    rows = []
+    for i in range(n):
+        row = {"provider_id": PROVIDER_ID, "document_id": rng.randrange(documents),
+               "content": f"chunk {i}", "metadata": {"timestampStart": 30 * (i % 40)},
+               "embedding": [float(x) for x in np.random.default_rng(rng.randrange(2 ** 32)).standard_normal(EMBED_DIM)]}
+        if start_id is not None:
+            row["id"] = start_id + i
+        rows.append(row)
+    return rows
+
+
+def timed(fn):
+    started = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - started
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark incremental snapshot sync.")
+    parser.add_argument("--chunks", type=int, default=10000)
+    parser.add_argument("--added", type=int, default=500)
+    parser.add_argument("--deleted", type=int, default=200)
+    parser.add_argument("--late", type=int, default=5, help="rows inserted with ids below the watermark")
+    parser.add_argument("--db-latency-ms", type=float, default=10)
+    parser.add_argument("--work-dir", help="snapshot location (default: a temp dir, removed afterwards)")
+    parser.add_argument("--out", help="write results JSON here")
+    args = parser.parse_args()
+
+    server, base, state = start_in_thread(n_articles=1, db_latency_ms=args.db_latency_ms)
+    os.environ.update(SUPABASE_URL=base, SUPABASE_SERVICE_ROLE_KEY="bench.bench.bench")
+    from supabase import create_client
+    from retrieval_service import load_provider
+    client = create_client(base, "bench.bench.bench")
+
+    rng = random.Random(5)
+    state.insert("provider_documents", [{"id": d, "provider_id": PROVIDER_ID, "title": f"Video {d}",
+                                         "source_url": f"https://vimeo.com/{1000 + d}"} for d in range(50)])
+    # Leave id gaps for the late rows, as concurrent seeders would
+    state.insert("provider_knowledge", knowledge_rows(rng, args.chunks, start_id=args.late + 1))
+    state.next_id["provider_knowledge"] = args.chunks + args.late
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="snapshot-sync-")
+    synced, fresh = os.path.join(work_dir, "synced"), os.path.join(work_dir, "fresh")
+    try:
+        shutil.rmtree(synced, ignore_errors=True)
+        _, full_seconds = timed(lambda: SimilarityEngine.from_rows(*load_provider(PROVIDER_ID)).save(fresh))
+        print(f"📦 full re-pull ({args.chunks:,} rows): {full_seconds:.2f}s")
+        initial, _ = timed(lambda: sync_snapshot(client, PROVIDER_ID, synced))
+        noop, _ = timed(lambda: sync_snapshot(client, PROVIDER_ID, synced))
+
+        with state.lock:
+            rows = state.tables["provider_knowledge"]
+            doomed = {r["id"] for r in rng.sample(rows, args.deleted)}
+            state.tables["provider_knowledge"] = [r for r in rows if r["id"] not in doomed]
+        state.insert("provider_knowledge", knowledge_rows(rng, args.added))
+        state.insert("provider_knowledge", knowledge_rows(rng, args.late, start_id=1))
+        delta, _ = timed(lambda: sync_snapshot(client, PROVIDER_ID, synced))
+
+        shutil.rmtree(fresh)
+        SimilarityEngine.from_rows(*load_provider(PROVIDER_ID), reduced_dim=0).save(fresh)
+        queries = np.random.default_rng(3).standard_normal((200, EMBED_DIM), dtype=np.float32)
+        expected = SimilarityEngine.open(fresh, reduced_dim=0)
+        actual = SimilarityEngine.open(synced, reduced_dim=0)
+        _, expected_ids = expected.top_k(queries, 8)
+        _, actual_ids = actual.top_k(queries, 8)
+        same = all(expected.rows[int(e)]["id"] == actual.rows[int(a)]["id"]
+                   for e, a in zip(expected_ids.ravel(), actual_ids.ravel()))
+
+        result = {
+            "chunks": args.chunks,
+            "full_seconds": round(full_seconds, 3),
+            "initial": initial,
+            "noop": noop,
+            "delta": delta,
+            "same_top_k_as_fresh_pull": same,
+        }
+        print(f"\n🔄 initial sync {initial['seconds']:.2f}s, no-op {noop['seconds']:.2f}s, "
+              f"delta (+{delta['fetched']} +{delta['late']} late -{delta['deleted']}) {delta['seconds']:.2f}s "
+              f"vs full re-pull {full_seconds:.2f}s ({full_seconds / delta['seconds']:.0f}x)")
+        print(f"   top-k identical to a fresh pull: {same}")
+
+        if args.out:
+            with open(args.out, "w") as f:
+                json.dump({"config": vars(args), "results": result}, f, indent=2)
+            print(f"\n💾 Results: {args.out}")
+    finally:
+        server.shutdown()
+        if not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
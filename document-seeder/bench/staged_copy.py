@@ -0,0 +1,146 @@
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import psycopg
+from psycopg import sql
+
+from bulk_load import load_all, table_identifier
+from staged_knowledge import StagedWriter, COLUMNS
+
+# REST-style inserts vs staged Parquet + binary COPY, against a real Postgres.
+#
+#   python bench/staged_copy.py --dsn postgresql://postgres@127.0.0.1:5432/postgres
+#   python bench/staged_copy.py --dsn ... --rows 50000 --rest-rows 5000 --rtt-ms 40 --out /tmp/bulk.json
+#
+# Needs the pgvector extension. Everything happens in a scratch schema
+# (--schema, dropped afterwards unless --keep) holding a provider_knowledge
+# lookalike: bigserial id, bigint provider/document ids, text, jsonb,
+# vector(--dim), created_at.
+#
+#   rest     what the seeders' REST inserts cost the database: batches of
+#            --batch rows sent as JSON, inserted through
+#            json_populate_recordset with RETURNING * (PostgREST's bulk
+#            insert, supabase-py's default return=representation), one
+#            transaction per request. --rtt-ms adds the client-database round
+#            trip each request pays; the real REST path also pays HTTP and
+#            PostgREST on top, so this is its upper bound on speed.
+#   stage    writing the same rows to Parquet with staged_knowledge.py
+#   copy     bulk_load.py: one binary COPY transaction per staged file
+
+WORDS = ("seis eis relief founders investors shares advance assurance hmrc option pool vesting "
+         "valuation round term sheet cap table compliance statement dilution board").split()
+
+
+def synthetic_rows(n, dim, seed=3):
+    rng = random.Random(seed)
+    vectors = np.random.default_rng(seed).standard_normal((n, dim), dtype=np.float32)
+    return [{
+        "provider_id": 1,
+        "document_id": i // 40,
+        "content": " ".join(rng.choice(WORDS) for _ in range(120)),
+        "metadata": {"source": f"https://example.com/articles/{i // 40}/", "header_path": ["Guide", f"Part {i % 7}"],
+                     "timestampStart": 30 * (i % 40)},
+        "embedding": vectors[i].tolist(),
+    } for i in range(n)]
+
+
+def create_schema(conn, schema, dim):
+    conn.execute("CREATE EXTENSION IF NOT EXISTS vector")
+    conn.execute(sql.SQL("DROP SCHEMA IF EXISTS {} CASCADE").format(sql.Identifier(schema)))
+    conn.execute(sql.SQL("CREATE SCHEMA {}").format(sql.Identifier(schema)))
+    conn.execute(sql.SQL(
+        "CREATE TABLE {}.provider_knowledge (id bigserial PRIMARY KEY, provider_id bigint, document_id bigint, "
+        "content text, metadata jsonb, embedding vector({}), created_at timestamptz NOT NULL DEFAULT now())"
+    ).format(sql.Identifier(schema), sql.Literal(dim)))
+
+
+def rest_insert(conn, table, rows, batch, rtt):
+    statement = sql.SQL(
+        "INSERT INTO {table} ({columns}) SELECT {columns} FROM json_populate_recordset(NULL::{table}, %s::json) "
+        "RETURNING *"
+    ).format(table=table_identifier(table), columns=sql.SQL(", ").join(map(sql.Identifier, COLUMNS)))
+    started = time.perf_counter()
+    for start in range(0, len(rows), batch):
+        payload = json.dumps(rows[start:start + batch])
+        if rtt:
+            time.sleep(rtt)
+        with conn.transaction():
+            conn.execute(statement, (payload,)).fetchall()
+    return time.perf_counter() - started
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark REST-style inserts vs staged binary COPY.")
+    parser.add_argument("--dsn", default=os.getenv("BENCH_DATABASE_URL") or os.getenv("DATABASE_URL"))
+    parser.add_argument("--rows", type=int, default=20000, help="rows staged and COPYed")
+    parser.add_argument("--rest-rows", type=int, default=2000, help="rows inserted the REST way")
+    parser.add_argument("--batch", type=int, default=20, help="rows per REST insert (the seeders use 10-20)")
+    parser.add_argument("--rtt-ms", type=float, default=0.0, help="round trip added per REST request")
+    parser.add_argument("--file-rows", type=int, default=10000, help="rows per staged file (= per COPY transaction)")
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--schema", default="bulk_load_bench")
+    parser.add_argument("--keep", action="store_true", help="keep the scratch schema")
+    parser.add_argument("--out", help="write results JSON here")
+    args = parser.parse_args()
+    if not args.dsn:
+        print("❌ Pass --dsn (or set BENCH_DATABASE_URL) to a Postgres with pgvector")
+        sys.exit(1)
+
+    table = f"{args.schema}.provider_knowledge"
+    rows = synthetic_rows(max(args.rows, args.rest_rows), args.dim)
+    stage_dir = tempfile.mkdtemp(prefix="bulk-load-")
+    try:
+        with psycopg.connect(args.dsn, autocommit=True) as conn:
+            create_schema(conn, args.schema, args.dim)
+            rest_seconds = rest_insert(conn, table, rows[:args.rest_rows], args.batch, args.rtt_ms / 1000)
+            conn.execute(sql.SQL("TRUNCATE {}").format(table_identifier(table)))
+
+        started = time.perf_counter()
+        writer = StagedWriter(stage_dir, prefix="bench", file_rows=args.file_rows)
+        for start in range(0, args.rows, args.batch):
+            writer.write(rows[start:start + args.batch])
+        writer.close()
+        stage_seconds = time.perf_counter() - started
+        staged_mb = sum(os.path.getsize(f) for f in writer.files) / 2 ** 20
+
+        loaded = load_all(args.dsn, writer.files, table, f"{args.schema}.seeder_bulk_loads")
+        with psycopg.connect(args.dsn) as conn:
+            in_table = conn.execute(sql.SQL("SELECT count(*) FROM {}").format(table_identifier(table))).fetchone()[0]
+
+        rest_rate = args.rest_rows / rest_seconds
+        result = {
+            "rest": {"rows": args.rest_rows, "batch": args.batch, "rtt_ms": args.rtt_ms,
+                     "seconds": round(rest_seconds, 3), "rows_per_s": round(rest_rate)},
+            "stage": {"rows": args.rows, "files": len(writer.files), "mb": round(staged_mb, 1),
+                      "seconds": round(stage_seconds, 3), "rows_per_s": round(args.rows / stage_seconds)},
+            "copy": loaded,
+            "rows_in_table": in_table,
+        }
+        print(f"\n🐘 {args.dim}-dim rows into {table}")
+        print(f"   rest   {args.rest_rows:>7,} rows, batches of {args.batch}"
+              f"{f' +{args.rtt_ms:g} ms RTT' if args.rtt_ms else ''}: {rest_seconds:.2f}s ({rest_rate:,.0f} rows/s)")
+        print(f"   stage  {args.rows:>7,} rows -> {len(writer.files)} Parquet file(s), {staged_mb:,.0f} MB: "
+              f"{stage_seconds:.2f}s ({args.rows / stage_seconds:,.0f} rows/s)")
+        print(f"   copy   {loaded['rows']:>7,} rows: {loaded['seconds']:.2f}s ({loaded['rows_per_s']:,} rows/s, "
+              f"{loaded['rows_per_s'] / rest_rate:.1f}x rest)")
+        if in_table != args.rows:
+            print(f"   ⚠️ {in_table} rows in the table, expected {args.rows}")
+
+        if args.out:
+            with open(args.out, "w") as f:
+                json.dump({"config": vars(args), "results": result}, f, indent=2)
+            print(f"\n💾 Results: {args.out}")
+    finally:
+        shutil.rmtree(stage_dir, ignore_errors=True)
+        if not args.keep:
+            with psycopg.connect(args.dsn, autocommit=True) as conn:
+                conn.execute(sql.SQL("DROP SCHEMA IF EXISTS {} CASCADE").format(sql.Identifier(args.schema)))
@@ -0,0 +1,234 @@
+import os
+import sys
+import glob
+import json
+import time
+import shutil
+import struct
+import argparse
+
+import numpy as np
+import psycopg
+import pyarrow.parquet as pq
+from psycopg import sql
+
+from instrumentation import span, count
+from staged_knowledge import COLUMNS, STAGED_SUFFIX
+
+# Bulk loader for staged provider_knowledge Parquet files (staged_knowledge.py).
+#
+#   python bulk_load.py staged/                           # every *.parquet in staged/
+#   python bulk_load.py staged/seed-site-*.parquet --dsn postgresql://postgres@127.0.0.1:54322/postgres
+#
+# Each file is loaded with one COPY ... FROM STDIN (FORMAT BINARY) inside one
+# transaction, streamed in batches of BULK_BATCH_ROWS: no JSON, no per-row
+# INSERT parsing, and the embedding goes over as pgvector's binary form
+# (dim, 0, big-endian float4s) straight from the float32 column. Encoders
+# follow the target columns' actual types (int2/4/8, text, json/jsonb,
+# vector/halfvec), read from pg_attribute, since binary COPY accepts
+# nothing else.
+#
+# The same transaction records the file in BULK_LOAD_LEDGER (created on
+# first use), so a file is loaded exactly once: re-running after a crash, or
+# two loaders on one directory, skip what has been committed. Loaded files
+# are moved to <dir>/loaded/ unless --keep.
+#
+# Needs the database's direct connection string (Supabase: Settings ->
+# Database), not the REST URL: SUPABASE_DB_URL, DATABASE_URL or --dsn.
+
+DATABASE_URL = os.getenv("SUPABASE_DB_URL") or os.getenv("DATABASE_URL")
+BULK_TABLE = os.getenv("BULK_LOAD_TABLE", "provider_knowledge")
+BULK_LOAD_LEDGER = os.getenv("BULK_LOAD_LEDGER", "seeder_bulk_loads")
+BULK_BATCH_ROWS = int(os.getenv("BULK_BATCH_ROWS", "2000"))
+
+COPY_HEADER = b"PGCOPY\n\xff\r\n\x00" + struct.pack(">ii", 0, 0)
+COPY_TRAILER = struct.pack(">h", -1)
+NULL_FIELD = struct.pack(">i", -1)
+FIELD_LENGTH = struct.Struct(">i")
+VECTOR_TYPES = {"vector": ">f4", "halfvec": ">f2"}
+
+
+def _integer(fmt):
+    packer = struct.Struct(fmt)
+    return lambda value: packer.pack(value)
+
+
+SCALAR_ENCODERS = {
+    "int2": _integer(">h"),
+    "int4": _integer(">i"),
+    "int8": _integer(">q"),
+    "text": str.encode,
+    "varchar": str.encode,
+    "json": str.encode,
+    "jsonb": lambda value: b"\x01" + value.encode(),  # jsonb binary format version 1
+}
+
+
+def table_identifier(name):
+    return sql.Identifier(*name.split("."))
+
+
+def column_types(conn, table, columns):
+    rows = conn.execute(
+        "SELECT a.attname::text, t.typname::text FROM pg_attribute a JOIN pg_type t ON t.oid = a.atttypid "
+        "WHERE a.attrelid = %s::regclass AND a.attnum > 0 AND NOT a.attisdropped",
+        (table,),
+    ).fetchall()
+    types = dict(rows)
+    missing = [c for c in columns if c not in types]
+    if missing:
+        raise ValueError(f"{table} has no column(s) {missing}")
+    unsupported = {c: types[c] for c in columns
+                   if types[c] not in SCALAR_ENCODERS and types[c] not in VECTOR_TYPES}
+    if unsupported:
+        raise ValueError(f"no binary COPY encoder for {unsupported}")
+    return {c: types[c] for c in columns}
+
+
+def encode_batch(batch, types):
+    """
+    One Arrow record batch as binary COPY tuples (no header/trailer).
+    """
+    n = batch.num_rows
+    fields = []
+    for column in COLUMNS:
+        values = batch.column(column)
+        typname = types[column]
+        if typname in VECTOR_TYPES:
+            dim = values.type.list_size
+            flat = values.values.slice(values.offset * dim, n * dim).to_numpy(zero_copy_only=False)
+            data = memoryview(np.ascontiguousarray(flat, dtype=VECTOR_TYPES[typname]).tobytes())
+            width = dim * np.dtype(VECTOR_TYPES[typname]).itemsize
+            prefix = FIELD_LENGTH.pack(4 + width) + struct.pack(">hh", dim, 0)
+            nulls = values.is_null().to_pylist()
+            fields.append([None if nulls[i] else prefix + data[i * width:(i + 1) * width] for i in range(n)])
+        else:
+            encode = SCALAR_ENCODERS[typname]
+            encoded = []
+            for value in values.to_pylist():
+                if value is None:
+                    encoded.append(None)
+                else:
+                    raw = encode(value)
+                    encoded.append(FIELD_LENGTH.pack(len(raw)) + raw)
+            fields.append(encoded)
+
+    field_count = struct.pack(">h", len(COLUMNS))
+    pieces = []
+    for row in zip(*fields):
+        pieces.append(field_count)
+        pieces.extend(NULL_FIELD if field is None else field for field in row)
+    return b"".join(pieces)
+
+
+def ensure_ledger(conn, ledger=BULK_LOAD_LEDGER):
+    with conn.transaction():
+        conn.execute(sql.SQL(
+            "CREATE TABLE IF NOT EXISTS {} (file text PRIMARY KEY, rows bigint NOT NULL, "
+            "loaded_at timestamptz NOT NULL DEFAULT now())"
+        ).format(table_identifier(ledger)))
+
+
+def load_file(conn, path, table=BULK_TABLE, ledger=BULK_LOAD_LEDGER, batch_rows=BULK_BATCH_ROWS, types=None):
+    """
+    COPYs one staged file in one transaction. Returns rows loaded, or None
+    when the ledger says it was loaded before.
+    """
+    parquet = pq.ParquetFile(path)
+    types = types or column_types(conn, table, COLUMNS)
+    copy_sql = sql.SQL("COPY {} ({}) FROM STDIN (FORMAT BINARY)").format(
+        table_identifier(table), sql.SQL(", ").join(map(sql.Identifier, COLUMNS)))
+    loaded = 0
+    with conn.transaction():
+        # Claiming the ledger row first also serialises two loaders on one file
+        claimed = conn.execute(
+            sql.SQL("INSERT INTO {} (file, rows) VALUES (%s, %s) ON CONFLICT DO NOTHING RETURNING file")
+            .format(table_identifier(ledger)),
+            (os.path.basename(path), parquet.metadata.num_rows),
+        ).fetchone()
+        if claimed is None:
+            return None
+        with conn.cursor().copy(copy_sql) as copy:
+            copy.write(COPY_HEADER)
+            for batch in parquet.iter_batches(batch_size=batch_rows, columns=list(COLUMNS)):
+                with span("bulk_load.encode"):
+                    data = encode_batch(batch, types)
+                with span("bulk_load.copy"):
+                    copy.write(data)
+                loaded += batch.num_rows
+            copy.write(COPY_TRAILER)
+    count("bulk_load.rows", loaded)
+    return loaded
+
+
+def staged_files(sources):
+    files = []
+    for source in sources:
+        if os.path.isdir(source):
+            files.extend(glob.glob(os.path.join(source, f"*{STAGED_SUFFIX}")))
+        else:
+            files.extend(glob.glob(source))
+    # Staged names start with seeder + timestamp: load in the order they were written
+    return sorted({f for f in files if f.endswith(STAGED_SUFFIX)}, key=lambda f: (os.path.basename(f), f))
+
+
+def load_all(dsn, files, table=BULK_TABLE, ledger=BULK_LOAD_LEDGER, keep=False):
+    """
+    Loads files one transaction each; returns {"files", "skipped", "rows", "seconds", "rows_per_s"}.
+    """
+    started = time.perf_counter()
+    loaded_files = skipped = total = 0
+    # autocommit: each conn.transaction() below is then its own BEGIN/COMMIT, not a savepoint
+    with psycopg.connect(dsn, autocommit=True) as conn:
+        ensure_ledger(conn, ledger)
+        types = column_types(conn, table, COLUMNS)
+        for path in files:
+            file_started = time.perf_counter()
+            try:
+                rows = load_file(conn, path, table, ledger, types=types)
+            except (psycopg.Error, ValueError, OSError) as e:
+                print(f"   ❌ {os.path.basename(path)}: {e} (rolled back)")
+                continue
+            if rows is None:
+                skipped += 1
+                print(f"   ⏭️  {os.path.basename(path)}: already loaded")
+            else:
+                loaded_files += 1
+                total += rows
+                elapsed = time.perf_counter() - file_started
+                print(f"   ✅ {os.path.basename(path)}: {rows} rows in {elapsed:.2f}s "
+                      f"({rows / elapsed if elapsed else 0:,.0f} rows/s)")
+            if not keep:
+                done_dir = os.path.join(os.path.dirname(path), "loaded")
+                os.makedirs(done_dir, exist_ok=True)
+                shutil.move(path, os.path.join(done_dir, os.path.basename(path)))
+
+    seconds = time.perf_counter() - started
+    result = {"files": loaded_files, "skipped": skipped, "rows": total, "seconds": round(seconds, 3),
+              "rows_per_s": round(total / seconds) if seconds else 0}
+    print(f"📥 {total} rows from {loaded_files} file(s) into {table} in {seconds:.1f}s "
+          f"({result['rows_per_s']:,} rows/s), {skipped} skipped")
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="COPY staged provider_knowledge Parquet files into Postgres.")
+    parser.add_argument("sources", nargs="+", help="staging directories and/or .parquet files (globs ok)")
+    parser.add_argument("--dsn", default=DATABASE_URL, help="Postgres connection string (default SUPABASE_DB_URL)")
+    parser.add_argument("--table", default=BULK_TABLE)
+    parser.add_argument("--ledger", default=BULK_LOAD_LEDGER)
+    parser.add_argument("--keep", action="store_true", help="leave loaded files in place")
+    parser.add_argument("--out", help="write results JSON here")
+    args = parser.parse_args()
+
+    if not args.dsn:
+        print("❌ No database: set SUPABASE_DB_URL / DATABASE_URL or pass --dsn")
+        sys.exit(1)
+    files = staged_files(args.sources)
+    if not files:
+        print("Nothing staged.")
+        sys.exit(0)
+    result = load_all(args.dsn, files, args.table, args.ledger, args.keep)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(result, f, indent=2)
@@ -1,11 +1,16 @@
 import os
+import sys
 import time
 import requests
 import re
 from bs4 import BeautifulSoup
 from dotenv import load_dotenv
 from supabase import create_client, Client
-from llama_index.embeddings.openai import OpenAIEmbedding
+from instrumentation import span, count, count_tokens
+from embedding_scheduler import ScheduledEmbedding
+from match_bundles import export_bundles
+from semantic_cache import SemanticCache
+from lexical_index import LexicalIndex, PrefilterReport, LEXICAL_MIN_SCORE, LEXICAL_AUDIT_RATE
 
 # 1. SETUP
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -15,11 +20,12 @@ load_dotenv(os.path.join(parent_dir, '.env'))
 SUPABASE_URL = os.getenv("SUPABASE_URL") or os.getenv("PLASMO_PUBLIC_SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
 supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
-embed_model = OpenAIEmbedding(model="text-embedding-3-small")
+embed_model = ScheduledEmbedding(model="text-embedding-3-small")
 
 # ⚠️ CONFIGURATION
 PROVIDER_ID = 12  # SeedLegals Provider ID
 CONFIDENCE_THRESHOLD = 0.5 # High precision for the "Pre-Map"
+CRAWL_DELAY = float(os.getenv("CRAWL_DELAY", "1.0"))
 
 # Target Pages to Map (We can fetch sitemap, but let's start with the top 3 resources for the Pilot)
 TARGET_URLS = [
@@ -32,12 +38,38 @@ headers = {
     "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
 }
 
-def process_url(url):
+def search_knowledge(vector):
+    """
+    Best knowledge match above the threshold with its metadata, or None.
+    """
+    with span("db.rpc.match_provider_knowledge"):
+        rpc_resp = supabase.rpc("match_provider_knowledge", {
+            "query_embedding": vector,
+            "match_threshold": CONFIDENCE_THRESHOLD, 
+            "match_count": 1,
+            "filter_provider_id": PROVIDER_ID
+        }).execute()
+    if not rpc_resp.data:
+        return None
+    match_data = rpc_resp.data[0]
+
+    # Fetch details to get Video URL and Document ID
+    # Note: We select document_id here to link tables
+    with span("db.select.provider_knowledge"):
+        details = supabase.table("provider_knowledge")\
+            .select("metadata, document_id")\
+            .eq("id", match_data['id'])\
+            .single().execute()
+    return {"match": match_data, "details": details.data}
+
+def process_url(url, match_cache=None, lexical=None):
     print(f"\n🌍 Processing: {url}")
     try:
         # 1. Fetch Page
-        resp = requests.get(url, headers=headers, timeout=10)
-        soup = BeautifulSoup(resp.text, 'html.parser')
+        with span("http.get"):
+            resp = requests.get(url, headers=headers, timeout=10)
+        with span("extract.bs4"):
+            soup = BeautifulSoup(resp.text, 'html.parser')
         
         # 2. Extract Text
         content_area = soup.find('div', class_='elementor-section-wrap') or soup.body
@@ -54,45 +86,63 @@ def process_url(url):
         
         # Deduplicate and limit to save tokens
         clean_sentences = list(set(clean_sentences))[:50] 
-        print(f"   ⚡ Scanned {len(clean_sentences)} sentences. Embedding...")
+        count("bytes.html", len(resp.text))
+        count("sentences", len(clean_sentences))
+
+        # 4. Lexical prefilter: only sentences sharing enough terms with the
+        # provider's knowledge are embedded. A sample of the skipped ones is
+        # still searched (LEXICAL_AUDIT_RATE) to count matches we would lose.
+        report = PrefilterReport(LEXICAL_MIN_SCORE, LEXICAL_AUDIT_RATE)
+        kept, audited = [], []
+        for sentence in clean_sentences:
+            if lexical is None or lexical.best_score(sentence) >= LEXICAL_MIN_SCORE:
+                kept.append(sentence)
+            else:
+                report.skipped += 1
+                if report.should_audit(sentence):
+                    audited.append(sentence)
+        report.kept, report.audited = len(kept), len(audited)
+        to_embed = kept + audited
 
-        if not clean_sentences: 
+        print(f"   ⚡ Scanned {len(clean_sentences)} sentences. Embedding {len(to_embed)}...")
+        count_tokens("tokens.embedded", to_embed)
+
+        if not to_embed: 
+            if lexical is not None:
+                report.print()
             return
 
-        # 4. Generate Embeddings
-        vectors = embed_model.get_text_embedding_batch(clean_sentences)
+        # 5. Generate Embeddings
+        with span("embed.openai"):
+            vectors = embed_model.get_text_embedding_batch(to_embed)
         
         matches_to_save = []
         
-        # 5. Find Matches
+        # 6. Find Matches
         for i, vector in enumerate(vectors):
-            sentence = clean_sentences[i]
+            sentence = to_embed[i]
             
-            # Call Supabase RPC
-            rpc_resp = supabase.rpc("match_provider_knowledge", {
-                "query_embedding": vector,
-                "match_threshold": CONFIDENCE_THRESHOLD, 
-                "match_count": 1,
-                "filter_provider_id": PROVIDER_ID
-            }).execute()
-
-            if rpc_resp.data:
-                match_data = rpc_resp.data[0]
-                
-                # Fetch details to get Video URL and Document ID
-                # Note: We select document_id here to link tables
-                details = supabase.table("provider_knowledge")\
-                    .select("metadata, document_id")\
-                    .eq("id", match_data['id'])\
-                    .single().execute()
+            # Paraphrases of sentences already searched reuse that result
+            if match_cache:
+                found = match_cache.get_or_search(vector, lambda: search_knowledge(vector))
+            else:
+                found = search_knowledge(vector)
+
+            if found:
+                match_data = found["match"]
+                details = found["details"]
                 
-                if details.data:
-                    doc_id = details.data.get('document_id')
-                    meta = details.data.get('metadata', {})
+                if details:
+                    doc_id = details.get('document_id')
+                    meta = details.get('metadata', {})
                     video_link = meta.get('source') or meta.get('source_url')
                     ts = meta.get('timestampStart', 0)
                     
-                    if video_link:
+                    if video_link and i >= len(kept):
+                        # Audited sentence the prefilter would have dropped
+                        report.lost += 1
+                        print(f"      🔤 Would lose ({match_data['similarity']:.2f}): {sentence[:30]}...")
+                    elif video_link:
                         final_video_url = f"{video_link}#t={ts}"
                         
                         matches_to_save.append({
@@ -105,25 +155,48 @@ def process_url(url):
                         })
                         print(f"      ✅ Match ({match_data['similarity']:.2f}): {sentence[:30]}...")
 
-        # 6. Bulk Insert to Supabase
+        if lexical is not None:
+            report.print()
+
+        # 7. Bulk Insert to Supabase
         if matches_to_save:
             # Delete old matches for this URL first (to prevent duplicates during testing)
-            supabase.table("page_matches").delete().eq("url", url).execute()
+            with span("db.delete.page_matches"):
+                supabase.table("page_matches").delete().eq("url", url).execute()
             
             # Insert new ones
-            supabase.table("page_matches").insert(matches_to_save).execute()
+            with span("db.insert.page_matches"):
+                supabase.table("page_matches").insert(matches_to_save).execute()
             print(f"      💾 Saved {len(matches_to_save)} matches to DB.")
+            count("matches", len(matches_to_save))
+
+            # 8. Static bundle for the highlighter (rewritten only if it changed)
+            export_bundles(PROVIDER_ID, [url])
         else:
             print("      0 Matches found above threshold.")
             
     except Exception as e:
         print(f"      ⚠️ Failed: {e}")
 
-def run():
+def run(urls=TARGET_URLS):
     print("🚀 Starting Pre-Mapper...")
-    for url in TARGET_URLS:
-        process_url(url)
-        time.sleep(1) # Be polite
+    match_cache = SemanticCache.for_provider(
+        supabase, PROVIDER_ID, f"match_provider_knowledge:{CONFIDENCE_THRESHOLD}:1"
+    )
+    lexical = None
+    if LEXICAL_MIN_SCORE > 0:
+        try:
+            lexical = LexicalIndex.for_provider(supabase, PROVIDER_ID)
+        except Exception as e:
+            print(f"   ⚠️ Lexical index unavailable, embedding every sentence: {e}")
+    try:
+        for url in urls:
+            process_url(url, match_cache, lexical)
+            time.sleep(CRAWL_DELAY) # Be polite
+    finally:
+        match_cache.report()
+        match_cache.close()
 
 if __name__ == "__main__":
-    run()
\ No newline at end of file
+    # Usage: python crawl_and_map.py [url ...]   (defaults to TARGET_URLS)
+    run(sys.argv[1:] or TARGET_URLS)
\ No newline at end of file
@@ -0,0 +1,251 @@
+import os
+import re
+import time
+import sqlite3
+import threading
+from urllib.parse import urlsplit
+
+# Persistent crawl frontier for seed-site.py.
+#
+#   frontier = CrawlFrontier("crawl_state/example.com-12.sqlite", max_pages=500, max_depth=3,
+#                            include=[r"/blog/"], exclude=[r"/tag/", r"\?replytocom="])
+#   frontier.add(start_url, depth=0)
+#   while (item := frontier.next()):
+#       url, depth = item
+#       ...
+#       frontier.mark(url, "done")
+#
+# Every URL the crawl has seen lives in one SQLite table with its depth and
+# status (queued / in_progress / done / skipped / failed) and, once created,
+# its provider_documents id. Writes are committed in small batches (every
+# CHECKPOINT_EVERY changes or CHECKPOINT_SECONDS), document ids immediately.
+# Reopening the same file resumes: pages that were in flight go back on the
+# queue and keep their document id, so a rerun neither refetches finished
+# pages nor inserts a second document for a half-written one. Failed pages
+# are retried the same way (their partial chunks are dropped when the
+# document is reused) until they have been claimed MAX_ATTEMPTS times;
+# after that they stay failed until --fresh. Content
+# fingerprints (url_canon.py) are stored alongside so dedupe survives resumes.
+# Sitemap lastmods are kept per URL so refresh runs (crawl_schedule.py) can
+# requeue only the pages that changed since they were crawled. max_pages
+# bounds the URLs claimed by this run, not the file's history, so resumed
+# and refresh runs get their full budget.
+
+STATUSES = ("queued", "in_progress", "done", "skipped", "failed")
+CHECKPOINT_EVERY = 25
+CHECKPOINT_SECONDS = 5.0
+STATE_DIR = os.getenv("CRAWL_STATE_DIR", "crawl_state")
+# Claims per URL before a failed page is no longer retried on resume
+MAX_ATTEMPTS = int(os.getenv("CRAWL_MAX_ATTEMPTS", "3"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS urls (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    url TEXT UNIQUE NOT NULL,
+    depth INTEGER NOT NULL,
+    priority REAL NOT NULL DEFAULT 0,
+    status TEXT NOT NULL DEFAULT 'queued',
+    document_id INTEGER,
+    error TEXT,
+    lastmod REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    updated_at REAL
+);
+CREATE INDEX IF NOT EXISTS urls_queue ON urls (status, priority DESC, id);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS fingerprints (url TEXT PRIMARY KEY, exact TEXT NOT NULL, simhash TEXT NOT NULL);
+"""
+
+
+def default_state_path(start_url, provider_id):
+    host = urlsplit(start_url).netloc.replace(":", "_") or "site"
+    return os.path.join(STATE_DIR, f"{host}-{provider_id}.sqlite")
+
+
+class CrawlFrontier:
+    def __init__(self, path, max_pages=None, max_depth=None, include=None, exclude=None):
+        self.path = path
+        self.max_pages = max_pages
+        self.max_depth = max_depth
+        self.include = [re.compile(p) for p in include or []]
+        self.exclude = [re.compile(p) for p in exclude or []]
+        self.lock = threading.RLock()
+        self._dirty = 0
+        self._last_commit = time.monotonic()
+        self.claimed = 0  # next() hand-outs in this run, what max_pages limits
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(SCHEMA)
+        columns = [row[1] for row in self.db.execute("PRAGMA table_info(urls)")]
+        if "lastmod" not in columns:
+            # State files from before sitemap scheduling
+            self.db.execute("ALTER TABLE urls ADD COLUMN lastmod REAL")
+        if "attempts" not in columns:
+            self.db.execute("ALTER TABLE urls ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0")
+
+        # Anything in flight when the last run stopped is unfinished work
+        resumed = self.db.execute(
+            "UPDATE urls SET status = 'queued' WHERE status = 'in_progress'"
+        ).rowcount
+        # Failed pages get another go unless they keep failing
+        retried = self.db.execute(
+            "UPDATE urls SET status = 'queued' WHERE status = 'failed' AND attempts < ?", (MAX_ATTEMPTS,)
+        ).rowcount
+        self.db.commit()
+        self.resumed = resumed
+        self.retried = retried
+
+    # --- Meta ---
+
+    def get_meta(self, key, default=None):
+        with self.lock:
+            row = self.db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def set_meta(self, key, value):
+        with self.lock:
+            self.db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
+            self.db.commit()
+
+    # --- Queue ---
+
+    def allowed(self, url, depth):
+        if self.max_depth is not None and depth > self.max_depth:
+            return False
+        if self.include and not any(p.search(url) for p in self.include):
+            return False
+        return not any(p.search(url) for p in self.exclude)
+
+    def add(self, url, depth, priority=0.0, lastmod=None):
+        """
+        Queues a URL unless it is already known or outside the crawl bounds
+        (the start URL, depth 0, is always allowed). Returns True if it was new.
+        A URL still waiting in the queue keeps the higher of its two priorities.
+        """
+        if depth and not self.allowed(url, depth):
+            return False
+        with self.lock:
+            added = self.db.execute(
+                "INSERT OR IGNORE INTO urls (url, depth, priority, lastmod, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (url, depth, priority, lastmod, time.time()),
+            ).rowcount
+            if not added:
+                self.db.execute(
+                    "UPDATE urls SET priority = MAX(priority, ?) WHERE url = ? AND status = 'queued'",
+                    (priority, url),
+                )
+            self._touch()
+        return bool(added)
+
+    def requeue_if_modified(self, url, lastmod, priority):
+        """
+        Puts a finished page back on the queue if lastmod is newer than the
+        last known lastmod (or, without one, than when it was crawled).
+        Its document id is kept, so the rerun replaces the page's chunks.
+        """
+        with self.lock:
+            requeued = self.db.execute(
+                "UPDATE urls SET status = 'queued', priority = ?, lastmod = ?, error = NULL "
+                "WHERE url = ? AND status = 'done' AND COALESCE(lastmod, updated_at) < ?",
+                (priority, lastmod, url, lastmod),
+            ).rowcount
+            self._touch()
+        return bool(requeued)
+
+    def next(self):
+        """
+        Claims the best queued URL (highest priority, then oldest) and returns
+        (url, depth), or None when the queue is empty or this run has claimed
+        max_pages URLs.
+        """
+        with self.lock:
+            if self.max_pages is not None and self.claimed >= self.max_pages:
+                return None
+            row = self.db.execute(
+                "SELECT url, depth FROM urls WHERE status = 'queued' ORDER BY priority DESC, id LIMIT 1"
+            ).fetchone()
+            if row is None:
+                return None
+            self.db.execute(
+                "UPDATE urls SET status = 'in_progress', attempts = attempts + 1, updated_at = ? WHERE url = ?",
+                (time.time(), row[0]),
+            )
+            self.claimed += 1
+            self._touch()
+            return row[0], row[1]
+
+    def mark(self, url, status, error=None):
+        assert status in STATUSES, status
+        with self.lock:
+            self.db.execute(
+                "UPDATE urls SET status = ?, error = ?, updated_at = ? WHERE url = ?",
+                (status, error, time.time(), url),
+            )
+            self._touch()
+
+    def known(self, url):
+        with self.lock:
+            return self.db.execute("SELECT 1 FROM urls WHERE url = ?", (url,)).fetchone() is not None
+
+    def status(self, url):
+        with self.lock:
+            row = self.db.execute("SELECT status FROM urls WHERE url = ?", (url,)).fetchone()
+        return row[0] if row else None
+
+    # --- Documents ---
+
+    def document_for(self, url):
+        with self.lock:
+            row = self.db.execute("SELECT document_id FROM urls WHERE url = ?", (url,)).fetchone()
+        return row[0] if row else None
+
+    def set_document(self, url, document_id):
+        # Committed straight away: losing this is what causes duplicate documents
+        with self.lock:
+            self.db.execute("UPDATE urls SET document_id = ? WHERE url = ?", (document_id, url))
+            self.checkpoint()
+
+    # --- Fingerprints ---
+
+    def fingerprints(self):
+        """
+        [(url, exact_hash, simhash)] for url_canon.ContentIndex.
+        """
+        with self.lock:
+            rows = self.db.execute("SELECT url, exact, simhash FROM fingerprints").fetchall()
+        return [(url, exact, int(sim, 16)) for url, exact, sim in rows]
+
+    def save_fingerprint(self, url, exact, sim):
+        with self.lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO fingerprints (url, exact, simhash) VALUES (?, ?, ?)",
+                (url, exact, f"{sim:016x}"),
+            )
+            self._touch()
+
+    # --- Persistence ---
+
+    def _touch(self):
+        self._dirty += 1
+        if self._dirty >= CHECKPOINT_EVERY or time.monotonic() - self._last_commit >= CHECKPOINT_SECONDS:
+            self.checkpoint()
+
+    def checkpoint(self):
+        with self.lock:
+            self.db.commit()
+            self._dirty = 0
+            self._last_commit = time.monotonic()
+
+    def stats(self):
+        counts = dict.fromkeys(STATUSES, 0)
+        with self.lock:
+            for status, n in self.db.execute("SELECT status, COUNT(*) FROM urls GROUP BY status").fetchall():
+                counts[status] = n
+        return counts
+
+    def close(self):
+        self.checkpoint()
+        self.db.close()
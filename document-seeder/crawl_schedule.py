@@ -0,0 +1,247 @@
+import re
+import gzip
+import math
+import time
+import threading
+import xml.etree.ElementTree as ET
+from datetime import datetime, timezone
+from urllib.parse import urlsplit
+from urllib.robotparser import RobotFileParser
+
+from instrumentation import count
+from url_canon import canonicalize, same_site, is_archive
+
+# robots.txt + sitemap driven scheduling for seed-site.py.
+#
+#   schedule = CrawlSchedule(start_url, get=fetch_text)   # get(url) -> text or None
+#   schedule.seed(frontier)                  # sitemap URLs, scored, into the frontier
+#   frontier.add(link, depth, schedule.priority(link, depth))
+#   schedule.wait(url)                       # per-host crawl delay before each fetch
+#
+# robots.txt is read once per crawl: Disallow rules keep URLs out of the
+# frontier and its Crawl-delay (if longer than CRAWL_DELAY) spaces fetches to
+# that host. With sitemaps enabled, every <url> listed by the sitemaps named in
+# robots.txt (or /sitemap.xml) is queued up front with a score from its
+# <priority>, how recently it changed (<lastmod>) and its path, so articles
+# are fetched before tag/category/author listings. On a refresh run, pages
+# already crawled are queued again only if their lastmod moved since.
+
+SITEMAP_MAX_FILES = 50
+SITEMAP_MAX_URLS = 50000
+
+# Score = sitemap priority + recency + path shape - depth
+DEFAULT_SITEMAP_PRIORITY = 0.5
+LINK_PRIORITY = 0.3             # found by following links only
+RECENCY_WEIGHT = 0.5
+RECENCY_HALF_LIFE_DAYS = 180
+ARCHIVE_PENALTY = 0.8
+CONTENT_BONUS = 0.3
+DEPTH_PENALTY = 0.05
+START_PRIORITY = 10.0
+REFRESH_BONUS = 1.0
+
+# Paths that usually hold an article rather than a listing
+CONTENT_PATTERNS = [re.compile(p) for p in (
+    r"/(blog|posts?|articles?|news|guides?|insights|resources|learn|help|docs?)/[^/]+",
+    r"/[a-z0-9]+(-[a-z0-9]+){2,}$",
+)]
+
+_SITEMAP_NS = re.compile(r"^\{[^}]+\}")
+
+
+def parse_lastmod(value):
+    """
+    W3C datetime ("2024-03-01", "2024-03-01T10:00:00+00:00", "...Z") -> epoch seconds or None.
+    """
+    if not value:
+        return None
+    value = value.strip().replace("Z", "+00:00")
+    for candidate in (value, value[:10]):
+        try:
+            parsed = datetime.fromisoformat(candidate)
+        except ValueError:
+            continue
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=timezone.utc)
+        return parsed.timestamp()
+    return None
+
+
+def parse_sitemap(text):
+    """
+    Returns (child_sitemaps, entries) where entries are {"loc", "lastmod", "priority"}.
+    """
+    if isinstance(text, bytes):
+        if text[:2] == b"\x1f\x8b":
+            text = gzip.decompress(text)
+        text = text.decode("utf-8", errors="replace")
+    try:
+        root = ET.fromstring(text.strip())
+    except ET.ParseError:
+        return [], []
+
+    children, entries = [], []
+    for node in root:
+        fields = {_SITEMAP_NS.sub("", child.tag): (child.text or "").strip() for child in node}
+        if not fields.get("loc"):
+            continue
+        if _SITEMAP_NS.sub("", node.tag) == "sitemap":
+            children.append(fields["loc"])
+            continue
+        try:
+            priority = float(fields["priority"]) if fields.get("priority") else None
+        except ValueError:
+            priority = None
+        entries.append({
+            "loc": fields["loc"],
+            "lastmod": parse_lastmod(fields.get("lastmod")),
+            "priority": priority,
+        })
+    return children, entries
+
+
+def score_url(url, depth=0, sitemap_priority=None, lastmod=None, now=None):
+    """
+    Frontier priority (higher is fetched first).
+    """
+    score = DEFAULT_SITEMAP_PRIORITY if sitemap_priority is None else sitemap_priority
+    if sitemap_priority is None and lastmod is None:
+        score = LINK_PRIORITY
+    if lastmod:
+        age_days = max(0.0, ((now or time.time()) - lastmod) / 86400)
+        score += RECENCY_WEIGHT * math.pow(0.5, age_days / RECENCY_HALF_LIFE_DAYS)
+    path = urlsplit(url).path
+    if is_archive(url):
+        score -= ARCHIVE_PENALTY
+    elif any(p.search(path) for p in CONTENT_PATTERNS):
+        score += CONTENT_BONUS
+    return round(score - DEPTH_PENALTY * depth, 4)
+
+
+class HostThrottle:
+    """
+    Minimum gap between fetch starts, per host.
+    """
+
+    def __init__(self, default_delay):
+        self.default_delay = default_delay
+        self.delays = {}
+        self.next_start = {}
+        self.lock = threading.Lock()
+
+    def set_delay(self, host, seconds):
+        self.delays[host] = max(self.default_delay, seconds)
+
+    def delay(self, host):
+        return self.delays.get(host, self.default_delay)
+
+    def wait(self, url):
+        host = urlsplit(url).netloc
+        with self.lock:
+            now = time.monotonic()
+            start_at = max(now, self.next_start.get(host, now))
+            self.next_start[host] = start_at + self.delay(host)
+        if start_at > now:
+            time.sleep(start_at - now)
+
+
+class CrawlSchedule:
+    def __init__(self, start_url, get, default_delay=0.0, use_sitemaps=False, user_agent="*"):
+        self.start_url = start_url
+        self.root = canonicalize(start_url)
+        self.get = get
+        self.use_sitemaps = use_sitemaps
+        self.user_agent = user_agent
+        self.throttle = HostThrottle(default_delay)
+        self.robots = None
+        self.sitemap_urls = []
+        self.disallowed = set()
+        self._load_robots()
+
+    # --- robots.txt ---
+
+    def _load_robots(self):
+        parts = urlsplit(self.start_url)
+        robots_url = f"{parts.scheme}://{parts.netloc}/robots.txt"
+        text = self.get(robots_url)
+        if text is None:
+            print(f"🤖 No robots.txt at {robots_url}")
+            return
+        robots = RobotFileParser(robots_url)
+        robots.parse(text.splitlines())
+        self.robots = robots
+        self.sitemap_urls = robots.site_maps() or []
+
+        delay = robots.crawl_delay(self.user_agent)
+        if delay:
+            self.throttle.set_delay(parts.netloc, float(delay))
+        print(f"🤖 robots.txt: {len(self.sitemap_urls)} sitemaps, "
+              f"{self.throttle.delay(parts.netloc):.1f}s between fetches")
+
+    def allowed(self, url):
+        if self.robots is None or self.robots.can_fetch(self.user_agent, url):
+            return True
+        if url not in self.disallowed:
+            self.disallowed.add(url)
+            count("crawl.robots_disallowed")
+        return False
+
+    def wait(self, url):
+        self.throttle.wait(url)
+
+    def priority(self, url, depth):
+        if depth == 0:
+            return START_PRIORITY
+        return score_url(url, depth) if self.use_sitemaps else 0.0
+
+    # --- Sitemaps ---
+
+    def sitemap_entries(self):
+        """
+        Every same-site <url> from the sitemaps (following sitemap indexes).
+        """
+        parts = urlsplit(self.start_url)
+        pending = list(self.sitemap_urls) or [f"{parts.scheme}://{parts.netloc}/sitemap.xml"]
+        seen, entries = set(), {}
+        while pending and len(seen) < SITEMAP_MAX_FILES and len(entries) < SITEMAP_MAX_URLS:
+            sitemap_url = pending.pop(0)
+            if sitemap_url in seen:
+                continue
+            seen.add(sitemap_url)
+            text = self.get(sitemap_url)
+            if text is None:
+                continue
+            count("crawl.sitemaps")
+            children, found = parse_sitemap(text)
+            pending.extend(children)
+            for entry in found:
+                url = canonicalize(entry["loc"], like=self.start_url)
+                if same_site(url, self.root):
+                    entries[url] = dict(entry, loc=url)
+        return list(entries.values())[:SITEMAP_MAX_URLS]
+
+    def seed(self, frontier, refresh=False):
+        """
+        Queues sitemap URLs with their scores. With refresh, pages crawled in
+        an earlier run whose lastmod is newer than that crawl are requeued
+        ahead of everything else. Returns (queued, requeued).
+        """
+        if not self.use_sitemaps:
+            return 0, 0
+        now = time.time()
+        queued = requeued = 0
+        for entry in self.sitemap_entries():
+            url = entry["loc"]
+            if not self.allowed(url):
+                continue
+            priority = score_url(url, 1, entry["priority"], entry["lastmod"], now)
+            if frontier.add(url, depth=1, priority=priority, lastmod=entry["lastmod"]):
+                queued += 1
+            elif refresh and entry["lastmod"] and frontier.requeue_if_modified(
+                url, entry["lastmod"], priority + REFRESH_BONUS
+            ):
+                requeued += 1
+        count("crawl.sitemap_urls", queued)
+        count("crawl.refreshed", requeued)
+        print(f"🗺️  Sitemaps: {queued} URLs queued" + (f", {requeued} modified pages requeued" if refresh else ""))
+        return queued, requeued
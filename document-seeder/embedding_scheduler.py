@@ -0,0 +1,300 @@
+import os
+import re
+import time
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import openai
+from openai import OpenAI
+
+from instrumentation import span, count
+from shared_quota import bucket
+
+# Process-wide embedding scheduler.
+#
+#   from embedding_scheduler import ScheduledEmbedding
+#   embed_model = ScheduledEmbedding(model="text-embedding-3-small")
+#   vectors = embed_model.get_text_embedding_batch(texts)
+#
+# Drop-in for the two OpenAIEmbedding methods the seeders use. Every call in
+# the process goes through one scheduler that:
+#   - counts tokens locally (tiktoken, or ~4 chars/token without it)
+#   - holds requests back to stay inside EMBED_TPM / EMBED_RPM token buckets,
+#     shared with every other seeder process on the machine (shared_quota.py)
+#   - narrows in-flight requests on 429s and widens again on success (AIMD),
+#     and syncs the buckets to the x-ratelimit-* response headers
+#   - retries 429/5xx/connection errors with full-jitter backoff
+#   - returns vectors in input order, however the batches were split
+
+EMBED_TPM = int(os.getenv("EMBED_TPM", "1000000"))
+EMBED_RPM = int(os.getenv("EMBED_RPM", "3000"))
+EMBED_MAX_CONCURRENCY = int(os.getenv("EMBED_MAX_CONCURRENCY", "8"))
+EMBED_MAX_RETRIES = int(os.getenv("EMBED_MAX_RETRIES", "8"))
+
+# OpenAI per-request caps for /v1/embeddings
+MAX_INPUTS_PER_REQUEST = 2048
+MAX_TOKENS_PER_REQUEST = 300000
+MAX_TOKENS_PER_INPUT = 8191
+
+BACKOFF_BASE = 0.5
+BACKOFF_CAP = 30.0
+
+# Optional: exact token counts
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("cl100k_base")
+except Exception:
+    _encoding = None
+
+_DURATION_RE = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_UNIT_SECONDS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+def count_text_tokens(text):
+    if _encoding is not None:
+        return len(_encoding.encode(text, disallowed_special=()))
+    return max(1, len(text) // 4)
+
+
+def parse_reset(value):
+    """
+    '6m0s' / '1.5s' / '20ms' -> seconds. None if missing or unparseable.
+    """
+    if not value:
+        return None
+    matches = _DURATION_RE.findall(value)
+    if not matches:
+        try:
+            return float(value)
+        except ValueError:
+            return None
+    return sum(float(n) * _UNIT_SECONDS[unit] for n, unit in matches)
+
+
+class TokenBucket:
+    """
+    Continuous-refill bucket. reserve() takes the amount immediately (the
+    level may go negative) and returns how long the caller must wait, so
+    big requests queue fairly behind small ones.
+    """
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount):
+        with self.lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.level -= amount
+            return max(0.0, -self.level / self.rate)
+
+    def sync(self, remaining, reset_seconds=None):
+        """
+        Server says only `remaining` is left: never believe we have more.
+        """
+        with self.lock:
+            self._refill(time.monotonic())
+            if remaining is not None:
+                self.level = min(self.level, float(remaining))
+            if reset_seconds is not None and self.level <= 0:
+                # Drain so the next reserve waits out the server's reset window
+                self.level = min(self.level, -reset_seconds * self.rate)
+
+
+class AdaptiveLimiter:
+    """
+    Concurrency cap that halves on rate-limit errors and creeps back up on success.
+    """
+
+    def __init__(self, maximum):
+        self.maximum = maximum
+        self.limit = float(maximum)
+        self.in_flight = 0
+        self.cond = threading.Condition()
+
+    def __enter__(self):
+        with self.cond:
+            while self.in_flight >= max(1, int(self.limit)):
+                self.cond.wait()
+            self.in_flight += 1
+        return self
+
+    def __exit__(self, *exc):
+        with self.cond:
+            self.in_flight -= 1
+            self.cond.notify_all()
+        return False
+
+    def on_success(self):
+        with self.cond:
+            self.limit = min(self.maximum, self.limit + 1.0 / max(1.0, self.limit))
+            self.cond.notify_all()
+
+    def on_throttle(self):
+        with self.cond:
+            self.limit = max(1.0, self.limit / 2)
+
+
+class EmbeddingScheduler:
+    def __init__(self, tpm=EMBED_TPM, rpm=EMBED_RPM, max_concurrency=EMBED_MAX_CONCURRENCY,
+                 max_retries=EMBED_MAX_RETRIES, client=None):
+        # SDK retries are off: this class owns retry/backoff
+        self.client = client or OpenAI(max_retries=0)
+        self.tokens = bucket("embed.tokens", tpm)
+        self.requests = bucket("embed.requests", rpm)
+        self.limiter = AdaptiveLimiter(max_concurrency)
+        self.max_retries = max_retries
+        self.pool = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="embed")
+
+    # --- Planning ---
+
+    def plan(self, texts, max_inputs):
+        """
+        Splits texts into [(start_index, texts, tokens), ...] under the request caps.
+        """
+        batches = []
+        current, current_tokens, start = [], 0, 0
+        for i, text in enumerate(texts):
+            n = min(count_text_tokens(text), MAX_TOKENS_PER_INPUT)
+            if current and (len(current) >= max_inputs or current_tokens + n > MAX_TOKENS_PER_REQUEST):
+                batches.append((start, current, current_tokens))
+                current, current_tokens, start = [], 0, i
+            current.append(text)
+            current_tokens += n
+        if current:
+            batches.append((start, current, current_tokens))
+        return batches
+
+    # --- Requests ---
+
+    def _sync_headers(self, headers):
+        if not headers:
+            return
+        remaining_tokens = headers.get("x-ratelimit-remaining-tokens")
+        remaining_requests = headers.get("x-ratelimit-remaining-requests")
+        self.tokens.sync(
+            int(remaining_tokens) if remaining_tokens is not None else None,
+            parse_reset(headers.get("x-ratelimit-reset-tokens")),
+        )
+        self.requests.sync(
+            int(remaining_requests) if remaining_requests is not None else None,
+            parse_reset(headers.get("x-ratelimit-reset-requests")),
+        )
+
+    def _retry_after(self, headers, attempt):
+        if headers:
+            ms = headers.get("retry-after-ms")
+            if ms:
+                return float(ms) / 1000 + random.uniform(0, 0.25)
+            after = headers.get("retry-after")
+            if after:
+                try:
+                    return float(after) + random.uniform(0, 0.25)
+                except ValueError:
+                    pass
+        # Full jitter
+        return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+
+    def _request(self, model, texts, tokens, extra):
+        for attempt in range(self.max_retries + 1):
+            wait = max(self.tokens.reserve(tokens), self.requests.reserve(1))
+            if wait:
+                count("embed.throttled_waits")
+                time.sleep(wait)
+
+            with self.limiter:
+                try:
+                    with span("embed.request"):
+                        raw = self.client.embeddings.with_raw_response.create(
+                            model=model, input=texts, **extra
+                        )
+                    self._sync_headers(raw.headers)
+                    self.limiter.on_success()
+                    count("embed.requests")
+                    count("embed.tokens", tokens)
+                    data = raw.parse().data
+                    return [item.embedding for item in sorted(data, key=lambda d: d.index)]
+                except openai.RateLimitError as e:
+                    headers = getattr(e.response, "headers", None)
+                    self._sync_headers(headers)
+                    self.limiter.on_throttle()
+                    count("embed.rate_limited")
+                    error = e
+                except (openai.APIConnectionError, openai.InternalServerError) as e:
+                    headers = None
+                    count("embed.retried_errors")
+                    error = e
+
+            if attempt == self.max_retries:
+                raise error
+            delay = self._retry_after(headers, attempt)
+            print(f"   ⏳ Embedding {type(error).__name__}, retrying in {delay:.1f}s "
+                  f"(attempt {attempt + 1}/{self.max_retries})")
+            time.sleep(delay)
+
+    def embed(self, texts, model="text-embedding-3-small", max_inputs=MAX_INPUTS_PER_REQUEST, **extra):
+        """
+        Embeds texts and returns vectors in the same order.
+        Large lists are split into requests that run in parallel.
+        """
+        texts = [t if t.strip() else " " for t in texts]
+        if not texts:
+            return []
+        batches = self.plan(texts, max_inputs)
+        if len(batches) == 1:
+            start, batch, tokens = batches[0]
+            return self._request(model, batch, tokens, extra)
+
+        results = [None] * len(texts)
+        futures = [
+            (start, self.pool.submit(self._request, model, batch, tokens, extra))
+            for start, batch, tokens in batches
+        ]
+        for start, future in futures:
+            vectors = future.result()
+            results[start:start + len(vectors)] = vectors
+        return results
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler():
+    """
+    The one scheduler shared by every worker in this process.
+    """
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = EmbeddingScheduler()
+        return _scheduler
+
+
+class ScheduledEmbedding:
+    """
+    Same calls as llama_index's OpenAIEmbedding, routed through the shared scheduler.
+    """
+
+    def __init__(self, model="text-embedding-3-small", embed_batch_size=100, **extra):
+        self.model_name = model
+        self.embed_batch_size = embed_batch_size
+        self.extra = extra
+
+    def get_text_embedding(self, text):
+        return get_scheduler().embed([text], self.model_name, **self.extra)[0]
+
+    def get_query_embedding(self, query):
+        return self.get_text_embedding(query)
+
+    def get_text_embedding_batch(self, texts, **kwargs):
+        return get_scheduler().embed(list(texts), self.model_name, self.embed_batch_size, **self.extra)
@@ -1,11 +1,22 @@
 import os
 import json
 import re
+import time
+import hashlib
+import argparse
 import requests
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+from requests.adapters import HTTPAdapter
 from bs4 import BeautifulSoup
 from dotenv import load_dotenv
 from supabase import create_client, Client
-from llama_index.embeddings.openai import OpenAIEmbedding
+from instrumentation import span, count, count_tokens
+from embedding_scheduler import ScheduledEmbedding
+from semantic_cache import SemanticCache
+from phrase_highlighter import highlight_phrases, MATCH_CLASS
+from match_bundles import build_bundle, export_bundles, fetch_documents, fetch_page_matches, normalize_page_url
+from crawl_schedule import CrawlSchedule, parse_sitemap, SITEMAP_MAX_FILES
 
 # 1. SETUP
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -15,247 +26,594 @@ load_dotenv(os.path.join(parent_dir, '.env'))
 SUPABASE_URL = os.getenv("SUPABASE_URL") or os.getenv("PLASMO_PUBLIC_SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
 supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
-embed_model = OpenAIEmbedding(model="text-embedding-3-small")
+embed_model = ScheduledEmbedding(model="text-embedding-3-small")
 
 # ⚠️ CONFIGURATION
 PROVIDER_ID = 12  # Ensure this matches your data
 TARGET_URL = "https://seedlegals.com/resources/what-is-seis-eis-an-essential-read-for-uk-startups/"
 OUTPUT_FILE = os.path.join(parent_dir, "web-embed", "seedlegals_mirror.html")
-
-
-def normalize_source_url(url: str) -> str:
-    if not url:
-        return ''
-    cleaned = re.sub(r'[#?].*', '', url)
-    return cleaned.rstrip('/')
-
-
-def generate_mirror():
-    print(f"🌍 Fetching: {TARGET_URL}")
-
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-        "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8",
-        "Accept-Language": "en-GB,en;q=0.9",
-        "Referer": "https://www.google.com/",
-        "Upgrade-Insecure-Requests": "1",
-        "Sec-Fetch-Dest": "document",
-        "Sec-Fetch-Mode": "navigate",
-        "Sec-Fetch-Site": "cross-site",
-        "Sec-Fetch-User": "?1"
-    }
-
-    try:
-        response = requests.get(TARGET_URL, headers=headers, timeout=10)
-        response.raise_for_status()
-        html_content = response.text
-    except Exception as e:
-        print(f"❌ Failed to fetch URL (Bot Protection): {e}")
-        return
-
-    soup = BeautifulSoup(html_content, 'html.parser')
+MAX_SENTENCES = 50  # per page, to save tokens
+MATCH_THRESHOLD = 0.50
+MATCH_MAP_SCRIPT_ID = "sl-match-map-data"
+
+# Batch mode (--batch): many pages, one mirror each under MIRROR_DIR/<host>/<path>/index.html.
+# Pages are handled in waves of MIRROR_WAVE: fetched MIRROR_WORKERS at a time over
+# pooled connections - but each host's robots.txt is honoured and its fetches are
+# spaced CRAWL_DELAY apart (or its Crawl-delay), as seed-site.py does. A mirror
+# shows its page's active page_matches rows (the ones the extension can act on),
+# read with one query per wave, so by default nothing is embedded or searched.
+# --match re-maps the pages first (costs embeddings and searches): the wave's
+# new sentences are embedded and searched in batches of MIRROR_MATCH_BATCH
+# (MIRROR_EMBED_BATCH inputs per embeddings request), and each page whose
+# sentences were all searched gets its active page_matches rows replaced by
+# the results (rows set inactive in the admin stay, and keep their phrase
+# from coming back) and its match bundle re-exported, as crawl_and_map.py
+# does. With --local the search runs in process (similarity_engine.py: top-k
+# + MMR, so a page's matches spread across documents and timestamps);
+# SIM_REDUCED_DIM=256 makes it scan 256-dim vectors first and rerank a
+# shortlist on the full ones.
+MIRROR_DIR = os.getenv("MIRROR_DIR", os.path.join(parent_dir, "web-embed", "mirrors"))
+MIRROR_WORKERS = int(os.getenv("MIRROR_WORKERS", "8"))
+MIRROR_WAVE = int(os.getenv("MIRROR_WAVE", "50"))
+MIRROR_EMBED_BATCH = int(os.getenv("MIRROR_EMBED_BATCH", "500"))
+MIRROR_MATCH_BATCH = int(os.getenv("MIRROR_MATCH_BATCH", "200"))
+CRAWL_DELAY = float(os.getenv("CRAWL_DELAY", "1.0"))
+bulk_embed_model = ScheduledEmbedding(model="text-embedding-3-small", embed_batch_size=MIRROR_EMBED_BATCH)
+
+BROWSER_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8",
+    "Accept-Language": "en-GB,en;q=0.9",
+    "Referer": "https://www.google.com/",
+    "Upgrade-Insecure-Requests": "1",
+    "Sec-Fetch-Dest": "document",
+    "Sec-Fetch-Mode": "navigate",
+    "Sec-Fetch-Site": "cross-site",
+    "Sec-Fetch-User": "?1"
+}
+
+HIGHLIGHT_STYLE = f"""
+    .{MATCH_CLASS} {{
+        border-bottom: 2px solid #00bfa5;
+        background-color: rgba(0, 191, 165, 0.15);
+        cursor: pointer;
+        color: #000;
+        transition: all 0.2s ease;
+    }}
+    .{MATCH_CLASS}:hover {{
+        background-color: #00bfa5;
+        color: white;
+        box-shadow: 0 2px 5px rgba(0,0,0,0.1);
+    }}
+    .{MATCH_CLASS}::after {{
+        content: " ▶";
+        font-size: 0.8em;
+        color: #00bfa5;
+    }}
+    .{MATCH_CLASS}:hover::after {{ color: white; }}
+"""
+
+
+def search_knowledge(vector):
+    """
+    Best knowledge match (>= MATCH_THRESHOLD) with its metadata, or None.
+    """
+    with span("db.rpc.match_provider_knowledge"):
+        resp = supabase.rpc("match_provider_knowledge", {
+            "query_embedding": vector,
+            "match_threshold": MATCH_THRESHOLD,
+            "match_count": 1,
+            "filter_provider_id": PROVIDER_ID
+        }).execute()
+    if not resp.data:
+        return None
+    match_data = resp.data[0]
+    with span("db.select.provider_knowledge"):
+        details = supabase.table("provider_knowledge") \
+            .select("metadata, document_id") \
+            .eq("id", match_data['id']) \
+            .single().execute()
+    return {"match": match_data, "details": details.data}
+
+
+def inject_mirror_assets(soup, target_url, match_map):
+    """
+    <base>, highlight CSS, the inline match map and highlight-matches.js
+    (which installs the click handler on server-highlighted pages and
+    re-syncs them with the live /api/match-map).
+    """
+    if soup.html is not None:
+        soup.html["data-sl-highlighted"] = "server"
+    head = soup.head
+    if head is None:
+        head = soup.new_tag("head")
+        (soup.html or soup).insert(0, head)
+    head.insert(0, soup.new_tag("base", href=target_url))
+    style = soup.new_tag("style")
+    style.string = HIGHLIGHT_STYLE
+    head.append(style)
+
+    body = soup.body or soup
+    # Where admin-script.js keeps its map too; the extension's content script reads it from here
+    map_script = soup.new_tag("script", id=MATCH_MAP_SCRIPT_ID, type="application/json")
+    # "</" would end the script element early
+    map_script.string = json.dumps(match_map).replace("</", "<\\/")
+    body.append(map_script)
+    body.append(soup.new_tag("script", src="/highlight-matches.js", defer=None))
+
+
+def fetch_html(url, session=None):
+    with span("http.get"):
+        if session is not None:
+            response = session.get(url, timeout=10)
+        else:
+            response = requests.get(url, headers=BROWSER_HEADERS, timeout=10)
+    response.raise_for_status()
+    return response.text
+
+
+def extract_sentences(soup):
     content_area = soup.find('div', class_='elementor-section-wrap') or soup.body
-
-    clean_sentences = []
-    print("⚡ Analyzing Page Content...")
     raw_text = content_area.get_text(" ", strip=True)
     potential_sentences = re.split(r'(?<=[.!?])\s+', raw_text)
 
+    clean_sentences = []
     for s in potential_sentences:
         clean = s.strip()
         if len(clean) > 30 and len(clean) < 150:
             clean_sentences.append(clean)
+    return list(set(clean_sentences))[:MAX_SENTENCES]
 
-    clean_sentences = list(set(clean_sentences))[:50]
-    print(f"   Found {len(clean_sentences)} candidate sentences.")
 
-    provider_docs_lookup = {}
-    try:
-        provider_docs_resp = supabase.table("provider_documents") \
-            .select("title, source_url") \
-            .eq("provider_id", PROVIDER_ID).execute()
-        if provider_docs_resp.data:
-            for doc in provider_docs_resp.data:
-                normalized_doc_url = normalize_source_url(doc.get("source_url"))
-                if normalized_doc_url:
-                    provider_docs_lookup[normalized_doc_url] = doc
-    except Exception as e:
-        print(f"   ⚠️ provider_documents query failed: {e}")
+def match_entry(found):
+    """
+    Match (without the phrase) for a search result, or None. video_url is
+    stored the way page_matches keeps it: source URL + "#t=<seconds>".
+    """
+    if not found or not found["details"]:
+        return None
+    match_data = found["match"]
+    meta = found["details"].get('metadata', {})
+    url = meta.get('source') or meta.get('source_url')
+    if not url:
+        return None
+    return {
+        "video_url": f"{url}#t={meta.get('timestampStart', 0)}",
+        "confidence": match_data.get('confidence', match_data['similarity']),
+        "document_title": meta.get('title', '') or '',
+        "document_id": match_data.get('document_id') or found["details"].get('document_id'),
+        "knowledge_id": match_data.get('id'),
+        "provider_id": PROVIDER_ID,
+        "similarity": match_data['similarity'],
+    }
 
-    matches_found = []
-    batch_size = 20
-    print(f"⚡ Matching against Supabase...")
 
-    for i in range(0, len(clean_sentences), batch_size):
-        batch = clean_sentences[i:i + batch_size]
+def match_sentences(sentences, match_cache, embed=embed_model, batch_size=20, pool=None):
+    """
+    {sentence: match entry or None} for every sentence whose batch succeeded.
+    With a pool, the cache misses of a batch are searched concurrently.
+    """
+    def search_many(vectors):
+        if pool is None:
+            return [search_knowledge(v) for v in vectors]
+        return list(pool.map(search_knowledge, vectors))
+
+    results = {}
+    for i in range(0, len(sentences), batch_size):
+        batch = sentences[i:i + batch_size]
         try:
-            vectors = embed_model.get_text_embedding_batch(batch)
-            for j, vector in enumerate(vectors):
-                sentence = batch[j]
-                resp = supabase.rpc("match_provider_knowledge", {
-                    "query_embedding": vector,
-                    "match_threshold": 0.50,
-                    "match_count": 1,
-                    "filter_provider_id": PROVIDER_ID
-                }).execute()
-
-                if resp.data:
-                    match_data = resp.data[0]
-                    details = supabase.table("provider_knowledge") \
-                        .select("metadata") \
-                        .eq("id", match_data['id']) \
-                        .single().execute()
-
-                    if details.data:
-                        meta = details.data.get('metadata', {})
-                        url = meta.get('source') or meta.get('source_url')
-                        ts = meta.get('timestampStart', 0)
-
-                        if url:
-                            normalized_url = normalize_source_url(url)
-                            doc_title = ''
-                            doc_ref = provider_docs_lookup.get(normalized_url)
-                            if doc_ref:
-                                doc_title = doc_ref.get('title', '')
-                            meta_title = meta.get('title', '')
-                            document_title_value = doc_title or meta_title or ''
-                        def vimeo_embed(original_url: str, timestamp: int) -> str:
-                            video_id = None
-                            for pattern in (r'vimeo\\.com/(\\d+)', r'player\\.vimeo\\.com/video/(\\d+)'):
-                                found = re.search(pattern, original_url)
-                                if found:
-                                    video_id = found.group(1)
-                                    break
-                            if not video_id:
-                                return f"{original_url}#t={timestamp}"
-                            ts_param = f"#t={timestamp}s" if timestamp else ""
-                            return f"https://player.vimeo.com/video/{video_id}?autoplay=1&title=0&byline=0{ts_param}"
-
-                        matches_found.append({
-                            "phrase": sentence,
-                            "video_url": vimeo_embed(url, ts),
-                            "confidence": match_data.get('confidence', match_data['similarity']),
-                            "document_title": document_title_value,
-                            "document_id": match_data.get('document_id'),
-                            "knowledge_id": match_data.get('id'),
-                            "provider_id": PROVIDER_ID
-                        })
-                        print(f"   📄 Injecting document title: '{document_title_value or '—'}'")
-                        print(f"   ✅ Match found: ({match_data['similarity']:.2f}) -> '{sentence[:30]}...'")
+            count_tokens("tokens.embedded", batch)
+            with span("embed.openai"):
+                vectors = embed.get_text_embedding_batch(batch)
+            # Paraphrases of sentences already searched reuse that result
+            found = match_cache.get_or_search_many(vectors, search_many)
+            for sentence, result in zip(batch, found):
+                results[sentence] = match_entry(result)
         except Exception as e:
             print(f"   ⚠️ Batch error: {e}")
+    return results
 
-    print(f"🖌️  Injecting {len(matches_found)} matches into HTML...")
 
-    script_template = """
-    <script>
-    const log = (...args) => console.log("[sg-decision]", ...args);
+def top_k_sentences(engine, sentences):
+    """
+    {sentence: (scores, chunk indexes)} of its engine.top_k() candidates.
+    """
+    try:
+        count_tokens("tokens.embedded", sentences)
+        with span("embed.openai"):
+            vectors = bulk_embed_model.get_text_embedding_batch(sentences)
+        scores, ids = engine.top_k(vectors)
+    except Exception as e:
+        print(f"   ⚠️ Batch error: {e}")
+        return {}
+    return {sentence: (scores[i], ids[i]) for i, sentence in enumerate(sentences)}
 
-    const style = document.createElement('style');
-    style.innerHTML = `
-        .sl-smart-link {
-            border-bottom: 2px solid #00bfa5;
-            background-color: rgba(0, 191, 165, 0.15);
-            cursor: pointer;
-            color: #000;
-            transition: all 0.2s ease;
-        }
-        .sl-smart-link:hover {
-            background-color: #00bfa5;
-            color: white;
-            box-shadow: 0 2px 5px rgba(0,0,0,0.1);
-        }
-        .sl-smart-link::after {
-            content: " ▶";
-            font-size: 0.8em;
-            color: #00bfa5;
-        }
-        .sl-smart-link:hover::after { color: white; }
-    `;
-    document.head.appendChild(style);
-
-    const normalize = (str) => str.replace(/\\s+/g, ' ').trim();
-    const contentWalker = document.createTreeWalker(document.body, NodeFilter.SHOW_TEXT, null, false);
-
-    const highlightMatches = (MATCH_MAP) => {
-        const textNodes = [];
-        let node;
-        while (node = contentWalker.nextNode()) textNodes.push(node);
-
-        MATCH_MAP.forEach((match, matchIndex) => {
-            if (!match.phrase) return;
-            const targetPhrase = normalize(match.phrase);
-
-            for (let n of textNodes) {
-                const parent = n.parentElement;
-                if (!parent || parent.tagName.match(/SCRIPT|STYLE|A|BUTTON|NOSCRIPT/)) continue;
-                if (parent.getAttribute('data-sl-scanned') === 'true') continue;
-
-                const currentText = normalize(n.nodeValue);
-
-                if (currentText.includes(targetPhrase) && targetPhrase.length > 0) {
-                    if (currentText === targetPhrase) {
-                        const span = document.createElement('span');
-                        span.className = 'sl-smart-link';
-                        span.textContent = match.phrase;
-                        span.dataset.matchIndex = matchIndex;
-                        parent.replaceChild(span, n);
-                        parent.setAttribute('data-sl-scanned', 'true');
-                    } else {
-                        const safePhrase = match.phrase.replace(/[.*+?^${}()|[\\]\\\\]/g, '\\\\$&');
-                        const re = new RegExp(safePhrase, 'i');
-                        const newHTML = parent.innerHTML.replace(re, (m) => {
-                            return `<span class="sl-smart-link" data-match-index="${matchIndex}">${m}</span>`;
-                        });
-                        parent.innerHTML = newHTML;
-                        parent.setAttribute('data-sl-scanned', 'true');
-                    }
-                    break;
-                }
-            }
-        });
-        log("matches highlighted for extension");
-    };
-
-    const fetchMatches = async () => {
-        try {
-            const response = await fetch("http://localhost:4173/api/match-map?provider_id=12");
-            if (!response.ok) throw new Error('match-map fetch failed');
-            const data = await response.json();
-            const activeMatches = Array.isArray(data) ? data.filter(match => match.status === 'active') : [];
-            highlightMatches(activeMatches);
-            window.__SL_MATCH_MAP__ = activeMatches;
-        } catch (error) {
-            log('failed to load match map', error);
-            highlightMatches([]);
-        }
-    };
 
-    document.addEventListener("DOMContentLoaded", function() {
-        fetchMatches();
-    });
-    </script>
+def local_matches(engine, sentences, candidates):
+    """
+    A page's matches from the similarity engine: MMR over its sentences'
+    top-k, so they spread across documents and timestamps.
+    """
+    page = [s for s in sentences if s in candidates]
+    if not page:
+        return []
+    picks = engine.mmr([candidates[s][0] for s in page], [candidates[s][1] for s in page], MATCH_THRESHOLD)
+    matches = []
+    for index, chunk, score in sorted(picks):
+        row = engine.rows[chunk]
+        url = row.get("source_url")
+        if not url:
+            continue
+        matches.append({
+            "phrase": page[index],
+            "video_url": f"{url}#t={row.get('timestamp_start') or 0}",
+            "confidence": score,
+            "document_title": row.get("title") or '',
+            "document_id": row.get("document_id"),
+            "knowledge_id": row.get("id"),
+            "provider_id": PROVIDER_ID,
+            "similarity": score,
+        })
+    return matches
+
+
+def page_match_maps(urls):
     """
-    script_content = script_template
+    {normalized page URL: its active page_matches rows, in /api/match-map's shape}.
+    The extension acts on page_match_id and status, so only these go in a mirror.
+    """
+    # page_matches.url is stored as crawled; ask for both slash variants
+    lookup = sorted({v for u in urls for v in (normalize_page_url(u), normalize_page_url(u) + "/")})
+    try:
+        rows = [r for r in fetch_page_matches(PROVIDER_ID, lookup) if r.get("status") == "active"]
+        documents = fetch_documents(PROVIDER_ID, {r["document_id"] for r in rows if r.get("document_id")})
+    except Exception as e:
+        print(f"   ⚠️ page_matches query failed, mirrors will load the live match map: {e}")
+        return {}
+    by_page = {}
+    for row in rows:
+        by_page.setdefault(normalize_page_url(row["url"]), []).append(row)
+    return {url: build_bundle(page_rows, documents, PROVIDER_ID) for url, page_rows in by_page.items()}
 
-    base_tag = f"<base href='{TARGET_URL}'>"
-    if "<head>" in html_content:
-        final_html = html_content.replace("<head>", f"<head>{base_tag}")
-    else:
-        final_html = f"{base_tag}{html_content}"
 
-    highlight_script = "<script src=\"/highlight-matches.js\" defer></script>"
+def save_page_matches(page_results):
+    """
+    {page url: matches} -> replaces each page's active page_matches rows with
+    its matches and re-exports the pages' bundles. Rows set inactive are
+    kept and their phrases not inserted again. Returns the rows inserted.
+    """
+    if not page_results:
+        return 0
+    lookup = sorted({v for u in page_results for v in (normalize_page_url(u), normalize_page_url(u) + "/")})
+    existing = fetch_page_matches(PROVIDER_ID, lookup)
+    inactive = {(normalize_page_url(r["url"]), r["phrase"]) for r in existing if r.get("status") == "inactive"}
+    stale = [r["id"] for r in existing if r.get("status") != "inactive"]
+    rows = [
+        {
+            "provider_id": PROVIDER_ID,
+            "document_id": m["document_id"],
+            "url": url,
+            "phrase": m["phrase"],
+            "video_url": m["video_url"],
+            "confidence": m["confidence"],
+            "status": "active",
+        }
+        for url, matches in page_results.items() for m in matches
+        if (normalize_page_url(url), m["phrase"]) not in inactive
+    ]
+    # Insert before deleting: a failure leaves old and new rows, never neither
+    if rows:
+        with span("db.insert.page_matches"):
+            supabase.table("page_matches").insert(rows).execute()
+    for i in range(0, len(stale), MIRROR_MATCH_BATCH):
+        with span("db.delete.page_matches"):
+            supabase.table("page_matches").delete().in_("id", stale[i:i + MIRROR_MATCH_BATCH]).execute()
+    count("matches", len(rows))
+    export_bundles(PROVIDER_ID, list(page_results))
+    return len(rows)
+
+
+def render_mirror(soup, target_url, match_map):
+    """
+    Mirror HTML with the page's page_matches highlighted in place. Returns (html, highlighted).
+    """
+    # Highlight at generation time: the mirror ships with its spans and its
+    # match map inline, so the browser has nothing to scan
+    with span("mirror.highlight"):
+        found = highlight_phrases(soup, soup.body or soup, [m["phrase"] for m in match_map])
+    count("matches.highlighted", sum(found))
+    # highlight-matches.js re-indexes the spans against the live map by row id
+    for tag in soup.find_all("span", class_=MATCH_CLASS, attrs={"data-match-index": True}):
+        tag["data-page-match-id"] = match_map[int(tag["data-match-index"])]["page_match_id"]
+
+    inject_mirror_assets(soup, target_url, [dict(m, highlighted=hit) for m, hit in zip(match_map, found)])
+
+    with span("mirror.serialize"):
+        return str(soup), sum(found)
 
-    if "</body>" in final_html:
-        final_html = final_html.replace("</body>", script_content + highlight_script + "</body>")
-    else:
-        final_html = final_html + script_content + highlight_script
 
-    with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
+def generate_mirror(target_url=TARGET_URL, output_file=OUTPUT_FILE, match=False):
+    print(f"🌍 Fetching: {target_url}")
+    try:
+        html_content = fetch_html(target_url)
+    except Exception as e:
+        print(f"❌ Failed to fetch URL (Bot Protection): {e}")
+        return
+
+    with span("extract.bs4"):
+        soup = BeautifulSoup(html_content, 'html.parser')
+
+    if match:
+        print("⚡ Analyzing Page Content...")
+        clean_sentences = extract_sentences(soup)
+        print(f"   Found {len(clean_sentences)} candidate sentences.")
+
+        print(f"⚡ Matching against Supabase...")
+        match_cache = SemanticCache.for_provider(supabase, PROVIDER_ID, "match_provider_knowledge:0.5:1")
+        matched = match_sentences(clean_sentences, match_cache)
+        match_cache.report()
+        match_cache.close()
+
+        matches_found = []
+        for sentence in clean_sentences:
+            entry = matched.get(sentence)
+            if entry:
+                matches_found.append(dict(entry, phrase=sentence))
+                print(f"   📄 Document title: '{entry['document_title'] or '—'}'")
+                print(f"   ✅ Match found: ({entry['similarity']:.2f}) -> '{sentence[:30]}...'")
+        unsearched = sum(1 for s in clean_sentences if s not in matched)
+        if unsearched:
+            print(f"   ⚠️ {unsearched} sentences not searched, page_matches left as they were")
+        else:
+            try:
+                saved = save_page_matches({target_url: matches_found})
+                print(f"   💾 Saved {saved} matches to page_matches.")
+            except Exception as e:
+                print(f"   ⚠️ Saving page_matches failed: {e}")
+
+    match_map = page_match_maps([target_url]).get(normalize_page_url(target_url), [])
+    print(f"🖌️  Injecting {len(match_map)} active page matches into HTML...")
+
+    started = time.perf_counter()
+    final_html, highlighted = render_mirror(soup, target_url, match_map)
+    print(f"🖍️  Highlighted {highlighted}/{len(match_map)} phrases server-side "
+          f"in {(time.perf_counter() - started) * 1000:.1f} ms")
+
+    with open(output_file, "w", encoding="utf-8") as f:
         f.write(final_html)
 
-    print(f"\n🎉 DONE! Mirror saved to: {OUTPUT_FILE}")
+    print(f"\n🎉 DONE! Mirror saved to: {output_file}")
+
+
+# --- Batch mode ---
+
+def read_url_list(source, session):
+    """
+    Page URLs from a sitemap (URL or local .xml/.xml.gz, indexes followed) or
+    a text file with one URL per line. Order kept, duplicates dropped.
+    """
+    urls = []
+    if source.startswith(("http://", "https://")) or source.endswith((".xml", ".xml.gz")):
+        pending, seen = [source], set()
+        while pending and len(seen) < SITEMAP_MAX_FILES:
+            sitemap = pending.pop(0)
+            if sitemap in seen:
+                continue
+            seen.add(sitemap)
+            if sitemap.startswith(("http://", "https://")):
+                with span("http.get"):
+                    response = session.get(sitemap, timeout=10)
+                response.raise_for_status()
+                body = response.content
+            else:
+                with open(sitemap, "rb") as f:
+                    body = f.read()
+            children, entries = parse_sitemap(body)
+            pending.extend(children)
+            urls.extend(entry["loc"] for entry in entries)
+    else:
+        with open(source) as f:
+            urls = [line.strip() for line in f if line.strip() and not line.startswith("#")]
+    return list(dict.fromkeys(urls))
+
+
+def mirror_path(out_dir, url):
+    """
+    <out_dir>/<host>/<path>/index.html; a query string gets its own directory.
+    """
+    parts = urlsplit(url)
+    segments = [re.sub(r'[^A-Za-z0-9._-]', '_', s) for s in parts.path.split('/') if s not in ('', '.', '..')]
+    if parts.query:
+        segments.append("q-" + hashlib.sha1(parts.query.encode()).hexdigest()[:10])
+    return os.path.join(out_dir, parts.netloc.replace(':', '_'), *segments, "index.html")
+
+
+def host_schedules(urls, session):
+    """
+    One CrawlSchedule (robots.txt + per-host crawl delay) per host in urls.
+    """
+    def get_text(url):
+        try:
+            with span("http.get"):
+                response = session.get(url, timeout=10)
+        except requests.RequestException:
+            return None
+        return response.text if response.status_code == 200 else None
+
+    schedules = {}
+    for url in urls:
+        parts = urlsplit(url)
+        origin = f"{parts.scheme}://{parts.netloc}"
+        if origin not in schedules:
+            schedules[origin] = CrawlSchedule(origin + "/", get_text, CRAWL_DELAY)
+    return schedules
+
+
+def load_page(url, session, schedule):
+    """
+    (soup, sentences) for a page, or (None, error).
+    """
+    if not schedule.allowed(url):
+        return None, "disallowed by robots.txt"
+    schedule.wait(url)
+    try:
+        html_content = fetch_html(url, session)
+        with span("extract.bs4"):
+            soup = BeautifulSoup(html_content, 'html.parser')
+        return soup, extract_sentences(soup)
+    except Exception as e:
+        return None, e
+
+
+def generate_mirrors(source, out_dir=MIRROR_DIR, workers=MIRROR_WORKERS, wave_size=MIRROR_WAVE, match=False, engine=None):
+    """
+    One mirror per page of source. With match (or an engine for --local),
+    each page is re-mapped into page_matches before its mirror is rendered.
+    """
+    match = match or engine is not None
+    started = time.perf_counter()
+    session = requests.Session()
+    session.headers.update(BROWSER_HEADERS)
+    adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+
+    urls = read_url_list(source, session)
+    print(f"🗂️  {len(urls)} pages from {source} -> {out_dir}")
+    schedules = host_schedules(urls, session)
+
+    def schedule_for(url):
+        parts = urlsplit(url)
+        return schedules[f"{parts.scheme}://{parts.netloc}"]
+
+    match_cache = None
+    if match and engine is None:
+        match_cache = SemanticCache.for_provider(
+            supabase, PROVIDER_ID, f"match_provider_knowledge:{MATCH_THRESHOLD:g}:1"
+        )
+
+    # sentence -> entry or None (RPC), or its top-k candidates (engine);
+    # shared by every page of the run
+    matched = {}
+    manifest, written, failed = {}, 0, 0
+    try:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="mirror") as pool:
+            for w in range(0, len(urls), wave_size):
+                wave = urls[w:w + wave_size]
+                pages = list(pool.map(lambda url: load_page(url, session, schedule_for(url)), wave))
+
+                # Sentences seen on earlier pages are not embedded again; ones
+                # whose batch failed are retried when a later page has them
+                new = []
+                if match:
+                    new = list(dict.fromkeys(
+                        s for soup, sentences in pages if soup is not None for s in sentences if s not in matched
+                    ))
+                    print(f"📦 Pages {w + 1}-{w + len(wave)}/{len(urls)}: {len(new)} new sentences")
+                else:
+                    print(f"📦 Pages {w + 1}-{w + len(wave)}/{len(urls)}")
+                if new and engine is not None:
+                    for i in range(0, len(new), MIRROR_MATCH_BATCH):
+                        matched.update(top_k_sentences(engine, new[i:i + MIRROR_MATCH_BATCH]))
+                elif new:
+                    matched.update(match_sentences(
+                        new, match_cache, embed=bulk_embed_model, batch_size=MIRROR_MATCH_BATCH, pool=pool,
+                    ))
+
+                # Re-map the pages whose sentences were all searched; the rest
+                # keep the page_matches rows they had
+                page_results, unsearched = {}, {}
+                if match:
+                    for url, (soup, sentences) in zip(wave, pages):
+                        if soup is None:
+                            continue
+                        unsearched[url] = sum(1 for s in sentences if s not in matched)
+                        if unsearched[url]:
+                            continue
+                        if engine is not None:
+                            page_results[url] = local_matches(engine, sentences, matched)
+                        else:
+                            page_results[url] = [dict(matched[s], phrase=s) for s in sentences if matched.get(s)]
+                    try:
+                        save_page_matches(page_results)
+                    except Exception as e:
+                        print(f"   ⚠️ Saving page_matches failed, mirrors show the previous rows: {e}")
+                        page_results = {}
+
+                # One page_matches query per wave for what the mirrors show
+                match_maps = page_match_maps([url for url, (soup, _) in zip(wave, pages) if soup is not None])
+
+                for url, (soup, sentences) in zip(wave, pages):
+                    if soup is None:
+                        failed += 1
+                        print(f"   ❌ {url}: {sentences}")
+                        continue
+                    match_map = match_maps.get(normalize_page_url(url), [])
+                    final_html, highlighted = render_mirror(soup, url, match_map)
+                    path = mirror_path(out_dir, url)
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    with open(path, "w", encoding="utf-8") as f:
+                        f.write(final_html)
+                    written += 1
+                    manifest[url] = {"file": os.path.relpath(path, out_dir), "matches": len(match_map),
+                                     "highlighted": highlighted}
+                    remapped = ""
+                    if url in page_results:
+                        manifest[url]["remapped"] = True
+                        remapped = ", re-mapped"
+                    elif unsearched.get(url):
+                        remapped = f", {unsearched[url]} sentences not searched, previous matches kept"
+                    print(f"   ✅ {url} -> {manifest[url]['file']} ({highlighted}/{len(match_map)} highlighted{remapped})")
+    finally:
+        if match_cache is not None:
+            match_cache.report()
+            match_cache.close()
+        if engine is not None:
+            engine.report()
+
+    os.makedirs(out_dir, exist_ok=True)
+    with open(os.path.join(out_dir, "index.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+
+    elapsed = time.perf_counter() - started
+    count("mirror.pages", written)
+    searched = f", {len(matched)} distinct sentences searched" if match else ""
+    print(f"\n🎉 {written} mirrors ({failed} failed) in {elapsed:.1f}s: "
+          f"{written / elapsed * 60:.1f} pages/min{searched}")
 
 
 if __name__ == "__main__":
-    generate_mirror()
+    parser = argparse.ArgumentParser(description="Generate highlighted mirrors of provider pages.")
+    parser.add_argument("target_url", nargs="?", default=TARGET_URL)
+    parser.add_argument("output_file", nargs="?", default=OUTPUT_FILE)
+    parser.add_argument("--batch", metavar="SOURCE",
+                        help="sitemap URL/file or a file of page URLs (one per line): one mirror per page")
+    parser.add_argument("--out-dir", default=MIRROR_DIR, help="batch mode output tree")
+    parser.add_argument("--workers", type=int, default=MIRROR_WORKERS, help="concurrent fetches and searches")
+    parser.add_argument("--match", action="store_true",
+                        help="re-map the pages first: embed and search their sentences and replace their "
+                             "page_matches rows with the results (costs embeddings and searches)")
+    parser.add_argument("--local", nargs="?", const="", metavar="SNAPSHOT",
+                        help="batch mode, implies --match: search in process with the similarity engine "
+                             "(top-k + MMR) instead of one RPC per sentence; loads the provider from "
+                             "Supabase, or from a similarity_engine.py snapshot directory")
+    parser.add_argument("--sync", action="store_true",
+                        help="with --local SNAPSHOT: bring the snapshot up to date first (snapshot_sync.py)")
+    args = parser.parse_args()
+
+    if args.batch:
+        engine = None
+        if args.local is not None:
+            from similarity_engine import SimilarityEngine
+            if args.local:
+                if args.sync:
+                    from snapshot_sync import sync_snapshot
+                    sync_snapshot(supabase, PROVIDER_ID, args.local)
+                engine = SimilarityEngine.open(args.local)
+            else:
+                from retrieval_service import load_provider
+                engine = SimilarityEngine.from_rows(*load_provider(PROVIDER_ID))
+            print(f"🧮 {len(engine)} chunks loaded for local matching")
+        generate_mirrors(args.batch, args.out_dir, args.workers, match=args.match, engine=engine)
+    else:
+        generate_mirror(args.target_url, args.output_file, match=args.match)
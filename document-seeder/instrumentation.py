@@ -0,0 +1,217 @@
+import os
+import sys
+import json
+import math
+import time
+import atexit
+import threading
+
+# Lightweight timing/counter layer for the seeders.
+#
+#   from instrumentation import span, count
+#
+#   with span("http.get"):
+#       response = scraper.get(url)
+#   count("bytes.html", len(response.text))
+#
+# Turn it on with SEEDER_METRICS=1. When off, span() hands back one shared
+# no-op context manager and count() returns immediately, so the calls can
+# stay in hot loops. At exit a JSON summary (count/total/p50/p95/max per
+# span, plus counters) is written to SEEDER_METRICS_DIR (default ./metrics).
+# SEEDER_PROFILE=cprofile or SEEDER_PROFILE=pyinstrument dumps a profile too
+# (with or without SEEDER_METRICS).
+
+ENABLED = os.getenv("SEEDER_METRICS", "").lower() in ("1", "true", "yes")
+METRICS_DIR = os.getenv("SEEDER_METRICS_DIR", "metrics")
+PROFILER = os.getenv("SEEDER_PROFILE", "").lower()
+
+_lock = threading.Lock()
+_timings = {}
+_counters = {}
+_started = time.perf_counter()
+_profiler = None
+
+# Optional: exact token counts for embedding inputs
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("cl100k_base")
+except Exception:
+    _encoding = None
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP = _NoopSpan()
+
+
+class _Span:
+    __slots__ = ("name", "started")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        record(self.name, time.perf_counter() - self.started)
+        return False
+
+
+def span(name):
+    """
+    Times the enclosed block under `name`. Free when metrics are disabled.
+    """
+    if not ENABLED:
+        return _NOOP
+    return _Span(name)
+
+
+def timed(name):
+    """
+    Decorator form of span().
+    """
+    def wrap(fn):
+        if not ENABLED:
+            return fn
+
+        def inner(*args, **kwargs):
+            with _Span(name):
+                return fn(*args, **kwargs)
+        inner.__name__ = fn.__name__
+        inner.__doc__ = fn.__doc__
+        return inner
+    return wrap
+
+
+def record(name, seconds):
+    if not ENABLED:
+        return
+    with _lock:
+        _timings.setdefault(name, []).append(seconds)
+
+
+def count(name, n=1):
+    if not ENABLED:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + n
+
+
+def count_tokens(name, texts):
+    """
+    Adds the token count of texts (a string or list of strings) to counter `name`.
+    Uses tiktoken when installed, otherwise the ~4 chars/token rule of thumb.
+    """
+    if not ENABLED:
+        return
+    if isinstance(texts, str):
+        texts = [texts]
+    if _encoding is not None:
+        tokens = sum(len(_encoding.encode(t)) for t in texts)
+    else:
+        tokens = sum(len(t) for t in texts) // 4
+    count(name, tokens)
+
+
+def _percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    # Nearest-rank
+    index = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def summary():
+    with _lock:
+        timings = {k: sorted(v) for k, v in _timings.items()}
+        counters = dict(_counters)
+
+    spans = {}
+    for name, values in sorted(timings.items()):
+        spans[name] = {
+            "count": len(values),
+            "total_s": round(sum(values), 4),
+            "p50_ms": round(_percentile(values, 50) * 1000, 2),
+            "p95_ms": round(_percentile(values, 95) * 1000, 2),
+            "max_ms": round(values[-1] * 1000, 2),
+        }
+    return {
+        "script": os.path.basename(sys.argv[0]) if sys.argv and sys.argv[0] else "python",
+        "argv": sys.argv[1:],
+        "wall_s": round(time.perf_counter() - _started, 3),
+        "spans": spans,
+        "counters": counters,
+    }
+
+
+def write_report():
+    data = summary()
+    if not data["spans"] and not data["counters"]:
+        return None
+
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    stem = os.path.splitext(data["script"])[0]
+    path = os.path.join(METRICS_DIR, f"{stem}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    with open(path, "w") as f:
+        json.dump(data, f, indent=2)
+
+    print(f"\n📈 Performance report: {path}")
+    for name, s in data["spans"].items():
+        print(f"   {name:<24}{s['count']:>7}x  p50 {s['p50_ms']:>8.1f}ms  p95 {s['p95_ms']:>8.1f}ms  total {s['total_s']:>8.2f}s")
+    for name, value in sorted(data["counters"].items()):
+        print(f"   {name:<24}{value:>10}")
+    return path
+
+
+def _start_profiler():
+    global _profiler
+    if PROFILER == "cprofile":
+        import cProfile
+        _profiler = cProfile.Profile()
+        _profiler.enable()
+    elif PROFILER == "pyinstrument":
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            print("⚠️ SEEDER_PROFILE=pyinstrument but pyinstrument is not installed.")
+            return
+        _profiler = Profiler()
+        _profiler.start()
+
+
+def _stop_profiler():
+    if _profiler is None:
+        return
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    stem = os.path.splitext(os.path.basename(sys.argv[0] or "python"))[0]
+    stamp = time.strftime('%Y%m%d-%H%M%S')
+    if PROFILER == "cprofile":
+        _profiler.disable()
+        path = os.path.join(METRICS_DIR, f"{stem}-{stamp}.prof")
+        _profiler.dump_stats(path)
+    else:
+        _profiler.stop()
+        path = os.path.join(METRICS_DIR, f"{stem}-{stamp}.html")
+        with open(path, "w") as f:
+            f.write(_profiler.output_html())
+    print(f"   🔬 Profile written to: {path}")
+
+
+def _at_exit():
+    _stop_profiler()
+    write_report()
+
+
+if ENABLED or PROFILER:
+    _start_profiler()
+    atexit.register(_at_exit)
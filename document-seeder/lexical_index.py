@@ -0,0 +1,291 @@
+import os
+import re
+import sys
+import gzip
+import json
+import math
+import time
+import struct
+import hashlib
+from collections import Counter
+
+from instrumentation import span, count
+
+# BM25 inverted index over a provider's provider_knowledge text.
+#
+#   index = LexicalIndex.for_provider(supabase, 12)     # loads or (re)builds
+#   score = index.best_score("Founders can claim SEIS relief")
+#
+# crawl_and_map.py uses it as a prefilter: a page sentence only goes to
+# embedding + vector search when its best BM25 score against any chunk
+# clears LEXICAL_MIN_SCORE, i.e. when it shares enough (rare enough) terms
+# with the provider's content to have a chance of matching. Sentences about
+# cookies, newsletters and navigation are dropped for the price of a few
+# dictionary lookups.
+#
+# The index is stored per provider in LEXICAL_INDEX_DIR as one gzip file:
+# a JSON header (terms, document frequencies, chunk lengths, the knowledge
+# version it was built from) followed by varint delta-encoded postings. It is
+# rebuilt when the provider's knowledge version (semantic_cache.py) changes.
+#
+# The bar trades recall for cost. Each page reports how many sentences were
+# skipped; with LEXICAL_AUDIT_RATE > 0 that share of the skipped sentences is
+# embedded and searched anyway (never saved) and the report adds how many of
+# them would have matched, i.e. the recall the bar is costing. 1.0 audits
+# everything, which is the way to tune LEXICAL_MIN_SCORE on a new provider.
+# The prefilter is off until a bar is set, so nothing is dropped unaudited:
+#
+#   LEXICAL_MIN_SCORE=2 LEXICAL_AUDIT_RATE=1 python crawl_and_map.py   # measure the recall cost
+#
+#   python lexical_index.py build 12
+#   python lexical_index.py query 12 "what is advance assurance"
+
+LEXICAL_INDEX_DIR = os.getenv("LEXICAL_INDEX_DIR", "lexical_index")
+LEXICAL_MIN_SCORE = float(os.getenv("LEXICAL_MIN_SCORE", "0"))      # 0 disables the prefilter
+LEXICAL_AUDIT_RATE = float(os.getenv("LEXICAL_AUDIT_RATE", "0.0"))  # share of skipped sentences still searched
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+PAGE_SIZE = 1000
+FORMAT_VERSION = 1
+
+STOPWORDS = set("""
+a about above after again against all am an and any are as at be because been before being below between
+both but by can could did do does doing down during each few for from further had has have having he her
+here hers herself him himself his how i if in into is it its itself just me more most my myself no nor not
+now of off on once only or other our ours ourselves out over own same she should so some such than that the
+their theirs them themselves then there these they this those through to too under until up very was we
+were what when where which while who whom why will with would you your yours yourself yourselves also get
+got may might must shall us one two new use used using via per etc
+""".split())
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_SUFFIXES = ("ingly", "edly", "ings", "ing", "ied", "ies", "ed", "es", "ly", "s")
+
+
+def _stem(word):
+    for suffix in _SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            if suffix in ("ied", "ies"):
+                return word[:-len(suffix)] + "y"
+            return word[:-len(suffix)]
+    return word
+
+
+def tokenize(text):
+    return [_stem(t) for t in _TOKEN_RE.findall(text.lower()) if t not in STOPWORDS and len(t) > 1]
+
+
+def _encode_varints(numbers):
+    out = bytearray()
+    for n in numbers:
+        while n >= 0x80:
+            out.append((n & 0x7F) | 0x80)
+            n >>= 7
+        out.append(n)
+    return bytes(out)
+
+
+def _decode_varints(data, start, count_):
+    numbers, n, shift, pos = [], 0, 0, start
+    while len(numbers) < count_:
+        byte = data[pos]
+        pos += 1
+        n |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+        else:
+            numbers.append(n)
+            n, shift = 0, 0
+    return numbers, pos
+
+
+class LexicalIndex:
+    def __init__(self, postings, doc_lengths, version=None):
+        # postings: term -> [(chunk, tf)], chunk = position in doc_lengths
+        self.postings = postings
+        self.doc_lengths = doc_lengths
+        self.version = version
+        self.n_docs = len(doc_lengths)
+        self.avgdl = (sum(doc_lengths) / self.n_docs) if self.n_docs else 0.0
+        self.idf = {
+            term: math.log(1 + (self.n_docs - len(plist) + 0.5) / (len(plist) + 0.5))
+            for term, plist in postings.items()
+        }
+
+    @classmethod
+    def build(cls, texts, version=None):
+        postings, doc_lengths = {}, []
+        for chunk, text in enumerate(texts):
+            terms = Counter(tokenize(text or ""))
+            doc_lengths.append(sum(terms.values()))
+            for term, tf in terms.items():
+                postings.setdefault(term, []).append((chunk, tf))
+        return cls(postings, doc_lengths, version)
+
+    # --- Scoring ---
+
+    def scores(self, text):
+        """
+        {chunk: BM25 score} for the chunks sharing at least one term with text.
+        """
+        totals = {}
+        for term in set(tokenize(text)):
+            plist = self.postings.get(term)
+            if not plist:
+                continue
+            idf = self.idf[term]
+            for chunk, tf in plist:
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_lengths[chunk] / (self.avgdl or 1.0))
+                totals[chunk] = totals.get(chunk, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + norm)
+        return totals
+
+    def best_score(self, text):
+        totals = self.scores(text)
+        return max(totals.values()) if totals else 0.0
+
+    # --- Persistence ---
+
+    def save(self, path):
+        terms = sorted(self.postings)
+        header_terms, blob, offset = [], bytearray(), 0
+        for term in terms:
+            plist = self.postings[term]
+            flat, previous = [], 0
+            for chunk, tf in plist:
+                flat.extend((chunk - previous, tf))
+                previous = chunk
+            encoded = _encode_varints(flat)
+            header_terms.append([term, len(plist), offset])
+            blob.extend(encoded)
+            offset += len(encoded)
+        header = json.dumps({
+            "format": FORMAT_VERSION,
+            "version": self.version,
+            "doc_lengths": self.doc_lengths,
+            "terms": header_terms,
+        }, separators=(",", ":")).encode()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.tmp"
+        with gzip.open(tmp, "wb", compresslevel=6) as f:
+            f.write(struct.pack("<I", len(header)))
+            f.write(header)
+            f.write(bytes(blob))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        with gzip.open(path, "rb") as f:
+            data = f.read()
+        (header_len,) = struct.unpack("<I", data[:4])
+        header = json.loads(data[4:4 + header_len])
+        if header.get("format") != FORMAT_VERSION:
+            raise ValueError(f"unsupported lexical index format {header.get('format')}")
+        base = 4 + header_len
+        postings = {}
+        for term, n, offset in header["terms"]:
+            flat, _ = _decode_varints(data, base + offset, 2 * n)
+            plist, chunk = [], 0
+            for i in range(0, len(flat), 2):
+                chunk += flat[i]
+                plist.append((chunk, flat[i + 1]))
+            postings[term] = plist
+        return cls(postings, header["doc_lengths"], header.get("version"))
+
+    @classmethod
+    def for_provider(cls, supabase, provider_id, index_dir=LEXICAL_INDEX_DIR):
+        """
+        The provider's saved index, rebuilt from provider_knowledge when the
+        knowledge version changed (or there is none yet).
+        """
+        from semantic_cache import knowledge_version
+
+        path = os.path.join(index_dir, f"provider-{provider_id}.bm25.gz")
+        version = knowledge_version(supabase, provider_id)
+        if os.path.exists(path):
+            try:
+                index = cls.load(path)
+                if index.version == version:
+                    return index
+            except (OSError, ValueError) as e:
+                print(f"   ⚠️ Lexical index unreadable, rebuilding: {e}")
+
+        started = time.perf_counter()
+        texts, start = [], 0
+        while True:
+            with span("db.select.provider_knowledge"):
+                page = supabase.table("provider_knowledge") \
+                    .select("id, content") \
+                    .eq("provider_id", provider_id) \
+                    .order("id") \
+                    .range(start, start + PAGE_SIZE - 1) \
+                    .execute().data or []
+            texts.extend(row.get("content") or "" for row in page)
+            if len(page) < PAGE_SIZE:
+                break
+            start += PAGE_SIZE
+        with span("lexical.build"):
+            index = cls.build(texts, version)
+        index.save(path)
+        count("lexical.rebuilds")
+        print(f"🔤 Lexical index for provider {provider_id}: {index.n_docs} chunks, {len(index.postings)} terms, "
+              f"{os.path.getsize(path) / 1024:.0f} KB ({time.perf_counter() - started:.1f}s)")
+        return index
+
+
+class PrefilterReport:
+    """
+    Per-page tally of what the prefilter skipped and, for the audited share
+    of skipped sentences, how many would have matched.
+    """
+
+    def __init__(self, min_score, audit_rate):
+        self.min_score = min_score
+        self.audit_rate = audit_rate
+        self.kept = self.skipped = self.audited = self.lost = 0
+
+    def should_audit(self, sentence):
+        if self.audit_rate <= 0:
+            return False
+        # Deterministic sample, so reruns audit the same sentences
+        return hash_fraction(sentence) < self.audit_rate
+
+    def print(self, prefix="   "):
+        total = self.kept + self.skipped
+        line = (f"{prefix}🔤 Lexical prefilter: {self.skipped}/{total} sentences skipped "
+                f"(BM25 < {self.min_score:g})")
+        if self.audited:
+            estimate = self.lost / self.audited * self.skipped
+            line += f"; audited {self.audited} skipped -> {self.lost} matches lost (~{estimate:.1f} est.)"
+        print(line)
+        count("lexical.kept", self.kept)
+        count("lexical.skipped", self.skipped)
+        count("lexical.audited", self.audited)
+        count("lexical.lost", self.lost)
+
+
+def hash_fraction(text):
+    return int.from_bytes(hashlib.blake2b(text.encode(), digest_size=4).digest(), "little") / 2 ** 32
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3 or sys.argv[1] not in ("build", "query"):
+        print('Usage: python lexical_index.py build <provider_id> | query <provider_id> "<text>"')
+        sys.exit(1)
+
+    from dotenv import load_dotenv
+    from supabase import create_client
+
+    load_dotenv(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '.env'))
+    client = create_client(os.getenv("SUPABASE_URL") or os.getenv("PLASMO_PUBLIC_SUPABASE_URL"),
+                           os.getenv("SUPABASE_SERVICE_ROLE_KEY"))
+    lexical = LexicalIndex.for_provider(client, int(sys.argv[2]))
+    if sys.argv[1] == "query":
+        text = " ".join(sys.argv[3:])
+        top = sorted(lexical.scores(text).items(), key=lambda kv: -kv[1])[:5]
+        print(f"terms: {tokenize(text)}")
+        for chunk, score in top:
+            print(f"   chunk #{chunk}: {score:.2f}")
+        print(f"best {lexical.best_score(text):.2f} (bar {LEXICAL_MIN_SCORE:g})")
@@ -0,0 +1,237 @@
+import os
+import re
+import sys
+import gzip
+import json
+import time
+import hashlib
+from dotenv import load_dotenv
+from supabase import create_client, Client
+from instrumentation import span, count
+
+# Optional: brotli copies next to the gzip ones (pip install brotli)
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
+# Precomputed per-page match bundles for the highlighter.
+#
+#   python match_bundles.py 12                       # every page with matches for provider 12
+#   python match_bundles.py 12 https://seedlegals.com/resources/seis-eis-rules-for-founders/
+#
+# For each page URL in page_matches this writes one JSON array with
+# everything highlight-matches.js / admin-script.js show for a match: phrase,
+# embed-ready video URL with timestamp, document title, cover image,
+# confidence and status (the same shape /api/match-map returns). Files go to
+# web-embed/match-bundles/<key>.json (+ .json.gz, + .json.br with brotli),
+# where <key> is the first 20 hex chars of sha1(normalised page URL); the
+# index.json manifest maps URL -> key, ETag (content hash) and match count.
+# A bundle is only rewritten when its content hash changes.
+# web-embed/api/match-bundles.js serves them with ETag / If-None-Match and
+# the pre-compressed encodings, so a page's matches are a single file read
+# instead of a page_matches query plus one provider_documents query per match.
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+load_dotenv(os.path.join(parent_dir, '.env'))
+
+SUPABASE_URL = os.getenv("SUPABASE_URL") or os.getenv("PLASMO_PUBLIC_SUPABASE_URL")
+SUPABASE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
+supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+
+BUNDLE_DIR = os.getenv("MATCH_BUNDLE_DIR", os.path.join(parent_dir, "web-embed", "match-bundles"))
+MANIFEST_FILE = "index.json"
+PAGE_SIZE = 1000
+
+VIMEO_PATTERNS = [re.compile(r"vimeo\.com/(\d+)"), re.compile(r"player\.vimeo\.com/video/(\d+)")]
+
+
+def normalize_page_url(url):
+    """
+    Query, fragment and trailing slash dropped (match-bundles.js does the same).
+    """
+    return re.sub(r'[#?].*', '', url or '').rstrip('/')
+
+
+def bundle_key(url):
+    return hashlib.sha1(normalize_page_url(url).encode()).hexdigest()[:20]
+
+
+def vimeo_embed_url(original_url, timestamp=0):
+    """
+    Port of vimeoEmbedUrl() in web-embed/api/match-map.js.
+    """
+    if not original_url:
+        return original_url
+    for pattern in VIMEO_PATTERNS:
+        found = pattern.search(original_url)
+        if found:
+            suffix = f"#t={timestamp}s" if timestamp else ""
+            return f"https://player.vimeo.com/video/{found.group(1)}?autoplay=1&title=0&byline=0{suffix}"
+    return original_url
+
+
+def _timestamp(video_url):
+    found = re.search(r"#t=(\d+)", video_url or "")
+    return int(found.group(1)) if found else 0
+
+
+def fetch_page_matches(provider_id, urls=None):
+    rows, start = [], 0
+    while True:
+        query = supabase.table("page_matches") \
+            .select("id, url, phrase, video_url, confidence, document_id, status") \
+            .eq("provider_id", provider_id)
+        if urls:
+            query = query.in_("url", urls)
+        with span("db.select.page_matches"):
+            page = query.order("id").range(start, start + PAGE_SIZE - 1).execute().data or []
+        rows.extend(page)
+        if len(page) < PAGE_SIZE:
+            return rows
+        start += PAGE_SIZE
+
+
+def fetch_documents(provider_id, document_ids):
+    if not document_ids:
+        return {}
+    with span("db.select.provider_documents"):
+        resp = supabase.table("provider_documents") \
+            .select("id, title, cover_image_url") \
+            .eq("provider_id", provider_id) \
+            .in_("id", sorted(document_ids)) \
+            .execute()
+    return {doc["id"]: doc for doc in resp.data or []}
+
+
+def build_bundle(rows, documents, provider_id):
+    """
+    page_matches rows for one page -> list of highlighter-ready matches.
+    """
+    matches = []
+    for row in sorted(rows, key=lambda r: r["id"]):
+        doc = documents.get(row.get("document_id")) or {}
+        matches.append({
+            "page_match_id": row["id"],
+            "phrase": row.get("phrase") or "",
+            "video_url": vimeo_embed_url(row.get("video_url"), _timestamp(row.get("video_url"))),
+            "confidence": row.get("confidence"),
+            "document_id": row.get("document_id"),
+            "provider_id": provider_id,
+            "status": row.get("status"),
+            "document_title": doc.get("title") or "",
+            "cover_image_url": doc.get("cover_image_url") or "",
+        })
+    return matches
+
+
+def _write_atomic(path, data):
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def load_manifest(bundle_dir=BUNDLE_DIR):
+    path = os.path.join(bundle_dir, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_manifest(manifest, bundle_dir=BUNDLE_DIR):
+    body = json.dumps(manifest, indent=2, sort_keys=True).encode()
+    _write_atomic(os.path.join(bundle_dir, MANIFEST_FILE), body)
+
+
+def write_bundle(url, matches, manifest, provider_id, bundle_dir=BUNDLE_DIR):
+    """
+    Writes the bundle files unless the manifest already has the same hash.
+    Returns True if anything was written.
+    """
+    body = json.dumps(matches, sort_keys=True, separators=(",", ":")).encode()
+    etag = hashlib.sha256(body).hexdigest()[:32]
+    key = bundle_key(url)
+    base = os.path.join(bundle_dir, f"{key}.json")
+
+    entry = manifest.get(normalize_page_url(url))
+    if entry and entry["etag"] == etag and os.path.exists(base):
+        return False
+
+    _write_atomic(base, body)
+    # mtime=0 keeps the gzip bytes a pure function of the content
+    _write_atomic(f"{base}.gz", gzip.compress(body, compresslevel=9, mtime=0))
+    if BROTLI_AVAILABLE:
+        _write_atomic(f"{base}.br", brotli.compress(body, quality=11))
+    manifest[normalize_page_url(url)] = {
+        "key": key,
+        "provider_id": provider_id,
+        "etag": etag,
+        "matches": len(matches),
+        "bytes": len(body),
+        "updated_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+    }
+    return True
+
+
+def remove_bundle(url, manifest, bundle_dir=BUNDLE_DIR):
+    entry = manifest.pop(normalize_page_url(url), None)
+    if not entry:
+        return False
+    for suffix in (".json", ".json.gz", ".json.br"):
+        path = os.path.join(bundle_dir, entry["key"] + suffix)
+        if os.path.exists(path):
+            os.remove(path)
+    return True
+
+
+def export_bundles(provider_id, urls=None, bundle_dir=BUNDLE_DIR):
+    """
+    Regenerates bundles for the given page URLs (or every page of the
+    provider). Pages whose matches are gone lose their bundle.
+    Returns (written, unchanged, removed).
+    """
+    os.makedirs(bundle_dir, exist_ok=True)
+    # page_matches.url is stored as crawled; ask for both slash variants
+    lookup = None
+    if urls:
+        lookup = sorted({v for u in urls for v in (normalize_page_url(u), normalize_page_url(u) + "/")})
+    rows = fetch_page_matches(provider_id, lookup)
+    documents = fetch_documents(provider_id, {r["document_id"] for r in rows if r.get("document_id")})
+
+    by_page = {}
+    for row in rows:
+        by_page.setdefault(normalize_page_url(row["url"]), []).append(row)
+
+    manifest = load_manifest(bundle_dir)
+    written = unchanged = removed = 0
+    for url, page_rows in sorted(by_page.items()):
+        if write_bundle(url, build_bundle(page_rows, documents, provider_id), manifest, provider_id, bundle_dir):
+            written += 1
+        else:
+            unchanged += 1
+
+    # Pages that had a bundle but no matches any more
+    if urls:
+        stale = [normalize_page_url(u) for u in urls]
+    else:
+        stale = [u for u, entry in manifest.items() if entry.get("provider_id") == provider_id]
+    for url in stale:
+        if url not in by_page and remove_bundle(url, manifest, bundle_dir):
+            removed += 1
+
+    save_manifest(manifest, bundle_dir)
+    count("bundles.written", written)
+    count("bundles.unchanged", unchanged)
+    print(f"📦 Match bundles: {written} written, {unchanged} unchanged, {removed} removed ({bundle_dir})")
+    return written, unchanged, removed
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python match_bundles.py <provider_id> [page_url ...]")
+        sys.exit(1)
+    export_bundles(int(sys.argv[1]), sys.argv[2:] or None)
@@ -0,0 +1,266 @@
+import os
+import re
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+# Local, page-parallel PDF -> markdown.
+#
+#   from pdf_extract import extract_pdf
+#   pages = extract_pdf("handbook.pdf")      # [{"page_number", "markdown", "chars"}]
+#
+# Pages are split into ranges and extracted on a process pool, each worker
+# opening the file once per range. Output is one markdown string per page,
+# with headings ("#", "##", "###") recovered from font sizes relative to the
+# page's body text, so seed-pdf.py can hand it straight to MarkdownNodeParser
+# and keep page numbers for deep links. pypdfium2 is used when installed (an
+# order of magnitude faster, paragraphs only break at headings); pdfminer
+# recovers paragraph boundaries too.
+#
+# Text-less pages (scans) are reported via looks_scanned()/probe_scanned();
+# seed-pdf.py sends those documents to LlamaParse instead. extract_range() and
+# page_ranges() are the building blocks for callers running their own pool.
+#
+#   python pdf_extract.py <file.pdf> [workers]     # prints pages/sec
+
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", str(os.cpu_count() or 4)))
+PDF_BACKEND = os.getenv("PDF_BACKEND", "")  # "pdfminer" | "pypdfium2" | "" (auto)
+
+# Pages per pool task: big enough to amortise opening the file
+RANGES_PER_WORKER = 4
+
+# Heading = text at least this much larger than the page's body text
+HEADING_RATIOS = [(1.6, "#"), (1.3, "##"), (1.12, "###")]
+MAX_HEADING_CHARS = 150
+
+# A page with fewer extractable characters than this is treated as an image
+SCANNED_MIN_CHARS = 25
+SCANNED_PAGE_SHARE = 0.5
+
+# Optional backends: at least one of them is needed for local parsing
+try:
+    from pdfminer.high_level import extract_pages
+    from pdfminer.layout import LAParams, LTChar, LTTextContainer
+    from pdfminer.pdfpage import PDFPage
+    PDFMINER_AVAILABLE = True
+except ImportError:
+    PDFMINER_AVAILABLE = False
+
+try:
+    import pypdfium2 as pdfium
+    import pypdfium2.raw as pdfium_raw
+    PDFIUM_AVAILABLE = True
+except ImportError:
+    PDFIUM_AVAILABLE = False
+
+_HYPHEN_BREAK = re.compile(r"(\w)-\n(\w)")
+
+
+def choose_backend(backend=None):
+    backend = backend or PDF_BACKEND
+    if backend:
+        return backend
+    if PDFIUM_AVAILABLE:
+        return "pypdfium2"
+    if PDFMINER_AVAILABLE:
+        return "pdfminer"
+    raise RuntimeError("Local PDF parsing needs pypdfium2 or pdfminer.six (pip install pypdfium2)")
+
+
+def page_count(path, backend=None):
+    backend = choose_backend(backend)
+    if backend == "pypdfium2":
+        pdf = pdfium.PdfDocument(path)
+        try:
+            return len(pdf)
+        finally:
+            pdf.close()
+    with open(path, "rb") as f:
+        return sum(1 for _ in PDFPage.get_pages(f))
+
+
+def _join_lines(text):
+    text = _HYPHEN_BREAK.sub(r"\1\2", text.strip())
+    return " ".join(text.split())
+
+
+def _body_size(weights):
+    return weights.most_common(1)[0][0] if weights else 0.0
+
+
+def _heading_marker(size, body, text):
+    if not body or len(text) > MAX_HEADING_CHARS:
+        return None
+    for ratio, hashes in HEADING_RATIOS:
+        if size >= body * ratio:
+            return hashes
+    return None
+
+
+# --- pdfminer: headings from font size ---
+
+def _box_size(box):
+    sizes = [round(ch.size, 1) for line in box for ch in line if isinstance(ch, LTChar)]
+    if not sizes:
+        return 0.0
+    return Counter(sizes).most_common(1)[0][0]
+
+
+def _pdfminer_pages(path, page_numbers):
+    """
+    page_numbers are 0-based. Yields markdown per page.
+    """
+    for layout in extract_pages(path, page_numbers=page_numbers, laparams=LAParams()):
+        boxes = []
+        weights = Counter()
+        for element in layout:
+            if not isinstance(element, LTTextContainer):
+                continue
+            text = element.get_text()
+            if not text.strip():
+                continue
+            size = _box_size(element)
+            boxes.append((element.y1, element.x0, text, size))
+            weights[size] += len(text)
+
+        body = _body_size(weights)
+        parts = []
+        # Top-to-bottom, then left-to-right
+        for _, _, text, size in sorted(boxes, key=lambda b: (-round(b[0]), b[1])):
+            clean = _join_lines(text)
+            marker = _heading_marker(size, body, clean)
+            parts.append(f"{marker} {clean}" if marker else clean)
+        yield "\n\n".join(parts)
+
+
+# --- pypdfium2: headings from per-line font size ---
+
+def _pdfium_pages(path, page_numbers):
+    pdf = pdfium.PdfDocument(path)
+    try:
+        for index in page_numbers:
+            page = pdf[index]
+            textpage = page.get_textpage()
+            raw = textpage.get_text_range()
+
+            # Text is index-aligned with pdfium's chars, so the first char
+            # of each line gives that line's font size
+            lines, offset = [], 0
+            weights = Counter()
+            for line in raw.split("\r\n"):
+                if line.strip():
+                    size = round(pdfium_raw.FPDFText_GetFontSize(textpage.raw, offset), 1)
+                    lines.append((line.strip(), size))
+                    weights[size] += len(line)
+                offset += len(line) + 2
+            textpage.close()
+            page.close()
+
+            body = _body_size(weights)
+            parts, paragraph, heading = [], [], None
+            for line, size in lines:
+                marker = _heading_marker(size, body, line)
+                if marker and heading and heading[0] == marker and not paragraph:
+                    # Heading wrapped onto a second line
+                    heading = (marker, f"{heading[1]} {line}")
+                    continue
+                if marker or heading:
+                    if heading:
+                        parts.append(f"{heading[0]} {heading[1]}")
+                        heading = None
+                    if marker:
+                        if paragraph:
+                            parts.append(_join_lines("\n".join(paragraph)))
+                            paragraph = []
+                        heading = (marker, line)
+                        continue
+                paragraph.append(line)
+            if heading:
+                parts.append(f"{heading[0]} {heading[1]}")
+            if paragraph:
+                parts.append(_join_lines("\n".join(paragraph)))
+            yield "\n\n".join(parts)
+    finally:
+        pdf.close()
+
+
+def extract_range(path, start, end, backend):
+    """
+    Pool task: pages [start, end) -> [{"page_number", "markdown", "chars"}].
+    page_number is 1-based, as shown in PDF viewers and #page= links.
+    """
+    numbers = list(range(start, end))
+    pages = _pdfminer_pages(path, numbers) if backend == "pdfminer" else _pdfium_pages(path, numbers)
+    out = []
+    for number, markdown in zip(numbers, pages):
+        out.append({
+            "page_number": number + 1,
+            "markdown": markdown,
+            "chars": len(markdown.replace("#", "").strip()),
+        })
+    return out
+
+
+def page_ranges(total, workers):
+    size = max(1, -(-total // (workers * RANGES_PER_WORKER)))
+    return [(start, min(start + size, total)) for start in range(0, total, size)]
+
+
+def iter_pdf_pages(path, workers=PDF_WORKERS, backend=None):
+    """
+    Yields page dicts in page order while later ranges are still being extracted.
+    """
+    backend = choose_backend(backend)
+    total = page_count(path, backend)
+    ranges = page_ranges(total, workers)
+
+    if workers <= 1 or len(ranges) == 1:
+        for start, end in ranges:
+            yield from extract_range(path, start, end, backend)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(extract_range, path, start, end, backend) for start, end in ranges]
+        for future in futures:
+            yield from future.result()
+
+
+def extract_pdf(path, workers=PDF_WORKERS, backend=None):
+    return list(iter_pdf_pages(path, workers, backend))
+
+
+def probe_scanned(path, sample_pages=8, backend=None):
+    """
+    Cheap scanned-PDF check on the first few pages, before committing to a
+    full local parse.
+    """
+    backend = choose_backend(backend)
+    total = page_count(path, backend)
+    return looks_scanned(extract_range(path, 0, min(sample_pages, total), backend)), total
+
+
+def looks_scanned(pages):
+    """
+    True when most pages have (almost) no text layer.
+    """
+    if not pages:
+        return True
+    empty = sum(1 for p in pages if p["chars"] < SCANNED_MIN_CHARS)
+    return empty / len(pages) >= SCANNED_PAGE_SHARE
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python pdf_extract.py <file.pdf> [workers]")
+        sys.exit(1)
+
+    pdf_path = sys.argv[1]
+    n_workers = int(sys.argv[2]) if len(sys.argv) > 2 else PDF_WORKERS
+    started = time.perf_counter()
+    result = extract_pdf(pdf_path, n_workers)
+    elapsed = time.perf_counter() - started
+    headings = sum(p["markdown"].count("\n#") + p["markdown"].startswith("#") for p in result)
+    print(f"📄 {len(result)} pages with {choose_backend()} on {n_workers} workers in {elapsed:.2f}s "
+          f"({len(result) / elapsed:.1f} pages/sec), {headings} headings"
+          + (" — looks scanned" if looks_scanned(result) else ""))
@@ -0,0 +1,212 @@
+import re
+from bisect import bisect_right
+from collections import deque
+
+from bs4 import NavigableString, Comment, CData, Declaration, Doctype, ProcessingInstruction
+
+# Server-side phrase highlighting for generate-map.py mirrors.
+#
+#   found = highlight_phrases(soup, soup.body, [m["phrase"] for m in matches])
+#   # found[i] is True when matches[i] got a <span class="sl-smart-link" data-match-index="i">
+#
+# The page's text nodes are joined into one normalized stream (whitespace
+# collapsed, lowercased, nodes separated by a space the way get_text(" ",
+# strip=True) joins them - which is how the phrases were extracted) and all
+# phrases are found in a single Aho-Corasick pass over it. Each phrase is
+# wrapped at its first occurrence; a phrase crossing inline markup
+# (<strong>, <em>, ...) gets one span per text node, all with the same
+# match index. Text inside links and buttons is never wrapped: an occurrence
+# that lies entirely inside one does not count (a later one can still be
+# wrapped, otherwise found[i] stays False), and script/style content breaks
+# the stream so nothing matches across it.
+
+MATCH_CLASS = "sl-smart-link"
+NO_WRAP_TAGS = {"a", "button"}
+SKIP_TAGS = {"script", "style", "noscript", "template", "textarea", "title", "head"}
+SKIP_STRING_TYPES = (Comment, CData, Declaration, Doctype, ProcessingInstruction)
+
+# Never appears in a normalized phrase, so no match can cross it
+BREAK = "\x00"
+_WHITESPACE = re.compile(r"\s+")
+_WORD = re.compile(r"\S+")
+
+
+def normalize_phrase(text):
+    return _WHITESPACE.sub(" ", text).strip().lower()
+
+
+class AhoCorasick:
+    """
+    Multi-pattern matcher: finditer(text) yields (start, end, pattern_id) for
+    every occurrence of every pattern in one pass over text.
+    """
+
+    def __init__(self, patterns):
+        self.goto = [{}]
+        self.fail = [0]
+        self.out = [[]]
+        self.lengths = []
+        for pattern_id, pattern in enumerate(patterns):
+            self.lengths.append(len(pattern))
+            if not pattern:
+                continue
+            state = 0
+            for ch in pattern:
+                nxt = self.goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(self.goto)
+                    self.goto[state][ch] = nxt
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.out.append([])
+                state = nxt
+            self.out[state].append(pattern_id)
+
+        # Breadth-first failure links; outputs inherit along them
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self.goto[state].items():
+                queue.append(nxt)
+                f = self.fail[state]
+                while f and ch not in self.goto[f]:
+                    f = self.fail[f]
+                self.fail[nxt] = self.goto[f].get(ch, 0) if state else 0
+                self.out[nxt] = self.out[nxt] + self.out[self.fail[nxt]]
+
+    def finditer(self, text):
+        goto, fail, out, lengths = self.goto, self.fail, self.out, self.lengths
+        state = 0
+        for pos, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            for pattern_id in out[state]:
+                yield pos + 1 - lengths[pattern_id], pos + 1, pattern_id
+
+
+def _text_nodes(element, can_wrap=True):
+    """
+    (node, wrappable) for each visible text node under element, or (None,
+    False) where skipped content (script, style, ...) interrupts the text.
+    """
+    for child in element.children:
+        if isinstance(child, NavigableString):
+            if not isinstance(child, SKIP_STRING_TYPES):
+                yield child, can_wrap
+        elif child.name in SKIP_TAGS:
+            yield None, False
+        else:
+            yield from _text_nodes(child, can_wrap and child.name not in NO_WRAP_TAGS)
+
+
+def _build_stream(root):
+    """
+    Normalized text of root, the text nodes in it and where each node's
+    normalized text starts in the stream.
+    """
+    pieces, nodes, wrappable, starts = [], [], [], []
+    length, last = 0, BREAK
+    for node, can_wrap in _text_nodes(root):
+        if node is None:
+            if last != BREAK:
+                pieces.append(BREAK)
+                length += 1
+                last = BREAK
+            continue
+        normalized = normalize_phrase(str(node))
+        if not normalized:
+            continue
+        if last != BREAK:
+            pieces.append(" ")
+            length += 1
+        nodes.append(node)
+        wrappable.append(can_wrap)
+        starts.append(length)
+        pieces.append(normalized)
+        length += len(normalized)
+        last = " "
+    return "".join(pieces), nodes, wrappable, starts
+
+
+def _offsets(text):
+    """
+    Original offset in text of each character of normalize_phrase(text).
+    """
+    offsets = []
+    for k, word in enumerate(_WORD.finditer(text)):
+        start, end = word.span()
+        if k:
+            offsets.append(start - 1)
+        for offset in range(start, end):
+            # Lowercasing can change the length (e.g. "İ")
+            offsets.extend([offset] * len(text[offset].lower()))
+    return offsets
+
+
+def _select(occurrences, n_patterns):
+    """
+    First occurrence of each phrase, leftmost-longest, never overlapping.
+    """
+    chosen, used, taken_until = [], set(), -1
+    for start, end, pattern_id in sorted(occurrences, key=lambda o: (o[0], o[0] - o[1])):
+        if pattern_id in used or start < taken_until:
+            continue
+        chosen.append((start, end, pattern_id))
+        used.add(pattern_id)
+        taken_until = end
+        if len(used) == n_patterns:
+            break
+    return chosen
+
+
+def highlight_phrases(soup, root, phrases, match_class=MATCH_CLASS):
+    """
+    Wrap the first occurrence of each phrase under root in
+    <span class=match_class data-match-index=i>. Returns one bool per phrase.
+    """
+    patterns = [normalize_phrase(p or "") for p in phrases]
+    found = [False] * len(phrases)
+    if root is None or not any(patterns):
+        return found
+
+    stream, nodes, wrappable, starts = _build_stream(root)
+    matcher = AhoCorasick(patterns)
+    wrappable_occurrences = (
+        (start, end, pattern_id) for start, end, pattern_id in matcher.finditer(stream)
+        if any(wrappable[bisect_right(starts, start) - 1:bisect_right(starts, end - 1)])
+    )
+    chosen = _select(wrappable_occurrences, sum(1 for p in patterns if p))
+
+    # Per text node: [(start, end, match index)] in original offsets
+    cuts, offset_maps = {}, {}
+    for start, end, pattern_id in chosen:
+        for node_index in range(bisect_right(starts, start) - 1, bisect_right(starts, end - 1)):
+            if not wrappable[node_index]:
+                continue
+            if node_index not in offset_maps:
+                offset_maps[node_index] = _offsets(str(nodes[node_index]))
+            offsets, node_start = offset_maps[node_index], starts[node_index]
+            first = max(start, node_start) - node_start
+            last = min(end, node_start + len(offsets)) - node_start - 1
+            if first <= last:
+                cuts.setdefault(node_index, []).append((offsets[first], offsets[last] + 1, pattern_id))
+                found[pattern_id] = True
+
+    for node_index, spans in cuts.items():
+        node = nodes[node_index]
+        text = str(node)
+        pieces, cursor = [], 0
+        for first, last, pattern_id in sorted(spans):
+            if first > cursor:
+                pieces.append(NavigableString(text[cursor:first]))
+            span = soup.new_tag("span", attrs={"class": match_class, "data-match-index": str(pattern_id)})
+            span.string = text[first:last]
+            pieces.append(span)
+            cursor = last
+        if cursor < len(text):
+            pieces.append(NavigableString(text[cursor:]))
+        for piece in pieces:
+            node.insert_before(piece)
+        node.extract()
+    return found
@@ -0,0 +1,257 @@
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from instrumentation import record
+
+# Staged, backpressured pipeline for the seeders.
+#
+#   pipe = Pipeline([
+#       Stage("fetch", fetch_page, min_interval=2.0),
+#       Stage("extract", extract_page, concurrency=2),
+#       Stage("chunk", chunk_page, fan_out=True),
+#       Stage("embed", embed_chunks, concurrency=4, batch_size=32),
+#       Stage("write", write_chunks, batch_size=10),
+#   ])
+#   errors = stage_errors(pipe.run(start_urls))    # {"embed": 2} when batches failed
+#
+# Each stage function takes one item (or a list when batch_size > 1) and
+# returns the item for the next stage. Returning None drops the item; fan_out
+# stages and batch stages return an iterable whose elements go downstream.
+# Plain functions run on a thread pool, async functions on the event loop.
+# Queues between stages are bounded, so a slow stage stalls the ones before
+# it instead of buffering the whole crawl in memory.
+
+DEFAULT_QUEUE_SIZE = 64
+SAMPLE_INTERVAL = 0.05
+
+
+def stage_errors(report):
+    """
+    {stage name: errors} for the stages of a run() report that had any.
+    """
+    return {row["stage"]: row["errors"] for row in report if row["errors"]}
+
+
+class Stage:
+    def __init__(self, name, fn, concurrency=1, batch_size=1, fan_out=False,
+                 queue_size=None, min_interval=0.0):
+        self.name = name
+        self.fn = fn
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.fan_out = fan_out or batch_size > 1
+        self.queue_size = queue_size
+        # Minimum seconds between call starts across all workers (politeness)
+        self.min_interval = min_interval
+
+        self.items_in = 0
+        self.items_out = 0
+        self.errors = 0
+        self.calls = 0
+        self.busy_seconds = 0.0
+        self.depth_samples = 0
+        self.depth_total = 0
+        self.depth_max = 0
+        self._next_start = 0.0
+
+    def stats(self, wall_seconds):
+        capacity = wall_seconds * self.concurrency
+        return {
+            "stage": self.name,
+            "workers": self.concurrency,
+            "in": self.items_in,
+            "out": self.items_out,
+            "errors": self.errors,
+            "calls": self.calls,
+            "busy_seconds": round(self.busy_seconds, 3),
+            "utilization": round(self.busy_seconds / capacity, 3) if capacity else 0.0,
+            "avg_queue": round(self.depth_total / self.depth_samples, 1) if self.depth_samples else 0.0,
+            "max_queue": self.depth_max,
+        }
+
+
+class Pipeline:
+    def __init__(self, stages, queue_size=DEFAULT_QUEUE_SIZE, name="pipeline"):
+        self.stages = stages
+        self.queue_size = queue_size
+        self.name = name
+        self.wall_seconds = 0.0
+        self._loop = None
+        self._queues = []
+        self._pending = 0
+        self._idle = None
+
+    # --- Public API ---
+
+    def run(self, items=()):
+        """
+        Feeds items into the first stage and blocks until every stage drains.
+        Returns the per-stage stats (also printed).
+        """
+        return asyncio.run(self._run(items))
+
+    def submit(self, item):
+        """
+        Adds more work to the first stage while the pipeline is running
+        (e.g. links discovered by a fetch stage). Safe to call from stage
+        functions running on worker threads.
+        """
+        if self._loop is None:
+            raise RuntimeError("Pipeline is not running")
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self._loop:
+            self._put_first(item)
+        else:
+            # Scheduled before the calling stage's completion callback, so the
+            # pipeline can never look idle in between
+            self._loop.call_soon_threadsafe(self._put_first, item)
+
+    def report(self):
+        rows = [s.stats(self.wall_seconds) for s in self.stages]
+        print(f"\n📊 {self.name} report ({self.wall_seconds:.1f}s)")
+        print(f"   {'stage':<12}{'workers':>8}{'in':>7}{'out':>7}{'err':>5}{'busy%':>8}{'avg q':>8}{'max q':>7}")
+        for r in rows:
+            print(f"   {r['stage']:<12}{r['workers']:>8}{r['in']:>7}{r['out']:>7}{r['errors']:>5}"
+                  f"{r['utilization'] * 100:>7.0f}%{r['avg_queue']:>8}{r['max_queue']:>7}")
+        bottleneck = max(rows, key=lambda r: r["utilization"], default=None)
+        if bottleneck and bottleneck["utilization"] > 0:
+            print(f"   🐢 Bottleneck: {bottleneck['stage']} ({bottleneck['utilization'] * 100:.0f}% busy)")
+        return rows
+
+    # --- Internals ---
+
+    def _put_first(self, item):
+        # The first queue is the frontier and is unbounded, so this never blocks
+        self._pending += 1
+        self._queues[0].put_nowait(item)
+
+    def _done_one(self):
+        self._pending -= 1
+        if self._pending == 0:
+            self._idle.set()
+
+    async def _call(self, executor, stage, arg):
+        if asyncio.iscoroutinefunction(stage.fn):
+            result = await stage.fn(arg)
+            if stage.fan_out and result is not None:
+                result = list(result)
+            return result
+
+        fn = stage.fn
+        if stage.fan_out:
+            # Materialise generators on the worker thread, not the event loop
+            def fn(x, _fn=stage.fn):
+                out = _fn(x)
+                return list(out) if out is not None else None
+        return await self._loop.run_in_executor(executor, fn, arg)
+
+    async def _pace(self, stage):
+        if not stage.min_interval:
+            return
+        now = time.monotonic()
+        start_at = max(now, stage._next_start)
+        stage._next_start = start_at + stage.min_interval
+        if start_at > now:
+            await asyncio.sleep(start_at - now)
+
+    async def _worker(self, executor, index):
+        stage = self.stages[index]
+        inq = self._queues[index]
+        outq = self._queues[index + 1] if index + 1 < len(self._queues) else None
+
+        while True:
+            batch = [await inq.get()]
+            while len(batch) < stage.batch_size:
+                try:
+                    batch.append(inq.get_nowait())
+                except asyncio.QueueEmpty:
+                    break
+            stage.items_in += len(batch)
+
+            try:
+                await self._pace(stage)
+                started = time.perf_counter()
+                try:
+                    arg = batch if stage.batch_size > 1 else batch[0]
+                    result = await self._call(executor, stage, arg)
+                finally:
+                    elapsed = time.perf_counter() - started
+                    stage.busy_seconds += elapsed
+                    stage.calls += 1
+                    record(f"stage.{stage.name}", elapsed)
+
+                if result is None:
+                    outputs = []
+                elif stage.fan_out:
+                    outputs = result
+                else:
+                    outputs = [result]
+
+                for out in outputs:
+                    if out is None:
+                        continue
+                    stage.items_out += 1
+                    if outq is not None:
+                        self._pending += 1
+                        await outq.put(out)
+            except Exception as e:
+                stage.errors += 1
+                print(f"   ❌ [{stage.name}] {e}")
+            finally:
+                for _ in batch:
+                    inq.task_done()
+                    self._done_one()
+
+    async def _monitor(self):
+        while True:
+            for stage, q in zip(self.stages, self._queues):
+                depth = q.qsize()
+                stage.depth_samples += 1
+                stage.depth_total += depth
+                stage.depth_max = max(stage.depth_max, depth)
+            await asyncio.sleep(SAMPLE_INTERVAL)
+
+    async def _run(self, items):
+        self._loop = asyncio.get_running_loop()
+        self._idle = asyncio.Event()
+        self._pending = 0
+        self._queues = [asyncio.Queue()] + [
+            asyncio.Queue(maxsize=s.queue_size or self.queue_size) for s in self.stages[1:]
+        ]
+
+        executor = ThreadPoolExecutor(
+            max_workers=sum(s.concurrency for s in self.stages),
+            thread_name_prefix=self.name,
+        )
+        started = time.perf_counter()
+        tasks = [asyncio.create_task(self._monitor())]
+        for index, stage in enumerate(self.stages):
+            for _ in range(stage.concurrency):
+                tasks.append(asyncio.create_task(self._worker(executor, index)))
+
+        try:
+            if hasattr(items, "__aiter__"):
+                async for item in items:
+                    self._put_first(item)
+            else:
+                for item in items:
+                    self._put_first(item)
+                    # Let workers start while a slow iterator is still producing
+                    await asyncio.sleep(0)
+
+            if self._pending:
+                self._idle.clear()
+                await self._idle.wait()
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            executor.shutdown(wait=True)
+            self.wall_seconds = time.perf_counter() - started
+            self._loop = None
+
+        return self.report()
@@ -0,0 +1,493 @@
+import os
+import sys
+import json
+import time
+import heapq
+import asyncio
+import argparse
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from dotenv import load_dotenv
+from instrumentation import span, count
+from embedding_scheduler import ScheduledEmbedding
+
+# Optional: numpy turns a provider search into one matrix-vector product
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+# Local knowledge search with each provider's vectors held in RAM.
+#
+#   python retrieval_service.py --port 8765 --preload 12
+#   curl -s localhost:8765/search -d '{"provider_id": 12, "query": "What is SEIS?", "match_count": 3}'
+#
+# Same data and parameters as the match_provider_knowledge RPC
+# (match_threshold, match_count, provider_id / filter_provider_id), but the
+# provider's provider_knowledge rows are loaded once and searched in process:
+# cosine similarity is a dot product against an L2-normalised float32 matrix,
+# top-k via argpartition. Searches that queue up behind a running one are
+# scored together as one matrix product (up to SEARCH_BATCH), which reads the
+# provider's matrix once instead of once per query. Results carry the chunk plus its document's title,
+# source_url and media_type and the chunk's timestamps (video/audio seeders).
+# Text queries are embedded once and kept in an LRU (QUERY_CACHE_SIZE);
+# concurrent misses for the same text share one embeddings call.
+#
+#   POST /search   {"provider_id", "query" | "query_embedding", "match_threshold", "match_count"}
+#   POST /reload   {"provider_id"}       re-read the provider after a seeder run
+#   GET  /stats    index sizes, cache hit rate, p50/p95/p99 service time
+#   GET  /health
+#
+# bench/retrieval_load.py is the concurrent load test.
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+load_dotenv(os.path.join(parent_dir, '.env'))
+
+RETRIEVAL_HOST = os.getenv("RETRIEVAL_HOST", "127.0.0.1")
+RETRIEVAL_PORT = int(os.getenv("RETRIEVAL_PORT", "8765"))
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "10000"))
+SEARCH_WORKERS = int(os.getenv("SEARCH_WORKERS", str(os.cpu_count() or 4)))
+SEARCH_BATCH = int(os.getenv("SEARCH_BATCH", "32"))
+# Below this many queries, separate matrix-vector products are faster than one GEMM
+GEMM_MIN_BATCH = 4
+EMBED_MODEL = "text-embedding-3-small"
+
+DEFAULT_THRESHOLD = 0.5
+DEFAULT_COUNT = 5
+MAX_COUNT = 100
+PAGE_SIZE = 1000
+LATENCY_WINDOW = 10000
+
+_supabase = None
+
+
+def get_supabase():
+    """
+    Created on first load, so synthetic indexes (the load test) need no keys.
+    """
+    global _supabase
+    if _supabase is None:
+        from supabase import create_client
+        url = os.getenv("SUPABASE_URL") or os.getenv("PLASMO_PUBLIC_SUPABASE_URL")
+        _supabase = create_client(url, os.getenv("SUPABASE_SERVICE_ROLE_KEY"))
+    return _supabase
+
+
+def parse_vector(value):
+    # PostgREST returns pgvector columns as "[0.1,0.2,...]"
+    if isinstance(value, str):
+        return json.loads(value)
+    return value
+
+
+def _select_all(query_fn):
+    rows, start = [], 0
+    while True:
+        page = query_fn().range(start, start + PAGE_SIZE - 1).execute().data or []
+        rows.extend(page)
+        if len(page) < PAGE_SIZE:
+            return rows
+        start += PAGE_SIZE
+
+
+def load_provider(provider_id):
+    """
+    (knowledge rows, {document_id: document}) for one provider, from Supabase.
+    """
+    supabase = get_supabase()
+    with span("db.select.provider_knowledge"):
+        rows = _select_all(lambda: supabase.table("provider_knowledge")
+                           .select("id, document_id, content, metadata, embedding")
+                           .eq("provider_id", provider_id).order("id"))
+    with span("db.select.provider_documents"):
+        docs = _select_all(lambda: supabase.table("provider_documents")
+                           .select("id, title, source_url, media_type")
+                           .eq("provider_id", provider_id).order("id"))
+    return rows, {doc["id"]: doc for doc in docs}
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+class ProviderIndex:
+    """
+    One provider's chunks: unit-length vectors plus what a result needs.
+    """
+
+    def __init__(self, provider_id, rows, documents):
+        self.provider_id = provider_id
+        self.loaded_at = time.time()
+        self.rows = []
+        vectors = []
+        for row in rows:
+            vector = parse_vector(row.get("embedding"))
+            if vector is None or len(vector) == 0:
+                continue
+            meta = row.get("metadata") or {}
+            doc = documents.get(row.get("document_id")) or {}
+            self.rows.append({
+                "id": row["id"],
+                "document_id": row.get("document_id"),
+                "provider_id": provider_id,
+                "content": row.get("content"),
+                "metadata": meta,
+                "title": doc.get("title") or meta.get("title") or "",
+                "source_url": doc.get("source_url") or meta.get("source") or meta.get("source_url") or "",
+                "media_type": doc.get("media_type") or "",
+                "timestamp_start": meta.get("timestampStart"),
+                "timestamp_end": meta.get("timestampEnd"),
+            })
+            vectors.append(vector)
+
+        if NUMPY_AVAILABLE and vectors:
+            matrix = np.asarray(vectors, dtype=np.float32)
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            self.matrix = matrix / norms
+        else:
+            self.matrix = [self._unit(v) for v in vectors]
+
+    @staticmethod
+    def _unit(vector):
+        norm = sum(x * x for x in vector) ** 0.5 or 1.0
+        return [x / norm for x in vector]
+
+    def __len__(self):
+        return len(self.rows)
+
+    def search(self, vector, k=DEFAULT_COUNT, threshold=DEFAULT_THRESHOLD):
+        """
+        [(similarity, row)] best first, at most k, all >= threshold.
+        """
+        return self.search_many([(vector, k, threshold)])[0]
+
+    def search_many(self, queries):
+        """
+        search() for several (vector, k, threshold) at once, one matrix product.
+        """
+        if not self.rows:
+            return [[] for _ in queries]
+        if not NUMPY_AVAILABLE:
+            return [self._search_python(*query) for query in queries]
+
+        batch = np.asarray([vector for vector, _, _ in queries], dtype=np.float32)
+        norms = np.linalg.norm(batch, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        batch /= norms
+        if len(queries) >= GEMM_MIN_BATCH:
+            all_scores = (self.matrix @ batch.T).T
+        else:
+            all_scores = [self.matrix @ query for query in batch]
+
+        results = []
+        for scores, (_, k, threshold) in zip(all_scores, queries):
+            k = max(1, min(k, len(scores)))
+            if k < len(scores):
+                top = np.argpartition(-scores, k - 1)[:k]
+            else:
+                top = np.arange(len(scores))
+            top = top[np.argsort(-scores[top])]
+            results.append([(float(scores[i]), self.rows[i]) for i in top if scores[i] >= threshold])
+        return results
+
+    def _search_python(self, vector, k, threshold):
+        query = self._unit(vector)
+        scored = ((sum(a * b for a, b in zip(query, v)), i) for i, v in enumerate(self.matrix))
+        return [(s, self.rows[i]) for s, i in heapq.nlargest(k, scored) if s >= threshold]
+
+
+class SearchBatcher:
+    """
+    Coalesces concurrent searches on one index. An idle batcher runs a search
+    straight away; while workers are busy, new searches wait and go out
+    together in the next search_many call.
+    """
+
+    def __init__(self, index, pool, workers=SEARCH_WORKERS, max_batch=SEARCH_BATCH):
+        self.index = index
+        self.pool = pool
+        self.workers = workers
+        self.max_batch = max_batch
+        self.queue = []
+        self.running = 0
+        self.batches = 0
+        self.batched = 0
+
+    async def search(self, vector, k, threshold):
+        future = asyncio.get_running_loop().create_future()
+        self.queue.append((vector, k, threshold, future))
+        if self.running < self.workers:
+            self.running += 1
+            asyncio.create_task(self._drain())
+        return await future
+
+    async def _drain(self):
+        loop = asyncio.get_running_loop()
+        try:
+            while self.queue:
+                batch = self.queue[:self.max_batch]
+                del self.queue[:self.max_batch]
+                try:
+                    results = await loop.run_in_executor(
+                        self.pool, self.index.search_many, [(v, k, t) for v, k, t, _ in batch]
+                    )
+                except Exception as e:
+                    for *_, future in batch:
+                        if not future.done():
+                            future.set_exception(e)
+                    continue
+                self.batches += 1
+                self.batched += len(batch)
+                for (*_, future), result in zip(batch, results):
+                    if not future.done():
+                        future.set_result(result)
+        finally:
+            self.running -= 1
+
+
+class QueryEmbeddingCache:
+    """
+    LRU of query text -> embedding. Concurrent misses for one text share a call.
+    """
+
+    def __init__(self, embed_fn, size=QUERY_CACHE_SIZE):
+        self.embed_fn = embed_fn
+        self.size = size
+        self.entries = OrderedDict()
+        self.pending = {}
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(text):
+        return " ".join(text.split())
+
+    async def get(self, text):
+        key = self.key(text)
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            count("retrieval.query_cache.hit")
+            return self.entries[key], True
+        if key in self.pending:
+            self.hits += 1
+            return await asyncio.shield(self.pending[key]), True
+
+        self.misses += 1
+        count("retrieval.query_cache.miss")
+        future = asyncio.get_running_loop().run_in_executor(None, self.embed_fn, key)
+        self.pending[key] = future
+        try:
+            vector = await future
+        finally:
+            self.pending.pop(key, None)
+        self.entries[key] = vector
+        if len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+        return vector, False
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "size": len(self.entries),
+            "capacity": self.size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
+
+
+class RetrievalService:
+    def __init__(self, loader=load_provider, embed_fn=None, cache_size=QUERY_CACHE_SIZE, workers=SEARCH_WORKERS):
+        if embed_fn is None:
+            embed_fn = ScheduledEmbedding(model=EMBED_MODEL).get_query_embedding
+        self.loader = loader
+        self.cache = QueryEmbeddingCache(embed_fn, cache_size)
+        self.indexes = {}
+        self.batchers = {}
+        self.locks = {}
+        self.workers = workers
+        # numpy releases the GIL in the matrix product, so searches use every core
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="search")
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.searches = 0
+
+    async def index(self, provider_id, reload=False):
+        lock = self.locks.setdefault(provider_id, asyncio.Lock())
+        async with lock:
+            if reload or provider_id not in self.indexes:
+                started = time.perf_counter()
+                loop = asyncio.get_running_loop()
+                rows, documents = await loop.run_in_executor(self.pool, self.loader, provider_id)
+                index = await loop.run_in_executor(self.pool, ProviderIndex, provider_id, rows, documents)
+                self.indexes[provider_id] = index
+                self.batchers[provider_id] = SearchBatcher(index, self.pool, self.workers)
+                print(f"📚 Provider {provider_id}: {len(index)} chunks in RAM "
+                      f"({time.perf_counter() - started:.1f}s)")
+            return self.indexes[provider_id]
+
+    async def search(self, provider_id, query=None, query_embedding=None,
+                     threshold=DEFAULT_THRESHOLD, k=DEFAULT_COUNT):
+        started = time.perf_counter()
+        await self.index(provider_id)
+        cached = None
+        if query_embedding is None:
+            query_embedding, cached = await self.cache.get(query)
+        k = max(1, min(int(k), MAX_COUNT))
+        hits = await self.batchers[provider_id].search(query_embedding, k, float(threshold))
+        took = time.perf_counter() - started
+        self.latencies.append(took)
+        self.searches += 1
+        count("retrieval.searches")
+        return {
+            "matches": [dict(row, similarity=round(score, 6)) for score, row in hits],
+            "took_ms": round(took * 1000, 3),
+            "embedding_cached": cached,
+        }
+
+    def stats(self):
+        window = list(self.latencies)
+        return {
+            "providers": {str(pid): len(index) for pid, index in self.indexes.items()},
+            "avg_batch": round(
+                sum(b.batched for b in self.batchers.values()) / max(1, sum(b.batches for b in self.batchers.values())), 2
+            ),
+            "searches": self.searches,
+            "query_cache": self.cache.stats(),
+            "service_ms": {
+                "p50": round(percentile(window, 50) * 1000, 3),
+                "p95": round(percentile(window, 95) * 1000, 3),
+                "p99": round(percentile(window, 99) * 1000, 3),
+            },
+            "numpy": NUMPY_AVAILABLE,
+        }
+
+    # --- HTTP ---
+
+    async def route(self, method, path, body):
+        if method == "GET" and path == "/health":
+            return 200, {"ok": True}
+        if method == "GET" and path == "/stats":
+            return 200, self.stats()
+        if method != "POST" or path not in ("/search", "/reload"):
+            return 404, {"error": f"no route for {method} {path}"}
+
+        try:
+            payload = json.loads(body or b"{}")
+            provider_id = int(payload.get("provider_id") or payload.get("filter_provider_id"))
+        except (ValueError, TypeError):
+            return 400, {"error": "JSON body with provider_id required"}
+
+        if path == "/reload":
+            index = await self.index(provider_id, reload=True)
+            return 200, {"provider_id": provider_id, "chunks": len(index)}
+
+        query, vector = payload.get("query"), payload.get("query_embedding")
+        if not query and not vector:
+            return 400, {"error": "query or query_embedding required"}
+        result = await self.search(
+            provider_id, query=query, query_embedding=parse_vector(vector) if vector else None,
+            threshold=payload.get("match_threshold", DEFAULT_THRESHOLD),
+            k=payload.get("match_count", DEFAULT_COUNT),
+        )
+        return 200, result
+
+    async def handle(self, reader, writer):
+        """
+        Minimal HTTP/1.1 with keep-alive; enough for the widget API and the load test.
+        """
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, target, _ = request_line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get("content-length") or 0)
+                body = await reader.readexactly(length) if length else b""
+
+                if method == "OPTIONS":
+                    status, payload = 204, None
+                else:
+                    try:
+                        status, payload = await self.route(method, urlsplit(target).path, body)
+                    except Exception as e:
+                        print(f"   ❌ {method} {target}: {e}")
+                        status, payload = 500, {"error": str(e)}
+
+                data = b"" if payload is None else json.dumps(payload).encode()
+                keep_alive = headers.get("connection", "").lower() != "close"
+                writer.write(
+                    f"HTTP/1.1 {status} {'OK' if status < 400 else 'Error'}\r\n"
+                    "Content-Type: application/json\r\n"
+                    "Access-Control-Allow-Origin: *\r\n"
+                    "Access-Control-Allow-Headers: Content-Type\r\n"
+                    f"Content-Length: {len(data)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode() + data
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host=RETRIEVAL_HOST, port=RETRIEVAL_PORT, preload=(), ready=None):
+        for provider_id in preload:
+            await self.index(provider_id)
+        server = await asyncio.start_server(self.handle, host, port)
+        bound = server.sockets[0].getsockname()[1]
+        print(f"🔎 Retrieval service on http://{host}:{bound}")
+        if ready is not None:
+            ready(bound)
+        async with server:
+            await server.serve_forever()
+
+
+def start_in_thread(service, host="127.0.0.1", port=0, preload=()):
+    """
+    Runs the service on its own event loop in a daemon thread. Returns the port.
+    """
+    bound = []
+    started = threading.Event()
+
+    def ready(p):
+        bound.append(p)
+        started.set()
+
+    threading.Thread(
+        target=lambda: asyncio.run(service.serve(host, port, preload, ready)), daemon=True
+    ).start()
+    started.wait()
+    return bound[0]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="In-memory knowledge search over provider_knowledge.")
+    parser.add_argument("--host", default=RETRIEVAL_HOST)
+    parser.add_argument("--port", type=int, default=RETRIEVAL_PORT)
+    parser.add_argument("--preload", type=int, action="append", default=[], help="provider id to load at startup")
+    args = parser.parse_args()
+
+    if not NUMPY_AVAILABLE:
+        print("⚠️  numpy not installed: falling back to pure-Python scoring (pip install numpy)")
+    try:
+        asyncio.run(RetrievalService().serve(args.host, args.port, args.preload))
+    except KeyboardInterrupt:
+        sys.exit(0)
@@ -1,15 +1,25 @@
 import os
 import sys
-import json
-import nest_asyncio
+import time
+import threading
+from concurrent.futures import ProcessPoolExecutor
 from dotenv import load_dotenv
-from llama_parse import LlamaParse  # <--- NEW IMPORT
+from llama_index.core import Document
 from llama_index.core.node_parser import MarkdownNodeParser
-from llama_index.embeddings.openai import OpenAIEmbedding
+from embedding_scheduler import ScheduledEmbedding
 from supabase import create_client, Client
-
-# 0. Apply nest_asyncio (Required for LlamaParse in some envs)
-nest_asyncio.apply()
+from instrumentation import span, count, count_tokens, record
+from staged_knowledge import insert_knowledge
+from pdf_extract import PDF_WORKERS, choose_backend, extract_range, page_ranges, probe_scanned
+from pipeline import Pipeline, Stage, stage_errors
+
+# Optional: LlamaParse (cloud) is only needed for scanned PDFs or --cloud
+try:
+    import nest_asyncio
+    from llama_parse import LlamaParse
+    LLAMAPARSE_AVAILABLE = True
+except ImportError:
+    LLAMAPARSE_AVAILABLE = False
 
 # 1. Load Environment Variables
 load_dotenv()
@@ -19,99 +29,206 @@ SUPABASE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 LLAMA_CLOUD_API_KEY = os.getenv("LLAMA_CLOUD_API_KEY") # <--- NEW KEY
 
-if not SUPABASE_URL or not SUPABASE_KEY or not LLAMA_CLOUD_API_KEY:
-    print("Error: Missing keys (Supabase or LlamaCloud) in .env")
+if not SUPABASE_URL or not SUPABASE_KEY:
+    print("Error: Missing Supabase keys in .env")
     sys.exit(1)
 
 # 2. Initialize Clients
 supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
-embed_model = OpenAIEmbedding(model="text-embedding-3-small")
+embed_model = ScheduledEmbedding(model="text-embedding-3-small")
 
-def seed_pdf(file_path: str, provider_id: int):
-    print(f"🔵 Starting LlamaParse Ingest for: {file_path}")
-    
-    if not os.path.exists(file_path):
-        print(f"❌ File not found: {file_path}")
-        return
+# Chunks per embeddings call / per insert
+EMBED_BATCH = 64
+WRITE_BATCH = 50
+
+def parse_with_llamaparse(file_path):
+    """
+    Cloud parse. Slow and needs LLAMA_CLOUD_API_KEY, but OCRs scanned pages.
+    """
+    if not LLAMAPARSE_AVAILABLE or not LLAMA_CLOUD_API_KEY:
+        print("❌ LlamaParse fallback needs llama-parse installed and LLAMA_CLOUD_API_KEY set.")
+        return []
+
+    # Required for LlamaParse in some envs
+    nest_asyncio.apply()
 
-    # --- Step 1: Parse PDF with LlamaParse (Cloud) ---
     # result_type="markdown" is best for RAG because it keeps structure
     parser = LlamaParse(
         api_key=LLAMA_CLOUD_API_KEY,
         result_type="markdown",
         verbose=True
     )
-    
+
     # This sends the file to the cloud and returns parsed markdown text
-    documents = parser.load_data(file_path)
+    with span("parse.llamaparse"):
+        documents = parser.load_data(file_path)
     print(f"   ✅ LlamaParse returned {len(documents)} document objects.")
-
-    # --- Step 2: Create 'provider_documents' Record ---
-    file_name = os.path.basename(file_path)
-    
+    return documents
+
+def page_documents(pages, file_name):
+    """
+    Local pages -> one markdown Document per page, page_number in metadata.
+    """
+    return [
+        Document(text=page["markdown"], metadata={"file_name": file_name, "page_number": page["page_number"]})
+        for page in pages
+        if page["markdown"].strip()
+    ]
+
+def create_document(file_path, provider_id):
+    """
+    provider_documents row for the PDF. Returns its id or None.
+    """
     document_payload = {
         "provider_id": provider_id,
-        "title": file_name,
+        "title": os.path.basename(file_path),
         "source_url": file_path, 
         "media_type": "pdf"
     }
 
     try:
-        response = supabase.table("provider_documents").insert(document_payload).execute()
-        new_doc = response.data[0]
-        document_id = new_doc['id']
+        with span("db.insert.provider_documents"):
+            response = supabase.table("provider_documents").insert(document_payload).execute()
+        document_id = response.data[0]['id']
         print(f"   ✅ Created Document ID: {document_id}")
+        return document_id
     except Exception as e:
         print(f"❌ Error inserting document: {e}")
-        return
-
-    # --- Step 3: Chunking (Specialized for Markdown) ---
-    # Since LlamaParse gives us Markdown, we use MarkdownNodeParser 
-    # This chunks intelligently by headers (#, ##) rather than just random sentences.
-    node_parser = MarkdownNodeParser()
-    nodes = node_parser.get_nodes_from_documents(documents)
-    
-    print(f"   ⚡ Split into {len(nodes)} semantic chunks...")
-
-    knowledge_rows = []
-
-    for i, node in enumerate(nodes):
+        return None
+
+def chunk_document(document, provider_id, document_id):
+    """
+    One page (or LlamaParse document) -> knowledge rows awaiting embeddings.
+    MarkdownNodeParser chunks by headers (#, ##) rather than random sentences,
+    and carries the page's metadata (page_number) onto every node.
+    """
+    with span("chunk.markdown"):
+        nodes = MarkdownNodeParser().get_nodes_from_documents([document])
+
+    rows = []
+    for node in nodes:
         content = node.get_content()
-        
         if not content.strip():
             continue # Skip empty chunks
-
-        # Create Embedding
-        vector = embed_model.get_text_embedding(content)
-        
-        # Extract Metadata
-        metadata = node.metadata 
-        
-        # Prepare Row
-        row = {
+        rows.append({
             "provider_id": provider_id,
             "document_id": document_id,
             "content": content,
-            "embedding": vector,
-            "metadata": json.loads(json.dumps(metadata))
-        }
-        knowledge_rows.append(row)
-        
-        # Batch Insert (Safety check for large docs)
-        if len(knowledge_rows) >= 10:
-            supabase.table("provider_knowledge").insert(knowledge_rows).execute()
-            sys.stdout.write(f"\r      Inserted chunks {i+1}/{len(nodes)}")
-            sys.stdout.flush()
-            knowledge_rows = []
+            "metadata": dict(node.metadata)
+        })
+    count("chunks", len(rows))
+    return rows
+
+def embed_rows(rows):
+    """
+    One batched embeddings call for many chunks (split and parallelised by the scheduler).
+    """
+    texts = [row["content"] for row in rows]
+    count_tokens("tokens.embedded", texts)
+    with span("embed.openai"):
+        vectors = embed_model.get_text_embedding_batch(texts)
+    for row, vector in zip(rows, vectors):
+        row["embedding"] = vector
+    return rows
+
+def seed_pdf(file_path: str, provider_id: int, use_cloud: bool = False):
+    """
+    Streams the PDF through parse -> chunk -> embed -> write, so the first
+    chunks are in the database while later pages are still being parsed.
+    Returns True only when every chunk was written.
+    """
+    print(f"🔵 Starting PDF Ingest for: {file_path}")
+    
+    if not os.path.exists(file_path):
+        print(f"❌ File not found: {file_path}")
+        return False
+
+    started = time.perf_counter()
+    file_name = os.path.basename(file_path)
 
-    # Insert remaining
-    if knowledge_rows:
-        supabase.table("provider_knowledge").insert(knowledge_rows).execute()
+    # --- Step 1: Decide the parser (local first, LlamaParse for scans) ---
+    documents = None
+    if not use_cloud:
+        try:
+            scanned, total_pages = probe_scanned(file_path)
+        except RuntimeError as e:
+            # Neither local backend is installed
+            print(f"   ⚠️  {e}: falling back to LlamaParse.")
+            use_cloud = True
+        else:
+            count("pdf.pages", total_pages)
+            if scanned:
+                print("   🖼️  First pages have almost no text layer: looks scanned.")
+                use_cloud = True
+            else:
+                print(f"   📄 Parsing {total_pages} pages locally on {PDF_WORKERS} workers...")
+    if use_cloud:
+        print("   ☁️  Using LlamaParse...")
+        documents = parse_with_llamaparse(file_path)
+        if not documents:
+            print("❌ No text extracted.")
+            return False
 
-    print(f"\n✅ Successfully ingested {file_name} using LlamaParse!")
+    # --- Step 2: Create 'provider_documents' Record ---
+    document_id = create_document(file_path, provider_id)
+    if document_id is None:
+        return False
+
+    # --- Step 3: Parse/chunk/embed/write as a pipeline ---
+    first_insert = []
+    written = [0]
+    lock = threading.Lock()
+
+    def write_stage(rows):
+        insert_knowledge(supabase, rows)
+        with lock:
+            if not first_insert:
+                first_insert.append(time.perf_counter() - started)
+            written[0] += len(rows)
+            sys.stdout.write(f"\r      Inserted chunks {written[0]}")
+            sys.stdout.flush()
+        count("rows.written", len(rows))
+        return None
+
+    chunk_stage = Stage("chunk", lambda doc: chunk_document(doc, provider_id, document_id), concurrency=2, fan_out=True)
+    tail = [
+        chunk_stage,
+        Stage("embed", embed_rows, concurrency=4, batch_size=EMBED_BATCH),
+        Stage("write", write_stage, concurrency=2, batch_size=WRITE_BATCH),
+    ]
+
+    if documents is not None:
+        report = Pipeline(tail, name="seed-pdf").run(documents)
+    else:
+        backend = choose_backend()
+        ranges = page_ranges(total_pages, PDF_WORKERS)
+        with ProcessPoolExecutor(max_workers=PDF_WORKERS) as pool:
+            def parse_stage(page_range):
+                with span("parse.local"):
+                    pages = pool.submit(extract_range, file_path, page_range[0], page_range[1], backend).result()
+                return page_documents(pages, file_name)
+
+            # One thread per pool worker keeps every process busy
+            report = Pipeline(
+                [Stage("parse", parse_stage, concurrency=PDF_WORKERS, fan_out=True)] + tail,
+                name="seed-pdf",
+            ).run(ranges)
+
+    total = time.perf_counter() - started
+    if first_insert:
+        record("pdf.time_to_first_insert", first_insert[0])
+        print(f"\n⏱️  First insert after {first_insert[0]:.1f}s, total {total:.1f}s ({written[0]} chunks)")
+    errors = stage_errors(report)
+    if errors:
+        failed = ", ".join(f"{stage}: {n}" for stage, n in errors.items())
+        print(f"\n❌ {file_name} only partly ingested ({written[0]} chunks written; failed batches {failed})")
+        return False
+    print(f"\n✅ Successfully ingested {file_name}!")
+    return True
 
 if __name__ == "__main__":
     if len(sys.argv) < 3:
-        print("Usage: python pdf-seeder.py <path_to_pdf> <provider_id>")
+        print("Usage: python seed-pdf.py <path_to_pdf> <provider_id> [--cloud]")
     else:
-        seed_pdf(sys.argv[1], int(sys.argv[2]))
\ No newline at end of file
+        ok = seed_pdf(sys.argv[1], int(sys.argv[2]), use_cloud="--cloud" in sys.argv[3:])
+        sys.exit(0 if ok else 1)
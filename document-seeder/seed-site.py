@@ -1,14 +1,22 @@
 import os
 import sys
-import time
+import argparse
+import threading
 import cloudscraper  # <--- The magic fix
 import trafilatura
 from bs4 import BeautifulSoup
 from urllib.parse import urljoin
 from dotenv import load_dotenv
 from llama_index.core.node_parser import SentenceSplitter
-from llama_index.embeddings.openai import OpenAIEmbedding
+from embedding_scheduler import ScheduledEmbedding
 from supabase import create_client, Client
+from instrumentation import span, count, count_tokens
+from staged_knowledge import insert_knowledge
+from pipeline import Pipeline, Stage, stage_errors
+from web_chunker import chunk_html
+from crawl_frontier import CrawlFrontier, default_state_path
+from crawl_schedule import CrawlSchedule, START_PRIORITY
+from url_canon import CrawlDeduper, canonicalize, same_site, url_key
 
 # 1. Setup
 load_dotenv()
@@ -21,19 +29,27 @@ if not SUPABASE_URL or not SUPABASE_KEY:
     sys.exit(1)
 
 supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
-embed_model = OpenAIEmbedding(model="text-embedding-3-small")
+embed_model = ScheduledEmbedding(model="text-embedding-3-small")
 
 # Initialize the Scraper (pretends to be a real Desktop Chrome browser)
 scraper = cloudscraper.create_scraper(browser='chrome')
 
+# Seconds between page fetches per host (lower only for local fixtures/benchmarks);
+# a longer robots.txt Crawl-delay wins
+CRAWL_DELAY = float(os.getenv("CRAWL_DELAY", "2.0"))
+
 VISITED_URLS = set()
 
-def get_internal_links(base_url, current_url, html_content):
+def get_internal_links(base_url, current_url, html_content, deduper=None):
+    """
+    Canonical (url_canon.py) links under base_url that haven't been visited.
+    """
     if not html_content:
         return []
         
     soup = BeautifulSoup(html_content, 'html.parser')
     links = set()
+    root = canonicalize(base_url)
     
     for a_tag in soup.find_all('a', href=True):
         href = a_tag['href']
@@ -42,120 +58,434 @@ def get_internal_links(base_url, current_url, html_content):
             continue
 
         full_url = urljoin(current_url, href)
-        full_url = full_url.split('#')[0].split('?')[0]
-        
-        if full_url.endswith('/'):
-            full_url = full_url[:-1]
+        if not full_url.startswith(('http://', 'https://')):
+            continue
+        canonical = canonicalize(full_url, like=base_url)
+        if not same_site(canonical, root):
+            continue
 
-        if full_url.startswith(base_url) and full_url not in VISITED_URLS:
-            links.add(full_url)
+        if deduper:
+            # The old key, to count the fetches canonical URLs save
+            raw = full_url.split('#')[0].split('?')[0]
+            deduper.note_link(raw[:-1] if raw.endswith('/') else raw, canonical)
+            canonical = deduper.link(canonical)
+
+        if canonical not in VISITED_URLS:
+            links.add(canonical)
             
     return links
 
-def ingest_url(url, provider_id):
-    clean_url_check = url[:-1] if url.endswith('/') else url
-    if clean_url_check in VISITED_URLS:
-        return []
+def fetch_text(url):
+    """
+    robots.txt / sitemap fetch. Returns the body (bytes for .gz) or None.
+    """
+    try:
+        with span("http.get"):
+            response = scraper.get(url)
+    except Exception as e:
+        print(f"   ❌ Network Error: {e}")
+        return None
+    if response.status_code != 200:
+        return None
+    return response.content if url.endswith(".gz") else response.text
+
+def already_visited(url):
+    """
+    True when this run already fetched the page under another spelling
+    (see url_canon.url_key), so fetching it again would only duplicate it.
+    """
+    return url_key(canonicalize(url)) in VISITED_URLS
+
+def fetch_page(url, deduper=None):
+    """
+    Stage 1 (network): downloads a page. Returns {"url", "html", "links"} or None
+    (already visited, network error or non-200; check already_visited() first
+    to tell them apart). With a deduper, links are scoped to the crawl root.
+    """
+    if already_visited(url):
+        return None
     
     print(f"🕷️  Crawling: {url}")
-    VISITED_URLS.add(clean_url_check)
+    VISITED_URLS.add(url_key(canonicalize(url)))
 
     # --- CHANGED: Use Cloudscraper instead of Requests ---
     try:
-        response = scraper.get(url) # Handles the 403 logic automatically
+        with span("http.get"):
+            response = scraper.get(url) # Handles the 403 logic automatically
         if response.status_code != 200:
             print(f"   ❌ Status {response.status_code}: Skipping.")
-            return []
+            return None
         html_content = response.text
+        count("pages.fetched")
+        count("bytes.html", len(html_content))
     except Exception as e:
         print(f"   ❌ Network Error: {e}")
-        return []
+        return None
+
+    return {
+        "url": url,
+        "html": html_content,
+        "links": get_internal_links(deduper.root if deduper else url, url, html_content, deduper),
+    }
+
+def extract_page(page):
+    """
+    Stage 2 (CPU): pulls clean text + title out of the HTML.
+    Returns the page dict with "text" and "title", or None if too thin.
+    """
+    html_content = page["html"]
+    url = page["url"]
 
     # Extract Clean Text
-    main_text = trafilatura.extract(html_content, include_comments=False, include_tables=True)
+    with span("extract.trafilatura"):
+        main_text = trafilatura.extract(html_content, include_comments=False, include_tables=True)
     
-    if not main_text:
+    with span("extract.bs4"):
         soup = BeautifulSoup(html_content, 'html.parser')
+    if not main_text:
         for script in soup(["script", "style", "nav", "footer"]):
             script.decompose()
         main_text = soup.get_text(separator=' ', strip=True)
 
     if not main_text or len(main_text) < 50:
         print("   ⚠️  Skipping: Not enough content text found.")
-        return get_internal_links(url, url, html_content)
+        return None
 
-    soup = BeautifulSoup(html_content, 'html.parser')
-    page_title = soup.title.string.strip() if soup.title else url
+    page_title = soup.title.string.strip() if soup.title and soup.title.string else url
+    page["text"] = main_text
+    page["title"] = page_title
+    return page
+
+def create_document(page, provider_id):
+    """
+    Stage 3 (DB): creates the provider_documents row. Returns the page with "document_id".
+    A page resumed from an interrupted crawl already has one: reuse it and
+    drop whatever chunks the interrupted run managed to write.
+    """
+    if page.get("document_id"):
+        print(f"   ♻️  Resuming '{page['title']}' (document {page['document_id']})")
+        try:
+            with span("db.delete.provider_knowledge"):
+                supabase.table("provider_knowledge").delete().eq("document_id", page["document_id"]).execute()
+        except Exception as e:
+            print(f"   ❌ DB Error: {e}")
+            return None
+        return page
 
-    print(f"   📄 Indexing '{page_title}'...")
+    print(f"   📄 Indexing '{page['title']}'...")
     
     doc_payload = {
         "provider_id": provider_id,
-        "title": page_title,
-        "source_url": url,
+        "title": page["title"],
+        "source_url": page["url"],
         "media_type": "web_page"
     }
 
     try:
-        res = supabase.table("provider_documents").insert(doc_payload).execute()
-        document_id = res.data[0]['id']
+        with span("db.insert.provider_documents"):
+            res = supabase.table("provider_documents").insert(doc_payload).execute()
+        page["document_id"] = res.data[0]['id']
     except Exception as e:
         print(f"   ❌ DB Error: {e}")
+        return None
+    return page
+
+def chunk_page(page, provider_id):
+    """
+    Stage 4 (CPU): splits the page along its headings into knowledge rows
+    (without embeddings yet). Falls back to plain sentence splitting when the
+    HTML has no usable structure.
+    """
+    with span("chunk.web_structure"):
+        chunks = chunk_html(page["html"])
+
+    if not chunks:
+        with span("chunk.sentence_splitter"):
+            text_splitter = SentenceSplitter(chunk_size=1024, chunk_overlap=50)
+            chunks = [{"text": node} for node in text_splitter.split_text(page["text"])]
+
+    count("chunks", len(chunks))
+    rows = []
+    for chunk in chunks:
+        metadata = {"source": page["url"]}
+        if "header_path" in chunk:
+            metadata["header_path"] = chunk["header_path"]
+            metadata["section"] = chunk["section"]
+        rows.append({
+            "provider_id": provider_id,
+            "document_id": page["document_id"],
+            "content": chunk["text"],
+            "metadata": metadata
+        })
+    return rows
+
+def embed_rows(rows):
+    """
+    Stage 5 (network): embeds a batch of knowledge rows in one API call.
+    """
+    texts = [row["content"] for row in rows]
+    count_tokens("tokens.embedded", texts)
+    with span("embed.openai"):
+        vectors = embed_model.get_text_embedding_batch(texts)
+    for row, vector in zip(rows, vectors):
+        row["embedding"] = vector
+    return rows
+
+def write_rows(rows):
+    """
+    Stage 6 (DB): inserts a batch of knowledge rows.
+    """
+    insert_knowledge(supabase, rows)
+    count("rows.written", len(rows))
+    return None
+
+def ingest_url(url, provider_id, frontier=None, deduper=None):
+    """
+    Runs one page through every stage in sequence. Returns newly found links.
+    With a frontier, records the page's document id and final status in it;
+    with a deduper, archive/alias/duplicate pages stop before chunking.
+    """
+    if already_visited(url):
+        if frontier:
+            frontier.mark(url, "skipped", "duplicate")
         return []
+    page = fetch_page(url, deduper)
+    if not page:
+        if frontier:
+            frontier.mark(url, "failed")
+        return []
+    links = page["links"]
+    if frontier:
+        page["document_id"] = frontier.document_for(url)
+
+    if not extract_page(page):
+        if frontier:
+            frontier.mark(url, "skipped")
+        return links
+    if deduper and deduper.check(page):
+        if frontier:
+            frontier.mark(url, "skipped", "duplicate")
+        return links
+    if not create_document(page, provider_id):
+        if frontier:
+            frontier.mark(url, "skipped")
+        return links
+    if frontier:
+        frontier.set_document(url, page["document_id"])
 
     # Vectorise
     try:
-        text_splitter = SentenceSplitter(chunk_size=1024, chunk_overlap=50)
-        nodes = text_splitter.split_text(main_text)
-        
-        knowledge_rows = []
-        for node in nodes:
-            vector = embed_model.get_text_embedding(node)
-            row = {
-                "provider_id": provider_id,
-                "document_id": document_id,
-                "content": node,
-                "embedding": vector,
-                "metadata": {"source": url}
-            }
-            knowledge_rows.append(row)
+        knowledge_rows = chunk_page(page, provider_id)
 
         if knowledge_rows:
+            # One embed call per page; the scheduler splits it under the rate limits
+            embed_rows(knowledge_rows)
             batch_size = 10
             for i in range(0, len(knowledge_rows), batch_size):
-                batch = knowledge_rows[i:i + batch_size]
-                supabase.table("provider_knowledge").insert(batch).execute()
+                write_rows(knowledge_rows[i:i + batch_size])
                 
             print(f"   ✅ Saved {len(knowledge_rows)} chunks.")
+        if frontier:
+            frontier.mark(url, "done")
             
     except Exception as e:
          print(f"   ❌ DB/Vector Error: {e}")
+         if frontier:
+             frontier.mark(url, "failed", str(e))
 
-    return get_internal_links(url, url, html_content)
+    return links
 
-def crawl_site(start_url, provider_id):
-    if start_url.endswith('/'):
-        start_url = start_url[:-1]
-        
+def open_frontier(start_url, provider_id, schedule, state_path=None, fresh=False, refresh=False, **bounds):
+    """
+    Opens (or resumes) the crawl state for this site + provider and seeds it
+    with the start URL and, in sitemap mode, the sitemap URLs.
+    """
+    path = state_path or default_state_path(start_url, provider_id)
+    if fresh and os.path.exists(path):
+        os.remove(path)
+    frontier = CrawlFrontier(path, **bounds)
+    frontier.add(start_url, depth=0, priority=START_PRIORITY)
+    schedule.seed(frontier, refresh=refresh)
+
+    stats = frontier.stats()
+    if stats["done"] or frontier.resumed or frontier.retried:
+        print(f"💾 Resuming from {path}: {stats['done']} done, {stats['queued']} queued "
+              f"({frontier.resumed} were in flight, {frontier.retried} failed before)")
+    else:
+        print(f"💾 Crawl state: {path}")
+    return frontier
+
+def queue_links(frontier, schedule, links, depth):
+    for link in links:
+        if schedule.allowed(link):
+            frontier.add(link, depth, schedule.priority(link, depth))
+
+def report_frontier(frontier):
+    stats = frontier.stats()
+    print(f"\n📋 Frontier: " + ", ".join(f"{n} {status}" for status, n in stats.items()))
+
+def crawl_site(start_url, provider_id, sitemaps=False, **frontier_args):
+    """
+    Sequential crawl: one page at a time, fetch through insert. Links are
+    followed in discovery order, or best-score first with sitemaps.
+    """
     print(f"🚀 Starting Cloudscraper Crawl for: {start_url}")
     
-    queue = [start_url]
-    
-    while queue:
-        current_url = queue.pop(0)
-        found_links = ingest_url(current_url, provider_id)
-        
-        for link in found_links:
-            check_link = link[:-1] if link.endswith('/') else link
-            if check_link not in VISITED_URLS and link not in queue:
-                queue.append(link)
-        
-        time.sleep(2.0) # increased sleep slightly to be safer
+    start_url = canonicalize(start_url)
+    schedule = CrawlSchedule(start_url, fetch_text, CRAWL_DELAY, use_sitemaps=sitemaps)
+    frontier = open_frontier(start_url, provider_id, schedule, **frontier_args)
+    deduper = CrawlDeduper(start_url, frontier)
+    try:
+        while True:
+            item = frontier.next()
+            if item is None:
+                break
+            current_url, depth = item
+            schedule.wait(current_url)
+            found_links = ingest_url(current_url, provider_id, frontier, deduper)
+            queue_links(frontier, schedule, found_links, depth + 1)
+    finally:
+        deduper.report()
+        report_frontier(frontier)
+        frontier.close()
+
+def crawl_site_pipelined(start_url, provider_id, sitemaps=False, **frontier_args):
+    """
+    Same crawl, but fetch / extract / chunk / embed / write run as concurrent
+    stages so the network, CPU and DB are busy at the same time.
+    Fetching stays single-file with the same politeness gap: each finished
+    fetch claims the next URL from the frontier.
+    Returns False when a stage failed; pages it left unfinished are marked
+    failed in the frontier.
+    """
+    print(f"🚀 Starting Pipelined Crawl for: {start_url}")
+
+    start_url = canonicalize(start_url)
+    schedule = CrawlSchedule(start_url, fetch_text, CRAWL_DELAY, use_sitemaps=sitemaps)
+    frontier = open_frontier(start_url, provider_id, schedule, **frontier_args)
+    deduper = CrawlDeduper(start_url, frontier)
+    # Chunks still to be written per page; the page is done when it hits zero
+    unwritten = {}
+    unwritten_lock = threading.Lock()
+    # Every URL this run took off the queue, to find the ones a failed batch stranded
+    claimed = set()
+
+    def fetch_stage(item):
+        url, depth = item
+        claimed.add(url)
+        try:
+            if already_visited(url):
+                frontier.mark(url, "skipped", "duplicate")
+                return None
+            schedule.wait(url)
+            page = fetch_page(url, deduper)
+            if page:
+                page["depth"] = depth
+                page["document_id"] = frontier.document_for(url)
+                queue_links(frontier, schedule, page["links"], depth + 1)
+            else:
+                frontier.mark(url, "failed")
+            return page
+        finally:
+            following = frontier.next()
+            if following:
+                pipe.submit(following)
+
+    def extract_stage(page):
+        if not extract_page(page):
+            frontier.mark(page["url"], "skipped")
+            return None
+        if deduper.check(page):
+            frontier.mark(page["url"], "skipped", "duplicate")
+            return None
+        return page
+
+    def document_stage(page):
+        if not create_document(page, provider_id):
+            frontier.mark(page["url"], "skipped")
+            return None
+        frontier.set_document(page["url"], page["document_id"])
+        return page
+
+    def chunk_stage(page):
+        rows = chunk_page(page, provider_id)
+        if not rows:
+            frontier.mark(page["url"], "done")
+        else:
+            with unwritten_lock:
+                unwritten[page["url"]] = len(rows)
+        return rows
+
+    def write_stage(rows):
+        write_rows(rows)
+        finished = []
+        with unwritten_lock:
+            for row in rows:
+                url = row["metadata"]["source"]
+                unwritten[url] -= 1
+                if not unwritten[url]:
+                    del unwritten[url]
+                    finished.append(url)
+        for url in finished:
+            frontier.mark(url, "done")
+        return None
+
+    pipe = Pipeline([
+        Stage("fetch", fetch_stage),
+        Stage("extract", extract_stage, concurrency=2),
+        Stage("document", document_stage, concurrency=2),
+        Stage("chunk", chunk_stage, fan_out=True),
+        Stage("embed", embed_rows, concurrency=4, batch_size=32),
+        Stage("write", write_stage, concurrency=2, batch_size=10),
+    ], name="seed-site")
+    try:
+        first = frontier.next()
+        report = pipe.run([first] if first else [])
+        errors = stage_errors(report)
+        # A page whose extract/document/embed/write batch raised never reaches
+        # done; record it so report_frontier shows it and a resume retries it
+        stranded = [url for url in claimed if frontier.status(url) == "in_progress"]
+        for url in stranded:
+            frontier.mark(url, "failed", "pipeline stage error")
+        if errors:
+            failed = ", ".join(f"{stage}: {n}" for stage, n in errors.items())
+            print(f"\n❌ {len(stranded)} pages not fully written (failed batches {failed})")
+        return not errors and not stranded
+    finally:
+        deduper.report()
+        report_frontier(frontier)
+        frontier.close()
 
 if __name__ == "__main__":
-    if len(sys.argv) < 3:
-        print("Usage: python seed-site.py <start_url> <provider_id>")
+    parser = argparse.ArgumentParser(description="Crawl a site into provider_documents/provider_knowledge.")
+    parser.add_argument("start_url")
+    parser.add_argument("provider_id", type=int)
+    parser.add_argument("--pipeline", action="store_true", help="run fetch/extract/embed/write as concurrent stages")
+    parser.add_argument("--state", help="crawl state file (default crawl_state/<host>-<provider_id>.sqlite)")
+    parser.add_argument("--fresh", action="store_true",
+                        help="discard saved crawl state and start over (also retries pages out of attempts)")
+    parser.add_argument("--max-pages", type=int, help="stop after this many pages in this run")
+    parser.add_argument("--max-depth", type=int, help="ignore links more than this many hops from the start URL")
+    parser.add_argument("--include", action="append", help="only crawl URLs matching this regex (repeatable)")
+    parser.add_argument("--exclude", action="append", help="skip URLs matching this regex (repeatable)")
+    parser.add_argument("--sitemaps", action="store_true",
+                        help="seed from robots.txt sitemaps and fetch the highest-scoring URLs first")
+    parser.add_argument("--refresh", action="store_true",
+                        help="with saved state: recrawl pages whose sitemap lastmod changed (implies --sitemaps)")
+    args = parser.parse_args()
+
+    frontier_args = {
+        "state_path": args.state,
+        "fresh": args.fresh,
+        "max_pages": args.max_pages,
+        "max_depth": args.max_depth,
+        "include": args.include,
+        "exclude": args.exclude,
+        "sitemaps": args.sitemaps or args.refresh,
+        "refresh": args.refresh,
+    }
+    if args.pipeline:
+        ok = crawl_site_pipelined(args.start_url, args.provider_id, **frontier_args)
+        sys.exit(0 if ok else 1)
     else:
-        start_arg = sys.argv[1]
-        id_arg = int(sys.argv[2])
-        crawl_site(start_arg, id_arg)
\ No newline at end of file
+        crawl_site(args.start_url, args.provider_id, **frontier_args)
@@ -1,5 +1,6 @@
 import os
 import sys
+import time
 import requests
 import feedparser
 import cloudscraper
@@ -7,10 +8,17 @@ from bs4 import BeautifulSoup
 from difflib import SequenceMatcher
 from dotenv import load_dotenv
 from openai import OpenAI
-from pydub import AudioSegment
-from llama_index.embeddings.openai import OpenAIEmbedding
+from embedding_scheduler import ScheduledEmbedding
+from shared_quota import acquire
 from supabase import create_client, Client
 
+# Shared audio preprocessing (silence trim + size-capped encoding)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "chrome-extension", "useful_tools"))
+from audio_preprocess import preprocess_audio, remap_segments, report_upload_stats
+from pipeline import Pipeline, Stage
+from instrumentation import span, count, count_tokens
+from staged_knowledge import insert_knowledge
+
 # 1. Setup
 load_dotenv()
 SUPABASE_URL = os.getenv("SUPABASE_URL")
@@ -22,7 +30,7 @@ if not SUPABASE_URL or not SUPABASE_KEY or not OPENAI_API_KEY:
     sys.exit(1)
 
 supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
-embed_model = OpenAIEmbedding(model="text-embedding-3-small")
+embed_model = ScheduledEmbedding(model="text-embedding-3-small")
 openai_client = OpenAI(api_key=OPENAI_API_KEY)
 scraper = cloudscraper.create_scraper(browser='chrome')
 
@@ -33,7 +41,8 @@ def clean_text(text):
 def get_spotify_metadata(url):
     print(f"   🔎 Scraping Spotify Metadata...")
     try:
-        response = scraper.get(url)
+        with span("http.get"):
+            response = scraper.get(url)
         if response.status_code != 200:
             return None, None
         
@@ -70,7 +79,8 @@ def find_rss_feed(show_name):
     clean_name = show_name.split(':')[0].strip()
     try:
         search_url = f"https://itunes.apple.com/search?term={clean_name}&media=podcast&limit=5"
-        res = requests.get(search_url).json()
+        with span("http.itunes_search"):
+            res = requests.get(search_url).json()
         if res['resultCount'] == 0: return None
             
         best_feed = None
@@ -87,7 +97,8 @@ def find_rss_feed(show_name):
 
 def find_audio_url(feed_url, target_title):
     print(f"   📖 Parsing RSS Feed...")
-    feed = feedparser.parse(feed_url)
+    with span("http.feed"):
+        feed = feedparser.parse(feed_url)
     target_lower = target_title.lower()
     
     best_entry = None
@@ -113,6 +124,10 @@ def get_mp3_link(entry):
     return None
 
 def download_and_compress(mp3_url):
+    """
+    Downloads the episode and preprocesses it for Whisper.
+    Returns (compressed_filename, offset_map, stats) or (None, None, None).
+    """
     print(f"   ⬇️  Downloading Audio...")
     raw_filename = "temp_raw.mp3"
     compressed_filename = "temp_compressed.mp3"
@@ -126,27 +141,30 @@ def download_and_compress(mp3_url):
         file_size_mb = os.path.getsize(raw_filename) / (1024 * 1024)
         print(f"      📦 Compressing {file_size_mb:.1f}MB file...")
         
-        audio = AudioSegment.from_file(raw_filename)
-        audio = audio.set_channels(1)
-        audio.export(compressed_filename, format="mp3", bitrate="32k")
+        with span("audio.preprocess"):
+            compressed, offset_map, stats = preprocess_audio(raw_filename, compressed_filename)
         
+        count("bytes.audio_in", stats["input_bytes"])
+        count("bytes.audio_upload", stats["upload_bytes"])
         os.remove(raw_filename)
-        return compressed_filename
+        return compressed, offset_map, stats
     except Exception as e:
         if os.path.exists(raw_filename): os.remove(raw_filename)
-        return None
+        return None, None, None
 
 # --- UPDATED: Use verbose_json to get timestamps ---
 def transcribe_with_timestamps(file_path):
     print(f"   🎙️  Transcribing (Verbose)...")
     try:
         with open(file_path, "rb") as audio_file:
-            transcript = openai_client.audio.transcriptions.create(
-                model="whisper-1", 
-                file=audio_file,
-                response_format="verbose_json", # <--- CRITICAL CHANGE
-                timestamp_granularities=["segment"]
-            )
+            acquire("whisper.requests")
+            with span("whisper.transcribe"):
+                transcript = openai_client.audio.transcriptions.create(
+                    model="whisper-1", 
+                    file=audio_file,
+                    response_format="verbose_json", # <--- CRITICAL CHANGE
+                    timestamp_granularities=["segment"]
+                )
         return transcript.segments # Returns list of objects with start, end, text
     except Exception as e:
         print(f"      ❌ Transcription Error: {e}")
@@ -157,7 +175,8 @@ def get_canonical_url(url):
     Follows redirects to find the real Spotify URL.
     """
     try:
-        response = requests.head(url, allow_redirects=True)
+        with span("http.head"):
+            response = requests.head(url, allow_redirects=True)
         final_url = response.url
         # Clean specific Spotify tracking params
         if "spotify.com" in final_url and "?" in final_url:
@@ -166,55 +185,11 @@ def get_canonical_url(url):
     except:
         return url
 
-def seed_spotify_universal(url, provider_id):
-    # 0. Resolve the true URL immediately
-    final_url = get_canonical_url(url)
-    print(f"🎧 Processing Spotify URL: {final_url}")
-    
-    # 1. Metadata
-    show_name, ep_title = get_spotify_metadata(final_url)
-    if not show_name or not ep_title: return
-
-    # 2. RSS Feed
-    feed_url = find_rss_feed(show_name)
-    if not feed_url: return
-
-    # 3. Audio Link
-    mp3_url, rss_title = find_audio_url(feed_url, ep_title)
-    if not mp3_url: return
-
-    # 4. Download & Compress
-    local_file = download_and_compress(mp3_url)
-    if not local_file: return
-
-    # 5. Transcribe (Get Segments)
-    segments = transcribe_with_timestamps(local_file)
-    if os.path.exists(local_file): os.remove(local_file)
-    if not segments: return
-
-    # 6. Database
-    print(f"   💾 Saving Document...")
-    try:
-        # Check duplicate
-        existing = supabase.table("provider_documents").select("id").eq("source_url", final_url).execute()
-        if existing.data:
-            print("      ⚠️ Document already exists. Skipping.")
-            return
-
-        res = supabase.table("provider_documents").insert({
-            "provider_id": provider_id,
-            "title": rss_title,
-            "source_url": final_url, # Saves the CLEAN url
-            "media_type": "audio"    # Standardized type
-        }).execute()
-        
-        doc_id = res.data[0]['id'] if res.data else None
-    except Exception as e:
-        print(f"   ❌ DB Error: {e}")
-        return
-# 7. CHUNKING WITH TIMESTAMPS
-    print(f"   ⚡ Processing {len(segments)} segments...")
-    
+def chunk_segments(segments, provider_id, doc_id, source_url):
+    """
+    Aggregates small Whisper segments into ~1000 char knowledge rows
+    (embeddings are added by the embed stage).
+    """
     rows = []
     
     current_chunk_text = ""
@@ -222,10 +197,10 @@ def seed_spotify_universal(url, provider_id):
     
     # We aggregate small Whisper segments into larger chunks (~1000 chars)
     for i, seg in enumerate(segments):
-        # FIX: Use dot notation for OpenAI objects
-        text = seg.text  # was seg['text']
-        start = seg.start # was seg['start']
-        end = seg.end     # was seg['end']
+        # Segments are dicts after remapping to the original timeline
+        text = seg['text']
+        start = seg['start']
+        end = seg['end']
         
         # If starting a new chunk, set the start time
         if current_chunk_text == "":
@@ -235,18 +210,12 @@ def seed_spotify_universal(url, provider_id):
         
         # If chunk is big enough OR it's the last segment
         if len(current_chunk_text) > 1000 or i == len(segments) - 1:
-            
-            # Embed
-            vec = embed_model.get_text_embedding(current_chunk_text)
-            
-            # Save
             rows.append({
                 "provider_id": provider_id,
                 "document_id": doc_id,
                 "content": current_chunk_text.strip(),
-                "embedding": vec,
                 "metadata": {
-                    "source": final_url,
+                    "source": source_url,
                     "timestampStart": int(chunk_start_time), # Save as integer seconds
                     "timestampEnd": int(end)
                 }
@@ -254,18 +223,107 @@ def seed_spotify_universal(url, provider_id):
             
             # Reset
             current_chunk_text = ""
+    return rows
+
+def embed_rows(rows):
+    texts = [row["content"] for row in rows]
+    count_tokens("tokens.embedded", texts)
+    with span("embed.openai"):
+        vectors = embed_model.get_text_embedding_batch(texts)
+    for row, vec in zip(rows, vectors):
+        row["embedding"] = vec
+    return rows
+
+def write_rows(rows):
+    try:
+        insert_knowledge(supabase, rows)
+        count("rows.written", len(rows))
+    except Exception as e:
+        print(f"Error inserting batch: {e}")
+        return None
+    return rows
+
+def seed_spotify_universal(url, provider_id):
+    # 0. Resolve the true URL immediately
+    final_url = get_canonical_url(url)
+    print(f"🎧 Processing Spotify URL: {final_url}")
     
-    # Batch Insert
-    if rows:
-        batch_size = 20
-        print(f"   💾 Inserting {len(rows)} chunks with timestamps...")
-        for i in range(0, len(rows), batch_size):
-            try:
-                supabase.table("provider_knowledge").insert(rows[i:i+batch_size]).execute()
-            except Exception as e:
-                print(f"Error inserting batch: {e}")
-                
-        print(f"   ✅ Success! Saved {len(rows)} timestamped chunks.")
+    # 1. Metadata
+    show_name, ep_title = get_spotify_metadata(final_url)
+    if not show_name or not ep_title: return
+
+    # 2. RSS Feed
+    feed_url = find_rss_feed(show_name)
+    if not feed_url: return
+
+    # 3. Audio Link
+    mp3_url, rss_title = find_audio_url(feed_url, ep_title)
+    if not mp3_url: return
+
+    # 4. Download & Compress
+    local_file, offset_map, audio_stats = download_and_compress(mp3_url)
+    if not local_file: return
+
+    # 5. Transcribe (Get Segments)
+    def transcribe_stage(path):
+        started = time.perf_counter()
+        segments = transcribe_with_timestamps(path)
+        if os.path.exists(path): os.remove(path)
+        if not segments: return None
+        report_upload_stats(audio_stats, time.perf_counter() - started)
+
+        # Whisper timestamps are on the trimmed timeline; map back to the episode
+        return remap_segments(segments, offset_map)
+
+    # 6. Database
+    def document_stage(segments):
+        print(f"   💾 Saving Document...")
+        try:
+            # Check duplicate
+            with span("db.select.provider_documents"):
+                existing = supabase.table("provider_documents").select("id").eq("source_url", final_url).execute()
+            if existing.data:
+                print("      ⚠️ Document already exists. Skipping.")
+                return None
+
+            with span("db.insert.provider_documents"):
+                res = supabase.table("provider_documents").insert({
+                    "provider_id": provider_id,
+                    "title": rss_title,
+                    "source_url": final_url, # Saves the CLEAN url
+                    "media_type": "audio"    # Standardized type
+                }).execute()
+            
+            doc_id = res.data[0]['id'] if res.data else None
+        except Exception as e:
+            print(f"   ❌ DB Error: {e}")
+            return None
+        return segments, doc_id
+
+    # 7. CHUNKING WITH TIMESTAMPS
+    def chunk_stage(job):
+        segments, doc_id = job
+        print(f"   ⚡ Processing {len(segments)} segments...")
+        with span("chunk.segments"):
+            rows = chunk_segments(segments, provider_id, doc_id, final_url)
+        count("chunks", len(rows))
+        return rows
+
+    pipe = Pipeline([
+        Stage("transcribe", transcribe_stage),
+        Stage("document", document_stage),
+        Stage("chunk", chunk_stage, fan_out=True),
+        Stage("embed", embed_rows, concurrency=4, batch_size=32),
+        Stage("write", write_rows, concurrency=2, batch_size=20),
+    ], name="seed-spotify")
+    pipe.run([local_file])
+
+    # Leftover if the transcribe stage failed before cleanup
+    if os.path.exists(local_file): os.remove(local_file)
+
+    saved = pipe.stages[-1].items_out
+    if saved:
+        print(f"   ✅ Success! Saved {saved} timestamped chunks.")
 
 if __name__ == "__main__":
     if len(sys.argv) < 3:
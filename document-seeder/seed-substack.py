@@ -1,13 +1,18 @@
 import os
 import sys
+import threading
 import requests
 import feedparser
 import cloudscraper
 from bs4 import BeautifulSoup
 from dotenv import load_dotenv
 from llama_index.core.node_parser import SentenceSplitter
-from llama_index.embeddings.openai import OpenAIEmbedding
+from embedding_scheduler import ScheduledEmbedding
 from supabase import create_client, Client
+from instrumentation import span, count, count_tokens
+from staged_knowledge import insert_knowledge
+from pipeline import Pipeline, Stage, stage_errors
+from web_chunker import chunk_html
 
 # 1. Setup
 load_dotenv()
@@ -20,7 +25,7 @@ if not SUPABASE_URL or not SUPABASE_KEY or not OPENAI_API_KEY:
     sys.exit(1)
 
 supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
-embed_model = OpenAIEmbedding(model="text-embedding-3-small")
+embed_model = ScheduledEmbedding(model="text-embedding-3-small")
 scraper = cloudscraper.create_scraper(browser='chrome')
 
 def get_feed_url(base_url):
@@ -82,98 +87,190 @@ def clean_html_content(html_content):
     # Compress whitespace
     return " ".join(text.split())
 
-def seed_substack(url, provider_id):
+def prepare_entry(entry):
+    """
+    Stage 1 (CPU): feed entry -> article dict with clean text, or None if too short.
+    """
+    title = entry.title
+    link = entry.link
+    
+    # Get content (Substack usually puts full HTML in 'content', summary in 'description')
+    if 'content' in entry:
+        raw_html = entry.content[0].value
+    elif 'summary_detail' in entry:
+        raw_html = entry.summary_detail.value
+    else:
+        raw_html = ""
+
+    with span("extract.bs4"):
+        clean_text = clean_html_content(raw_html)
+    
+    if len(clean_text) < 200:
+        print(f"      ⚠️  Skipping '{title}' (Content too short/Paywalled)")
+        return None
+
+    return {
+        "title": title,
+        "link": link,
+        "text": clean_text,
+        "html": raw_html,
+        "cover_image": extract_image(entry),
+        "author": entry.get('author', 'Substack'),
+    }
+
+def create_document(article, provider_id):
+    """
+    Stage 2 (DB): provider_documents insert. Returns the article with "document_id".
+    """
+    print(f"      📄 Seeding: {article['title'][:50]}...")
+
+    # 1. DB Insert
+    doc_payload = {
+        "provider_id": provider_id,
+        "title": article["title"],
+        "source_url": article["link"],
+        "cover_image_url": article["cover_image"],
+        "media_type": "document" # Use 'document' so it triggers text highlighting
+    }
+
+    try:
+        with span("db.insert.provider_documents"):
+            res = supabase.table("provider_documents").insert(doc_payload).execute()
+        doc_id = res.data[0]['id'] if res.data else None
+    except Exception as e:
+        # Often fails on unique constraint if you run it twice. Just skip.
+        # print(f"      ⚠️  DB Insert/Skip: {e}") 
+        return None
+
+    # If doc_id is None, it might be a duplicate or error
+    if not doc_id:
+        return None
+    article["document_id"] = doc_id
+    return article
+
+def chunk_article(article, provider_id):
+    """
+    Stage 3 (CPU): article -> knowledge rows awaiting embeddings, split along
+    the article's headings (sentence splitting if it has none we can use).
+    """
+    with span("chunk.web_structure"):
+        chunks = chunk_html(article["html"])
+
+    if not chunks:
+        with span("chunk.sentence_splitter"):
+            nodes = SentenceSplitter(chunk_size=1024, chunk_overlap=50).split_text(article["text"])
+        chunks = [{"text": node} for node in nodes]
+
+    count("chunks", len(chunks))
+    rows = []
+    for chunk in chunks:
+        metadata = {"source": article["link"], "author": article["author"]}
+        if "header_path" in chunk:
+            metadata["header_path"] = chunk["header_path"]
+            metadata["section"] = chunk["section"]
+        rows.append({
+            "provider_id": provider_id,
+            "document_id": article["document_id"],
+            "content": chunk["text"],
+            "metadata": metadata
+        })
+    return rows
+
+def embed_rows(rows):
+    """
+    Stage 4 (network): one embedding call per batch of rows.
+    """
+    texts = [row["content"] for row in rows]
+    count_tokens("tokens.embedded", texts)
+    with span("embed.openai"):
+        vectors = embed_model.get_text_embedding_batch(texts)
+    for row, vec in zip(rows, vectors):
+        row["embedding"] = vec
+    return rows
+
+def write_rows(rows):
+    """
+    Stage 5 (DB): provider_knowledge insert.
+    """
+    insert_knowledge(supabase, rows)
+    count("rows.written", len(rows))
+    return None
+
+def seed_substack(url, provider_id, max_articles=20):
     feed_url = get_feed_url(url)
     print(f"📰 Processing Substack: {url}")
     print(f"   📡 Fetching Feed: {feed_url}...")
     
     try:
         # We use cloudscraper to fetch the XML because standard requests might get 403
-        xml_response = scraper.get(feed_url).text
-        feed = feedparser.parse(xml_response)
+        with span("http.get"):
+            xml_response = scraper.get(feed_url).text
+        count("bytes.feed", len(xml_response))
+        with span("extract.feedparser"):
+            feed = feedparser.parse(xml_response)
     except Exception as e:
         print(f"   ❌ Failed to fetch feed: {e}")
-        return
+        return False
 
     if not feed.entries:
         print("   ❌ No entries found. Is this a valid Substack URL?")
-        return
+        return False
 
     print(f"   ✅ Found {len(feed.entries)} articles. Processing...")
 
-    count = 0
-    for entry in feed.entries:
-        # Limit to recent 20 to avoid blasting the DB (optional)
-        if count >= 20: break 
-        
-        title = entry.title
-        link = entry.link
-        
-        # Get content (Substack usually puts full HTML in 'content', summary in 'description')
-        if 'content' in entry:
-            raw_html = entry.content[0].value
-        elif 'summary_detail' in entry:
-            raw_html = entry.summary_detail.value
-        else:
-            raw_html = ""
+    # Limit to recent 20 to avoid blasting the DB (optional)
+    seeded = []
+    seeded_lock = threading.Lock()
 
-        clean_text = clean_html_content(raw_html)
-        
-        if len(clean_text) < 200:
-            print(f"      ⚠️  Skipping '{title}' (Content too short/Paywalled)")
-            continue
+    def document_stage(article):
+        with seeded_lock:
+            if len(seeded) >= max_articles:
+                return None
+            seeded.append(article["link"])
+        link = article["link"]
+        article = create_document(article, provider_id)
+        if article is None:
+            with seeded_lock:
+                seeded.remove(link)
+        return article
 
-        cover_image = extract_image(entry)
-        
-        print(f"      📄 Seeding: {title[:50]}...")
+    # Articles that lost chunks to a failed chunk/embed/write call
+    failed = set()
 
-        # 1. DB Insert
-        doc_payload = {
-            "provider_id": provider_id,
-            "title": title,
-            "source_url": link,
-            "cover_image_url": cover_image,
-            "media_type": "document" # Use 'document' so it triggers text highlighting
-        }
+    def tracked(fn, links):
+        def run(item):
+            try:
+                return fn(item)
+            except Exception:
+                with seeded_lock:
+                    failed.update(links(item))
+                raise
+        return run
 
-        try:
-            res = supabase.table("provider_documents").insert(doc_payload).execute()
-            doc_id = res.data[0]['id'] if res.data else None
-            
-            # If doc_id is None, it might be a duplicate or error
-            if not doc_id: 
-                # Optional: Handle duplicate logic here
-                continue
-
-        except Exception as e:
-            # Often fails on unique constraint if you run it twice. Just skip.
-            # print(f"      ⚠️  DB Insert/Skip: {e}") 
-            continue
-
-        # 2. Vectorise
-        nodes = SentenceSplitter(chunk_size=1024, chunk_overlap=50).split_text(clean_text)
-        
-        rows = []
-        for node in nodes:
-            vec = embed_model.get_text_embedding(node)
-            rows.append({
-                "provider_id": provider_id,
-                "document_id": doc_id,
-                "content": node,
-                "embedding": vec,
-                "metadata": {"source": link, "author": entry.get('author', 'Substack')}
-            })
-
-        if rows:
-            batch_size = 20
-            for i in range(0, len(rows), batch_size):
-                supabase.table("provider_knowledge").insert(rows[i:i+batch_size]).execute()
-            count += 1
-            
-    print(f"   ✅ Successfully seeded {count} articles!")
+    def row_links(rows):
+        return {row["metadata"]["source"] for row in rows}
+
+    report = Pipeline([
+        Stage("extract", prepare_entry, concurrency=2),
+        Stage("document", document_stage),
+        Stage("chunk", tracked(lambda article: chunk_article(article, provider_id), lambda article: [article["link"]]),
+              fan_out=True),
+        Stage("embed", tracked(embed_rows, row_links), concurrency=4, batch_size=32),
+        Stage("write", tracked(write_rows, row_links), concurrency=2, batch_size=20),
+    ], name="seed-substack").run(feed.entries)
+
+    complete = [link for link in seeded if link not in failed]
+    print(f"   ✅ Successfully seeded {len(complete)} articles!")
+    errors = stage_errors(report)
+    if errors:
+        batches = ", ".join(f"{stage}: {n}" for stage, n in errors.items())
+        print(f"   ❌ {len(failed)} article(s) only partly seeded (failed batches {batches})")
+        return False
+    return True
 
 if __name__ == "__main__":
     if len(sys.argv) < 3:
         print("Usage: python seed-substack.py \"<substack_url>\" <provider_id>")
     else:
-        seed_substack(sys.argv[1], int(sys.argv[2]))
\ No newline at end of file
+        ok = seed_substack(sys.argv[1], int(sys.argv[2]))
+        sys.exit(0 if ok else 1)
\ No newline at end of file
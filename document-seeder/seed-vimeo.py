@@ -5,7 +5,10 @@ from pathlib import Path
 from dotenv import load_dotenv
 from openai import OpenAI
 from supabase import create_client, Client
-from llama_index.embeddings.openai import OpenAIEmbedding
+from instrumentation import span, count_tokens
+from staged_knowledge import insert_knowledge
+from embedding_scheduler import ScheduledEmbedding
+from shared_quota import acquire
 
 # --- CONFIGURATION ---
 load_dotenv()
@@ -16,7 +19,7 @@ url: str = os.environ.get("SUPABASE_URL")
 key: str = os.environ.get("SUPABASE_SERVICE_ROLE_KEY")
 openai_client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
 supabase: Client = create_client(url, key)
-embed_model = OpenAIEmbedding(model="text-embedding-3-small")
+embed_model = ScheduledEmbedding(model="text-embedding-3-small")
 
 # 2. CONFIG
 PROVIDER_ID = 12  
@@ -49,7 +52,8 @@ def process_video(video_url, manual_title=None):
         # A. DOWNLOAD
         print("   ⬇️  Downloading audio (using Chrome cookies)...")
         with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(video_url, download=True)
+            with span("http.yt_dlp"):
+                info = ydl.extract_info(video_url, download=True)
             detected_title = info.get('title', 'Unknown Title')
             video_id = info.get('id')
             audio_path = str(OUTPUT_DIR / f"{video_id}.mp3")
@@ -62,12 +66,14 @@ def process_video(video_url, manual_title=None):
         # B. TRANSCRIBE WITH TIMESTAMPS
         print("   🎙️  Transcribing (Verbose Mode)...")
         with open(audio_path, "rb") as audio_file:
-            transcript = openai_client.audio.transcriptions.create(
-                model="whisper-1", 
-                file=audio_file,
-                response_format="verbose_json",  # <--- CRITICAL CHANGE
-                timestamp_granularities=["segment"]
-            )
+            acquire("whisper.requests")
+            with span("whisper.transcribe"):
+                transcript = openai_client.audio.transcriptions.create(
+                    model="whisper-1", 
+                    file=audio_file,
+                    response_format="verbose_json",  # <--- CRITICAL CHANGE
+                    timestamp_granularities=["segment"]
+                )
         
         segments = transcript.segments
         print(f"   ✅ Transcription complete ({len(segments)} segments).")
@@ -76,19 +82,21 @@ def process_video(video_url, manual_title=None):
         print("   💾 Saving to Supabase...")
         
         # Check for duplicates first
-        existing = supabase.table('provider_documents').select("id").eq("source_url", video_url).execute()
+        with span("db.select.provider_documents"):
+            existing = supabase.table('provider_documents').select("id").eq("source_url", video_url).execute()
         if existing.data:
             print(f"      ⚠️ Document already exists (ID: {existing.data[0]['id']}). Skipping insert.")
             doc_id = existing.data[0]['id']
             # Optional: Delete old chunks if re-seeding
             # supabase.table('provider_knowledge').delete().eq("document_id", doc_id).execute()
         else:
-            data, count = supabase.table('provider_documents').insert({
-                "provider_id": PROVIDER_ID,
-                "title": final_title,
-                "source_url": video_url,
-                "media_type": "video" 
-            }).execute()
+            with span("db.insert.provider_documents"):
+                data, count = supabase.table('provider_documents').insert({
+                    "provider_id": PROVIDER_ID,
+                    "title": final_title,
+                    "source_url": video_url,
+                    "media_type": "video" 
+                }).execute()
             
             # Robust ID retrieval
             if hasattr(data, 'data') and len(data.data) > 0:
@@ -117,7 +125,9 @@ def process_video(video_url, manual_title=None):
             # Aggregate into ~1000 char chunks
             if len(current_chunk_text) > 1000 or i == len(segments) - 1:
                 
-                vec = embed_model.get_text_embedding(current_chunk_text)
+                count_tokens("tokens.embedded", current_chunk_text)
+                with span("embed.openai"):
+                    vec = embed_model.get_text_embedding(current_chunk_text)
                 
                 rows.append({
                     "provider_id": PROVIDER_ID,
@@ -137,7 +147,7 @@ def process_video(video_url, manual_title=None):
             print(f"   💾 Inserting {len(rows)} chunks...")
             batch_size = 20
             for i in range(0, len(rows), batch_size):
-                supabase.table('provider_knowledge').insert(rows[i:i+batch_size]).execute()
+                insert_knowledge(supabase, rows[i:i+batch_size])
             print(f"   ✨ SUCCESS! '{final_title}' has been ingested with timestamps.")
 
     except Exception as e:
@@ -4,8 +4,11 @@ import glob
 from dotenv import load_dotenv
 import yt_dlp
 from openai import OpenAI
-from llama_index.embeddings.openai import OpenAIEmbedding
+from embedding_scheduler import ScheduledEmbedding
+from shared_quota import acquire
 from supabase import create_client, Client
+from instrumentation import span, count, count_tokens
+from staged_knowledge import insert_knowledge
 
 # 1. Setup
 load_dotenv()
@@ -18,7 +21,7 @@ if not SUPABASE_URL or not SUPABASE_KEY or not OPENAI_API_KEY:
     sys.exit(1)
 
 supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
-embed_model = OpenAIEmbedding(model="text-embedding-3-small")
+embed_model = ScheduledEmbedding(model="text-embedding-3-small")
 openai_client = OpenAI(api_key=OPENAI_API_KEY)
 
 def download_audio(url):
@@ -44,7 +47,8 @@ def download_audio(url):
     try:
         with yt_dlp.YoutubeDL(ydl_opts) as ydl:
             # Get metadata first
-            info = ydl.extract_info(url, download=True)
+            with span("http.yt_dlp"):
+                info = ydl.extract_info(url, download=True)
             title = info.get('title', 'Unknown YouTube Video')
             video_id = info.get('id', 'unknown')
             thumbnail = info.get('thumbnail', None)
@@ -71,6 +75,7 @@ def transcribe_audio_with_timestamps(file_path):
     to get timestamp segments.
     """
     file_size_mb = os.path.getsize(file_path) / (1024 * 1024)
+    count("bytes.audio_upload", os.path.getsize(file_path))
     print(f"   🎙️  Transcribing with Whisper ({file_size_mb:.2f} MB)...")
 
     if file_size_mb > 25:
@@ -79,12 +84,14 @@ def transcribe_audio_with_timestamps(file_path):
 
     try:
         audio_file = open(file_path, "rb")
-        transcript = openai_client.audio.transcriptions.create(
-            model="whisper-1", 
-            file=audio_file,
-            response_format="verbose_json", # <--- CRITICAL CHANGE FOR TIMESTAMPS
-            timestamp_granularities=["segment"]
-        )
+        acquire("whisper.requests")
+        with span("whisper.transcribe"):
+            transcript = openai_client.audio.transcriptions.create(
+                model="whisper-1", 
+                file=audio_file,
+                response_format="verbose_json", # <--- CRITICAL CHANGE FOR TIMESTAMPS
+                timestamp_granularities=["segment"]
+            )
         return transcript.segments # Returns list of objects (text, start, end)
     except Exception as e:
         print(f"   ❌ Whisper Error: {e}")
@@ -123,7 +130,8 @@ def seed_youtube_audio(url, provider_id):
     }
 
     try:
-        res = supabase.table("provider_documents").insert(doc_payload).execute()
+        with span("db.insert.provider_documents"):
+            res = supabase.table("provider_documents").insert(doc_payload).execute()
         if hasattr(res, 'data') and len(res.data) > 0:
             document_id = res.data[0]['id']
         else:
@@ -155,7 +163,10 @@ def seed_youtube_audio(url, provider_id):
         # If chunk is large enough OR last segment
         if len(current_chunk_text) > 1000 or i == len(segments) - 1:
             
-            vector = embed_model.get_text_embedding(current_chunk_text)
+            count("chunks")
+            count_tokens("tokens.embedded", current_chunk_text)
+            with span("embed.openai"):
+                vector = embed_model.get_text_embedding(current_chunk_text)
             
             row = {
                 "provider_id": provider_id,
@@ -179,7 +190,7 @@ def seed_youtube_audio(url, provider_id):
             batch_size = 20
             for i in range(0, len(knowledge_rows), batch_size):
                 batch = knowledge_rows[i:i + batch_size]
-                supabase.table("provider_knowledge").insert(batch).execute()
+                insert_knowledge(supabase, batch)
             print(f"   ✅ Successfully saved {len(knowledge_rows)} chunks with timestamps!")
         except Exception as e:
              print(f"   ❌ DB Insert Error: {e}")
@@ -8,8 +8,10 @@ from youtube_transcript_api import YouTubeTranscriptApi
 from bs4 import BeautifulSoup
 from dotenv import load_dotenv
 from llama_index.core.node_parser import SentenceSplitter
-from llama_index.embeddings.openai import OpenAIEmbedding
+from embedding_scheduler import ScheduledEmbedding
 from supabase import create_client, Client
+from instrumentation import span, count, count_tokens
+from staged_knowledge import insert_knowledge
 
 # 1. Setup
 load_dotenv()
@@ -22,7 +24,7 @@ if not SUPABASE_URL or not SUPABASE_KEY:
     sys.exit(1)
 
 supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
-embed_model = OpenAIEmbedding(model="text-embedding-3-small")
+embed_model = ScheduledEmbedding(model="text-embedding-3-small")
 scraper = cloudscraper.create_scraper(browser='chrome')
 
 def get_video_id(url):
@@ -40,7 +42,8 @@ def get_video_metadata(video_id):
     """
     url = f"https://www.youtube.com/watch?v={video_id}"
     try:
-        response = scraper.get(url)
+        with span("http.get"):
+            response = scraper.get(url)
         if response.status_code == 200:
             soup = BeautifulSoup(response.text, 'html.parser')
             
@@ -68,7 +71,8 @@ def seed_youtube(url, provider_id):
     full_text = ""
     try:
         # Using the imported class directly
-        transcript_list = YouTubeTranscriptApi.get_transcript(video_id)
+        with span("http.youtube_transcript"):
+            transcript_list = YouTubeTranscriptApi.get_transcript(video_id)
         full_text = " ".join([item['text'] for item in transcript_list])
     except Exception as e:
         # Use simple string matching to handle specific error types without importing them
@@ -99,7 +103,8 @@ def seed_youtube(url, provider_id):
     }
 
     try:
-        res = supabase.table("provider_documents").insert(doc_payload).execute()
+        with span("db.insert.provider_documents"):
+            res = supabase.table("provider_documents").insert(doc_payload).execute()
         # Handle Supabase V2 response format
         if hasattr(res, 'data') and len(res.data) > 0:
             document_id = res.data[0]['id']
@@ -115,11 +120,15 @@ def seed_youtube(url, provider_id):
     print(f"   ⚡ Chunking {len(full_text)} characters...")
     
     text_splitter = SentenceSplitter(chunk_size=1024, chunk_overlap=50)
-    nodes = text_splitter.split_text(full_text)
+    with span("chunk.sentence_splitter"):
+        nodes = text_splitter.split_text(full_text)
     
+    count("chunks", len(nodes))
+    count_tokens("tokens.embedded", nodes)
     knowledge_rows = []
     for node in nodes:
-        vector = embed_model.get_text_embedding(node)
+        with span("embed.openai"):
+            vector = embed_model.get_text_embedding(node)
         
         row = {
             "provider_id": provider_id,
@@ -135,7 +144,7 @@ def seed_youtube(url, provider_id):
             batch_size = 20
             for i in range(0, len(knowledge_rows), batch_size):
                 batch = knowledge_rows[i:i + batch_size]
-                supabase.table("provider_knowledge").insert(batch).execute()
+                insert_knowledge(supabase, batch)
             print(f"   ✅ Successfully saved {len(knowledge_rows)} chunks!")
         except Exception as e:
              print(f"   ❌ DB Vector Insert Error: {e}")
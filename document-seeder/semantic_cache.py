@@ -0,0 +1,300 @@
+import os
+import sys
+import json
+import time
+import sqlite3
+import tempfile
+from array import array
+
+from instrumentation import count
+
+# Optional: numpy scores the whole cache in one product
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+# Semantic result cache for knowledge searches (crawl_and_map.py, generate-map.py).
+#
+#   cache = SemanticCache.for_provider(supabase, PROVIDER_ID, "match_provider_knowledge:0.5:1")
+#   result = cache.get_or_search(vector, lambda: run_the_rpc(vector))
+#   ...
+#   cache.report()
+#
+# Before a search, the sentence's embedding is compared with the embeddings
+# of sentences already searched; if one is within SEMANTIC_CACHE_SIMILARITY
+# (cosine, tight by default) its stored result - match or no match - is
+# reused and the RPC is skipped. Repeated CTAs and boilerplate paraphrases
+# across a provider's pages then cost one search instead of one per page.
+#
+# In memory the entries are a ring of SEMANTIC_CACHE_MAX_ENTRIES slots (one
+# float32 matrix with numpy): once it is full each add overwrites the oldest
+# slot, so an add costs the same at 20k entries as at 20.
+#
+# Entries persist in SQLite (SEEDER_SEMANTIC_CACHE, "off" keeps them in
+# memory for the run) under a namespace of provider + search parameters. The
+# namespace is tagged with the provider's knowledge version (row count + max
+# id of provider_knowledge); when a seeder adds, deletes or re-seeds
+# knowledge the version changes and the namespace is cleared on next open.
+#
+#   python semantic_cache.py status
+#   python semantic_cache.py clear [namespace]
+
+CACHE_DB = os.getenv("SEEDER_SEMANTIC_CACHE", os.path.join(tempfile.gettempdir(), "seeder-semantic-cache.sqlite"))
+PERSISTENT = CACHE_DB.lower() not in ("", "0", "off", "false")
+SIMILARITY = float(os.getenv("SEMANTIC_CACHE_SIMILARITY", "0.97"))
+MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "20000"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS namespaces (name TEXT PRIMARY KEY, version TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS entries (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    namespace TEXT NOT NULL,
+    vector BLOB NOT NULL,
+    value TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_namespace ON entries (namespace, id);
+"""
+
+
+def knowledge_version(supabase, provider_id):
+    """
+    Changes whenever provider_knowledge rows are added or removed for the
+    provider (re-seeding deletes and reinserts, so the max id moves too).
+    """
+    resp = supabase.table("provider_knowledge") \
+        .select("id", count="exact") \
+        .eq("provider_id", provider_id) \
+        .order("id", desc=True) \
+        .limit(1) \
+        .execute()
+    max_id = resp.data[0]["id"] if resp.data else 0
+    return f"{resp.count or 0}:{max_id}"
+
+
+def _unit(vector):
+    norm = sum(x * x for x in vector) ** 0.5 or 1.0
+    return [x / norm for x in vector]
+
+
+class SemanticCache:
+    def __init__(self, namespace, version, similarity=SIMILARITY, max_entries=MAX_ENTRIES, path=CACHE_DB):
+        self.namespace = namespace
+        self.version = version
+        self.similarity = similarity
+        self.max_entries = max_entries
+        self.db = None
+        # Slot i holds ids[i], values[i] and row i of _vectors (a float32
+        # matrix, or a list without numpy); _next is the oldest slot once full
+        self.ids, self.values = [], []
+        self._vectors = None
+        self._next = 0
+        self._last_id = 0
+        self.lookups = self.hits = 0
+        self.invalidated = False
+
+        if PERSISTENT and path:
+            self.db = sqlite3.connect(path, timeout=30)
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.executescript(SCHEMA)
+            self._load()
+
+    @classmethod
+    def for_provider(cls, supabase, provider_id, search_key, **kwargs):
+        """
+        Cache for one provider and one kind of search (RPC + threshold + count).
+        A failed version lookup just disables reuse across runs.
+        """
+        try:
+            version = knowledge_version(supabase, provider_id)
+        except Exception as e:
+            print(f"   ⚠️ knowledge version lookup failed, cache is per-run only: {e}")
+            version, kwargs["path"] = "unknown", None
+        return cls(f"{provider_id}:{search_key}", version, **kwargs)
+
+    # --- Storage ---
+
+    def _load(self):
+        row = self.db.execute("SELECT version FROM namespaces WHERE name = ?", (self.namespace,)).fetchone()
+        if row is None or row[0] != self.version:
+            self.invalidated = row is not None
+            with self.db:
+                self.db.execute("DELETE FROM entries WHERE namespace = ?", (self.namespace,))
+                self.db.execute("INSERT OR REPLACE INTO namespaces (name, version) VALUES (?, ?)",
+                                (self.namespace, self.version))
+            if self.invalidated:
+                count("semantic_cache.invalidated")
+                print(f"🧠 Knowledge changed for {self.namespace}: semantic cache cleared")
+            return
+        rows = self.db.execute(
+            "SELECT id, vector, value FROM entries WHERE namespace = ? ORDER BY id", (self.namespace,)
+        ).fetchall()
+        for entry_id, blob, value in rows[-self.max_entries:]:
+            vector = array("f")
+            vector.frombytes(blob)
+            self._append(entry_id, list(vector), json.loads(value))
+        if len(rows) > self.max_entries:
+            with self.db:
+                self.db.execute("DELETE FROM entries WHERE namespace = ? AND id <= ?",
+                                (self.namespace, rows[-self.max_entries - 1][0]))
+
+    def _dim(self):
+        return len(self._vectors[0]) if isinstance(self._vectors, list) else self._vectors.shape[1]
+
+    def _append(self, entry_id, vector, value):
+        """
+        Stores an entry in the next slot. Returns the id it overwrote, if any.
+        """
+        self._last_id = entry_id
+        if self._vectors is not None and len(vector) != self._dim():
+            # Another embedding model: nothing cached so far is comparable
+            self.ids, self.values, self._vectors, self._next = [], [], None, 0
+        evicted = None
+        if len(self.ids) < self.max_entries:
+            slot = len(self.ids)
+            self.ids.append(entry_id)
+            self.values.append(value)
+        else:
+            slot = self._next
+            evicted = self.ids[slot]
+            self.ids[slot], self.values[slot] = entry_id, value
+            self._next = (slot + 1) % self.max_entries
+        self._store(slot, vector)
+        return evicted
+
+    def _store(self, slot, vector):
+        if not NUMPY_AVAILABLE:
+            if self._vectors is None:
+                self._vectors = []
+            if slot == len(self._vectors):
+                self._vectors.append(vector)
+            else:
+                self._vectors[slot] = vector
+            return
+        if self._vectors is None or slot >= self._vectors.shape[0]:
+            # Grow by doubling until max_entries rows; from then on slots are reused
+            capacity = min(self.max_entries, max(64, 2 * (slot + 1)))
+            grown = np.zeros((capacity, len(vector)), dtype=np.float32)
+            if self._vectors is not None:
+                grown[:slot] = self._vectors[:slot]
+            self._vectors = grown
+        self._vectors[slot] = vector
+
+    # --- Lookup ---
+
+    def lookup(self, vector):
+        """
+        (value, similarity) of the closest cached search within the bound, or None.
+        """
+        self.lookups += 1
+        if not self.ids:
+            return None
+        query = _unit(vector)
+        if len(query) != self._dim():
+            return None
+        if NUMPY_AVAILABLE:
+            scores = self._vectors[:len(self.ids)] @ np.asarray(query, dtype=np.float32)
+            best = int(np.argmax(scores))
+            score = float(scores[best])
+        else:
+            score, best = max((sum(a * b for a, b in zip(query, v)), i) for i, v in enumerate(self._vectors))
+        if score < self.similarity:
+            return None
+        self.hits += 1
+        count("semantic_cache.hit")
+        return self.values[best], score
+
+    def add(self, vector, value):
+        vector = _unit(vector)
+        if self.db is None:
+            self._append(self._last_id + 1, vector, value)
+            return
+        with self.db:
+            entry_id = self.db.execute(
+                "INSERT INTO entries (namespace, vector, value, created_at) VALUES (?, ?, ?, ?)",
+                (self.namespace, array("f", vector).tobytes(), json.dumps(value), time.time()),
+            ).lastrowid
+            evicted = self._append(entry_id, vector, value)
+            if evicted is not None:
+                # Ids only grow, so this also clears anything older left over
+                self.db.execute("DELETE FROM entries WHERE namespace = ? AND id <= ?", (self.namespace, evicted))
+
+    def get_or_search(self, vector, search):
+        """
+        Cached value for a near-identical vector, else search() (stored for next time).
+        """
+        cached = self.lookup(vector)
+        if cached is not None:
+            return cached[0]
+        count("semantic_cache.miss")
+        value = search()
+        self.add(vector, value)
+        return value
+
+    def get_or_search_many(self, vectors, search_many):
+        """
+        get_or_search for a batch: search_many(vectors) runs once, on the misses only.
+        """
+        values, missing = [None] * len(vectors), []
+        for i, vector in enumerate(vectors):
+            cached = self.lookup(vector)
+            if cached is None:
+                missing.append(i)
+            else:
+                values[i] = cached[0]
+        if missing:
+            count("semantic_cache.miss", len(missing))
+            for i, value in zip(missing, search_many([vectors[i] for i in missing])):
+                values[i] = value
+                self.add(vectors[i], value)
+        return values
+
+    # --- Reporting ---
+
+    def stats(self):
+        return {
+            "lookups": self.lookups,
+            "hits": self.hits,
+            "hit_rate": round(self.hits / self.lookups, 4) if self.lookups else 0.0,
+            "rpcs_avoided": self.hits,
+            "entries": len(self.ids),
+        }
+
+    def report(self):
+        s = self.stats()
+        count("semantic_cache.rpcs_avoided", s["rpcs_avoided"])
+        print(f"🧠 Semantic cache: {s['hits']}/{s['lookups']} hits ({s['hit_rate']:.0%}), "
+              f"{s['rpcs_avoided']} RPCs avoided, {s['entries']} entries (>= {self.similarity} cosine)")
+
+    def close(self):
+        if self.db is not None:
+            self.db.close()
+            self.db = None
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] not in ("status", "clear"):
+        print("Usage: python semantic_cache.py status | clear [namespace]")
+        sys.exit(1)
+    if not PERSISTENT:
+        print("Semantic cache persistence is off (SEEDER_SEMANTIC_CACHE).")
+        sys.exit(0)
+
+    db = sqlite3.connect(CACHE_DB)
+    db.executescript(SCHEMA)
+    if sys.argv[1] == "clear":
+        where, args = ("WHERE namespace = ?", (sys.argv[2],)) if len(sys.argv) > 2 else ("", ())
+        with db:
+            removed = db.execute(f"DELETE FROM entries {where}", args).rowcount
+            db.execute(f"DELETE FROM namespaces {where.replace('namespace', 'name')}", args)
+        print(f"🧹 Removed {removed} entries from {CACHE_DB}")
+    else:
+        rows = db.execute(
+            "SELECT n.name, n.version, COUNT(e.id) FROM namespaces n "
+            "LEFT JOIN entries e ON e.namespace = n.name GROUP BY n.name ORDER BY n.name"
+        ).fetchall()
+        print(f"{'namespace':<48}{'version':>16}{'entries':>9}")
+        for name, version, n in rows:
+            print(f"{name:<48}{version:>16}{n:>9}")
@@ -0,0 +1,214 @@
+import os
+import sys
+import time
+import sqlite3
+import tempfile
+import threading
+
+# Cross-process OpenAI quota shared by every seeder on this machine.
+#
+# The buckets live in one SQLite file; each reservation is a short
+# BEGIN IMMEDIATE transaction, so any number of seeder processes (site
+# crawls, Substack, Spotify, ...) draw from the same per-minute budget
+# without a daemon to start or keep alive.
+#
+#   from shared_quota import acquire
+#   acquire("whisper.requests")          # blocks until the shared budget allows it
+#
+# embedding_scheduler.py uses SharedBucket for its TPM/RPM buckets.
+#
+#   python shared_quota.py status                  # current levels
+#   python shared_quota.py demo 4 60               # 4 processes vs a 60/min bucket
+#
+# SEEDER_QUOTA_DB=off falls back to per-process buckets.
+
+QUOTA_DB = os.getenv("SEEDER_QUOTA_DB", os.path.join(tempfile.gettempdir(), "seeder-quota.sqlite"))
+SHARED_QUOTA_ENABLED = QUOTA_DB.lower() not in ("", "0", "off", "false")
+
+WHISPER_RPM = int(os.getenv("WHISPER_RPM", "50"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS buckets (
+    name TEXT PRIMARY KEY,
+    capacity REAL NOT NULL,
+    rate REAL NOT NULL,
+    level REAL NOT NULL,
+    updated REAL NOT NULL
+)
+"""
+
+
+class SharedBucket:
+    """
+    Same interface as embedding_scheduler.TokenBucket, but the level is
+    stored in SQLite and shared by every process using the same file.
+    Timestamps are wall-clock so separate processes agree on refill.
+    """
+
+    def __init__(self, name, per_minute, path=QUOTA_DB):
+        self.name = name
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.path = path
+        self._local = threading.local()
+        with self._transaction() as db:
+            db.execute(SCHEMA)
+            row = db.execute("SELECT capacity FROM buckets WHERE name = ?", (name,)).fetchone()
+            if row is None:
+                db.execute(
+                    "INSERT INTO buckets (name, capacity, rate, level, updated) VALUES (?, ?, ?, ?, ?)",
+                    (name, self.capacity, self.rate, self.capacity, time.time()),
+                )
+            elif row[0] != self.capacity:
+                # Last writer's limit wins; keeps the level inside the new capacity
+                db.execute(
+                    "UPDATE buckets SET capacity = ?, rate = ?, level = MIN(level, ?) WHERE name = ?",
+                    (self.capacity, self.rate, self.capacity, name),
+                )
+
+    def _connect(self):
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    def _transaction(self):
+        bucket = self
+
+        class _Tx:
+            def __enter__(self):
+                self.db = bucket._connect()
+                self.db.execute("BEGIN IMMEDIATE")
+                return self.db
+
+            def __exit__(self, exc_type, *exc):
+                self.db.execute("ROLLBACK" if exc_type else "COMMIT")
+                return False
+
+        return _Tx()
+
+    def _refilled(self, db, now):
+        level, updated = db.execute(
+            "SELECT level, updated FROM buckets WHERE name = ?", (self.name,)
+        ).fetchone()
+        return min(self.capacity, level + max(0.0, now - updated) * self.rate)
+
+    def reserve(self, amount):
+        with self._transaction() as db:
+            now = time.time()
+            level = self._refilled(db, now) - amount
+            db.execute("UPDATE buckets SET level = ?, updated = ? WHERE name = ?", (level, now, self.name))
+        return max(0.0, -level / self.rate)
+
+    def sync(self, remaining, reset_seconds=None):
+        with self._transaction() as db:
+            now = time.time()
+            level = self._refilled(db, now)
+            if remaining is not None:
+                level = min(level, float(remaining))
+            if reset_seconds is not None and level <= 0:
+                level = min(level, -reset_seconds * self.rate)
+            db.execute("UPDATE buckets SET level = ?, updated = ? WHERE name = ?", (level, now, self.name))
+
+    def level(self):
+        with self._transaction() as db:
+            return self._refilled(db, time.time())
+
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+
+def bucket(name, per_minute):
+    """
+    Shared bucket when enabled, else a per-process one. Cached by name.
+    """
+    with _buckets_lock:
+        if name not in _buckets:
+            if SHARED_QUOTA_ENABLED:
+                _buckets[name] = SharedBucket(name, per_minute)
+            else:
+                from embedding_scheduler import TokenBucket
+                _buckets[name] = TokenBucket(per_minute)
+        return _buckets[name]
+
+
+def acquire(name, amount=1, per_minute=None):
+    """
+    Reserves `amount` from the named bucket and sleeps until it is covered.
+    Returns the seconds waited.
+    """
+    if per_minute is None:
+        per_minute = WHISPER_RPM if name.startswith("whisper") else 60
+    wait = bucket(name, per_minute).reserve(amount)
+    if wait:
+        print(f"   ⏳ Waiting {wait:.1f}s for shared {name} quota")
+        time.sleep(wait)
+    return wait
+
+
+# --- CLI ---
+
+def _status():
+    if not os.path.exists(QUOTA_DB):
+        print(f"No quota file at {QUOTA_DB}")
+        return
+    db = sqlite3.connect(QUOTA_DB)
+    now = time.time()
+    print(f"📒 {QUOTA_DB}")
+    for name, capacity, rate, level, updated in db.execute("SELECT * FROM buckets ORDER BY name"):
+        current = min(capacity, level + (now - updated) * rate)
+        print(f"   {name:<28}{current:>12.0f} / {capacity:<10.0f}({capacity:.0f}/min)")
+
+
+def _demo_worker(name, per_minute, duration):
+    b = SharedBucket(name, per_minute)
+    done = 0
+    deadline = time.time() + duration
+    while True:
+        wait = b.reserve(1)
+        if time.time() + wait > deadline:
+            break
+        time.sleep(wait)
+        done += 1
+    print(done, flush=True)
+
+
+def _demo(processes, per_minute, duration=10.0):
+    """
+    Starts N processes hammering one bucket; the total they get through
+    should be capacity + rate * duration, however many processes there are.
+    """
+    import subprocess
+    name = f"demo.{os.getpid()}"
+    started = time.time()
+    procs = [
+        subprocess.Popen(
+            [sys.executable, __file__, "_worker", name, str(per_minute), str(duration)],
+            stdout=subprocess.PIPE, text=True,
+        )
+        for _ in range(processes)
+    ]
+    counts = [int(p.communicate()[0].strip() or 0) for p in procs]
+    elapsed = time.time() - started
+    with sqlite3.connect(QUOTA_DB) as db:
+        db.execute("DELETE FROM buckets WHERE name = ?", (name,))
+    allowed = per_minute + per_minute / 60.0 * duration
+    print(f"🧪 {processes} processes, {per_minute}/min bucket, {duration:.0f}s")
+    print(f"   per process: {counts}")
+    print(f"   total: {sum(counts)} (budget {allowed:.0f}) in {elapsed:.1f}s")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 2 and sys.argv[1] == "status":
+        _status()
+    elif len(sys.argv) >= 3 and sys.argv[1] == "demo":
+        _demo(int(sys.argv[2]), float(sys.argv[3]) if len(sys.argv) > 3 else 60,
+              float(sys.argv[4]) if len(sys.argv) > 4 else 10.0)
+    elif len(sys.argv) == 5 and sys.argv[1] == "_worker":
+        _demo_worker(sys.argv[2], float(sys.argv[3]), float(sys.argv[4]))
+    else:
+        print("Usage: python shared_quota.py status | demo <processes> [per_minute] [seconds]")
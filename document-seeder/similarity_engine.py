@@ -0,0 +1,431 @@
+import os
+import sys
+import json
+import time
+from array import array
+
+import numpy as np
+
+from instrumentation import span, count
+
+# Blocked sentence x chunk similarity for bulk matching (generate-map.py --local).
+#
+#   engine = SimilarityEngine.from_rows(rows, documents)    # provider_knowledge rows, in RAM
+#   engine.save("snapshots/provider-12")                    # vectors.f32 + rows.jsonl + meta.json
+#   engine = SimilarityEngine.open("snapshots/provider-12") # memory-mapped, any size
+#   scores, ids = engine.top_k(sentence_vectors, k=8)
+#   picks = engine.mmr(scores, ids, threshold=0.5)          # [(sentence, chunk, score)] for one page
+#
+# Chunk vectors are L2-normalised float32, so cosine similarity is a matrix
+# product. top_k() walks the chunk matrix in blocks of SIM_BLOCK_ROWS rows
+# (one read of each block serves every query) and the queries in blocks of
+# SIM_QUERY_BLOCK, keeping a running top-k per query with argpartition, so
+# memory is bounded by the block sizes rather than the provider: a
+# 1M-chunk provider is scanned from a memory-mapped file without ever being
+# in RAM.
+#
+# mmr() turns each page's per-sentence top-k into at most one match per
+# sentence by maximal marginal relevance: candidates above the threshold are
+# picked greedily by MMR_LAMBDA * similarity - (1 - MMR_LAMBDA) * (max cosine
+# to the chunks already picked on the page), each chunk (video moment) is
+# used once per page and each document at most MMR_MAX_PER_DOCUMENT times.
+# A sentence whose best chunk was taken falls back to its next candidate, so
+# matches spread across documents and timestamps instead of several
+# sentences pointing at the same moment.
+#
+# Reduced-dimension mode (SIM_REDUCED_DIM, e.g. 256): the first pass scans a
+# compact secondary copy of every chunk - its first SIM_REDUCED_DIM
+# dimensions, renormalised, kept as vectors-<dim>.f32 next to the full
+# vectors - and shortlists SIM_RERANK_SHORTLIST chunks per sentence; only the
+# shortlist is rescored with the full vectors. text-embedding-3 vectors are
+# trained so that a prefix is itself a usable embedding (it is what the API's
+# `dimensions` parameter returns), so the scan reads 6x less at 256 dims
+# while the final scores stay full-precision. bench/reduced_dims.py measures
+# recall@1 against the full scan.
+#
+# Snapshots are append-only: snapshot_sync.py adds new provider_knowledge rows
+# at the end and lists rows deleted upstream in meta.json ("deleted", row
+# indexes), which top_k() never returns.
+#
+#   python similarity_engine.py build 12 snapshots/provider-12    # from Supabase
+#   python similarity_engine.py reduce snapshots/provider-12 256  # add vectors-256.f32
+#   python similarity_engine.py info snapshots/provider-12
+
+SIM_BLOCK_ROWS = int(os.getenv("SIM_BLOCK_ROWS", "8192"))
+SIM_QUERY_BLOCK = int(os.getenv("SIM_QUERY_BLOCK", "1024"))
+TOP_K = int(os.getenv("SIM_TOP_K", "8"))
+MMR_LAMBDA = float(os.getenv("MMR_LAMBDA", "0.7"))
+MMR_MAX_PER_DOCUMENT = int(os.getenv("MMR_MAX_PER_DOCUMENT", "3"))  # 0 = no limit
+SIM_REDUCED_DIM = int(os.getenv("SIM_REDUCED_DIM", "0"))               # 0 = full vectors only
+SIM_RERANK_SHORTLIST = int(os.getenv("SIM_RERANK_SHORTLIST", "64"))
+RERANK_BLOCK_FLOATS = 2 ** 23  # 32 MB of gathered full vectors per rerank step
+
+VECTORS_FILE = "vectors.f32"
+REDUCED_FILE = "vectors-{dim}.f32"
+ROWS_FILE = "rows.jsonl"
+META_FILE = "meta.json"
+ROW_FIELDS = ("id", "document_id", "title", "source_url", "media_type", "timestamp_start", "timestamp_end")
+
+
+def unit_rows(matrix):
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def read_meta(path):
+    with open(os.path.join(path, META_FILE)) as f:
+        return json.load(f)
+
+
+def write_meta(path, meta):
+    """
+    Replaced atomically: its count is what makes appended rows part of the snapshot.
+    """
+    target = os.path.join(path, META_FILE)
+    with open(f"{target}.tmp", "w") as f:
+        json.dump(meta, f)
+    os.replace(f"{target}.tmp", target)
+
+
+def reduce_rows(matrix, dim):
+    """
+    First dim dimensions of each (unit) row, renormalised.
+    """
+    return unit_rows(np.asarray(matrix)[:, :dim])
+
+
+def write_reduced(path, dim, block_rows=SIM_BLOCK_ROWS):
+    """
+    Adds vectors-<dim>.f32 to a snapshot, derived block by block from vectors.f32.
+    """
+    full = SimilarityEngine.open(path, reduced_dim=0, block_rows=block_rows)
+    if dim >= full.dim:
+        raise ValueError(f"reduced dim {dim} must be below the full {full.dim}")
+    target = os.path.join(path, REDUCED_FILE.format(dim=dim))
+    with open(f"{target}.tmp", "wb") as f:
+        for _, block in full._blocks():
+            f.write(reduce_rows(block, dim).tobytes())
+    os.replace(f"{target}.tmp", target)
+
+    meta = read_meta(path)
+    meta["reduced_dims"] = sorted(set(meta.get("reduced_dims", [])) | {dim})
+    write_meta(path, meta)
+    return target
+
+
+def knowledge_row(row, documents):
+    """
+    What a match needs from a provider_knowledge row and its document.
+    """
+    meta = row.get("metadata") or {}
+    doc = documents.get(row.get("document_id")) or {}
+    return {
+        "id": row["id"],
+        "document_id": row.get("document_id"),
+        "title": doc.get("title") or meta.get("title") or "",
+        "source_url": doc.get("source_url") or meta.get("source") or meta.get("source_url") or "",
+        "media_type": doc.get("media_type") or "",
+        "timestamp_start": meta.get("timestampStart"),
+        "timestamp_end": meta.get("timestampEnd"),
+    }
+
+
+class RowFile:
+    """
+    rows.jsonl with a line-offset index: rows are read only when asked for.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.offsets = array("q")
+        with open(path, "rb") as f:
+            position = 0
+            for line in f:
+                self.offsets.append(position)
+                position += len(line)
+        self._file = open(path, "rb")
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __getitem__(self, index):
+        self._file.seek(self.offsets[index])
+        return json.loads(self._file.readline())
+
+
+class SimilarityEngine:
+    def __init__(self, vectors, rows, block_rows=SIM_BLOCK_ROWS, query_block=SIM_QUERY_BLOCK, vectors_path=None,
+                 deleted=()):
+        # vectors: (n, dim) unit float32 array or memmap; rows[i] describes vectors[i]
+        self.vectors = vectors
+        self.vectors_path = vectors_path
+        self.rows = rows
+        # Row indexes removed upstream since the snapshot was written (snapshot_sync.py)
+        self.deleted = np.unique(np.asarray(deleted, dtype=np.int64))
+        self.block_rows = block_rows
+        self.query_block = query_block
+        self.reduced = None  # secondary engine over the reduced vectors, see use_reduced()
+        self.shortlist = SIM_RERANK_SHORTLIST
+        self.pairs = 0
+        self.seconds = 0.0
+
+    def __len__(self):
+        return self.vectors.shape[0]
+
+    @property
+    def dim(self):
+        return self.vectors.shape[1]
+
+    def use_reduced(self, vectors, vectors_path=None, shortlist=SIM_RERANK_SHORTLIST):
+        """
+        First-pass on these reduced vectors (same rows), full-vector rerank of the shortlist.
+        """
+        self.reduced = SimilarityEngine(vectors, self.rows, self.block_rows, self.query_block, vectors_path,
+                                        self.deleted)
+        self.shortlist = shortlist
+        return self
+
+    @classmethod
+    def from_rows(cls, rows, documents, reduced_dim=SIM_REDUCED_DIM, **kwargs):
+        """
+        In-memory engine from provider_knowledge rows (embedding as list or pgvector text).
+        """
+        kept, vectors = [], []
+        for row in rows:
+            vector = row.get("embedding")
+            if isinstance(vector, str):
+                vector = json.loads(vector)
+            if vector is None or len(vector) == 0:
+                continue
+            kept.append(knowledge_row(row, documents))
+            vectors.append(vector)
+        matrix = unit_rows(vectors) if vectors else np.zeros((0, 0), dtype=np.float32)
+        engine = cls(matrix, kept, **kwargs)
+        if reduced_dim and len(engine) and reduced_dim < engine.dim:
+            engine.use_reduced(reduce_rows(matrix, reduced_dim))
+        return engine
+
+    @classmethod
+    def open(cls, path, reduced_dim=SIM_REDUCED_DIM, **kwargs):
+        meta = read_meta(path)
+        rows = RowFile(os.path.join(path, ROWS_FILE))
+        if meta["count"] == 0:
+            return cls(np.zeros((0, meta["dim"]), dtype=np.float32), rows, **kwargs)
+        vectors_path = os.path.join(path, VECTORS_FILE)
+        vectors = np.memmap(vectors_path, dtype=np.float32, mode="r", shape=(meta["count"], meta["dim"]))
+        engine = cls(vectors, rows, vectors_path=vectors_path, deleted=meta.get("deleted", ()), **kwargs)
+        if reduced_dim and reduced_dim < engine.dim:
+            reduced_path = os.path.join(path, REDUCED_FILE.format(dim=reduced_dim))
+            if not os.path.exists(reduced_path):
+                print(f"🧮 Writing {reduced_dim}-dim vectors for {path}")
+                write_reduced(path, reduced_dim, engine.block_rows)
+            reduced = np.memmap(reduced_path, dtype=np.float32, mode="r", shape=(meta["count"], reduced_dim))
+            engine.use_reduced(reduced, reduced_path)
+        return engine
+
+    def save(self, path):
+        os.makedirs(path, exist_ok=True)
+        with open(os.path.join(path, VECTORS_FILE), "wb") as f:
+            for start in range(0, len(self), self.block_rows):
+                f.write(np.ascontiguousarray(self.vectors[start:start + self.block_rows], dtype=np.float32).tobytes())
+        with open(os.path.join(path, ROWS_FILE), "w") as f:
+            for i in range(len(self)):
+                row = self.rows[i]
+                f.write(json.dumps({k: row.get(k) for k in ROW_FIELDS}) + "\n")
+        meta = {"dim": self.dim, "count": len(self), "dtype": "float32"}
+        if self.reduced is not None:
+            with open(os.path.join(path, REDUCED_FILE.format(dim=self.reduced.dim)), "wb") as f:
+                for _, block in self.reduced._blocks():
+                    f.write(np.ascontiguousarray(block, dtype=np.float32).tobytes())
+            meta["reduced_dims"] = [self.reduced.dim]
+        if self.deleted.size:
+            meta["deleted"] = self.deleted.tolist()
+        write_meta(path, meta)
+
+    # --- Scoring ---
+
+    def _blocks(self):
+        if self.vectors_path is None:
+            for start in range(0, len(self), self.block_rows):
+                yield start, np.asarray(self.vectors[start:start + self.block_rows])
+            return
+        # Snapshots are streamed with plain reads into one reused buffer: a
+        # full scan through the memory map would leave the whole file resident
+        buffer = np.empty((min(self.block_rows, len(self)), self.dim), dtype=np.float32)
+        with open(self.vectors_path, "rb", buffering=0) as f:
+            for start in range(0, len(self), self.block_rows):
+                block = buffer[:min(self.block_rows, len(self) - start)]
+                target, filled = memoryview(block).cast("B"), 0
+                while filled < len(target):
+                    n = f.readinto(target[filled:])
+                    if not n:
+                        raise ValueError(f"{self.vectors_path} is shorter than its meta.json says")
+                    filled += n
+                yield start, block
+
+    def top_k(self, queries, k=TOP_K):
+        """
+        (scores, chunk indexes), both (n_queries, k), best first. Rows are
+        padded with -inf / -1 when the provider has fewer than k chunks.
+        """
+        queries = unit_rows(queries)
+        n, total = queries.shape[0], len(self)
+        if n == 0 or total == 0:
+            return np.full((n, k), -np.inf, dtype=np.float32), np.full((n, k), -1, dtype=np.int64)
+
+        started = time.perf_counter()
+        if self.reduced is not None and self.shortlist > k:
+            with span("similarity.top_k.reduced"):
+                _, shortlist = self.reduced._scan(reduce_rows(queries, self.reduced.dim), self.shortlist)
+            with span("similarity.rerank"):
+                result = self._rerank(queries, shortlist, k)
+            count("similarity.rerank_pairs", shortlist.size)
+        else:
+            with span("similarity.top_k"):
+                result = self._scan(queries, k)
+        self.pairs += n * total
+        self.seconds += time.perf_counter() - started
+        count("similarity.pairs", n * total)
+        return result
+
+    def _scan(self, queries, k):
+        """
+        Exact blocked top-k over every chunk for unit queries.
+        """
+        n = queries.shape[0]
+        best_scores = np.full((n, k), -np.inf, dtype=np.float32)
+        best_ids = np.full((n, k), -1, dtype=np.int64)
+        for start, block in self._blocks():
+            kk = min(k, block.shape[0])
+            dead = self.deleted[(self.deleted >= start) & (self.deleted < start + block.shape[0])] - start
+            for q in range(0, n, self.query_block):
+                sims = queries[q:q + self.query_block] @ block.T
+                if dead.size:
+                    sims[:, dead] = -np.inf
+                part = np.argpartition(sims, -kk, axis=1)[:, -kk:]
+                # Merge the block's best with the running best, keep k
+                merged_scores = np.concatenate(
+                    [best_scores[q:q + self.query_block], np.take_along_axis(sims, part, axis=1)], axis=1)
+                merged_ids = np.concatenate([best_ids[q:q + self.query_block], part + start], axis=1)
+                keep = np.argpartition(merged_scores, -k, axis=1)[:, -k:]
+                best_scores[q:q + self.query_block] = np.take_along_axis(merged_scores, keep, axis=1)
+                best_ids[q:q + self.query_block] = np.take_along_axis(merged_ids, keep, axis=1)
+
+        order = np.argsort(-best_scores, axis=1)
+        best_scores = np.take_along_axis(best_scores, order, axis=1)
+        best_ids = np.take_along_axis(best_ids, order, axis=1)
+        best_ids[np.isneginf(best_scores)] = -1  # padding, or only deleted rows left in a block
+        return best_scores, best_ids
+
+    def _rerank(self, queries, shortlist, k):
+        """
+        Full-vector scores for each query's shortlisted chunks, best k kept.
+        """
+        n, width = shortlist.shape
+        scores = np.full(shortlist.shape, -np.inf, dtype=np.float32)
+        # Gathered rows per block stay around RERANK_BLOCK_FLOATS floats
+        step = max(1, RERANK_BLOCK_FLOATS // (width * self.dim))
+        for q in range(0, n, step):
+            ids = shortlist[q:q + step]
+            valid = ids >= 0
+            rows = np.asarray(self.vectors[np.where(valid, ids, 0).ravel()]).reshape(ids.shape + (self.dim,))
+            block_scores = np.einsum("qsd,qd->qs", rows, queries[q:q + step])
+            scores[q:q + step] = np.where(valid, block_scores, -np.inf)
+
+        order = np.argsort(-scores, axis=1)[:, :k]
+        top_scores = np.take_along_axis(scores, order, axis=1)
+        top_ids = np.take_along_axis(shortlist, order, axis=1)
+        if top_scores.shape[1] < k:
+            pad = k - top_scores.shape[1]
+            top_scores = np.pad(top_scores, ((0, 0), (0, pad)), constant_values=-np.inf)
+            top_ids = np.pad(top_ids, ((0, 0), (0, pad)), constant_values=-1)
+        return top_scores, top_ids
+
+    def mmr(self, scores, ids, threshold, lam=MMR_LAMBDA, max_per_document=MMR_MAX_PER_DOCUMENT):
+        """
+        One page: at most one (sentence, chunk index, score) per sentence,
+        in pick order. scores/ids are top_k() output for the page's sentences.
+        """
+        scores, ids = np.asarray(scores), np.asarray(ids)
+        candidates = [(s, int(c), float(score))
+                      for s in range(scores.shape[0]) for score, c in zip(scores[s], ids[s])
+                      if c >= 0 and score >= threshold]
+        if not candidates:
+            return []
+
+        chunk_list = sorted({c for _, c, _ in candidates})
+        position = {c: i for i, c in enumerate(chunk_list)}
+        chunk_vectors = np.asarray(self.vectors[chunk_list])
+        similarity = chunk_vectors @ chunk_vectors.T
+        documents = {c: self.rows[c].get("document_id") for c in chunk_list}
+
+        sentence = np.array([s for s, _, _ in candidates])
+        chunk = np.array([position[c] for _, c, _ in candidates])
+        relevance = np.array([score for _, _, score in candidates], dtype=np.float32)
+        redundancy = np.zeros(len(candidates), dtype=np.float32)
+        alive = np.ones(len(candidates), dtype=bool)
+        per_document, picks = {}, []
+
+        while alive.any():
+            mmr = np.where(alive, lam * relevance - (1 - lam) * redundancy, -np.inf)
+            best = int(np.argmax(mmr))
+            c = chunk_list[chunk[best]]
+            picks.append((int(sentence[best]), c, float(relevance[best])))
+
+            document = documents[c]
+            per_document[document] = per_document.get(document, 0) + 1
+            alive &= sentence != sentence[best]
+            alive &= chunk != chunk[best]
+            if max_per_document and per_document[document] >= max_per_document:
+                alive &= np.array([documents[chunk_list[i]] != document for i in chunk])
+            redundancy = np.maximum(redundancy, similarity[chunk, chunk[best]])
+        return picks
+
+    def stats(self):
+        return {
+            "chunks": len(self),
+            "dim": self.dim if len(self.vectors.shape) == 2 else 0,
+            "pairs": self.pairs,
+            "seconds": round(self.seconds, 3),
+            "pairs_per_s": round(self.pairs / self.seconds) if self.seconds else 0,
+            "deleted": int(self.deleted.size),
+            "reduced_dim": self.reduced.dim if self.reduced is not None else 0,
+            "shortlist": self.shortlist if self.reduced is not None else 0,
+        }
+
+    def report(self):
+        s = self.stats()
+        print(f"🧮 Similarity engine: {s['pairs']:,} sentence-chunk pairs in {s['seconds']:.2f}s "
+              f"({s['pairs_per_s']:,}/s) over {s['chunks']:,} chunks")
+        if s["reduced_dim"]:
+            print(f"   first pass on {s['reduced_dim']} dims, top {s['shortlist']} reranked on {s['dim']}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3 or sys.argv[1] not in ("build", "reduce", "info"):
+        print("Usage: python similarity_engine.py build <provider_id> <dir> | reduce <dir> <dim> | info <dir>")
+        sys.exit(1)
+
+    if sys.argv[1] == "build":
+        from retrieval_service import load_provider
+        rows, documents = load_provider(int(sys.argv[2]))
+        engine = SimilarityEngine.from_rows(rows, documents)
+        engine.save(sys.argv[3])
+        print(f"💾 {len(engine)} chunks x {engine.dim} dims -> {sys.argv[3]}")
+    elif sys.argv[1] == "reduce":
+        target = write_reduced(sys.argv[2], int(sys.argv[3]))
+        print(f"💾 {os.path.getsize(target) / 2 ** 20:.1f} MB -> {target}")
+    else:
+        engine = SimilarityEngine.open(sys.argv[2], reduced_dim=0)
+        meta = read_meta(sys.argv[2])
+        size = len(engine) * engine.dim * 4
+        print(f"{len(engine)} chunks x {engine.dim} dims, {size / 2 ** 20:.1f} MB of vectors, "
+              f"{engine.deleted.size} deleted upstream")
+        for dim in meta.get("reduced_dims", []):
+            print(f"  reduced: {dim} dims, {len(engine) * dim * 4 / 2 ** 20:.1f} MB")
+        if "watermark" in meta:
+            mark = meta["watermark"]
+            print(f"  synced from provider {meta.get('provider_id')} up to id {mark['id']} "
+                  f"({mark.get('created_at')}) at {meta.get('synced_at')}")
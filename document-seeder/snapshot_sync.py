@@ -0,0 +1,254 @@
+import os
+import json
+import time
+import argparse
+from array import array
+from datetime import datetime, timezone
+
+import numpy as np
+
+from instrumentation import span, count
+from similarity_engine import (
+    ROW_FIELDS, ROWS_FILE, VECTORS_FILE, REDUCED_FILE, SIM_BLOCK_ROWS,
+    knowledge_row, read_meta, reduce_rows, unit_rows, write_meta,
+)
+
+# Incremental sync of a provider's provider_knowledge into a similarity_engine.py snapshot.
+#
+#   python snapshot_sync.py 12 snapshots/provider-12          # first run pulls everything
+#   python snapshot_sync.py 12 snapshots/provider-12          # later runs: new rows + deletions
+#   python generate-map.py --batch urls.txt --local snapshots/provider-12 --sync
+#
+# Rows are pulled with keyset pagination - `id > last id ORDER BY id LIMIT
+# SNAPSHOT_PAGE_SIZE`, never OFFSET, so every page is an index range scan
+# on the primary key however deep it is - and each page is appended straight
+# to vectors.f32 / rows.jsonl (and any reduced vectors-<dim>.f32). meta.json
+# records the watermark (id and created_at of the last row pulled) after
+# every page, so an interrupted sync resumes where it stopped; anything
+# written past meta's count by a crash is truncated on the next run.
+#
+# Later runs fetch only rows above the watermark. Deletions (a seeder
+# re-seeding a document deletes and re-inserts its chunks) are found by the
+# tombstone check: the provider's ids alone are listed, again by keyset, and
+# snapshot rows whose id is gone are added to meta's "deleted" list, which
+# the engine masks out. Ids at or below the watermark that the snapshot
+# never saw (a transaction that committed after a later id was synced) are
+# fetched too. Once more than SNAPSHOT_COMPACT_RATIO of the rows are
+# deleted the files are rewritten without them.
+
+SNAPSHOT_PAGE_SIZE = int(os.getenv("SNAPSHOT_PAGE_SIZE", "1000"))   # PostgREST max-rows caps this
+SNAPSHOT_ID_PAGE_SIZE = int(os.getenv("SNAPSHOT_ID_PAGE_SIZE", "1000"))
+SNAPSHOT_COMPACT_RATIO = float(os.getenv("SNAPSHOT_COMPACT_RATIO", "0.2"))
+KNOWLEDGE_COLUMNS = "id, created_at, document_id, metadata, embedding"
+DOCUMENT_COLUMNS = "id, title, source_url, media_type"
+ID_LOOKUP_CHUNK = 200  # ids per in.() filter, keeps the URL short
+
+
+def keyset_pages(query_fn, after=0, page_size=SNAPSHOT_PAGE_SIZE):
+    """
+    Pages of query_fn() rows with id > after, in id order.
+    """
+    while True:
+        page = query_fn().gt("id", after).order("id").limit(page_size).execute().data or []
+        if page:
+            yield page
+            after = page[-1]["id"]
+        if len(page) < page_size:
+            return
+
+
+def parse_embedding(value):
+    # PostgREST returns pgvector columns as "[0.1,0.2,...]"
+    return json.loads(value) if isinstance(value, str) else value
+
+
+def _vector_files(meta):
+    return [(VECTORS_FILE, meta["dim"])] + [(REDUCED_FILE.format(dim=d), d) for d in meta.get("reduced_dims", [])]
+
+
+def _line_offsets(path):
+    offsets = array("q", [0])
+    if os.path.exists(path):
+        with open(path, "rb") as f:
+            for line in f:
+                offsets.append(offsets[-1] + len(line))
+    return offsets
+
+
+def _truncate(path, meta):
+    """
+    Drops anything appended after meta was last written (an interrupted sync).
+    """
+    n = meta["count"]
+    for name, dim in _vector_files(meta):
+        target = os.path.join(path, name)
+        if os.path.exists(target) and os.path.getsize(target) > n * dim * 4:
+            os.truncate(target, n * dim * 4)
+    rows_path = os.path.join(path, ROWS_FILE)
+    offsets = _line_offsets(rows_path)
+    if len(offsets) - 1 > n:
+        os.truncate(rows_path, offsets[n])
+
+
+def _local_ids(path):
+    with open(os.path.join(path, ROWS_FILE)) as f:
+        return [json.loads(line)["id"] for line in f]
+
+
+class SnapshotAppender:
+    """
+    Appends provider_knowledge rows to a snapshot; meta is updated in place.
+    """
+
+    def __init__(self, path, meta, documents):
+        self.path = path
+        self.meta = meta
+        self.documents = documents
+        self.appended = 0
+
+    def append(self, rows):
+        if not rows:
+            return
+        vectors = [parse_embedding(row.get("embedding")) for row in rows]
+        if not self.meta["dim"]:
+            self.meta["dim"] = next((len(v) for v in vectors if v), 0)
+        dim = self.meta["dim"]
+
+        # A row without a usable vector keeps its slot (so its id is known
+        # locally) but starts out deleted
+        matrix = np.zeros((len(rows), dim), dtype=np.float32)
+        deleted = self.meta.setdefault("deleted", [])
+        for i, vector in enumerate(vectors):
+            if vector and len(vector) == dim:
+                matrix[i] = vector
+            else:
+                deleted.append(self.meta["count"] + i)
+        matrix = unit_rows(matrix)
+
+        for name, width in _vector_files(self.meta):
+            with open(os.path.join(self.path, name), "ab") as f:
+                f.write((matrix if width == dim else reduce_rows(matrix, width)).tobytes())
+        with open(os.path.join(self.path, ROWS_FILE), "a") as f:
+            for row in rows:
+                kept = knowledge_row(row, self.documents)
+                f.write(json.dumps({k: kept.get(k) for k in ROW_FIELDS}) + "\n")
+        self.meta["count"] += len(rows)
+        self.appended += len(rows)
+        count("snapshot.rows_appended", len(rows))
+
+
+def compact(path, meta, block_rows=SIM_BLOCK_ROWS):
+    """
+    Rewrites the snapshot without its deleted rows.
+    """
+    n, dead = meta["count"], set(meta.get("deleted", []))
+    keep = np.ones(n, dtype=bool)
+    keep[list(dead)] = False
+
+    replaced = []
+    for name, dim in _vector_files(meta):
+        source = os.path.join(path, name)
+        vectors = np.memmap(source, dtype=np.float32, mode="r", shape=(n, dim))
+        with open(f"{source}.tmp", "wb") as f:
+            for start in range(0, n, block_rows):
+                f.write(np.ascontiguousarray(vectors[start:start + block_rows][keep[start:start + block_rows]]).tobytes())
+        del vectors
+        replaced.append(source)
+    rows_path = os.path.join(path, ROWS_FILE)
+    with open(rows_path) as src, open(f"{rows_path}.tmp", "w") as dst:
+        for i, line in enumerate(src):
+            if i < n and keep[i]:
+                dst.write(line)
+    replaced.append(rows_path)
+
+    for target in replaced:
+        os.replace(f"{target}.tmp", target)
+    meta["count"] = int(keep.sum())
+    meta["deleted"] = []
+    write_meta(path, meta)
+    count("snapshot.compactions")
+    return n - meta["count"]
+
+
+def sync_snapshot(supabase, provider_id, path, page_size=SNAPSHOT_PAGE_SIZE, check_deletions=True):
+    """
+    Brings the snapshot at path up to date with the provider's provider_knowledge.
+    Returns {"fetched", "late", "deleted", "compacted", "count", "seconds"}.
+    """
+    started = time.perf_counter()
+    os.makedirs(path, exist_ok=True)
+    try:
+        meta = read_meta(path)
+    except FileNotFoundError:
+        meta = {"dim": 0, "count": 0, "dtype": "float32", "provider_id": provider_id,
+                "watermark": {"id": 0, "created_at": None}}
+    if meta.get("provider_id", provider_id) != provider_id:
+        raise ValueError(f"{path} is a snapshot of provider {meta['provider_id']}, not {provider_id}")
+    if "watermark" not in meta:
+        raise ValueError(f"{path} has no sync watermark (written by save()); sync into a new directory")
+    _truncate(path, meta)
+
+    with span("db.select.provider_documents"):
+        documents = {}
+        for page in keyset_pages(lambda: supabase.table("provider_documents")
+                                 .select(DOCUMENT_COLUMNS).eq("provider_id", provider_id), 0, page_size):
+            documents.update((doc["id"], doc) for doc in page)
+
+    appender = SnapshotAppender(path, meta, documents)
+    synced_before, initial = meta["watermark"]["id"], meta["count"] == 0
+
+    def knowledge():
+        return supabase.table("provider_knowledge").select(KNOWLEDGE_COLUMNS).eq("provider_id", provider_id)
+
+    with span("snapshot.pull"):
+        for page in keyset_pages(knowledge, synced_before, page_size):
+            appender.append(page)
+            meta["watermark"] = {"id": page[-1]["id"], "created_at": page[-1].get("created_at")}
+            write_meta(path, meta)
+    fetched = appender.appended
+
+    late, gone = 0, 0
+    if check_deletions and not initial:
+        with span("snapshot.tombstones"):
+            remote = set()
+            for page in keyset_pages(lambda: supabase.table("provider_knowledge")
+                                     .select("id").eq("provider_id", provider_id), 0, SNAPSHOT_ID_PAGE_SIZE):
+                remote.update(row["id"] for row in page)
+            local = _local_ids(path)[:meta["count"]]
+            already = set(meta.get("deleted", []))
+            removed = [i for i, row_id in enumerate(local) if row_id not in remote and i not in already]
+            missed = sorted(set(r for r in remote if r <= synced_before) - set(local))
+            for start in range(0, len(missed), ID_LOOKUP_CHUNK):
+                appender.append(knowledge().in_("id", missed[start:start + ID_LOOKUP_CHUNK]).order("id").execute().data or [])
+            meta["deleted"] = sorted(already | set(removed))
+            late, gone = len(missed), len(removed)
+            count("snapshot.rows_deleted", gone)
+
+    compacted = 0
+    dead = len(meta.get("deleted", []))
+    if dead and dead > SNAPSHOT_COMPACT_RATIO * meta["count"]:
+        with span("snapshot.compact"):
+            compacted = compact(path, meta)
+    meta["synced_at"] = datetime.now(timezone.utc).isoformat()
+    write_meta(path, meta)
+
+    result = {"fetched": fetched, "late": late, "deleted": gone, "compacted": compacted,
+              "count": meta["count"], "seconds": round(time.perf_counter() - started, 3)}
+    print(f"🔄 Snapshot {path}: +{fetched} rows"
+          + (f" (+{late} late)" if late else "")
+          + f", {gone} deleted upstream" + (f", compacted {compacted}" if compacted else "")
+          + f" -> {meta['count'] - len(meta.get('deleted', []))} live rows in {result['seconds']:.1f}s"
+          + f" (watermark id {meta['watermark']['id']})")
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sync a provider's knowledge into a local similarity snapshot.")
+    parser.add_argument("provider_id", type=int)
+    parser.add_argument("path", help="snapshot directory (created on first sync)")
+    parser.add_argument("--page-size", type=int, default=SNAPSHOT_PAGE_SIZE)
+    parser.add_argument("--no-deletions", action="store_true", help="skip the tombstone check (new rows only)")
+    args = parser.parse_args()
+
+    from retrieval_service import get_supabase
+    sync_snapshot(get_supabase(), args.provider_id, args.path, args.page_size, not args.no_deletions)
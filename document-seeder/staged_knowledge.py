@@ -0,0 +1,179 @@
+import os
+import sys
+import json
+import time
+import atexit
+import threading
+
+from instrumentation import span, count
+
+# Optional: only needed when seeders stage rows instead of inserting them
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+# provider_knowledge writes for the seeders: REST inserts, or staged Parquet files.
+#
+#   insert_knowledge(supabase, rows)        # what every seeder calls per batch
+#
+#   SEEDER_STAGE_DIR=staged python seed-site.py https://example.com 12
+#   python bulk_load.py staged/             # COPY the files into Postgres
+#
+# By default rows go through the REST API as before. With SEEDER_STAGE_DIR
+# set they are appended to a Parquet file there instead - provider_id,
+# document_id, content, metadata (JSON text) and embedding as a fixed-size
+# float32 list - in row groups of STAGE_ROW_GROUP rows, and bulk_load.py
+# loads the files later with binary COPY. A file is written as
+# <name>.parquet.partial and renamed when it is closed (STAGE_FILE_ROWS rows,
+# or at exit), so the loader never sees a half-written file. provider_documents
+# rows are still inserted over REST (chunks need their ids), and so are a
+# re-seed's deletes: a re-seeded document has no chunks until the load.
+
+STAGE_DIR = os.getenv("SEEDER_STAGE_DIR", "")
+STAGE_ROW_GROUP = int(os.getenv("STAGE_ROW_GROUP", "1000"))
+STAGE_FILE_ROWS = int(os.getenv("STAGE_FILE_ROWS", "50000"))
+STAGED_SUFFIX = ".parquet"
+PARTIAL_SUFFIX = ".partial"
+COLUMNS = ("provider_id", "document_id", "content", "metadata", "embedding")
+
+
+def knowledge_schema(dim):
+    return pa.schema([
+        ("provider_id", pa.int64()),
+        ("document_id", pa.int64()),
+        ("content", pa.string()),
+        ("metadata", pa.string()),
+        ("embedding", pa.list_(pa.float32(), dim)),
+    ])
+
+
+def rows_to_table(rows, dim):
+    """
+    provider_knowledge rows (as the seeders build them) -> Arrow table.
+    """
+    unknown = {key for row in rows for key in row} - set(COLUMNS)
+    if unknown:
+        raise ValueError(f"staged rows only carry {COLUMNS}, got {sorted(unknown)}")
+    flat, missing = [], []
+    for row in rows:
+        vector = row.get("embedding")
+        if vector is None:
+            missing.append(True)
+            flat.extend([0.0] * dim)
+            continue
+        if len(vector) != dim:
+            raise ValueError(f"embedding has {len(vector)} dims, the staged file {dim}")
+        missing.append(False)
+        flat.extend(vector)
+    mask = pa.array(missing, pa.bool_()) if any(missing) else None
+    embeddings = pa.FixedSizeListArray.from_arrays(pa.array(flat, pa.float32()), dim, mask=mask)
+    return pa.Table.from_arrays([
+        pa.array([row.get("provider_id") for row in rows], pa.int64()),
+        pa.array([row.get("document_id") for row in rows], pa.int64()),
+        pa.array([row.get("content") for row in rows], pa.string()),
+        pa.array([None if row.get("metadata") is None else json.dumps(row["metadata"]) for row in rows],
+                 pa.string()),
+        embeddings,
+    ], schema=knowledge_schema(dim))
+
+
+class StagedWriter:
+    """
+    Buffers rows into Parquet row groups; rotates files every file_rows rows.
+    """
+
+    def __init__(self, directory, prefix=None, row_group=STAGE_ROW_GROUP, file_rows=STAGE_FILE_ROWS):
+        if not PYARROW_AVAILABLE:
+            raise RuntimeError("SEEDER_STAGE_DIR needs pyarrow (pip install pyarrow)")
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        # seed-site-20261019-101500-4242-0001.parquet: which seeder, when, which process
+        prefix = prefix or os.path.splitext(os.path.basename(sys.argv[0]))[0].strip("-") or "knowledge"
+        self.prefix = f"{prefix}-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+        self.row_group = row_group
+        self.file_rows = file_rows
+        self.lock = threading.Lock()
+        self.pending = []
+        self.dim = None
+        self.writer = None
+        self.path = None
+        self.file_count = 0
+        self.in_file = 0
+        self.rows = 0
+        self.files = []
+
+    def write(self, rows):
+        with self.lock:
+            for row in rows:
+                if self.dim is None and row.get("embedding") is not None:
+                    self.dim = len(row["embedding"])
+                self.pending.append(row)
+                if len(self.pending) >= self.row_group:
+                    self._flush()
+
+    def _flush(self):
+        if not self.pending:
+            return
+        if self.dim is None:
+            raise ValueError("cannot stage rows before one of them has an embedding")
+        while self.pending:
+            if self.writer is None:
+                self.file_count += 1
+                self.path = os.path.join(self.directory, f"{self.prefix}-{self.file_count:04d}{STAGED_SUFFIX}")
+                self.writer = pq.ParquetWriter(self.path + PARTIAL_SUFFIX, knowledge_schema(self.dim))
+                self.in_file = 0
+            take = min(len(self.pending), self.file_rows - self.in_file)
+            batch, self.pending = self.pending[:take], self.pending[take:]
+            self.writer.write_table(rows_to_table(batch, self.dim))
+            self.in_file += len(batch)
+            self.rows += len(batch)
+            count("stage.rows", len(batch))
+            if self.in_file >= self.file_rows:
+                self._close_file()
+
+    def _close_file(self):
+        self.writer.close()
+        os.replace(self.path + PARTIAL_SUFFIX, self.path)
+        self.files.append(self.path)
+        self.writer = None
+
+    def close(self):
+        with self.lock:
+            self._flush()
+            if self.writer is not None:
+                self._close_file()
+        if self.files:
+            print(f"📦 Staged {self.rows} knowledge rows in {len(self.files)} file(s) under {self.directory}")
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def stage_writer():
+    """
+    The process' StagedWriter for SEEDER_STAGE_DIR, closed at exit.
+    """
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = StagedWriter(STAGE_DIR)
+            atexit.register(_writer.close)
+        return _writer
+
+
+def insert_knowledge(supabase, rows):
+    """
+    One batch of provider_knowledge rows: REST insert, or staged with SEEDER_STAGE_DIR.
+    """
+    if not rows:
+        return
+    if STAGE_DIR:
+        with span("stage.write.provider_knowledge"):
+            stage_writer().write(rows)
+        return
+    with span("db.insert.provider_knowledge"):
+        supabase.table("provider_knowledge").insert(rows).execute()
@@ -0,0 +1,284 @@
+import os
+import re
+import hashlib
+import posixpath
+import threading
+from collections import Counter
+from urllib.parse import urlsplit, urlunsplit, unquote, quote, urljoin
+
+from bs4 import BeautifulSoup
+
+from instrumentation import count
+from web_chunker import chunk_html
+
+# URL canonicalization + duplicate-content detection for the site crawler.
+#
+#   canonicalize("HTTP://WWW.Example.com/Blog/index.html?utm=x#top", like="https://example.com")
+#       -> "https://example.com/Blog"
+#
+# Variants that differ only by scheme, "www.", host case, default documents
+# (index.html, ...), duplicate slashes, dot segments, query, fragment or a
+# trailing slash map to one URL. Scheme and "www." follow the crawl's start
+# URL (`like`) so the result is still fetchable. Path case is kept: the
+# canonical URL is what gets fetched. url_key() folds it for sites known to
+# be case-insensitive, so /Blog and /blog are queued once.
+#
+# Pages are also fingerprinted: an exact hash of the normalised text plus a
+# 64-bit SimHash, so near-identical bodies (same article under two URLs,
+# print views, tracking variants) are skipped before chunking/embedding.
+# CrawlDeduper ties both to a crawl_frontier.CrawlFrontier and counts the
+# fetches and chunks it saved.
+
+DEFAULT_DOCUMENTS = {"index.html", "index.htm", "index.php", "default.html", "default.htm",
+                     "default.aspx", "index.shtml"}
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+# Off by default: on most servers /Foo and /foo are different pages. Turn on
+# for a site that isn't (IIS, some WordPress setups); only the dedupe key is
+# folded, the URL fetched keeps the case of its first spelling
+CASE_INSENSITIVE_PATHS = os.getenv("CRAWL_CASE_INSENSITIVE_PATHS", "").lower() in ("1", "true", "yes")
+
+# Listing pages: crawled for their links, never ingested
+ARCHIVE_PATTERNS = [re.compile(p) for p in (
+    r"/(tag|tags|category|categories|author|topics?)(/|$)",
+    r"/page/\d+/?$",
+    r"/comment-page-\d+/?$",
+    r"/(19|20)\d\d(/\d\d){0,2}/?$",
+    r"/(archive|archives|feed|search)(/|$)",
+)]
+
+SIMHASH_BITS = 64
+SIMHASH_MAX_DISTANCE = 3
+SIMHASH_SHINGLE = 3
+_WORD_RE = re.compile(r"\w+")
+
+
+# --- URLs ---
+
+def _bare_host(host):
+    return host[4:] if host.startswith("www.") else host
+
+
+def canonicalize(url, like=None):
+    """
+    Normalised form of `url`. With `like` (the crawl's start URL), scheme and
+    www-prefix are taken from it when the hosts match modulo "www.".
+    """
+    parts = urlsplit(url.strip())
+    scheme = (parts.scheme or "https").lower()
+    host = (parts.hostname or "").lower().rstrip(".")
+    port = parts.port
+
+    if like:
+        ref = urlsplit(like)
+        ref_host = (ref.hostname or "").lower()
+        if _bare_host(host) == _bare_host(ref_host):
+            scheme, host = ref.scheme.lower() or scheme, ref_host
+            port = ref.port
+
+    netloc = host
+    if port and port != DEFAULT_PORTS.get(scheme):
+        netloc = f"{host}:{port}"
+
+    # Decode then re-encode so %7E / ~ and friends compare equal
+    path = quote(unquote(parts.path or "/"), safe="/:@!$&'()*+,;=-._~")
+    path = re.sub(r"/{2,}", "/", path)
+    path = posixpath.normpath(path) if path not in ("", "/") else "/"
+    head, tail = posixpath.split(path)
+    if tail in DEFAULT_DOCUMENTS:
+        path = head
+    path = path.rstrip("/")
+
+    return urlunsplit((scheme, netloc, path, "", ""))
+
+
+def url_key(url):
+    """
+    Dedupe key for a canonical URL: the URL itself, path lowercased with
+    CASE_INSENSITIVE_PATHS. Never fetch the key.
+    """
+    if not CASE_INSENSITIVE_PATHS:
+        return url
+    parts = urlsplit(url)
+    return urlunsplit(parts._replace(path=parts.path.lower()))
+
+
+def same_site(url, root):
+    """
+    True if canonical `url` lives under canonical `root` (host + path prefix).
+    """
+    return url == root or url.startswith(root.rstrip("/") + "/")
+
+
+def is_archive(url):
+    path = urlsplit(url).path
+    return any(p.search(path) for p in ARCHIVE_PATTERNS)
+
+
+def canonical_from_html(html, page_url, like=None):
+    """
+    The page's <link rel="canonical"> (canonicalized), or None.
+    """
+    soup = html if isinstance(html, BeautifulSoup) else BeautifulSoup(html, "html.parser")
+    for link in soup.find_all("link", href=True):
+        rel = link.get("rel") or []
+        rel = rel if isinstance(rel, list) else rel.split()
+        if "canonical" in [r.lower() for r in rel]:
+            return canonicalize(urljoin(page_url, link["href"]), like)
+    return None
+
+
+# --- Content fingerprints ---
+
+def normalise_text(text):
+    return " ".join(_WORD_RE.findall(text.lower()))
+
+
+def exact_hash(text):
+    return hashlib.sha1(normalise_text(text).encode()).hexdigest()
+
+
+def simhash(text):
+    words = _WORD_RE.findall(text.lower())
+    if len(words) < SIMHASH_SHINGLE:
+        words = words + [""] * (SIMHASH_SHINGLE - len(words))
+    weights = [0] * SIMHASH_BITS
+    for i in range(len(words) - SIMHASH_SHINGLE + 1):
+        shingle = " ".join(words[i:i + SIMHASH_SHINGLE])
+        h = int.from_bytes(hashlib.blake2b(shingle.encode(), digest_size=8).digest(), "little")
+        for bit in range(SIMHASH_BITS):
+            weights[bit] += 1 if (h >> bit) & 1 else -1
+    value = 0
+    for bit, weight in enumerate(weights):
+        if weight > 0:
+            value |= 1 << bit
+    return value
+
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+
+class ContentIndex:
+    """
+    Exact + near-duplicate lookup. SimHashes are bucketed by 16-bit bands, so
+    any fingerprint within 3 bits shares at least one band (pigeonhole).
+    """
+
+    BANDS = 4
+
+    def __init__(self, entries=()):
+        self.exact = {}
+        self.bands = [{} for _ in range(self.BANDS)]
+        for url, exact, sim in entries:
+            self.add(url, exact, sim)
+
+    def _band_keys(self, sim):
+        width = SIMHASH_BITS // self.BANDS
+        mask = (1 << width) - 1
+        return [(sim >> (i * width)) & mask for i in range(self.BANDS)]
+
+    def find(self, exact, sim):
+        """
+        URL of an already-indexed page with the same or nearly the same text.
+        """
+        if exact in self.exact:
+            return self.exact[exact]
+        for band, key in zip(self.bands, self._band_keys(sim)):
+            for other_sim, url in band.get(key, ()):
+                if hamming(sim, other_sim) <= SIMHASH_MAX_DISTANCE:
+                    return url
+        return None
+
+    def add(self, url, exact, sim):
+        self.exact.setdefault(exact, url)
+        for band, key in zip(self.bands, self._band_keys(sim)):
+            band.setdefault(key, []).append((sim, url))
+
+
+class CrawlDeduper:
+    """
+    Per-crawl URL + content dedupe for seed-site.py.
+    """
+
+    def __init__(self, start_url, frontier):
+        self.like = start_url
+        self.root = canonicalize(start_url)
+        self.frontier = frontier
+        self.index = ContentIndex(frontier.fingerprints())
+        self.lock = threading.Lock()
+        self.raw_links = set()
+        self.canonical_links = set()
+        self.spellings = {url_key(self.root): self.root}
+        self.skipped = Counter()
+        self.chunks_saved = 0
+        self.tokens_saved = 0
+
+    def canonical(self, url):
+        return canonicalize(url, self.like)
+
+    def link(self, canonical):
+        """
+        The URL to queue for a canonical link: the first spelling seen with
+        the same url_key, so case variants are fetched once.
+        """
+        with self.lock:
+            return self.spellings.setdefault(url_key(canonical), canonical)
+
+    def note_link(self, raw, canonical):
+        """
+        Records one discovered link. raw is the old key (query, fragment and
+        one trailing slash stripped), to count how many fetches the
+        canonical form saves.
+        """
+        with self.lock:
+            self.raw_links.add(raw)
+            self.canonical_links.add(url_key(canonical))
+
+    def _skip(self, page, reason, detail):
+        chunks = chunk_html(page["html"])
+        with self.lock:
+            self.skipped[reason] += 1
+            self.chunks_saved += len(chunks)
+            self.tokens_saved += sum(c["tokens"] for c in chunks)
+        count(f"dedupe.skipped.{reason}")
+        count("dedupe.chunks_saved", len(chunks))
+        print(f"   ♊ Skipping ({reason}): {detail}")
+        return reason
+
+    def check(self, page):
+        """
+        Returns None if the extracted page should be ingested, else the reason
+        it was skipped ("archive", "canonical" or "content").
+        """
+        url = page["url"]
+        if is_archive(url):
+            return self._skip(page, "archive", "listing page")
+
+        canonical = canonical_from_html(page["html"], url, self.like)
+        if canonical and url_key(canonical) != url_key(url) and same_site(canonical, self.root):
+            status = self.frontier.status(canonical)
+            if status in ("queued", "in_progress", "done"):
+                return self._skip(page, "canonical", f"canonical is {canonical}")
+            if status is None:
+                # Ingest under this URL; the canonical one need not be fetched
+                self.frontier.add(canonical, depth=1)
+                self.frontier.mark(canonical, "skipped", f"alias of {url}")
+
+        exact, sim = exact_hash(page["text"]), simhash(page["text"])
+        with self.lock:
+            duplicate = self.index.find(exact, sim)
+            if duplicate is None or duplicate == url:
+                self.index.add(url, exact, sim)
+        if duplicate is not None and duplicate != url:
+            return self._skip(page, "content", f"same text as {duplicate}")
+        self.frontier.save_fingerprint(url, exact, sim)
+        return None
+
+    def report(self):
+        fetches_saved = len(self.raw_links) - len(self.canonical_links)
+        count("dedupe.fetches_saved", fetches_saved)
+        skipped = ", ".join(f"{n} {reason}" for reason, n in self.skipped.items()) or "none"
+        print(f"🧹 Dedupe: {fetches_saved} fetches saved ({len(self.raw_links)} link variants -> "
+              f"{len(self.canonical_links)} URLs); pages skipped: {skipped}; "
+              f"{self.chunks_saved} chunks / {self.tokens_saved} tokens not embedded")
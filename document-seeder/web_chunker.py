@@ -0,0 +1,258 @@
+import os
+import re
+from bs4 import BeautifulSoup, NavigableString, Tag
+
+# Structure-aware chunking for web pages and newsletter HTML.
+#
+#   from web_chunker import chunk_html
+#   for chunk in chunk_html(html):
+#       chunk["text"], chunk["header_path"]     # "/Guide/Claiming relief/"
+#
+# Splits on the page's own heading hierarchy instead of a fixed token window:
+#   - nav/footer/aside/forms and page-level <header>s are dropped, <main>/<article>
+#     preferred; nothing that is or holds the main content is ever dropped
+#   - each heading starts a section; chunk text starts with that heading as
+#     markdown ("## Heading"), the same shape MarkdownNodeParser gives seed-pdf
+#   - tables become "a | b" rows so they stay in one piece
+#   - sections under WEB_CHUNK_MIN_TOKENS merge into their neighbour
+#   - sections over WEB_CHUNK_MAX_TOKENS split on paragraphs, then sentences
+#
+# header_path uses MarkdownNodeParser's format so web and PDF chunks carry
+# the same metadata key.
+
+MIN_TOKENS = int(os.getenv("WEB_CHUNK_MIN_TOKENS", "200"))
+MAX_TOKENS = int(os.getenv("WEB_CHUNK_MAX_TOKENS", "1024"))
+
+HEADING_TAGS = {"h1": 1, "h2": 2, "h3": 3, "h4": 4, "h5": 5, "h6": 6}
+BLOCK_TAGS = {"p", "li", "blockquote", "pre", "figcaption", "dt", "dd"}
+DROP_TAGS = ["script", "style", "noscript", "nav", "footer", "aside",
+             "form", "button", "svg", "iframe", "template"]
+PAGE_ONLY_TAGS = ["header"]  # site chrome outside the main content, an article's own title inside it
+# Whole class tokens, not substrings: "has-share-buttons" or "shareholder-rights" must survive
+DROP_CLASSES = {
+    "subscribe", "subscribe-widget", "subscription-widget", "share", "share-buttons", "sharing",
+    "social-share", "comments", "comment-list", "comments-section", "cookie-banner", "cookie-notice",
+    "cookie-consent", "newsletter", "newsletter-signup", "related", "related-posts", "byline",
+}
+MAIN_SELECTORS = ["main", "article", "[role=main]", ".post-content", ".entry-content", ".available-content"]
+
+SENTENCE_RE = re.compile(r"(?<=[.!?])\s+(?=[A-Z0-9\"'(])")
+
+# Optional: exact token counts
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("cl100k_base")
+except Exception:
+    _encoding = None
+
+
+def token_len(text):
+    if _encoding is not None:
+        return len(_encoding.encode(text, disallowed_special=()))
+    return max(1, len(text) // 4)
+
+
+# --- HTML -> sections ---
+
+def _main_content(soup):
+    mains = soup.select(", ".join(MAIN_SELECTORS))
+    inside = {id(tag) for tag in mains}
+    protected = set(inside)
+    for tag in mains:
+        protected.update(id(parent) for parent in tag.parents)
+
+    def droppable(tag):
+        return not tag.decomposed and id(tag) not in protected
+
+    for tag in soup(DROP_TAGS):
+        if droppable(tag):
+            tag.decompose()
+    for tag in soup(PAGE_ONLY_TAGS):
+        if droppable(tag) and not any(id(parent) in inside for parent in tag.parents):
+            tag.decompose()
+    for tag in soup.find_all(class_=True):
+        if droppable(tag) and DROP_CLASSES.intersection(c.lower() for c in tag.get("class") or []):
+            tag.decompose()
+    for selector in MAIN_SELECTORS:
+        found = soup.select_one(selector)
+        if found and len(found.get_text(strip=True)) > 200:
+            return found
+    return soup.body or soup
+
+
+def _clean(text):
+    return " ".join(text.split())
+
+
+def _table_text(table):
+    rows = []
+    for tr in table.find_all("tr"):
+        cells = [_clean(c.get_text(" ")) for c in tr.find_all(["th", "td"])]
+        if any(cells):
+            rows.append(" | ".join(cells))
+    return "\n".join(rows)
+
+
+def html_to_sections(html):
+    """
+    Returns [{"path": [h1, h2, ...], "level": n, "heading": str|None, "blocks": [str]}]
+    in document order. Text before the first heading gets an empty path.
+    """
+    soup = BeautifulSoup(html, "html.parser")
+    root = _main_content(soup)
+
+    sections = []
+    stack = []  # [(level, heading)]
+    current = {"path": [], "level": 0, "heading": None, "blocks": []}
+    loose = []
+
+    def flush_loose():
+        text = _clean(" ".join(loose))
+        loose.clear()
+        if text:
+            current["blocks"].append(text)
+
+    def walk(node):
+        nonlocal current
+        for child in node.children:
+            if isinstance(child, NavigableString):
+                if type(child) is NavigableString and child.strip():
+                    loose.append(str(child))
+                continue
+            if not isinstance(child, Tag):
+                continue
+            name = child.name
+            if name in HEADING_TAGS:
+                flush_loose()
+                heading = _clean(child.get_text(" "))
+                if not heading:
+                    continue
+                level = HEADING_TAGS[name]
+                stack[:] = [(l, h) for l, h in stack if l < level] + [(level, heading)]
+                if current["blocks"] or current["heading"]:
+                    sections.append(current)
+                current = {"path": [h for _, h in stack], "level": level, "heading": heading, "blocks": []}
+            elif name == "table":
+                flush_loose()
+                text = _table_text(child)
+                if text:
+                    current["blocks"].append(text)
+            elif name in BLOCK_TAGS:
+                flush_loose()
+                text = _clean(child.get_text(" "))
+                if text:
+                    current["blocks"].append(text)
+            elif name == "br":
+                flush_loose()
+            else:
+                walk(child)
+                if name in ("div", "section", "ul", "ol", "dl"):
+                    flush_loose()
+
+    walk(root)
+    flush_loose()
+    if current["blocks"] or current["heading"]:
+        sections.append(current)
+    # A heading with nothing under it just labels the next section
+    return [s for s in sections if s["blocks"]]
+
+
+# --- sections -> chunks ---
+
+def _split_long(text, max_tokens):
+    """
+    Sentence-level split for a single block that is over the cap.
+    """
+    pieces, current = [], []
+    for sentence in SENTENCE_RE.split(text):
+        if current and token_len(" ".join(current + [sentence])) > max_tokens:
+            pieces.append(" ".join(current))
+            current = []
+        if token_len(sentence) > max_tokens:
+            # No sentence boundaries at all: hard split on words
+            words = sentence.split()
+            step = max(1, len(words) * max_tokens // token_len(sentence))
+            pieces.extend(" ".join(words[i:i + step]) for i in range(0, len(words), step))
+            continue
+        current.append(sentence)
+    if current:
+        pieces.append(" ".join(current))
+    return pieces
+
+
+def _section_parts(section, max_tokens):
+    """
+    One section -> [(path, text)] pieces, each under max_tokens.
+    Only the first piece carries the markdown heading.
+    """
+    heading = f"{'#' * section['level']} {section['heading']}" if section["heading"] else None
+    # Leave room for the heading so it never ends up alone in a piece
+    budget = max(1, max_tokens - (token_len(heading) + 1 if heading else 0))
+    blocks = []
+    for block in section["blocks"]:
+        blocks.extend(_split_long(block, budget) if token_len(block) > budget else [block])
+
+    parts, current = [], [heading] if heading else []
+    for block in blocks:
+        if current != [heading] and current and token_len("\n\n".join(current + [block])) > max_tokens:
+            parts.append("\n\n".join(current))
+            current = []
+        current.append(block)
+    if current:
+        parts.append("\n\n".join(current))
+    return [(section["path"], text) for text in parts]
+
+
+def _common_path(a, b):
+    out = []
+    for x, y in zip(a, b):
+        if x != y:
+            break
+        out.append(x)
+    return out
+
+
+def _header_path(path):
+    return "/" + "".join(f"{p}/" for p in path)
+
+
+def chunk_sections(sections, min_tokens=MIN_TOKENS, max_tokens=MAX_TOKENS):
+    """
+    Merges tiny sections forward (never across a cap) and splits big ones.
+    Returns [{"text", "header_path", "section", "tokens"}].
+    """
+    parts = [part for section in sections for part in _section_parts(section, max_tokens)]
+
+    chunks = []
+    for path, text in parts:
+        tokens = token_len(text)
+        if chunks and chunks[-1]["tokens"] < min_tokens and chunks[-1]["tokens"] + tokens <= max_tokens:
+            last = chunks[-1]
+            last["text"] += "\n\n" + text
+            last["tokens"] += tokens
+            last["path"] = _common_path(last["path"], path)
+            continue
+        chunks.append({"path": list(path), "section": path[-1] if path else "", "text": text, "tokens": tokens})
+
+    # A tiny tail folds back into the chunk before it when there is room
+    if len(chunks) > 1 and chunks[-1]["tokens"] < min_tokens \
+            and chunks[-2]["tokens"] + chunks[-1]["tokens"] <= max_tokens:
+        tail = chunks.pop()
+        chunks[-1]["text"] += "\n\n" + tail["text"]
+        chunks[-1]["tokens"] += tail["tokens"]
+        chunks[-1]["path"] = _common_path(chunks[-1]["path"], tail["path"])
+
+    return [
+        {"text": c["text"], "header_path": _header_path(c["path"]), "section": c["section"], "tokens": c["tokens"]}
+        for c in chunks
+    ]
+
+
+def chunk_html(html, min_tokens=MIN_TOKENS, max_tokens=MAX_TOKENS):
+    """
+    HTML -> structure-aware chunks. Empty list if the page has no usable text,
+    so callers can fall back to plain-text splitting.
+    """
+    if not html:
+        return []
+    return chunk_sections(html_to_sections(html), min_tokens, max_tokens)
@@ -0,0 +1,96 @@
+const fs = require('fs');
+const path = require('path');
+const crypto = require('crypto');
+
+// Static per-page match bundles written by document-seeder/match_bundles.py.
+// <key>.json (+ .gz / .br) is the exact /api/match-map response for one page;
+// index.json maps the normalised page URL to its key and ETag.
+const BUNDLE_DIR = process.env.MATCH_BUNDLE_DIR || path.resolve(__dirname, '..', 'match-bundles');
+const MANIFEST_PATH = path.join(BUNDLE_DIR, 'index.json');
+
+let manifestCache = { mtimeMs: 0, entries: {} };
+
+// Query, fragment and trailing slash dropped (same as normalize_page_url in Python)
+const normalizePageUrl = (url = '') => url.replace(/[#?].*/, '').replace(/\/+$/, '');
+
+const bundleKey = (url) => crypto.createHash('sha1').update(normalizePageUrl(url)).digest('hex').slice(0, 20);
+
+const loadManifest = () => {
+  try {
+    const { mtimeMs } = fs.statSync(MANIFEST_PATH);
+    if (mtimeMs !== manifestCache.mtimeMs) {
+      manifestCache = { mtimeMs, entries: JSON.parse(fs.readFileSync(MANIFEST_PATH, 'utf8')) };
+    }
+  } catch (err) {
+    manifestCache = { mtimeMs: 0, entries: {} };
+  }
+  return manifestCache.entries;
+};
+
+const pickEncoding = (acceptEncoding = '', base) => {
+  if (/\bbr\b/.test(acceptEncoding) && fs.existsSync(`${base}.br`)) return ['br', `${base}.br`];
+  if (/\bgzip\b/.test(acceptEncoding) && fs.existsSync(`${base}.gz`)) return ['gzip', `${base}.gz`];
+  return [null, base];
+};
+
+/**
+ * Sends the bundle for pageUrl if one exists (304 when the ETag matches).
+ * @returns {boolean} false when there is no bundle and the caller should query the DB
+ */
+function serveBundle(req, res, pageUrl, providerId) {
+  const entry = loadManifest()[normalizePageUrl(pageUrl)];
+  if (!entry || (providerId && entry.provider_id !== providerId)) {
+    return false;
+  }
+  const base = path.join(BUNDLE_DIR, `${entry.key}.json`);
+  if (!fs.existsSync(base)) {
+    return false;
+  }
+
+  const etag = `"${entry.etag}"`;
+  const headers = {
+    'Content-Type': 'application/json',
+    'Access-Control-Allow-Origin': '*',
+    'Cache-Control': 'public, max-age=60, must-revalidate',
+    ETag: etag,
+    Vary: 'Accept-Encoding',
+    'X-Match-Source': 'bundle'
+  };
+  if (req.headers['if-none-match'] === etag) {
+    res.writeHead(304, headers);
+    res.end();
+    return true;
+  }
+
+  const [encoding, file] = pickEncoding(req.headers['accept-encoding'], base);
+  if (encoding) {
+    headers['Content-Encoding'] = encoding;
+  }
+  res.writeHead(200, headers);
+  res.end(fs.readFileSync(file));
+  return true;
+}
+
+/**
+ * Drops a page's bundle (e.g. after a status change) so requests fall back
+ * to the DB until match_bundles.py regenerates it.
+ */
+function invalidateBundle(pageUrl) {
+  const entries = loadManifest();
+  const key = normalizePageUrl(pageUrl);
+  const entry = entries[key];
+  if (!entry) return false;
+  for (const suffix of ['.json', '.json.gz', '.json.br']) {
+    fs.rmSync(path.join(BUNDLE_DIR, `${entry.key}${suffix}`), { force: true });
+  }
+  delete entries[key];
+  fs.writeFileSync(MANIFEST_PATH, JSON.stringify(entries, null, 2));
+  return true;
+}
+
+module.exports = {
+  bundleKey,
+  invalidateBundle,
+  normalizePageUrl,
+  serveBundle
+};
@@ -2,6 +2,7 @@ const path = require('path');
 const dotenv = require('dotenv');
 const { createClient } = require('@supabase/supabase-js');
 const { getProviderDocument } = require('./provider-documents');
+const { normalizePageUrl, serveBundle } = require('./match-bundles');
 
 dotenv.config({
   path: path.resolve(__dirname, '..', '..', '.env')
@@ -35,11 +36,16 @@ const vimeoEmbedUrl = (originalUrl = '', timestamp = 0) => {
   return `https://player.vimeo.com/video/${videoId}?autoplay=1&title=0&byline=0${suffix}`;
 };
 
-const fetchMatches = async (providerId, limit = 50) => {
-    const { data, error } = await supabase
+const fetchMatches = async (providerId, limit = 50, pageUrl = null) => {
+    let query = supabase
       .from('page_matches')
       .select('id, phrase, video_url, confidence, document_id, status')
-      .eq('provider_id', providerId)
+      .eq('provider_id', providerId);
+    if (pageUrl) {
+      const cleanUrl = normalizePageUrl(pageUrl);
+      query = query.in('url', [cleanUrl, `${cleanUrl}/`]);
+    }
+    const { data, error } = await query
       .order('created_at', { ascending: false })
       .limit(limit);
 
@@ -98,7 +104,13 @@ async function handler(req, res) {
       return res.end(JSON.stringify({ error: 'Missing provider_id' }));
     }
 
-    const matches = await fetchMatches(providerId);
+    // ?url=<page>: one static read of the precomputed bundle when there is one
+    const pageUrl = requestUrl.searchParams.get('url');
+    if (pageUrl && serveBundle(req, res, pageUrl, providerId)) {
+      return;
+    }
+
+    const matches = await fetchMatches(providerId, 50, pageUrl);
     res.setHeader('Content-Type', 'application/json');
     res.setHeader('Access-Control-Allow-Origin', '*');
     res.end(JSON.stringify(matches));
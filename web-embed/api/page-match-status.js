@@ -1,6 +1,7 @@
 const path = require("path");
 const dotenv = require("dotenv");
 const { createClient } = require("@supabase/supabase-js");
+const { invalidateBundle } = require("./match-bundles");
 
 dotenv.config({
   path: path.resolve(__dirname, "..", "..", ".env"),
@@ -38,9 +39,14 @@ async function handler(req, res) {
     const { data, error } = await supabase
       .from("page_matches")
       .update({ status })
-      .eq("id", page_match_id);
+      .eq("id", page_match_id)
+      .select("url");
 
     if (error) throw error;
+    // The page's static bundle has the old status now
+    for (const row of data || []) {
+      invalidateBundle(row.url);
+    }
 
     const updatedCount = Array.isArray(data) ? data.length : 0;
     res.setHeader("Content-Type", "application/json");
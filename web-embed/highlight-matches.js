@@ -1,26 +1,62 @@
 (() => {
   const MATCH_MAP_KEY = "__SL_MATCH_MAP__";
+  const MATCH_DATA_SCRIPT_ID = "sl-match-map-data";
   const MATCH_CLASS = "sl-smart-link";
-  const MATCH_MAP_URL = "/api/match-map?provider_id=12";
+  const pageUrl = () => {
+    const canonical = document.querySelector('link[rel="canonical"]');
+    return canonical ? canonical.href : window.location.href;
+  };
+  const MATCH_MAP_URL = `/api/match-map?provider_id=12&url=${encodeURIComponent(pageUrl())}`;
 
-  const getMatches = async () => {
+  const inlineMatches = () => {
     if (window[MATCH_MAP_KEY] && window[MATCH_MAP_KEY].length) {
       return window[MATCH_MAP_KEY];
     }
+    const script = document.getElementById(MATCH_DATA_SCRIPT_ID);
+    if (!script || !script.textContent) return [];
+    try {
+      const parsed = JSON.parse(script.textContent);
+      return Array.isArray(parsed) ? parsed : [];
+    } catch (error) {
+      console.error("[highlight-matches] bad inline match map", error);
+      return [];
+    }
+  };
+
+  const fetchMatches = async () => {
     try {
       const response = await fetch(MATCH_MAP_URL);
       if (!response.ok) throw new Error("Failed to load match map");
       return await response.json();
     } catch (error) {
       console.error("[highlight-matches] fetch error", error);
-      return [];
+      return null;
+    }
+  };
+
+  const getMatches = async () => {
+    const inline = inlineMatches();
+    if (inline.length) return inline;
+    return (await fetchMatches()) || [];
+  };
+
+  // Same places admin-script.js keeps it: the extension's content script reads the JSON one
+  const persistMatches = (matches) => {
+    window[MATCH_MAP_KEY] = matches;
+    let script = document.getElementById(MATCH_DATA_SCRIPT_ID);
+    if (!script) {
+      script = document.createElement("script");
+      script.id = MATCH_DATA_SCRIPT_ID;
+      script.type = "application/json";
+      document.body.appendChild(script);
     }
+    script.textContent = JSON.stringify(matches);
   };
 
   const normalize = (str) => str.replace(/\s+/g, " ").trim();
 
-  const highlightMatches = (matches) => {
-    if (!matches.length) return;
+  const highlightMatches = (matches, placed = new Set()) => {
+    if (matches.length <= placed.size) return;
     const contentWalker = document.createTreeWalker(document.body, NodeFilter.SHOW_TEXT, null, false);
     const textNodes = [];
     let node;
@@ -29,7 +65,7 @@
     }
 
     matches.forEach((match, matchIndex) => {
-      if (!match.phrase) return;
+      if (!match.phrase || placed.has(matchIndex)) return;
       const targetPhrase = normalize(match.phrase);
       for (const textNode of textNodes) {
         const parent = textNode.parentElement;
@@ -63,11 +99,47 @@
     });
   };
 
+  // Mirrors from generate-map.py arrive with their spans already in place
+  const serverHighlighted = () => document.documentElement.dataset.slHighlighted === "server";
+
+  // A mirror's spans carry the page_match_id they were generated for. The
+  // live map decides which are still active and at what index; spans of
+  // rows no longer active are unwrapped, rows activated since are
+  // highlighted here.
+  const syncWithLiveMap = async () => {
+    const live = await fetchMatches();
+    if (!Array.isArray(live)) return;
+    const active = live.filter((match) => match.status === "active");
+    const indexById = new Map(active.map((match, index) => [String(match.page_match_id), index]));
+    const placed = new Set();
+    document.querySelectorAll(`.${MATCH_CLASS}[data-page-match-id]`).forEach((span) => {
+      const index = indexById.get(span.dataset.pageMatchId);
+      if (index === undefined) {
+        span.replaceWith(...span.childNodes);
+        return;
+      }
+      span.dataset.matchIndex = index;
+      placed.add(index);
+    });
+    highlightMatches(active, placed);
+    persistMatches(active);
+  };
+
   const init = async () => {
+    const started = performance.now();
     const matches = await getMatches();
-    highlightMatches(matches);
+    const prehighlighted = serverHighlighted();
+    if (!prehighlighted) highlightMatches(matches);
     installClickHandler();
-    console.log("[highlight-matches] applied", matches.length, "highlights");
+    // Read by bench/mirror_highlight.py
+    window.__SL_HIGHLIGHT_MS__ = performance.now() - started;
+    console.log(
+      "[highlight-matches] applied",
+      matches.length,
+      prehighlighted ? "server-side highlights" : "highlights",
+      `in ${window.__SL_HIGHLIGHT_MS__.toFixed(1)} ms`
+    );
+    if (prehighlighted) syncWithLiveMap();
   };
 
   if (document.readyState === "loading") {